@@ -31,7 +31,8 @@ echo "Creating Kafka topics..."
 #   --config retention.ms=604800000
 
 # Schedule Events Topic
-kafka-topics --create \
+# Relayed from the schedule service's outbox, keyed by task id; notify_user keeps its timers from it
+kafka-topics --create --if-not-exists \
   --bootstrap-server kafka:9093 \
   --topic schedule-events \
   --partitions 3 \
@@ -40,14 +41,22 @@ kafka-topics --create \
   --config retention.ms=604800000
 
 # Notification Events Topic
-kafka-topics --create \
+# Keyed by task/user id, so 12 partitions let up to 12 consumers share the load
+# while each task's events stay in order
+kafka-topics --create --if-not-exists \
   --bootstrap-server kafka:9093 \
   --topic notification-events \
-  --partitions 3 \
+  --partitions 12 \
   --replication-factor 1 \
   --config cleanup.policy=delete \
   --config retention.ms=1209600000
 
+# The topic may already exist with the broker default of 3 (auto-create); partitions can only grow
+kafka-topics --alter \
+  --bootstrap-server kafka:9093 \
+  --topic notification-events \
+  --partitions 12 || true
+
 # # User Events Topic
 # kafka-topics --create \
 #   --bootstrap-server kafka:29092 \
@@ -1,6 +1,7 @@
+import uuid
 from typing import Dict, Any, Optional, List
 from fastapi import HTTPException
-from models import Project, ProjectCreate, ProjectUpdate, ProjectResponse, ProjectListResponse
+from models import Project, ProjectCreate, ProjectUpdate, ProjectResponse, ProjectListResponse, ProjectMembersResponse
 from services.project_service import ProjectService
 
 
@@ -73,6 +74,36 @@ class ProjectController:
             )
 
 
+    # Get projects visible to a user (owned + member + department)
+    def get_projects_visible_to_user(self, user_id: str,
+                                     profile: Optional[Dict[str, Any]] = None) -> ProjectListResponse:
+        """
+        profile: the caller's verified identity when they ask about themselves;
+        otherwise the role and department are read from the USER row
+        """
+        try:
+            uuid.UUID(user_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="User ID must be a UUID")
+        role = (profile or {}).get("role")
+        department = (profile or {}).get("department")
+        try:
+            projects_data = self.project_service.get_projects_visible_to_user(user_id, role, department) or []
+            projects = [self._project_from_row(p) for p in projects_data]
+
+            if not projects:
+                return ProjectListResponse(message=f"No projects visible to user {user_id}", project=[])
+
+            return ProjectListResponse(
+                message=f"{len(projects)} project(s) visible to user {user_id}",
+                project=projects
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error fetching projects visible to user: {str(e)}"
+            )
+
     def get_project_by_id(self, project_id: str) -> ProjectResponse:
         """
         Get a project by its ID
@@ -176,6 +207,32 @@ class ProjectController:
         except Exception as e:
             raise HTTPException(status_code=400, detail=str(e))
     
+    def change_members(self, project_id: str, user_ids: List[str], action: str,
+                       only_unreferenced: bool = True) -> ProjectMembersResponse:
+        """
+        Add or remove project members in one database call
+        """
+        try:
+            if action == "add":
+                result = self.project_service.add_members(project_id, user_ids)
+            else:
+                result = self.project_service.remove_members(project_id, user_ids, only_unreferenced)
+
+            if not result or not result.get("project"):
+                raise HTTPException(status_code=404, detail=f"Project {project_id} not found")
+
+            changed = result.get("changed") or []
+            verb = "added to" if action == "add" else "removed from"
+            return ProjectMembersResponse(
+                message=f"{len(changed)} member(s) {verb} project {project_id}",
+                project=self._project_from_row(result["project"]),
+                changed=changed
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error updating project members: {str(e)}")
+
     def delete_project(self, project_id: str) -> Dict[str, str]:
         """
         Delete a project
@@ -197,6 +254,12 @@ class ProjectController:
         Get all logs for a project
         """
         return self.project_service.get_all_logs(filter_by)
+
+    def get_logs_page(self, **filters) -> List[Dict[str, Any]]:
+        """
+        One keyset page of audit logs for projects
+        """
+        return self.project_service.get_logs_page(**filters)
     
     
     def get_projects_by_department(self, department: str) -> ProjectListResponse:
@@ -1,17 +1,37 @@
-from fastapi import FastAPI, HTTPException, Body
-from typing import Any, Dict
+from fastapi import FastAPI, HTTPException, Body, Query, Request
+from typing import Any, Dict, Optional
+from datetime import datetime
+from functools import partial
 from fastapi.params import Path
-from fastapi.responses import Response
+from fastapi.responses import Response, ORJSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from dotenv import load_dotenv
 import uvicorn
+from tracing import init_tracing, instrument_app
+from metrics import init_metrics
+from logging_config import setup_logging
+from auth_middleware import caller_profile, install_auth
+from audit_trail import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, logs_export, logs_page
 
 # Import MVC components
 from controllers import ProjectController
-from models import ProjectCreate, ProjectUpdate
+from models import ProjectCreate, ProjectUpdate, ProjectMembersChange
 
 load_dotenv() # pragma: no cover
 
-app = FastAPI(title="Atomic Microservice: Project Service")
+app = FastAPI(title="Atomic Microservice: Project Service", default_response_class=ORJSONResponse)
+
+# Compress large list payloads (clients send Accept-Encoding: gzip)
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=6)
+
+# Trace requests and outgoing calls (spans are exported when TRACE_EXPORT_DIR is set),
+# and expose latency histograms derived from those spans on GET /metrics
+init_tracing("project")
+instrument_app(app)
+init_metrics(app)
+setup_logging("project", app)
+install_auth(app)
+
 project_controller = ProjectController()
 
 @app.get("/")
@@ -46,6 +66,17 @@ def get_projects_by_user_id(user_id: str):
     Returns the project data if found, raises HTTPException if not found
     """
     return project_controller.get_projects_by_user_id(user_id)
+
+# Get every project visible to a user
+@app.get("/uid/{user_id}/visible", summary="Get projects visible to a user")
+def get_projects_visible_to_user(user_id: str, request: Request):
+    """
+    Owned projects + projects where the user is a member, plus projects whose
+    owner is in the same department for managers. HR/Admin see all projects.
+    The role comes from the caller's verified user_data cookie when they ask
+    about themselves, otherwise from the user's row in the database.
+    """
+    return project_controller.get_projects_visible_to_user(user_id, caller_profile(request, user_id))
     
 
 # Create new Row
@@ -58,15 +89,56 @@ def insert_new_project(new_data: Dict[str, Any] = Body(...) ):
 def update_project(id: str, new_data: Dict[str, Any] = Body(...)):
     return project_controller.update_project(id, new_data)
 
+# Add members (idempotent set union)
+@app.post("/pid/{project_id}/members/add", summary="Add users to project members")
+def add_project_members(project_id: str, change: ProjectMembersChange):
+    return project_controller.change_members(project_id, change.user_ids, "add")
+
+# Remove members (idempotent set difference)
+@app.post("/pid/{project_id}/members/remove", summary="Remove users from project members")
+def remove_project_members(project_id: str, change: ProjectMembersChange):
+    """
+    By default users that still own or collaborate on a task of the project are kept.
+    """
+    return project_controller.change_members(project_id, change.user_ids, "remove", change.only_unreferenced)
+
 # Delete Row
 @app.delete("/{id}")
 def delete_project(id: str):
     return project_controller.delete_project(id)
 
-@app.get("/logs", summary="Get all logs")
-async def get_all_logs():
-    logs = project_controller.get_all_logs()
-    return {"message": f"{len(logs)} log(s) retrieved", "logs": logs}
+@app.get("/logs", summary="Query the project audit trail")
+async def get_all_logs(
+    record_id: Optional[str] = Query(None, description="Only changes to this record"),
+    actor: Optional[str] = Query(None, description="Only changes made by this user ID"),
+    since: Optional[datetime] = Query(None, description="Changes at or after this time (ISO 8601)"),
+    until: Optional[datetime] = Query(None, description="Changes before this time (ISO 8601)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+):
+    """Newest first; follow next_cursor until it is null to walk the whole trail"""
+    fetch = _audit_fetch(record_id, actor, since, until)
+    page = logs_page(fetch, cursor, limit)
+    return {"message": f"{len(page['logs'])} log(s) retrieved", **page}
+
+@app.get("/logs/export", summary="Stream the project audit trail as NDJSON")
+async def export_logs(
+    record_id: Optional[str] = Query(None, description="Only changes to this record"),
+    actor: Optional[str] = Query(None, description="Only changes made by this user ID"),
+    since: Optional[datetime] = Query(None, description="Changes at or after this time (ISO 8601)"),
+    until: Optional[datetime] = Query(None, description="Changes before this time (ISO 8601)"),
+):
+    return logs_export(_audit_fetch(record_id, actor, since, until), filename="project_audit_trail.ndjson")
+
+def _audit_fetch(record_id, actor, since, until):
+    """get_logs_page with the request's filters bound; audit_trail supplies after/limit"""
+    return partial(
+        project_controller.get_logs_page,
+        record_id=record_id,
+        actor=actor,
+        since=since.isoformat() if since else None,
+        until=until.isoformat() if until else None,
+    )
 
 @app.get("/logs/{pid}", summary="Get a log by its ID")
 async def get_log(
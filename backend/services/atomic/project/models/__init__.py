@@ -1,9 +1,19 @@
-from .project import Project, ProjectCreate, ProjectUpdate, ProjectResponse, ProjectListResponse
+from .project import (
+    Project,
+    ProjectCreate,
+    ProjectUpdate,
+    ProjectMembersChange,
+    ProjectResponse,
+    ProjectListResponse,
+    ProjectMembersResponse,
+)
 
 __all__ = [
     "Project",
     "ProjectCreate", 
     "ProjectUpdate",
+    "ProjectMembersChange",
     "ProjectResponse",
-    "ProjectListResponse"
+    "ProjectListResponse",
+    "ProjectMembersResponse"
 ]
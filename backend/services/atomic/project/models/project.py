@@ -24,6 +24,14 @@ class ProjectUpdate(BaseModel):
     members: Optional[List[str]] = None
 
 
+class ProjectMembersChange(BaseModel):
+    """Model for adding/removing project members"""
+    user_ids: List[str] = Field(..., min_length=1, description="User IDs to add or remove")
+    only_unreferenced: bool = Field(
+        True, description="On remove, keep users that still own or collaborate on a task of the project"
+    )
+
+
 class Project(ProjectBase):
     """Complete project model with all fields"""
     id: str = Field(..., description="Project ID")
@@ -40,6 +48,13 @@ class ProjectResponse(BaseModel):
     data: Optional[dict] = None
 
 
+class ProjectMembersResponse(BaseModel):
+    """Response model for member add/remove operations"""
+    message: str
+    project: Optional[Project] = None
+    changed: List[str] = Field(default_factory=list, description="User IDs actually added/removed")
+
+
 class ProjectListResponse(BaseModel):
     """Response model for project list operations"""
     message: str
@@ -22,6 +22,18 @@ class ProjectService:
         # return as-is; controller will map into Pydantic Project safely
         return rows
 
+    def get_projects_visible_to_user(self, user_id: str, role: Optional[str] = None, department: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Fetch owned, member and (for managers) same-department projects.
+        HR/Admin see every project. Without a role, the user's own role and
+        department are looked up in the database.
+        """
+        return self.supabase_client.fetch_projects_visible_to_user(
+            user_id,
+            role=role.lower() if role else None,
+            department=department if role else None,
+        ) or []
+
     def get_project_by_id(self, project_id: str) -> Optional[Dict[str, Any]]:
         """
         Get a project by its ID
@@ -46,6 +58,20 @@ class ProjectService:
         """
         return self.supabase_client.update_project(project_id, update_data)
     
+    def add_members(self, project_id: str, user_ids: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Atomically add users to project.members.
+        Returns {"project": {...}, "changed": [newly added ids]} or None if the project does not exist
+        """
+        return self.supabase_client.add_members(project_id, list(dict.fromkeys(user_ids)))
+
+    def remove_members(self, project_id: str, user_ids: List[str], only_unreferenced: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Atomically remove users from project.members.
+        Returns {"project": {...}, "changed": [removed ids]} or None if the project does not exist
+        """
+        return self.supabase_client.remove_members(project_id, list(dict.fromkeys(user_ids)), only_unreferenced)
+
     def delete_project(self, project_id: str) -> Optional[Dict[str, Any]]:
         """
         Delete a project
@@ -57,6 +83,12 @@ class ProjectService:
         Get all logs for a project
         """
         return self.supabase_client.get_all_logs(filter_by)
+
+    def get_logs_page(self, **filters) -> List[Dict[str, Any]]:
+        """
+        One keyset page of audit logs for projects (see SupabaseClient.get_logs_page)
+        """
+        return self.supabase_client.get_logs_page(**filters)
     
     def get_projects_by_department(self, department: str) -> Optional[List[Dict[str, Any]]]:
         """
@@ -56,6 +56,28 @@ class SupabaseClient:
             query = query.eq("record_id", filter_by)
         resp = query.execute()
         return getattr(resp, "data", None) or []
+
+    def get_logs_page(self, record_id: str = None, actor: str = None, since: str = None, until: str = None,
+                      after: tuple = None, limit: int = 100):
+        """
+        One page of audit logs, newest first, ordered by (timestamp, id).
+        since is inclusive and until exclusive (ISO timestamps); actor matches changed_by.
+        after: (timestamp, id) of the last row already returned (keyset pagination)
+        """
+        query = self.client.table("AUDIT_TRAIL").select("*").eq("table_name", "PROJECT")
+        if record_id:
+            query = query.eq("record_id", record_id)
+        if actor:
+            query = query.eq("changed_by", actor)
+        if since:
+            query = query.gte("timestamp", since)
+        if until:
+            query = query.lt("timestamp", until)
+        if after:
+            timestamp, last_id = after
+            query = query.or_(f'timestamp.lt."{timestamp}",and(timestamp.eq."{timestamp}",id.lt."{last_id}")')
+        resp = query.order("timestamp", desc=True).order("id", desc=True).limit(limit).execute()
+        return getattr(resp, "data", None) or []
     
     def get_projects_by_department(self, department: str):
         # If you created view unquoted, prefer "v_project_with_dept"
@@ -63,4 +85,38 @@ class SupabaseClient:
             .select("*") \
             .eq("owner_department", department) \
             .execute()
-        return response.data or None
\ No newline at end of file
+        return response.data or None
+    
+    def fetch_projects_visible_to_user(self, uid, role=None, department=None):
+        """
+        Projects a user can see, from the projects_visible_to_user RPC:
+        owned, member and, for managers, projects whose owner is in their
+        department; HR/Admin see every project. Parameters are bound, not
+        spliced into a filter string. With no role the RPC reads the user's
+        role and department from USER.
+        """
+        response = self.client.rpc("projects_visible_to_user", {
+            "p_uid": uid,
+            "p_role": role,
+            "p_department": department,
+        }).execute()
+        return response.data or []
+
+
+    # Add members (set union done in the database, no read-modify-write)
+    def add_members(self, pid, uids):
+        response = self.client.rpc("project_members_add", {"p_pid": pid, "p_uids": list(uids)}).execute()
+        return response.data or None
+
+    # Remove members (set difference done in the database)
+    def remove_members(self, pid, uids, only_unreferenced=True):
+        """
+        only_unreferenced: keep users that still own or collaborate on a task
+        of the project (PROJECT_MEMBER_REF.task_count > 0)
+        """
+        response = self.client.rpc("project_members_remove", {
+            "p_pid": pid,
+            "p_uids": list(uids),
+            "p_only_unreferenced": only_unreferenced,
+        }).execute()
+        return response.data or None
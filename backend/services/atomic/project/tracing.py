@@ -0,0 +1,312 @@
+"""
+Shared tracing utilities for SPM microservices
+
+Spans follow the OpenTelemetry model (trace id, span id, parent, kind,
+attributes, status) and trace context travels in the W3C ``traceparent``
+header, over HTTP (httpx) and in Kafka message headers. Finished spans are
+written as JSON lines by a background thread to
+``$TRACE_EXPORT_DIR/<service>-<pid>.jsonl``, so traces can be inspected offline
+or shipped to a collector that tails the directory. With TRACE_EXPORT_DIR
+unset spans are still created and propagated, just not exported.
+"""
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+from starlette.datastructures import Headers, MutableHeaders
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT = "traceparent"
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_service_name = os.getenv("SERVICE_NAME", "unknown")
+_exporter: Optional["FileSpanExporter"] = None
+_span_listeners: List[Callable[["Span"], None]] = []
+_httpx_instrumented = False
+
+
+class SpanContext:
+    """Identifiers of a span, as carried across process boundaries"""
+
+    __slots__ = ("trace_id", "span_id")
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+
+class Span:
+    """A timed operation; use start_span() rather than creating one directly"""
+
+    def __init__(self, name: str, kind: str, parent: Optional[SpanContext], attributes: Optional[Dict[str, Any]]):
+        self.name = name
+        self.kind = kind
+        self.context = SpanContext(parent.trace_id if parent else secrets.token_hex(16), secrets.token_hex(8))
+        self.parent_id = parent.span_id if parent else None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = "error"
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def end(self) -> None:
+        if self.duration_ms is None:
+            self.duration_ms = round(self.elapsed_ms(), 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "service": _service_name,
+            "trace_id": self.context.trace_id,
+            "span_id": self.context.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class FileSpanExporter:
+    """Append finished spans as JSON lines from a background thread"""
+
+    def __init__(self, path: str, max_queue: int = 10000):
+        self.path = path
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span.to_dict())
+        except queue.Full:
+            # Never block a request on tracing; drop the span instead
+            pass
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 512:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(s, default=str) + "\n" for s in batch))
+            except OSError as e:
+                logger.error(f"Failed to export {len(batch)} span(s) to {self.path}: {e}")
+
+
+def init_tracing(service_name: str, export_dir: Optional[str] = None) -> None:
+    """Name this service in exported spans, start the file exporter and trace outgoing httpx calls"""
+    global _service_name, _exporter
+    _service_name = service_name
+    export_dir = export_dir or os.getenv("TRACE_EXPORT_DIR")
+    if export_dir and _exporter is None:
+        os.makedirs(export_dir, exist_ok=True)
+        _exporter = FileSpanExporter(os.path.join(export_dir, f"{service_name}-{os.getpid()}.jsonl"))
+    instrument_httpx()
+
+
+def add_span_listener(listener: Callable[[Span], None]) -> None:
+    """Call listener with every finished span (used by metrics.py to derive latency histograms)"""
+    if listener not in _span_listeners:
+        _span_listeners.append(listener)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def start_span(name: str, kind: str = "internal", attributes: Optional[Dict[str, Any]] = None,
+               parent: Optional[SpanContext] = None) -> Iterator[Span]:
+    """
+    Run the enclosed block inside a new span.
+
+    The parent defaults to the current span; pass ``parent`` (from extract())
+    to continue a trace received from another service.
+    """
+    if parent is None:
+        active = _current_span.get()
+        parent = active.context if active else None
+    span = Span(name, kind, parent, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+        if _exporter is not None:
+            _exporter.export(span)
+        for listener in _span_listeners:
+            try:
+                listener(span)
+            except Exception as e:
+                logger.debug(f"Span listener failed: {e}")
+
+
+def inject(headers) -> None:
+    """Write the current trace context into a mutable headers mapping"""
+    span = _current_span.get()
+    if span is not None:
+        headers[TRACEPARENT] = span.context.traceparent()
+
+
+def extract(carrier) -> Optional[SpanContext]:
+    """
+    Read a trace context from HTTP headers (any mapping) or Kafka message
+    headers (a list of (key, bytes) tuples). Returns None when absent or malformed.
+    """
+    if not carrier:
+        return None
+    value = None
+    if isinstance(carrier, (list, tuple)):
+        for key, raw in carrier:
+            if key == TRACEPARENT:
+                value = raw.decode("utf-8", "ignore") if isinstance(raw, bytes) else raw
+                break
+    else:
+        value = carrier.get(TRACEPARENT)
+    match = _TRACEPARENT_RE.match((value or "").strip().lower())
+    if not match:
+        return None
+    return SpanContext(match.group(1), match.group(2))
+
+
+def kafka_headers() -> Optional[List[Tuple[str, bytes]]]:
+    """Kafka message headers carrying the current trace context, or None outside a span"""
+    span = _current_span.get()
+    if span is None:
+        return None
+    return [(TRACEPARENT, span.context.traceparent().encode("utf-8"))]
+
+
+def _client_span(request: httpx.Request) -> Tuple[str, Dict[str, Any]]:
+    # Span names stay low-cardinality: ids only ever go into attributes
+    url = request.url
+    attributes = {"http.method": request.method, "http.url": str(url.copy_with(query=None)), "net.peer.name": url.host}
+    supabase_host = urlparse(os.getenv("SUPABASE_URL", "")).hostname
+    if supabase_host and url.host == supabase_host:
+        parts = url.path.strip("/").split("/")
+        table = parts[2] if len(parts) > 2 else url.path
+        attributes.update({"db.system": "postgresql", "db.sql.table": table})
+        return f"supabase {request.method} {table}", attributes
+    return f"HTTP {request.method} {url.host}", attributes
+
+
+def _outgoing_parent(request: httpx.Request) -> Optional[SpanContext]:
+    # Outside any span, keep a traceparent the caller already set on the request
+    return None if _current_span.get() is not None else extract(request.headers)
+
+
+def instrument_httpx() -> None:
+    """Wrap httpx Client/AsyncClient.send so every outgoing request gets a client span and a traceparent header"""
+    global _httpx_instrumented
+    if _httpx_instrumented:
+        return
+    _httpx_instrumented = True
+    sync_send = httpx.Client.send
+    async_send = httpx.AsyncClient.send
+
+    def traced_send(self, request, **kwargs):
+        name, attributes = _client_span(request)
+        with start_span(name, "client", attributes, parent=_outgoing_parent(request)) as span:
+            inject(request.headers)
+            response = sync_send(self, request, **kwargs)
+            span.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                span.status = "error"
+            return response
+
+    async def traced_async_send(self, request, **kwargs):
+        name, attributes = _client_span(request)
+        with start_span(name, "client", attributes, parent=_outgoing_parent(request)) as span:
+            inject(request.headers)
+            response = await async_send(self, request, **kwargs)
+            span.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                span.status = "error"
+            return response
+
+    httpx.Client.send = traced_send
+    httpx.AsyncClient.send = traced_async_send
+
+
+class _TraceRequests:
+    """
+    Plain ASGI middleware: unlike @app.middleware("http") it adds no task group
+    or body streams per request, only a wrapper around send().
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method, path = scope["method"], scope["path"]
+        with start_span(
+            f"{method} {path}",
+            "server",
+            {"http.method": method, "http.target": path},
+            parent=extract(Headers(scope=scope)),
+        ) as span:
+
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start":
+                    route = scope.get("route")
+                    if route is not None:
+                        span.name = f"{method} {route.path}"
+                        span.set_attribute("http.route", route.path)
+                    status = message["status"]
+                    span.set_attribute("http.status_code", status)
+                    if status >= 500:
+                        span.status = "error"
+                    headers = MutableHeaders(scope=message)
+                    headers["Server-Timing"] = f"app;dur={span.elapsed_ms():.1f}"
+                    headers["X-Trace-Id"] = span.context.trace_id
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
+
+
+def instrument_app(app) -> None:
+    """
+    Open a server span per request, continuing the caller's trace, and report
+    the time spent in this service as a Server-Timing response header.
+    """
+    app.add_middleware(_TraceRequests)
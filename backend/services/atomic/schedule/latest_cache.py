@@ -0,0 +1,85 @@
+"""
+In-process cache of each task's current (latest) schedule row
+
+Task lists and the daily summary ask for the current schedule of the same
+tasks over and over. Rows are kept per tid in an LRU, tasks without a schedule
+included, so a repeat lookup costs no DB round trip. The schedule service
+drops a task's entry whenever it writes one of the task's rows. Each uvicorn
+worker has its own cache, so a write made through another worker is only
+picked up once the entry's TTL runs out; the TTL is kept short for that reason.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+CACHE_SIZE = int(os.getenv("SCHEDULE_LATEST_CACHE_SIZE", "10000"))
+CACHE_TTL_SECONDS = float(os.getenv("SCHEDULE_LATEST_CACHE_SECONDS", "5"))
+
+Row = Optional[Dict[str, Any]]
+
+
+class LatestScheduleCache:
+    """LRU of tid -> current schedule row (None for a task with no schedule)"""
+
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl_seconds: float = CACHE_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._rows: "OrderedDict[str, Tuple[float, Row]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so rows read before a write are not stored after it
+        self._generation = 0
+
+    def get_many(self, tids: Iterable[str],
+                 load: Callable[[List[str]], Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Current rows for ``tids`` keyed by tid; tasks without a schedule are left out.
+        Whatever is not cached is fetched with a single ``load(missing_tids)`` call.
+        """
+        found: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        now = self.clock()
+        with self._lock:
+            for tid in dict.fromkeys(tids):
+                cached = self._rows.get(tid)
+                if cached and now < cached[0]:
+                    self._rows.move_to_end(tid)
+                    if cached[1] is not None:
+                        found[tid] = cached[1]
+                else:
+                    missing.append(tid)
+            generation = self._generation
+
+        if not missing:
+            return found
+        loaded = load(missing)
+        found.update(loaded)
+
+        with self._lock:
+            if generation == self._generation:
+                expires = self.clock() + self.ttl_seconds
+                for tid in missing:
+                    self._rows[tid] = (expires, loaded.get(tid))
+                    self._rows.move_to_end(tid)
+                while len(self._rows) > self.maxsize:
+                    self._rows.popitem(last=False)
+        return found
+
+    def get(self, tid: str, load: Callable[[List[str]], Dict[str, Dict[str, Any]]]) -> Row:
+        return self.get_many([tid], load).get(tid)
+
+    def invalidate(self, tids: Optional[Iterable[str]] = None) -> None:
+        """Drop these tasks' entries, or every entry when ``tids`` is None"""
+        with self._lock:
+            self._generation += 1
+            if tids is None:
+                self._rows.clear()
+                return
+            for tid in tids:
+                self._rows.pop(tid, None)
+
+    def __len__(self) -> int:
+        return len(self._rows)
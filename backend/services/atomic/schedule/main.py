@@ -1,12 +1,23 @@
-from typing import Any, Dict
-from fastapi import FastAPI, HTTPException, Body
-from fastapi.responses import Response
+from datetime import timedelta
+import json
+import uuid
+from typing import Any, Dict, Optional
+from fastapi import FastAPI, HTTPException, Body, Query
+from fastapi.responses import Response, ORJSONResponse, StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from supabaseClient import SupabaseClient
+from tracing import init_tracing, instrument_app
+from metrics import init_metrics
+from logging_config import setup_logging
+from auth_middleware import install_auth
+from outbox import OutboxRelay
+from occurrences import OccurrenceCache
+from latest_cache import LatestScheduleCache
+import recurrence
 from dotenv import load_dotenv
 import uvicorn
-import httpx
 import logging
-from datetime import datetime
+from contextlib import asynccontextmanager
 
 load_dotenv()
 
@@ -14,136 +25,41 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Atomic Microservice: Schedule Service")
-supabase = SupabaseClient()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Relay schedule change events from the outbox to Kafka while the app runs"""
+    # Timers in notify_user follow SCHEDULE through these events, written by a
+    # trigger in the same transaction as each change (see README)
+    relay = OutboxRelay(supabase)
+    relay.start()
+    yield
+    relay.stop()
 
-# Notify User Service URL
-NOTIFY_USER_SERVICE_URL = "http://notify_user:4500"
+app = FastAPI(title="Atomic Microservice: Schedule Service", default_response_class=ORJSONResponse, lifespan=lifespan)
 
-async def notify_schedule_added(schedule_data: Dict[str, Any]):
-    """Notify the notify_user service when a new recurring task is added"""
-    import asyncio
-    
-    # Try multiple connection methods with retries
-    urls_to_try = [
-        NOTIFY_USER_SERVICE_URL,  # Original hostname
-        "http://172.18.0.10:4500",  # Direct IP address
-        "http://notify-user:4500",  # Alternative hostname format
-    ]
-    
-    for attempt in range(3):  # 3 attempts
-        for url in urls_to_try:
-            try:
-                async with httpx.AsyncClient() as client:
-                    logger.info(f"Attempting to notify notify_user service at {url} (attempt {attempt + 1})")
-                    response = await client.post(
-                        f"{url}/schedule/update",
-                        json=schedule_data,
-                        timeout=10.0
-                    )
-                    if response.status_code == 200:
-                        logger.info(f"Successfully notified notify_user service about new recurring task {schedule_data.get('sid')}")
-                        return  # Success, exit function
-                    else:
-                        logger.warning(f"Failed to notify notify_user service at {url}: {response.status_code}")
-            except Exception as e: # pragma: no cover
-                logger.warning(f"Error connecting to {url}: {str(e)}")
-                continue
-        
-        # Wait before retry
-        if attempt < 2:  # Don't wait after the last attempt
-            await asyncio.sleep(2 ** attempt)  # Exponential backoff: 1s, 2s, 4s # pragma: no cover
-    
-    # If all attempts failed, log the error but don't crash the main operation
-    logger.error(f"Failed to notify notify_user service after all attempts for task {schedule_data.get('sid')}")
+# Compress large list payloads (clients send Accept-Encoding: gzip)
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=6)
 
-# Alias for backward compatibility with tests
-notify_recurring_task_added = notify_schedule_added
+# Trace requests and outgoing calls (spans are exported when TRACE_EXPORT_DIR is set),
+# and expose latency histograms derived from those spans on GET /metrics
+init_tracing("schedule")
+instrument_app(app)
+init_metrics(app)
+setup_logging("schedule", app)
+install_auth(app)
 
-async def notify_deadline_monitoring_added(deadline_data: Dict[str, Any]):
-    """Notify the notify_user service when deadline monitoring should be set up"""
-    import asyncio
-    
-    # Try multiple connection methods with retries
-    urls_to_try = [
-        NOTIFY_USER_SERVICE_URL,  # Original hostname
-        "http://172.18.0.10:4500",  # Direct IP address
-        "http://notify-user:4500",  # Alternative hostname format
-    ]
-    
-    for attempt in range(3):  # 3 attempts
-        for url in urls_to_try:
-            try:
-                async with httpx.AsyncClient() as client:
-                    logger.info(f"Attempting to notify notify_user service about deadline monitoring at {url} (attempt {attempt + 1})")
-                    response = await client.post(
-                        f"{url}/task/deadline/schedule",
-                        json=deadline_data,
-                        timeout=10.0
-                    )
-                    if response.status_code == 200:
-                        logger.info(f"Successfully notified notify_user service about deadline monitoring for task {deadline_data.get('sid')}")
-                        return  # Success, exit function
-                    else:
-                        logger.warning(f"Failed to notify notify_user service at {url}: {response.status_code}")
-            except Exception as e:
-                logger.warning(f"Error connecting to {url}: {str(e)}")
-                continue
-        
-        # Wait before retry
-        if attempt < 2:  # Don't wait after the last attempt
-            await asyncio.sleep(2 ** attempt)  # Exponential backoff: 1s, 2s, 4s
-    
-    # If all attempts failed, log the error but don't crash the main operation
-    logger.error(f"Failed to notify notify_user service about deadline monitoring after all attempts for task {deadline_data.get('sid')}")
+supabase = SupabaseClient()
 
-async def notify_recurring_task_updated(schedule_data: Dict[str, Any]):
-    """Notify the notify_user service when a recurring task is updated"""
-    import asyncio
-    
-    # Try multiple connection methods with retries
-    urls_to_try = [
-        NOTIFY_USER_SERVICE_URL,  # Original hostname
-        "http://172.18.0.10:4500",  # Direct IP address
-        "http://notify-user:4500",  # Alternative hostname format
-    ]
-    
-    for attempt in range(3):  # 3 attempts
-        for url in urls_to_try:
-            try:
-                async with httpx.AsyncClient() as client:
-                    logger.info(f"Attempting to notify notify_user service of update at {url} (attempt {attempt + 1})")
-                    response = await client.post(
-                        f"{url}/task/recurring/update",
-                        json=schedule_data,
-                        timeout=10.0
-                    )
-                    if response.status_code == 200:
-                        logger.info(f"Successfully notified notify_user service about updated recurring task {schedule_data.get('sid')}")
-                        return  # Success, exit function
-                    else:
-                        logger.warning(f"Failed to notify notify_user service at {url}: {response.status_code}")
-            except Exception as e: # pragma: no cover
-                logger.warning(f"Error connecting to {url}: {str(e)}")
-                continue
-        
-        # Wait before retry
-        if attempt < 2:  # Don't wait after the last attempt # pragma: no cover
-            await asyncio.sleep(2 ** attempt)  # Exponential backoff: 1s, 2s, 4s # pragma: no cover
-    
-    # If all attempts failed, log the error but don't crash the main operation
-    logger.error(f"Failed to notify notify_user service after all attempts for task {schedule_data.get('sid')}") # pragma: no cover
+# Expanded occurrence windows and each task's current row; writes below drop what they touch
+occurrence_cache = OccurrenceCache()
+latest_cache = LatestScheduleCache()
 
-def has_cron_affecting_changes(old_data: Dict[str, Any], new_data: Dict[str, Any]) -> bool:
-    """Check if any fields that affect cron jobs have changed"""
-    cron_affecting_fields = ['is_recurring', 'frequency', 'next_occurrence', 'start', 'deadline']
-    
-    for field in cron_affecting_fields:
-        if field in new_data and old_data.get(field) != new_data.get(field):
-            logger.info(f"Detected change in cron-affecting field '{field}': {old_data.get(field)} -> {new_data.get(field)}")
-            return True
-    
-    return False
+def schedules_written(*rows):
+    """Drop cached reads that a write to these rows may have changed"""
+    occurrence_cache.invalidate()
+    tids = [row.get("tid") for row in rows if isinstance(row, dict)]
+    # Without a tid for every row there is no telling which tasks changed
+    latest_cache.invalidate(tids if tids and all(tids) else None)
 
 @app.get("/")
 def read_root():
@@ -166,14 +82,58 @@ def get_all_schedules():
     data = supabase.fetch_all_schedules()
     return {"message":f"All Schedules Retrieved Successfully" ,"data": data}
 
+# Rows read from the DB per page when streaming every current schedule
+STREAM_PAGE_SIZE = 500
+MAX_STREAM_PAGE_SIZE = 5000
+
+def iter_schedules_ndjson(after: Optional[str], page_size: int):
+    """Every current schedule as one JSON line, read page by page in tid order so memory stays flat"""
+    while True:
+        rows = supabase.fetch_schedule_page(after=after, limit=page_size)
+        for row in rows:
+            yield (json.dumps(row, default=str) + "\n").encode("utf-8")
+        if len(rows) < page_size:
+            return
+        after = rows[-1]["tid"]
+
+# Stream All Current Schedules
+@app.get("/all/stream")
+def stream_all_schedules(after: Optional[str] = None,
+                         page_size: int = Query(STREAM_PAGE_SIZE, ge=1, le=MAX_STREAM_PAGE_SIZE)):
+    """
+    /all as NDJSON, one schedule per line in tid order. A client that loses the
+    stream resumes with ?after=<tid of the last line it got>.
+    """
+    if after is not None:
+        try:
+            uuid.UUID(after)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="after must be a task ID")
+    return StreamingResponse(iter_schedules_ndjson(after, page_size), media_type="application/x-ndjson")
+
 # Retrieve TID Latest
 @app.get("/tid/{tid}/latest")
 def get_schedule_by_tid(tid: str):
-    data = supabase.fetch_schedule_by_tid(tid, latest=True)
+    data = latest_cache.get(tid, supabase.fetch_latest_schedules)
     if data is None:
         raise HTTPException(status_code=404, detail=f"Task {tid} not found")
     return {"message":f"Task {tid} Schedule Retrieved Successfully" ,"data": data}
 
+# Largest number of tasks one /latest call may look up
+MAX_LATEST_LOOKUP = 1000
+
+# Retrieve the latest schedule of many tasks at once
+@app.post("/latest")
+def get_latest_schedules(lookup: Dict[str, Any] = Body(...)):
+    """{"tids": [...]} -> {"data": {tid: schedule}}; tasks without a schedule are left out"""
+    tids = lookup.get("tids")
+    if not isinstance(tids, list) or not all(isinstance(tid, str) for tid in tids):
+        raise HTTPException(status_code=400, detail="tids must be a list of task IDs")
+    if len(tids) > MAX_LATEST_LOOKUP:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_LATEST_LOOKUP} tasks per lookup")
+    data = latest_cache.get_many(tids, supabase.fetch_latest_schedules)
+    return {"message": f"{len(data)} Schedules Retrieved Successfully", "data": data}
+
 # Retrieve with Schedule ID
 @app.get("/sid/{sid}")
 def get_schedule_by_sid(sid: str):
@@ -184,8 +144,8 @@ def get_schedule_by_sid(sid: str):
 
 # Create new Row
 @app.post("/")
-async def insert_new_schedule(new_data: Dict[str, Any] = Body(...) ):
-    print(new_data)
+def insert_new_schedule(new_data: Dict[str, Any] = Body(...) ):
+    logger.debug("Insert schedule payload: %s", new_data)
     tid = new_data.get("tid")
     start = new_data.get("start", None)
     deadline = new_data.get("deadline")
@@ -196,52 +156,85 @@ async def insert_new_schedule(new_data: Dict[str, Any] = Body(...) ):
     is_recurring = new_data.get("is_recurring", False)
 
     try:
+        # notify_user picks the new schedule up from its schedule_created event
         data = supabase.insert_schedule(tid, start, deadline, is_recurring, status, next_occurrence, frequency)
-        
-        # If this is a recurring task, notify the notify_user service
-        if data and is_recurring:
-            import asyncio
-            asyncio.create_task(notify_recurring_task_added(data))
-        
+        schedules_written({"tid": tid})
         return {"message":f"Task {tid} Schedule Inserted Successfully" ,"data": data}
     except Exception as e:
             raise HTTPException(status_code=400, detail=str(e))
 
+# Largest number of rows one /batch call may write
+MAX_BATCH_SIZE = 500
+
+# Write many rows in one DB round trip
+@app.post("/batch")
+def batch_schedules(batch: Dict[str, Any] = Body(...)):
+    """
+    {"op": "insert" | "upsert", "rows": [...]}: rows shaped like POST /; upsert replaces whole rows by sid
+    {"op": "update", "rows": [{"sid": ..., ...}]}: a different partial update per row
+    {"op": "update", "sids": [...], "data": {...}}: the same partial update for every sid
+    """
+    op = batch.get("op")
+    rows = batch.get("rows")
+    sids = batch.get("sids")
+    if op not in ("insert", "update", "upsert"):
+        raise HTTPException(status_code=400, detail="op must be one of insert, update, upsert")
+    if op == "update" and sids is not None:
+        if not isinstance(sids, list) or not isinstance(batch.get("data"), dict) or not batch["data"]:
+            raise HTTPException(status_code=400, detail="sids must be a list and data a non-empty object")
+        size = len(sids)
+    else:
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="rows must be a list")
+        size = len(rows)
+    if size == 0:
+        return {"message": "No schedules to write", "data": []}
+    if size > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} schedules per batch")
+
+    try:
+        if op == "insert":
+            data = supabase.insert_schedules(rows)
+        elif op == "upsert":
+            data = supabase.upsert_schedules(rows)
+        elif sids is not None:
+            data = supabase.update_schedules(sids, batch["data"])
+        else:
+            data = supabase.patch_schedules(rows)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    schedules_written(*data)
+    return {"message": f"{len(data)} Schedules Written Successfully", "data": data}
+
+# Close a recurring schedule and open its next occurrence
+@app.post("/sid/{sid}/rollover")
+def rollover_schedule(sid: str, next_entry: Dict[str, Any] = Body(...)):
+    """
+    One transaction: insert the next occurrence (tid and frequency carried over), mark this
+    one completed, and return both rows with the task name and the new row's participants.
+    Rolling the same occurrence over twice returns the existing row with "created": false.
+    """
+    missing = [f for f in ("start", "deadline", "next_occurrence") if not next_entry.get(f)]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing required fields: {', '.join(missing)}")
+    try:
+        data = supabase.rollover_schedule(sid, next_entry["start"], next_entry["deadline"], next_entry["next_occurrence"])
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not data:
+        raise HTTPException(status_code=404, detail=f"Task Schedule {sid} not found")
+    schedules_written(data.get("previous"), data.get("schedule"))
+    return {"message": f"Task Schedule {sid} Rolled Over Successfully", "data": data}
+
 # Update the row
 @app.put("/{sid}")
-async def update_schedule(sid: str, new_data: Dict[str, Any] = Body(...)):
+def update_schedule(sid: str, new_data: Dict[str, Any] = Body(...)):
     try:
-        # Get the current schedule data to compare changes
-        current_schedule = supabase.fetch_schedule_by_sid(sid)
-        if not current_schedule:
-            raise HTTPException(status_code=404, detail=f"Task Schedule {sid} not found")
-        
-        # Check if any cron-affecting fields have changed
-        has_cron_changes = has_cron_affecting_changes(current_schedule, new_data)
-        
-        # Update the schedule
+        # A change to a timer field reaches notify_user as a schedule_updated event
         data = supabase.update_schedule(sid, new_data)
         if not data:
             raise HTTPException(status_code=404, detail=f"Task Schedule {sid} not found")
-        
-        # If cron-affecting fields have changed, notify the notify_user service
-        if has_cron_changes:
-            print(f"[DEBUG] Cron-affecting changes detected, notifying notify_user service")
-            
-            # Prepare notification data
-            notify_data = {
-                "sid": sid,
-                "tid": current_schedule.get("tid"),
-                "is_recurring": new_data.get("is_recurring", current_schedule.get("is_recurring", False)),
-                "frequency": new_data.get("frequency", current_schedule.get("frequency")),
-                "next_occurrence": new_data.get("next_occurrence", current_schedule.get("next_occurrence")),
-                "start": new_data.get("start", current_schedule.get("start")),
-                "deadline": new_data.get("deadline", current_schedule.get("deadline"))
-            }
-            
-            # Notify asynchronously (don't wait for response)
-            import asyncio
-            asyncio.create_task(notify_recurring_task_updated(notify_data))
+        schedules_written(data)
         
         return {"message":f"Task Schedule {sid} Updated Successfully" ,"data": data}
     
@@ -255,11 +248,10 @@ async def update_schedule(sid: str, new_data: Dict[str, Any] = Body(...)):
 
 # Update up task id
 @app.put("/tid/{tid}")
-async def update_schedule_by_tid(tid: str, new_data: Dict[str, Any] = Body(...)):
+def update_schedule_by_tid(tid: str, new_data: Dict[str, Any] = Body(...)):
     """Update schedule using task ID instead of schedule ID"""
     try:
-        print(f"[DEBUG] Received update request for tid: {tid}") # pragma: no cover
-        print(f"[DEBUG] Update data: {new_data}") # pragma: no cover
+        logger.debug("Update request for tid %s: %s", tid, new_data)
         
         # First, get the schedule to find the sid
         schedule = supabase.fetch_schedule_by_tid(tid, latest=True)
@@ -270,46 +262,17 @@ async def update_schedule_by_tid(tid: str, new_data: Dict[str, Any] = Body(...))
         if not sid:
             raise HTTPException(status_code=404, detail=f"Schedule ID not found for task {tid}")
         
-        print(f"[DEBUG] Found schedule sid: {sid}") # pragma: no cover
-        print(f"[DEBUG] Calling supabase.update_schedule with data: {new_data}") # pragma: no cover
-        
-        # Check if any cron-affecting fields have changed
-        has_cron_changes = has_cron_affecting_changes(schedule, new_data)
-        
         # Now update using the sid
         data = supabase.update_schedule(sid, new_data)
         if not data:
             raise HTTPException(status_code=404, detail=f"Task Schedule {sid} not found") # pragma: no cover
-        
-        # If cron-affecting fields have changed, notify the notify_user service
-        if has_cron_changes:
-            print(f"[DEBUG] Cron-affecting changes detected, notifying notify_user service")
-            
-            # Prepare notification data
-            notify_data = {
-                "sid": sid,
-                "tid": tid,
-                "is_recurring": new_data.get("is_recurring", schedule.get("is_recurring", False)),
-                "frequency": new_data.get("frequency", schedule.get("frequency")),
-                "next_occurrence": new_data.get("next_occurrence", schedule.get("next_occurrence")),
-                "start": new_data.get("start", schedule.get("start")),
-                "deadline": new_data.get("deadline", schedule.get("deadline"))
-            }
-            
-            # Notify asynchronously (don't wait for response)
-            import asyncio
-            asyncio.create_task(notify_recurring_task_updated(notify_data))
-        
-        # Note: Recurring task handling is now managed by the notify_user service
-        # through the notification system above
+        schedules_written({"tid": tid})
         
         return {"message": f"Task {tid} Schedule Updated Successfully", "data": data}
     except HTTPException:  # pragma: no cover
         raise
     except Exception as e:
-        print(f"[ERROR] Exception in update_schedule_by_tid: {str(e)}") # pragma: no cover
-        import traceback # pragma: no cover
-        traceback.print_exc() # pragma: no cover
+        logger.exception("Exception in update_schedule_by_tid: %s", e) # pragma: no cover
         raise HTTPException(status_code=400, detail=str(e))
 
 # Delete Row
@@ -318,8 +281,68 @@ def delete_schedule(sid: str):
     data = supabase.delete_schedule(sid)
     if not data:
         raise HTTPException(status_code=404, detail="Task Schedule not found")
+    schedules_written(data)
     return {"message": f"Task Schedule {sid} deleted successfully"}
 
+# Current schedules due in a deadline range
+@app.get("/due")
+def get_due_schedules(
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    status_not: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """
+    Each task's current schedule whose deadline is in [after, before), soonest first.
+    status_not: comma-separated statuses to leave out, e.g. "completed,cancelled"
+    """
+    if not before and not after:
+        raise HTTPException(status_code=400, detail="Give before, after or both")
+    try:
+        bounds = {name: recurrence.parse_datetime(value).isoformat()
+                  for name, value in (("before", before), ("after", after)) if value}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="before and after must be ISO 8601 timestamps")
+    excluded = [status.strip() for status in (status_not or "").split(",") if status.strip()]
+    try:
+        data = supabase.fetch_due_schedules(bounds.get("before"), bounds.get("after"), excluded, limit)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": f"{len(data)} Due Schedules Retrieved Successfully", "data": data}
+
+# Longest window /occurrences expands in one call
+MAX_OCCURRENCE_WINDOW = timedelta(days=366)
+
+# Future occurrences of recurring tasks, for calendar and workload views
+@app.get("/occurrences")
+def get_occurrences(
+    window_start: str = Query(..., alias="from"),
+    window_end: str = Query(..., alias="to"),
+):
+    """
+    Every occurrence of the current recurring schedules overlapping [from, to), ordered by start.
+    Occurrences after a task's current row are computed, not stored ("projected": true).
+    """
+    try:
+        start = recurrence.parse_datetime(window_start)
+        end = recurrence.parse_datetime(window_end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="from and to must be ISO 8601 timestamps")
+    if end <= start:
+        raise HTTPException(status_code=400, detail="to must be after from")
+    if end - start > MAX_OCCURRENCE_WINDOW:
+        raise HTTPException(status_code=400, detail=f"Window must be at most {MAX_OCCURRENCE_WINDOW.days} days")
+
+    # latest_schedule_per_task gives each task's current row, the one its series continues from
+    expanded = occurrence_cache.get(start, end, supabase.fetch_all_schedules)
+    return {
+        "message": f"{len(expanded['occurrences'])} Occurrences Retrieved Successfully",
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "data": expanded["occurrences"],
+        "truncated": expanded["truncated"],
+    }
+
 # API endpoints for notify_user service to call
 @app.get("/recurring/all")
 def get_recurring_tasks_for_notify():
@@ -0,0 +1,116 @@
+"""
+Occurrences of recurring schedules over a calendar window
+
+Only the current occurrence of a recurring task exists as a SCHEDULE row; the
+next one is written when notify_user rolls it over. Calendar and workload views
+need the ones after that too, so every recurring task's series is expanded
+over the requested window with the same arithmetic notify_user applies
+(recurrence.py). Nothing is written.
+
+Each task's occurrences come out in start order, so the per-task series are
+heap-merged into one ordered list. Expanded windows are kept in a small LRU
+and dropped on every schedule write this process makes; the TTL bounds how
+long a write made through another worker can go unseen.
+"""
+import heapq
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+import recurrence
+
+logger = logging.getLogger(__name__)
+
+CACHE_SIZE = int(os.getenv("SCHEDULE_OCCURRENCE_CACHE_SIZE", "32"))
+CACHE_TTL_SECONDS = float(os.getenv("SCHEDULE_OCCURRENCE_CACHE_SECONDS", "60"))
+# An Immediate task with a short gap recurs every few minutes; cap what one task can add to a window
+MAX_PER_SCHEDULE = int(os.getenv("SCHEDULE_OCCURRENCES_PER_TASK", "500"))
+
+
+def _series(schedule: Dict[str, Any], window_start: datetime, window_end: datetime, limit: int):
+    for index, start, deadline in recurrence.expand_schedule(schedule, window_start, window_end, limit):
+        yield start, schedule["tid"], index, {
+            "tid": schedule["tid"],
+            "sid": schedule.get("sid"),
+            "frequency": schedule["frequency"],
+            "index": index,
+            "start": start.isoformat(),
+            "deadline": deadline.isoformat(),
+            # index 0 is the row itself; later ones exist only once rolled over
+            "projected": index > 0,
+        }
+
+
+def expand_window(schedules: List[Dict[str, Any]], window_start: datetime, window_end: datetime,
+                  per_schedule: int = MAX_PER_SCHEDULE) -> Dict[str, Any]:
+    """
+    Occurrences of the current row of each recurring task in ``schedules`` that
+    overlap [window_start, window_end), ordered by start. Tasks that hit
+    ``per_schedule`` are listed under "truncated"; rows that cannot be expanded
+    (no start or deadline, unknown frequency, deadline before start) are skipped.
+    """
+    series = []
+    truncated: List[str] = []
+    for schedule in schedules:
+        if not schedule.get("is_recurring") or not schedule.get("start") or not schedule.get("deadline"):
+            continue
+        try:
+            occurrences = list(_series(schedule, window_start, window_end, per_schedule + 1))
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Skipping schedule {schedule.get('sid')} in occurrence expansion: {e}")
+            continue
+        if len(occurrences) > per_schedule:
+            occurrences = occurrences[:per_schedule]
+            truncated.append(schedule["tid"])
+        series.append(occurrences)
+
+    merged = heapq.merge(*series, key=lambda entry: entry[:3])
+    return {"occurrences": [entry[3] for entry in merged], "truncated": truncated}
+
+
+class OccurrenceCache:
+    """LRU of expanded windows, keyed by (from, to)"""
+
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl_seconds: float = CACHE_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._windows: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by invalidate, so an expansion that raced a write is not stored
+        self._generation = 0
+
+    def get(self, window_start: datetime, window_end: datetime,
+            load: Callable[[], List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """The expanded window, expanding the schedules from ``load()`` on a miss"""
+        key = (window_start.isoformat(), window_end.isoformat())
+        with self._lock:
+            cached = self._windows.get(key)
+            if cached and self.clock() < cached[0]:
+                self._windows.move_to_end(key)
+                return cached[1]
+            generation = self._generation
+
+        # Expand outside the lock; concurrent misses on one window just do the work twice
+        expanded = expand_window(load(), window_start, window_end)
+        with self._lock:
+            if generation != self._generation:
+                return expanded
+            self._windows[key] = (self.clock() + self.ttl_seconds, expanded)
+            self._windows.move_to_end(key)
+            while len(self._windows) > self.maxsize:
+                self._windows.popitem(last=False)
+        return expanded
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._windows.clear()
+            self._generation += 1
+
+    def __len__(self) -> int:
+        return len(self._windows)
@@ -0,0 +1,98 @@
+"""
+Relay from the SCHEDULE_OUTBOX table to the schedule-events topic
+
+A trigger on SCHEDULE writes one outbox row per insert, per delete and per
+update that touches a timer field, in the same transaction as the change, so
+a committed schedule change always has its event recorded. The relay claims
+pending rows oldest first, publishes them and marks them published.
+
+Claims are leased rather than deleted: a relay that dies between publishing
+and marking leaves its rows to be claimed again once the lease runs out.
+Delivery is therefore at-least-once and consumers apply events idempotently,
+using ``version`` (the outbox row id, increasing per change) to drop stale or
+repeated ones.
+"""
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from kafka_client import KafkaEventPublisher, Topics
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv("SCHEDULE_OUTBOX_BATCH_SIZE", "100"))
+LEASE_SECONDS = int(os.getenv("SCHEDULE_OUTBOX_LEASE_SECONDS", "30"))
+POLL_SECONDS = float(os.getenv("SCHEDULE_OUTBOX_POLL_SECONDS", "1.0"))
+
+
+def event_data(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Kafka payload for an outbox row: the schedule as it is now (as it was, for deletes)"""
+    schedule = row.get("payload") or {}
+    return {
+        "sid": row.get("sid") or schedule.get("sid"),
+        "tid": row.get("tid") or schedule.get("tid"),
+        "version": row["id"],
+        "changed_at": row.get("created_at"),
+        "schedule": schedule,
+    }
+
+
+class OutboxRelay:
+    """Publishes SCHEDULE_OUTBOX rows to Kafka from a background thread"""
+
+    def __init__(self, store, publisher: Optional[KafkaEventPublisher] = None,
+                 batch_size: int = BATCH_SIZE, lease_seconds: int = LEASE_SECONDS,
+                 poll_seconds: float = POLL_SECONDS):
+        self.store = store
+        self.publisher = publisher or KafkaEventPublisher()
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def relay_once(self) -> int:
+        """Publish one claimed batch; returns how many rows were published"""
+        # UPDATE ... RETURNING does not keep the claim's ORDER BY
+        rows = sorted(self.store.claim_outbox(self.batch_size, self.lease_seconds), key=lambda row: row["id"])
+        published: List[Any] = []
+        for row in rows:
+            if not self.publisher.publish_event(Topics.SCHEDULE_EVENTS, row["event_type"], event_data(row)):
+                # Kafka is most likely unreachable, so the rest would fail too. The
+                # unpublished rows are claimed again when their lease expires, and
+                # consumers compare versions, so a late retry cannot undo a newer change
+                logger.warning(f"Failed to publish schedule outbox row {row['id']}, retrying after its lease")
+                break
+            published.append(row["id"])
+        if published:
+            self.store.mark_outbox_published(published)
+            logger.debug("Relayed %d schedule events", len(published))
+        return len(published)
+
+    def run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                sent = self.relay_once()
+            except Exception as e:
+                logger.error(f"Error relaying schedule outbox: {e}")
+                sent = 0
+            # A full batch means more rows are probably waiting, so go again straight away
+            if sent < self.batch_size:
+                self._stop.wait(self.poll_seconds)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="schedule-outbox-relay", daemon=True)
+        self._thread.start()
+        logger.info("Schedule outbox relay started")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.publisher.close()
+        logger.info("Schedule outbox relay stopped")
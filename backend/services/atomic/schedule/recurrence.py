@@ -0,0 +1,109 @@
+"""
+Recurrence arithmetic for recurring schedules
+
+When a recurring schedule comes due it is rolled over: the next occurrence
+starts one period after the current start, plus the start-to-deadline gap (so
+one period after the current deadline), and keeps the same gap. Immediate
+schedules restart a minute after the deadline. notify_user applies this one
+occurrence at a time; the schedule service uses ``expand`` to list every
+occurrence in a window without writing placeholder rows.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from dateutil.relativedelta import relativedelta
+import pytz
+
+# Define UTC+8 timezone (Singapore time)
+UTC_PLUS_8 = pytz.timezone('Asia/Singapore')
+
+FREQUENCIES = ("Weekly", "Monthly", "Yearly", "Immediate")
+
+# Frequencies that add a fixed duration to the start. Occurrence k then starts
+# at start + k * (period + gap), so a window's first occurrence is computed
+# directly rather than stepped to
+_FIXED_PERIODS = {
+    "Weekly": timedelta(weeks=1),
+    "Immediate": timedelta(minutes=1),
+}
+
+# Calendar periods; month lengths vary, so these are stepped one at a time
+_CALENDAR_PERIODS = {
+    "Monthly": relativedelta(months=1),
+    "Yearly": relativedelta(years=1),
+}
+
+Occurrence = Tuple[int, datetime, datetime]
+
+
+def to_utc8(value: datetime) -> datetime:
+    """Naive datetimes are taken to be UTC+8 already"""
+    if value.tzinfo is None:
+        return UTC_PLUS_8.localize(value)
+    return value.astimezone(UTC_PLUS_8)
+
+
+def parse_datetime(value: Any) -> datetime:
+    """UTC+8 datetime for an ISO timestamp (or datetime) as stored in SCHEDULE"""
+    if isinstance(value, datetime):
+        return to_utc8(value)
+    return to_utc8(datetime.fromisoformat(str(value).replace('Z', '+00:00')))
+
+
+def next_start(frequency: str, start: datetime, deadline: datetime) -> datetime:
+    """Start of the occurrence after the one running from ``start`` to ``deadline``"""
+    start, deadline = to_utc8(start), to_utc8(deadline)
+    gap = deadline - start
+    if frequency in _FIXED_PERIODS:
+        return start + _FIXED_PERIODS[frequency] + gap
+    if frequency in _CALENDAR_PERIODS:
+        # relativedelta clamps day overflow (31 Jan + 1 month -> 28/29 Feb)
+        return start + _CALENDAR_PERIODS[frequency] + gap
+    raise ValueError(f"Unsupported frequency: {frequency}")
+
+
+def expand(frequency: str, start: datetime, deadline: datetime,
+           window_start: datetime, window_end: datetime,
+           limit: Optional[int] = None) -> Iterator[Occurrence]:
+    """
+    Occurrences (index, start, deadline) of a series whose current occurrence
+    runs from ``start`` to ``deadline`` (index 0), in start order, that overlap
+    [window_start, window_end): deadline at or after the window start and start
+    before its end. At most ``limit`` are yielded.
+    """
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Unsupported frequency: {frequency}")
+    start, deadline = to_utc8(start), to_utc8(deadline)
+    window_start, window_end = to_utc8(window_start), to_utc8(window_end)
+    gap = deadline - start
+    if gap < timedelta(0):
+        raise ValueError("deadline is before start")
+
+    yielded = 0
+    if frequency in _FIXED_PERIODS:
+        step = _FIXED_PERIODS[frequency] + gap
+        # Smallest k >= 0 whose deadline (deadline + k * step) reaches the window, in integer arithmetic
+        index = max(0, -((deadline - window_start) // step))
+        occurrence_start = start + index * step
+        while occurrence_start < window_end and (limit is None or yielded < limit):
+            yield index, occurrence_start, occurrence_start + gap
+            yielded += 1
+            index += 1
+            occurrence_start = start + index * step
+        return
+
+    period = _CALENDAR_PERIODS[frequency]
+    index, occurrence_start = 0, start
+    while occurrence_start < window_end and (limit is None or yielded < limit):
+        if occurrence_start + gap >= window_start:
+            yield index, occurrence_start, occurrence_start + gap
+            yielded += 1
+        index += 1
+        occurrence_start = occurrence_start + period + gap
+
+
+def expand_schedule(schedule: Dict[str, Any], window_start: datetime, window_end: datetime,
+                    limit: Optional[int] = None) -> Iterator[Occurrence]:
+    """``expand`` for a SCHEDULE row"""
+    return expand(schedule.get("frequency"), parse_datetime(schedule["start"]), parse_datetime(schedule["deadline"]),
+                  window_start, window_end, limit)
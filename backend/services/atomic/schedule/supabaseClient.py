@@ -1,5 +1,6 @@
 from supabase import create_client, Client
 import os
+from datetime import datetime, timezone
 
 # Class to Add the Supabase Client
 class SupabaseClient:
@@ -8,8 +9,9 @@ class SupabaseClient:
         self.key = os.getenv("SUPABASE_API_KEY")
         self.client: Client = create_client(self.url, self.key)
 
-    # Insert Schedule
-    def insert_schedule(self, tid, start, deadline, is_recurring, status, next_occurrence, frequency=None):
+    # Build the SCHEDULE row for a new schedule, validating recurring fields
+    @staticmethod
+    def build_schedule_row(tid, start, deadline, is_recurring, status, next_occurrence, frequency=None):
         # Validation for recurring schedules
         if is_recurring is True:
             if next_occurrence is None:
@@ -30,21 +32,116 @@ class SupabaseClient:
             db_data["next_occurrence"] = next_occurrence
         if frequency is not None:
             db_data["frequency"] = frequency
-            
+        return db_data
+
+    # Validate a partial update the same way update_schedule does
+    @staticmethod
+    def validate_update(updated_data):
+        if "is_recurring" in updated_data and updated_data["is_recurring"] is True and "next_occurrence" not in updated_data:
+            raise ValueError("next_occurrence is required when is_recurring is True")
+
+    # Insert Schedule
+    def insert_schedule(self, tid, start, deadline, is_recurring, status, next_occurrence, frequency=None):
+        db_data = self.build_schedule_row(tid, start, deadline, is_recurring, status, next_occurrence, frequency)
         response = self.client.table("SCHEDULE").insert(db_data).execute()
         data = response.data
         return data[0] if data else None
+
+    # SCHEDULE row for a request payload shaped like POST / (recurring fields only kept for recurring schedules)
+    def row_from_payload(self, payload):
+        is_recurring = payload.get("is_recurring", False)
+        row = self.build_schedule_row(
+            payload.get("tid"),
+            payload.get("start"),
+            payload.get("deadline"),
+            is_recurring,
+            payload.get("status"),
+            payload.get("next_occurrence") if is_recurring else None,
+            payload.get("frequency") if is_recurring else None,
+        )
+        if payload.get("sid"):
+            row["sid"] = payload["sid"]
+        return row
+
+    def _rows(self, payloads, build):
+        rows = []
+        for i, payload in enumerate(payloads):
+            try:
+                rows.append(build(payload))
+            except ValueError as e:
+                raise ValueError(f"rows[{i}]: {e}")
+        return rows
+
+    # Insert many schedules in one statement
+    def insert_schedules(self, payloads):
+        rows = self._rows(payloads, self.row_from_payload)
+        response = self.client.table("SCHEDULE").insert(rows, default_to_null=False).execute()
+        return response.data if response.data else []
+
+    # Insert or replace whole schedule rows by sid in one statement; rows without a sid get a new one
+    def upsert_schedules(self, payloads):
+        rows = self._rows(payloads, self.row_from_payload)
+        response = self.client.table("SCHEDULE").upsert(rows, on_conflict="sid", default_to_null=False).execute()
+        return response.data if response.data else []
+
+    # Apply one partial update to many schedules in one statement
+    def update_schedules(self, sids, updated_data):
+        self.validate_update(updated_data)
+        response = self.client.table("SCHEDULE").update(updated_data).in_("sid", list(sids)).execute()
+        return response.data if response.data else []
+
+    # Apply a different partial update to each schedule ({"sid": ..., **fields}) in one RPC
+    def patch_schedules(self, patches):
+        def check(patch):
+            if not patch.get("sid"):
+                raise ValueError("sid is required")
+            self.validate_update(patch)
+            return patch
+        patches = self._rows(patches, check)
+        response = self.client.rpc("schedule_batch_update", {"p_rows": patches}).execute()
+        return response.data if response.data else []
+
+    # Close a recurring schedule and open its next occurrence in one transaction
+    def rollover_schedule(self, sid, start, deadline, next_occurrence):
+        response = self.client.rpc("schedule_rollover", {
+            "p_sid": sid,
+            "p_start": start,
+            "p_deadline": deadline,
+            "p_next_occurrence": next_occurrence,
+        }).execute()
+        return response.data if response.data else None
     
     # All Schedules
     def fetch_all_schedules(self, latest=False):
         response = self.client.rpc("latest_schedule_per_task").execute()
         return response.data if response.data else []
     
+    # One page of current schedules in tid order, after tid `after`; keyset pagination on schedule_current's key
+    def fetch_schedule_page(self, after=None, limit=500):
+        response = self.client.rpc("current_schedules_page", {"p_after": after, "p_limit": limit}).execute()
+        return response.data if response.data else []
+
+    # Current (latest) schedule of each task, keyed by tid; one indexed lookup per tid in schedule_current
+    def fetch_latest_schedules(self, tids):
+        if not tids:
+            return {}
+        response = self.client.rpc("latest_schedule_for_tasks", {"p_tids": list(tids)}).execute()
+        return {row["tid"]: row for row in response.data or [] if row.get("tid")}
+
+    # Current schedules with a deadline in [after, before), soonest first; a range scan on the deadline index
+    def fetch_due_schedules(self, before=None, after=None, status_not=None, limit=None):
+        response = self.client.rpc("schedules_due", {
+            "p_after": after,
+            "p_before": before,
+            "p_status_not": list(status_not or []),
+            "p_limit": limit,
+        }).execute()
+        return response.data if response.data else []
+
     # Get Schedule by Task ID
     def fetch_schedule_by_tid(self, tid, latest=False):
         if latest:
-            response = self.client.table("SCHEDULE").select("*").eq("tid", tid).order("start", desc=True).limit(1).execute()
-            return response.data[0] if response.data else None
+            return self.fetch_latest_schedules([tid]).get(tid)
         response = self.client.table("SCHEDULE").select("*").eq("tid", tid).execute()
         return response.data if response.data else None
     
@@ -62,8 +159,7 @@ class SupabaseClient:
 
     # Update Schedule
     def update_schedule(self, sid, updated_data):
-        if "is_recurring" in updated_data and updated_data["is_recurring"] is True and "next_occurrence" not in updated_data:
-            raise ValueError("next_occurrence is required when is_recurring is True")
+        self.validate_update(updated_data)
 
         response = self.client.table("SCHEDULE").update(updated_data).eq("sid", sid).execute()
         data = response.data
@@ -78,4 +174,18 @@ class SupabaseClient:
     def fetch_schedule_user_info_by_sid(self, sid):
         response = self.client.table("schedule_participants").select("*").eq("sid", sid).execute()
         data = response.data
-        return data if data else None
\ No newline at end of file
+        return data if data else None
+
+    # Claim unpublished SCHEDULE_OUTBOX rows for the relay (oldest first, leased so concurrent relays skip them)
+    def claim_outbox(self, limit, lease_seconds):
+        response = self.client.rpc("schedule_outbox_claim", {"p_limit": limit, "p_lease_seconds": lease_seconds}).execute()
+        return response.data if response.data else []
+
+    # Mark outbox rows as published once Kafka acknowledged them
+    def mark_outbox_published(self, ids):
+        if not ids:
+            return []
+        response = self.client.table("SCHEDULE_OUTBOX").update(
+            {"published_at": datetime.now(timezone.utc).isoformat()}
+        ).in_("id", list(ids)).execute()
+        return response.data if response.data else []
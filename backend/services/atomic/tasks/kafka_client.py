@@ -9,6 +9,8 @@ from kafka.errors import KafkaError
 import os
 from datetime import datetime
 import pytz
+from tracing import extract, kafka_headers, start_span
+from metrics import observe_consumer_lag
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,6 +19,22 @@ logger = logging.getLogger(__name__)
 # Define UTC+8 timezone (Singapore time)
 UTC_PLUS_8 = pytz.timezone('Asia/Singapore')
 
+# Fields that identify the entity an event is about, most specific first.
+# Events keyed by the same entity land on the same partition, so they are
+# consumed in the order they were published.
+PARTITION_KEY_FIELDS = ("tid", "task_id", "sid", "schedule_id", "pid", "project_id", "uid", "user_id")
+
+
+def partition_key(data: Dict[str, Any]) -> Optional[str]:
+    """Default message key for an event payload, or None when it names no entity"""
+    if not isinstance(data, dict):
+        return None
+    for field in PARTITION_KEY_FIELDS:
+        value = data.get(field)
+        if value:
+            return str(value)
+    return None
+
 class KafkaEventPublisher:
     """Kafka event publisher for sending events to topics"""
     
@@ -50,7 +68,8 @@ class KafkaEventPublisher:
             topic: Kafka topic name
             event_type: Type of event (e.g., 'task_created', 'user_updated')
             data: Event data payload
-            key: Optional message key for partitioning
+            key: Optional message key for partitioning; derived from the task,
+                 schedule, project or user id in data when omitted
             partition: Optional partition number
         """
         if not self.producer:
@@ -60,6 +79,9 @@ class KafkaEventPublisher:
                 logger.error("Failed to initialize producer")
                 return False
         
+        if key is None and partition is None:
+            key = partition_key(data)
+
         try:
             event = {
                 'event_type': event_type,
@@ -67,17 +89,20 @@ class KafkaEventPublisher:
                 'data': data
             }
             
-            future = self.producer.send(
-                topic, 
-                value=event, 
-                key=key,
-                partition=partition
-            )
-            
-            # Wait for the message to be sent
-            record_metadata = future.get(timeout=10)
+            with start_span(f"produce {topic}", "producer",
+                            {"messaging.system": "kafka", "messaging.destination": topic, "event_type": event_type}):
+                future = self.producer.send(
+                    topic, 
+                    value=event, 
+                    key=key,
+                    partition=partition,
+                    headers=kafka_headers()
+                )
+                
+                # Wait for the message to be sent
+                record_metadata = future.get(timeout=10)
             
-            logger.info(f"Event published to {topic}: {event_type} at partition {record_metadata.partition}")
+            logger.debug("Event published to %s: %s at partition %s", topic, event_type, record_metadata.partition)
             return True
             
         except KafkaError as e:
@@ -150,8 +175,14 @@ class KafkaEventConsumer:
             for message in self.consumer:
                 try:
                     event = message.value
-                    logger.info(f"Received event: {event.get('event_type')} from {message.topic}")
-                    handler(event)
+                    logger.debug("Received event: %s from %s", event.get('event_type'), message.topic)
+                    # Continue the producer's trace so consumer work shows up under the originating request
+                    with start_span(f"consume {message.topic}", "consumer",
+                                    {"messaging.system": "kafka", "messaging.destination": message.topic,
+                                     "event_type": event.get('event_type')},
+                                    parent=extract(message.headers)):
+                        handler(event)
+                    observe_consumer_lag(self.consumer, message)
                 except Exception as e:
                     logger.error(f"Error processing message: {e}")
                             
@@ -203,6 +234,6 @@ class EventTypes:
 class Topics:
     # TASK_EVENTS = "task-events"
     # PROJECT_EVENTS = "project-events"
-    # SCHEDULE_EVENTS = "schedule-events"
+    SCHEDULE_EVENTS = "schedule-events"
     # USER_EVENTS = "user-events"
     NOTIFICATION_EVENTS = "notification-events"
\ No newline at end of file
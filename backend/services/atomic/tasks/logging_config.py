@@ -0,0 +1,161 @@
+"""
+Shared logging setup for SPM microservices
+
+- One JSON object per line on stdout: time, level, service, logger, message,
+  trace/span ids of the active span, plus any ``extra={...}`` fields
+- Non-blocking: loggers only put records on a queue; a QueueListener thread
+  serialises and writes them
+- Per-route sampling: LOG_SAMPLE_RATES="GET /tasks/user/{user_id}=0.05,..."
+  keeps DEBUG/INFO lines for that fraction of requests to the route
+  (LOG_SAMPLE_RATE is the default). WARNING and above are always kept.
+- LOG_LEVEL (default INFO). Pass payloads as %-style args, e.g.
+  ``logger.debug("Task MS response: %s", data)``, so they are only turned
+  into strings when that level is enabled.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from tracing import current_span
+
+_request_sampled: ContextVar[bool] = ContextVar("log_request_sampled", default=True)
+_listener: Optional[logging.handlers.QueueListener] = None
+
+# Attributes every LogRecord has; anything else came from extra={...}
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "trace_id", "span_id"}
+
+
+def parse_sample_rates(value: Optional[str]) -> Dict[str, float]:
+    """Parse 'METHOD /route=rate,...' into {"METHOD /route": rate}; malformed entries are skipped"""
+    rates = {}
+    for item in (value or "").split(","):
+        key, sep, rate = item.rpartition("=")
+        if not sep or not key.strip():
+            continue
+        try:
+            rates[key.strip()] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            continue
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, service_name: str):
+        super().__init__()
+        self.service_name = service_name
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "service": self.service_name,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+            entry["span_id"] = record.span_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Drop DEBUG/INFO records of requests that were not sampled"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or _request_sampled.get()
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue records without formatting them. Only the message template is
+    resolved here (args may be mutated after the call returns); JSON
+    serialisation and I/O happen on the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        span = current_span()
+        if span is not None:
+            record.trace_id = span.context.trace_id
+            record.span_id = span.context.span_id
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(service_name: str, app=None, level: Optional[str] = None) -> None:
+    """
+    Route the root logger through the JSON queue handler and, when an app is
+    given, decide per request whether its DEBUG/INFO lines are kept.
+    """
+    global _listener
+    if _listener is None:
+        log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JsonFormatter(service_name))
+        _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        handler = ContextQueueHandler(log_queue)
+        handler.addFilter(SamplingFilter())
+        root = logging.getLogger()
+        root.handlers = [handler]
+        root.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+        # httpx logs every request at INFO; client spans and metrics already cover those calls
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    if app is not None:
+        install_request_sampling(app)
+
+
+class _SampleRequestLogs:
+    """Plain ASGI middleware, so sampling adds no task group or body streams per request"""
+
+    def __init__(self, app, default_rate: float, route_rates: Dict[str, float]):
+        self.app = app
+        self.default_rate = default_rate
+        self.route_rates = route_rates
+        from starlette.routing import Match
+
+        self.full_match = Match.FULL
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rate = self.default_rate
+        if self.route_rates:
+            for route in scope["app"].router.routes:
+                match, _ = route.matches(scope)
+                if match == self.full_match:
+                    rate = self.route_rates.get(f"{scope['method']} {getattr(route, 'path', '')}", self.default_rate)
+                    break
+        token = _request_sampled.set(rate >= 1.0 or random.random() < rate)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_sampled.reset(token)
+
+
+def install_request_sampling(app) -> None:
+    default_rate = min(max(float(os.getenv("LOG_SAMPLE_RATE", "1.0")), 0.0), 1.0)
+    route_rates = parse_sample_rates(os.getenv("LOG_SAMPLE_RATES"))
+    if default_rate >= 1.0 and not route_rates:
+        return
+    app.add_middleware(_SampleRequestLogs, default_rate=default_rate, route_rates=route_rates)
@@ -1,16 +1,25 @@
 from fastapi import FastAPI, HTTPException, Body, Path, Request,Query
-from fastapi.responses import Response
+from fastapi.responses import Response, ORJSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from supabaseClient import SupabaseClient
 from dotenv import load_dotenv
 import uvicorn
 from postgrest.exceptions import APIError
-from datetime import datetime, timezone
-from typing import Any, Dict, List
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from functools import partial
+import asyncio
 import os
 import logging
 import pytz
 from fastapi.middleware.cors import CORSMiddleware
 from kafka_client import KafkaEventPublisher, EventTypes, Topics
+from tracing import init_tracing, instrument_app
+from metrics import init_metrics
+from logging_config import setup_logging
+from auth_middleware import install_auth
+from audit_trail import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, logs_export, logs_page
+from task_tree import TaskTreeCache, build_task_tree, find_subtree
 from datetime import datetime
 import uuid
 
@@ -25,12 +34,34 @@ logger = logging.getLogger(__name__)
 # Define UTC+8 timezone (Singapore time)
 UTC_PLUS_8 = pytz.timezone('Asia/Singapore')
 
-app = FastAPI(title="Atomic Microservice: Task Service")
+app = FastAPI(title="Atomic Microservice: Task Service", default_response_class=ORJSONResponse)
+
+# Compress large list payloads (clients send Accept-Encoding: gzip)
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=6)
+
+# Trace requests and outgoing calls (spans are exported when TRACE_EXPORT_DIR is set),
+# and expose latency histograms derived from those spans on GET /metrics
+init_tracing("tasks")
+instrument_app(app)
+init_metrics(app)
+setup_logging("tasks", app)
+install_auth(app)
+
 supabase = SupabaseClient()
 
 # Initialize Kafka publisher
 kafka_publisher = KafkaEventPublisher()
 
+# Built task trees and /stats aggregates per project, dropped on every task write below
+task_tree_cache = TaskTreeCache()
+project_stats_cache = TaskTreeCache()
+
+
+def invalidate_project(project_id: Optional[str] = None) -> None:
+    """Drop a project's cached tree and stats, or every project's when project_id is None."""
+    task_tree_cache.invalidate(project_id)
+    project_stats_cache.invalidate(project_id)
+
 # CORS
 DEFAULT_ORIGINS = [
     "http://localhost:3000",
@@ -94,7 +125,7 @@ def notify_task_participants(task_id, event_type: str, task_data: Dict[str, Any]
         # Get all participants for this task
         logger.info(f"👥 Fetching participants for task {task_id}")
         
-        logger.info(f"Participants data: {participants}")
+        logger.debug("Participants data: %s", participants)
         
         if not participants:
             logger.warning(f"⚠️ No participants found for task {task_id}")
@@ -175,6 +206,18 @@ def notify_task_participants(task_id, event_type: str, task_data: Dict[str, Any]
         logger.error(f"Full traceback: {traceback.format_exc()}")
         return False
 
+
+def get_project_tree(project_id: str) -> List[Dict[str, Any]]:
+    """Return the cached task forest for a project, building it on a miss."""
+    tree = task_tree_cache.get(project_id)
+    if tree is not None:
+        return tree
+    tasks = supabase.get_all_tasks(filter_by={"pid": project_id})
+    schedules = supabase.get_latest_schedules([t["id"] for t in tasks if t.get("id")]) if tasks else {}
+    tree = build_task_tree(tasks, schedules)
+    task_tree_cache.set(project_id, tree)
+    return tree
+
 @app.get("/")
 def read_root():
     return {"message": "Task Service is running 🚀😱"}
@@ -183,6 +226,15 @@ def read_root():
 async def get_favicon():
     return Response(status_code=204)
 
+def deadline_window(name: str, now: datetime):
+    """(before, after) ISO deadline range for a deadline filter value, or None if it is not one"""
+    if name == "upcoming":
+        # (deadline - now).days between 0 and 3
+        return (now + timedelta(days=4)).isoformat(), now.isoformat()
+    if name == "overdue":
+        return now.isoformat(), None
+    return None
+
 #Get All tasks
 @app.get("/tasks", summary="Get all tasks")
 async def get_all_tasks(sortBy: str = None, filter: str = None):
@@ -192,40 +244,22 @@ async def get_all_tasks(sortBy: str = None, filter: str = None):
       - sortBy: priority | deadline | status
       - filter: comma-separated key:value, e.g. "deadline:upcoming,status:incomplete"
     """
-    tasks = supabase.get_all_tasks()
-    
-    # ---- Apply filtering ----
-    if filter:
-        filters = dict(item.split(":") for item in filter.split(",") if ":" in item)
-        filtered_tasks = []
+    filters = dict(item.split(":") for item in filter.split(",") if ":" in item) if filter else {}
+
+    # Filter by deadline: deadlines live on each task's current schedule, so only the
+    # tasks due in the window are fetched, found with a range scan on the deadline index
+    if "deadline" in filters:
+        window = deadline_window(filters["deadline"], datetime.now(timezone.utc))
+        due = supabase.get_due_schedules(*window) if window else {}
+        tasks = supabase.get_tasks_by_ids(list(due)) if due else []
         for task in tasks:
-            include = True
-
-            # Filter by deadline
-            if "deadline" in filters:
-                now = datetime.now(timezone.utc)
-                deadline_str = task.get("deadline")  # assume string in ISO format
-                if deadline_str:
-                    try:
-                        deadline_dt = datetime.fromisoformat(deadline_str.replace("Z", "+00:00"))
-                        if filters["deadline"] == "upcoming" and not (0 <= (deadline_dt - now).days <= 3):
-                            include = False
-                        elif filters["deadline"] == "overdue" and not (deadline_dt < now):
-                            include = False
-                    except Exception:
-                        include = False
-                else:
-                    include = False
-
-            # Filter by status
-            if "status" in filters:
-                status = task.get("status", "").lower()
-                if filters["status"].lower() != status:
-                    include = False
-
-            if include:
-                filtered_tasks.append(task)
-        tasks = filtered_tasks
+            task.setdefault("deadline", due[task["id"]].get("deadline"))
+    else:
+        tasks = supabase.get_all_tasks()
+
+    # ---- Apply filtering ----
+    if "status" in filters:
+        tasks = [task for task in tasks if filters["status"].lower() == (task.get("status") or "").lower()]
 
     # ---- Apply sorting ----
     if sortBy:
@@ -275,6 +309,81 @@ async def get_tasks_by_project(
     return {"message": f"{len(tasks)} task(s) retrieved", "tasks": tasks}
 
 
+# Get full task hierarchy of a project
+@app.get("/tree/pid/{project_id}", summary="Get the task tree of a project with rollups")
+async def get_project_task_tree(
+    project_id: str = Path(..., description="Project ID")
+):
+    tree = get_project_tree(project_id)
+    if not tree:
+        return {"message": "No tasks found for this project", "project_id": project_id, "tasks": []}
+    total = sum(1 + node["rollup"]["descendant_count"] for node in tree)
+    return {"message": f"{total} task(s) retrieved", "project_id": project_id, "tasks": tree}
+
+
+# Get full subtree below a task
+@app.get("/tree/tid/{task_id}", summary="Get a task with all nested subtasks and rollups")
+async def get_task_tree(
+    task_id: str = Path(..., description="Primary key of the task (uuid)")
+):
+    task = supabase.get_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    if task.get("pid"):
+        node = find_subtree(get_project_tree(task["pid"]), task_id)
+    else:
+        # Tasks without a project are not cached; walk the subtree level by level
+        subtree = supabase.get_task_subtree(task_id)
+        schedules = supabase.get_latest_schedules([t["id"] for t in subtree])
+        node = find_subtree(build_task_tree(subtree, schedules), task_id)
+
+    if node is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return {"message": "Task tree retrieved successfully", "task": node}
+
+
+# Aggregate stats for one or more projects
+@app.get("/stats", summary="Get task counts, overdue count and logged time per project")
+async def get_project_task_stats(
+    pids: str = Query(..., description="Comma-separated project IDs")
+):
+    """
+    Aggregated in the database by one grouped RPC over the requested projects
+    not already cached; projects without tasks report zeros. Cached per
+    project like the task trees, so task writes here drop the entry.
+    """
+    project_ids = list(dict.fromkeys(p.strip() for p in pids.split(",") if p.strip()))
+    if not project_ids:
+        raise HTTPException(status_code=400, detail="At least one project ID is required")
+    try:
+        project_ids = list(dict.fromkeys(str(uuid.UUID(pid)) for pid in project_ids))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Project IDs must be UUIDs")
+
+    stats = {pid: project_stats_cache.get(pid) for pid in project_ids}
+    missing = [pid for pid, entry in stats.items() if entry is None]
+    rows = await asyncio.to_thread(supabase.get_project_stats, missing) if missing else []
+    totals = {pid: {"task_count": 0, "status_counts": {}, "overdue_count": 0, "minutes": 0} for pid in missing}
+    for row in rows:
+        entry = totals.get(str(row.get("pid")))
+        if entry is None:
+            continue
+        count = int(row.get("task_count") or 0)
+        status = row.get("status") or "none"
+        entry["task_count"] += count
+        entry["status_counts"][status] = entry["status_counts"].get(status, 0) + count
+        entry["overdue_count"] += int(row.get("overdue_count") or 0)
+        entry["minutes"] += int(row.get("total_minutes") or 0)
+
+    for pid, entry in totals.items():
+        minutes = entry.pop("minutes")
+        entry["time_spent"] = {"hours": minutes // 60, "minutes": minutes % 60, "total_minutes": minutes}
+        project_stats_cache.set(pid, entry)
+        stats[pid] = entry
+    return {"message": f"Stats for {len(stats)} project(s) retrieved", "stats": stats}
+
+
 # Get task by parent Task ID
 @app.get("/ptid/{parent_task_id}", summary="Get all tasks by parent Task ID")
 async def get_tasks_by_parent_task(
@@ -319,6 +428,8 @@ async def create_task(
         if not rows:
             raise HTTPException(status_code=400, detail="Failed to create task")
 
+        if rows[0].get("pid"):
+            invalidate_project(rows[0]["pid"])
         return {"message": "Task created successfully", "task": rows[0]}
 
     except APIError as e:
@@ -378,6 +489,8 @@ async def update_task(
         raise HTTPException(status_code=404, detail="Task not updated")
     
     updated_task = rows[0]
+    # A moved task leaves a stale copy in its old project's tree
+    invalidate_project(None if "pid" in updates else updated_task.get("pid"))
     
     # Send notifications to all task participants (excluding collaborator-only changes)
     try:
@@ -445,6 +558,8 @@ async def delete_task(
         raise HTTPException(status_code=404, detail="Task not found")
 
     deleted_task = rows[0]
+    if deleted_task.get("pid"):
+        invalidate_project(deleted_task["pid"])
     
     # Send notifications to all task participants
     try:
@@ -470,6 +585,24 @@ async def delete_task(
     return {"message": "Task deleted successfully", "task": deleted_task}
 
 
+@app.get("/tasks/{task_id}/messages", summary="Get all chat messages for a task")
+async def get_task_messages(
+    task_id: str = Path(..., description="Task ID")
+):
+    """
+    Fetch only the messages column of a task (oldest first, as appended).
+    """
+    resp = supabase.client.table("TASK").select("messages").eq("id", task_id).execute()
+    if not resp.data:
+        raise HTTPException(status_code=404, detail="Task not found")
+    messages = resp.data[0].get("messages") or []
+    return {
+        "message": f"{len(messages)} message(s) retrieved",
+        "task_id": task_id,
+        "messages": messages
+    }
+
+
 @app.get("/tasks/{task_id}/time-entries", summary="Get all time entries for a task")
 async def get_task_time_entries(
     task_id: str = Path(..., description="Task ID")
@@ -538,6 +671,9 @@ async def add_task_time_entry(
         
         if not update_resp.data:
             raise HTTPException(status_code=400, detail="Failed to add time entry")
+
+        if update_resp.data[0].get("pid"):
+            invalidate_project(update_resp.data[0]["pid"])
         
         logger.info(f"✅ Time entry added to task {task_id} by user {user_name}")
         
@@ -599,6 +735,9 @@ async def remove_task_time_entry(
         
         if not update_resp.data:
             raise HTTPException(status_code=400, detail="Failed to remove time entry")
+
+        if update_resp.data[0].get("pid"):
+            invalidate_project(update_resp.data[0]["pid"])
         
         logger.info(f"✅ Time entry {entry_id} removed from task {task_id}")
         
@@ -625,10 +764,38 @@ async def get_task_participants(
         return {"message": "No participants found for this task", "participants": []}
     return {"message": f"{len(participants)} participant(s) retrieved", "participants": participants}
 
-@app.get("/logs", summary="Get all logs")
-async def get_all_logs():
-    logs = supabase.get_all_logs()
-    return {"message": f"{len(logs)} log(s) retrieved", "logs": logs}
+@app.get("/logs", summary="Query the task and schedule audit trail")
+async def get_all_logs(
+    record_id: Optional[str] = Query(None, description="Only changes to this record"),
+    actor: Optional[str] = Query(None, description="Only changes made by this user ID"),
+    since: Optional[datetime] = Query(None, description="Changes at or after this time (ISO 8601)"),
+    until: Optional[datetime] = Query(None, description="Changes before this time (ISO 8601)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+):
+    """Newest first; follow next_cursor until it is null to walk the whole trail"""
+    fetch = _audit_fetch(record_id, actor, since, until)
+    page = logs_page(fetch, cursor, limit)
+    return {"message": f"{len(page['logs'])} log(s) retrieved", **page}
+
+@app.get("/logs/export", summary="Stream the task and schedule audit trail as NDJSON")
+async def export_logs(
+    record_id: Optional[str] = Query(None, description="Only changes to this record"),
+    actor: Optional[str] = Query(None, description="Only changes made by this user ID"),
+    since: Optional[datetime] = Query(None, description="Changes at or after this time (ISO 8601)"),
+    until: Optional[datetime] = Query(None, description="Changes before this time (ISO 8601)"),
+):
+    return logs_export(_audit_fetch(record_id, actor, since, until), filename="task_audit_trail.ndjson")
+
+def _audit_fetch(record_id, actor, since, until):
+    """get_logs_page with the request's filters bound; audit_trail supplies after/limit"""
+    return partial(
+        supabase.get_logs_page,
+        record_id=record_id,
+        actor=actor,
+        since=since.isoformat() if since else None,
+        until=until.isoformat() if until else None,
+    )
 
 @app.get("/logs/{tid}", summary="Get a log by its ID")
 async def get_log(
@@ -0,0 +1,246 @@
+"""
+Shared Prometheus metrics for SPM microservices
+
+Latency histograms are derived from the spans tracing.py already records, so
+nothing is timed twice:
+  - server spans   -> http_server_request_duration_seconds
+  - httpx calls    -> http_client_request_duration_seconds (by target service)
+  - Supabase calls -> supabase_query_duration_seconds (by table)
+  - Kafka          -> kafka_produce_duration_seconds / kafka_consume_duration_seconds
+  - SMTP           -> smtp_send_duration_seconds
+plus Kafka consumer lag and APScheduler job gauges/counters, including the
+job executor's queue depth.
+
+Labels are limited to bounded values (route templates, service host names,
+table and topic names, status classes) so series counts stay flat as data grows.
+
+Under uvicorn --workers N, PROMETHEUS_MULTIPROC_DIR must point at an empty
+directory private to the container (compose mounts a tmpfs; the image's CMD
+clears it before uvicorn starts) and /metrics merges every worker's values.
+Gauges are therefore only ever .set() from the code that changes them: values
+computed at scrape time (Gauge.set_function) are not collected across
+processes. Gauges declare how workers combine: livesum for counts that are
+split between workers, livemax for Kafka lag. A worker's live gauges are
+dropped when it exits cleanly.
+"""
+import atexit
+import logging
+import os
+import threading
+from typing import Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    start_http_server,
+)
+
+from tracing import Span, add_span_listener
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HTTP_SERVER_DURATION = Histogram(
+    "http_server_request_duration_seconds",
+    "Time to serve an HTTP request",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_CLIENT_DURATION = Histogram(
+    "http_client_request_duration_seconds",
+    "Time for an outgoing HTTP call to another service",
+    ["target", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+SUPABASE_DURATION = Histogram(
+    "supabase_query_duration_seconds",
+    "Time for a Supabase (PostgREST) request",
+    ["table", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+KAFKA_PRODUCE_DURATION = Histogram(
+    "kafka_produce_duration_seconds",
+    "Time to publish an event and wait for the broker ack",
+    ["topic", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+KAFKA_CONSUME_DURATION = Histogram(
+    "kafka_consume_duration_seconds",
+    "Time to handle one consumed event",
+    ["topic", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+KAFKA_CONSUMER_LAG = Gauge(
+    "kafka_consumer_lag_messages",
+    "Messages between the last handled offset and the partition high watermark",
+    ["topic", "partition"],
+    multiprocess_mode="livemax",
+)
+SMTP_SEND_DURATION = Histogram(
+    "smtp_send_duration_seconds",
+    "Time to deliver one email over SMTP",
+    ["outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+SCHEDULER_JOBS = Gauge(
+    "scheduler_jobs",
+    "Jobs currently scheduled in APScheduler",
+    multiprocess_mode="livesum",
+)
+SCHEDULER_JOB_QUEUE_DEPTH = Gauge(
+    "scheduler_job_queue_depth",
+    "Due scheduler jobs waiting for an executor slot",
+    multiprocess_mode="livesum",
+)
+SCHEDULER_JOBS_RUNNING = Gauge(
+    "scheduler_jobs_running",
+    "Scheduler jobs currently executing",
+    multiprocess_mode="livesum",
+)
+SCHEDULER_JOB_EVENTS = Counter(
+    "scheduler_job_events_total",
+    "APScheduler job executions by result",
+    ["event"],
+)
+
+
+def _status_class(code) -> str:
+    try:
+        return f"{int(code) // 100}xx"
+    except (TypeError, ValueError):
+        return "error"
+
+
+def observe_span(span: Span) -> None:
+    """Record a finished span in the matching histogram"""
+    attrs = span.attributes
+    seconds = (span.duration_ms or 0) / 1000
+    outcome = "error" if span.status == "error" else "ok"
+
+    if span.kind == "server":
+        HTTP_SERVER_DURATION.labels(
+            attrs.get("http.method", ""), attrs.get("http.route", "unmatched"), _status_class(attrs.get("http.status_code"))
+        ).observe(seconds)
+    elif span.kind == "client" and attrs.get("net.protocol.name") == "smtp":
+        SMTP_SEND_DURATION.labels(outcome).observe(seconds)
+    elif span.kind == "client" and attrs.get("db.system"):
+        SUPABASE_DURATION.labels(
+            attrs.get("db.sql.table", ""), attrs.get("http.method", ""), _status_class(attrs.get("http.status_code"))
+        ).observe(seconds)
+    elif span.kind == "client":
+        HTTP_CLIENT_DURATION.labels(
+            attrs.get("net.peer.name", ""), attrs.get("http.method", ""), _status_class(attrs.get("http.status_code"))
+        ).observe(seconds)
+    elif span.kind == "producer":
+        KAFKA_PRODUCE_DURATION.labels(attrs.get("messaging.destination", ""), outcome).observe(seconds)
+    elif span.kind == "consumer":
+        KAFKA_CONSUME_DURATION.labels(attrs.get("messaging.destination", ""), outcome).observe(seconds)
+
+
+def observe_consumer_lag(consumer, message) -> None:
+    """Update the lag gauge for the partition a just-handled message came from"""
+    try:
+        from kafka import TopicPartition
+
+        highwater = consumer.highwater(TopicPartition(message.topic, message.partition))
+        if highwater is not None:
+            KAFKA_CONSUMER_LAG.labels(message.topic, str(message.partition)).set(max(highwater - message.offset - 1, 0))
+    except Exception as e:
+        logger.debug(f"Could not read consumer lag: {e}")
+
+
+# Recounting walks every job, so job events schedule at most one recount per interval
+JOB_COUNT_INTERVAL_SECONDS = 1.0
+
+
+def instrument_scheduler(scheduler) -> None:
+    """Count job executions, errors and misfires, and keep the scheduled-jobs gauge current"""
+    from apscheduler.events import (
+        EVENT_ALL_JOBS_REMOVED,
+        EVENT_JOB_ADDED,
+        EVENT_JOB_ERROR,
+        EVENT_JOB_EXECUTED,
+        EVENT_JOB_MISSED,
+        EVENT_JOB_REMOVED,
+    )
+
+    names = {EVENT_JOB_EXECUTED: "executed", EVENT_JOB_ERROR: "error", EVENT_JOB_MISSED: "missed"}
+    recount_lock = threading.Lock()
+    recount_pending = [False]
+
+    def recount():
+        with recount_lock:
+            recount_pending[0] = False
+        try:
+            SCHEDULER_JOBS.set(len(scheduler.get_jobs()))
+        except Exception as e:
+            logger.debug(f"Could not count scheduler jobs: {e}")
+
+    def on_job_event(event):
+        if event.code in names:
+            SCHEDULER_JOB_EVENTS.labels(names[event.code]).inc()
+        with recount_lock:
+            if recount_pending[0]:
+                return
+            recount_pending[0] = True
+        timer = threading.Timer(JOB_COUNT_INTERVAL_SECONDS, recount)
+        timer.daemon = True
+        timer.start()
+
+    scheduler.add_listener(
+        on_job_event,
+        EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED
+        | EVENT_JOB_ADDED | EVENT_JOB_REMOVED | EVENT_ALL_JOBS_REMOVED,
+    )
+    recount()
+
+
+def instrument_executor(executor) -> None:
+    """Report the queue depth and running count of an executor that tracks them (async_jobs.AsyncJobExecutor)"""
+
+    def report():
+        SCHEDULER_JOB_QUEUE_DEPTH.set(executor.queue_depth)
+        SCHEDULER_JOBS_RUNNING.set(executor.running)
+
+    executor.on_load_change = report
+    report()
+
+
+def _registry() -> CollectorRegistry:
+    # uvicorn --workers N: each worker writes to PROMETHEUS_MULTIPROC_DIR and /metrics merges them
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def init_metrics(app=None, port: Optional[int] = None) -> None:
+    """
+    Start recording span metrics and expose them: as GET /metrics on a
+    FastAPI app, or on a standalone HTTP port for services without one.
+    """
+    add_span_listener(observe_span)
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        # Drop this worker's live gauges (scheduler counts, Kafka lag) once it is gone
+        atexit.register(multiprocess.mark_process_dead, os.getpid())
+
+    if app is not None:
+        from fastapi import Response
+
+        @app.get("/metrics", include_in_schema=False)
+        def metrics():
+            return Response(generate_latest(_registry()), media_type=CONTENT_TYPE_LATEST)
+
+    if port is not None:
+        start_http_server(port, registry=_registry())
@@ -63,6 +63,28 @@ class SupabaseClient:
             query = query.eq("record_id", filter_by)
         resp = query.execute()
         return getattr(resp, "data", None) or []
+
+    def get_logs_page(self, record_id: str = None, actor: str = None, since: str = None, until: str = None,
+                      after: tuple = None, limit: int = 100):
+        """
+        One page of audit logs, newest first, ordered by (timestamp, id).
+        since is inclusive and until exclusive (ISO timestamps); actor matches changed_by.
+        after: (timestamp, id) of the last row already returned (keyset pagination)
+        """
+        query = self.client.table("AUDIT_TRAIL").select("*").in_('table_name', ['TASK', 'SCHEDULE'])
+        if record_id:
+            query = query.eq("record_id", record_id)
+        if actor:
+            query = query.eq("changed_by", actor)
+        if since:
+            query = query.gte("timestamp", since)
+        if until:
+            query = query.lt("timestamp", until)
+        if after:
+            timestamp, last_id = after
+            query = query.or_(f'timestamp.lt."{timestamp}",and(timestamp.eq."{timestamp}",id.lt."{last_id}")')
+        resp = query.order("timestamp", desc=True).order("id", desc=True).limit(limit).execute()
+        return getattr(resp, "data", None) or []
     
     def get_task(self, task_id: str):
         """Get a single task by its ID"""
@@ -72,4 +94,65 @@ class SupabaseClient:
     def get_task_participants(self, tid: str):
         """Get all participants for a task"""
         response = self.client.table("schedule_participants").select("*").eq("tid", tid).execute()
-        return response.data if response.data else []
\ No newline at end of file
+        return response.data if response.data else []
+
+    def get_latest_schedules(self, task_ids: list):
+        """
+        Latest schedule row of each of these tasks, keyed by task ID.
+        Only the listed tasks' rows are read (schedule_current projection).
+        """
+        if not task_ids:
+            return {}
+        response = self.client.rpc("latest_schedule_for_tasks", {"p_tids": list(task_ids)}).execute()
+        rows = getattr(response, "data", None) or []
+        return {row["tid"]: row for row in rows if row.get("tid")}
+
+    def get_project_stats(self, project_ids: list):
+        """
+        Task count, overdue count and logged minutes per (pid, status), summed
+        in the database by the project_task_stats RPC in a single call.
+        """
+        if not project_ids:
+            return []
+        response = self.client.rpc("project_task_stats", {"p_pids": list(project_ids)}).execute()
+        return getattr(response, "data", None) or []
+
+    def get_tasks_by_ids(self, task_ids: list):
+        """TASK rows for these IDs, in one in_() query"""
+        if not task_ids:
+            return []
+        resp = self.client.table("TASK").select("*").in_("id", list(task_ids)).execute()
+        return getattr(resp, "data", None) or []
+
+    def get_due_schedules(self, before: str = None, after: str = None, status_not: list = None):
+        """
+        Current schedule rows with a deadline in [after, before), keyed by task ID.
+        Uses the schedules_due RPC (see the Schedule Service README).
+        """
+        response = self.client.rpc("schedules_due", {
+            "p_after": after,
+            "p_before": before,
+            "p_status_not": list(status_not or []),
+            "p_limit": None,
+        }).execute()
+        rows = getattr(response, "data", None) or []
+        return {row["tid"]: row for row in rows if row.get("tid")}
+
+    def get_task_subtree(self, task_id: str):
+        """
+        Get a task and all of its descendants, one query per level.
+        Returns a flat list of TASK rows (root first).
+        """
+        root = self.get_task(task_id)
+        if not root:
+            return []
+        rows = [root]
+        seen = {task_id}
+        frontier = [task_id]
+        while frontier:
+            resp = self.client.table("TASK").select("*").in_("parentTaskId", frontier).execute()
+            children = [t for t in (getattr(resp, "data", None) or []) if t.get("id") not in seen]
+            seen.update(t["id"] for t in children)
+            rows.extend(children)
+            frontier = [t["id"] for t in children]
+        return rows
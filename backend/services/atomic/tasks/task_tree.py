@@ -0,0 +1,187 @@
+"""
+Task hierarchy helpers for the Task Service.
+
+Builds the full parent -> children tree for a set of tasks in one pass and
+rolls progress, time spent and overdue counts up from the leaves.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parse an ISO timestamp (with or without 'Z') into an aware datetime."""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def time_spent_minutes(task: Dict[str, Any]) -> int:
+    """Total minutes logged in a task's time_entries column."""
+    total = 0
+    for entry in task.get("time_entries") or []:
+        try:
+            total += int(entry.get("hours") or 0) * 60 + int(entry.get("minutes") or 0)
+        except (TypeError, ValueError, AttributeError):
+            continue
+    return total
+
+
+def build_task_tree(
+    tasks: List[Dict[str, Any]],
+    schedules: Optional[Dict[str, Dict[str, Any]]] = None,
+    now: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Build the task forest and compute subtree rollups bottom-up.
+
+    Args:
+        tasks: TASK rows (any order, any depth)
+        schedules: latest schedule row keyed by task id (status / deadline source)
+        now: reference time for overdue checks, defaults to current UTC time
+
+    Returns:
+        List of root nodes. Every node is the task row plus ``status``,
+        ``deadline``, ``overdue``, ``subtasks`` and a ``rollup`` dict covering
+        the node and all of its descendants. Nodes with descendants also get
+        ``progress`` (percentage of completed descendants).
+    """
+    schedules = schedules or {}
+    now = now or datetime.now(timezone.utc)
+
+    nodes: Dict[str, Dict[str, Any]] = {}
+    order: List[str] = []
+    for task in tasks:
+        tid = task.get("id")
+        if tid is None or tid in nodes:
+            continue
+        schedule = schedules.get(tid) or {}
+        status = schedule.get("status", task.get("status"))
+        deadline = schedule.get("deadline", task.get("deadline"))
+        deadline_dt = _parse_timestamp(deadline)
+        nodes[tid] = {
+            **task,
+            "status": status,
+            "deadline": deadline,
+            "overdue": bool(deadline_dt and status != "complete" and deadline_dt < now),
+            "subtasks": [],
+        }
+        order.append(tid)
+
+    # Adjacency list built once; tasks whose parent is outside the set are roots
+    children: Dict[str, List[str]] = {tid: [] for tid in order}
+    roots: List[str] = []
+    for tid in order:
+        parent_id = nodes[tid].get("parentTaskId")
+        if parent_id and parent_id in nodes and parent_id != tid:
+            children[parent_id].append(tid)
+        else:
+            roots.append(tid)
+
+    visited = set()
+
+    def _rollup(root_id: str) -> None:
+        # Iterative post-order so deep hierarchies never hit the recursion limit
+        stack = [(root_id, False)]
+        visited.add(root_id)
+        while stack:
+            tid, expanded = stack.pop()
+            node = nodes[tid]
+            if not expanded:
+                stack.append((tid, True))
+                for child_id in children[tid]:
+                    if child_id not in visited:
+                        visited.add(child_id)
+                        node["subtasks"].append(nodes[child_id])
+                        stack.append((child_id, False))
+                continue
+
+            descendants = completed = overdue = 0
+            minutes = time_spent_minutes(node)
+            for child in node["subtasks"]:
+                child_rollup = child["rollup"]
+                descendants += 1 + child_rollup["descendant_count"]
+                completed += (1 if child["status"] == "complete" else 0) + child_rollup["completed_count"]
+                overdue += child_rollup["overdue_count"]
+                minutes += child_rollup["time_spent_minutes"]
+            overdue += 1 if node["overdue"] else 0
+
+            node["rollup"] = {
+                "descendant_count": descendants,
+                "completed_count": completed,
+                "overdue_count": overdue,
+                "time_spent_minutes": minutes,
+            }
+            if descendants:
+                node["progress"] = round((completed / descendants) * 100, 2)
+
+    for tid in roots:
+        _rollup(tid)
+
+    # Whatever is left sits on a parentTaskId cycle; promote it to a root
+    for tid in order:
+        if tid not in visited:
+            roots.append(tid)
+            _rollup(tid)
+
+    return [nodes[tid] for tid in roots]
+
+
+def find_subtree(forest: List[Dict[str, Any]], task_id: str) -> Optional[Dict[str, Any]]:
+    """Return the node for task_id from a forest built by build_task_tree."""
+    stack = list(forest)
+    while stack:
+        node = stack.pop()
+        if node.get("id") == task_id:
+            return node
+        stack.extend(node.get("subtasks", []))
+    return None
+
+
+class TaskTreeCache:
+    """
+    Per-project cache of values built from a project's tasks (the task
+    trees, and the /stats aggregates).
+
+    Entries are dropped explicitly whenever this service writes a task of the
+    project, and expire after ``ttl`` seconds to pick up schedule changes
+    made by other services (and writes handled by other workers).
+    """
+
+    def __init__(self, ttl: float = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("TASK_TREE_CACHE_TTL", "30"))
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, project_id: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(project_id)
+            if not entry:
+                return None
+            expires_at, tree = entry
+            if expires_at < time.monotonic():
+                del self._entries[project_id]
+                return None
+            return tree
+
+    def set(self, project_id: str, tree: List[Dict[str, Any]]) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[project_id] = (time.monotonic() + self.ttl, tree)
+
+    def invalidate(self, project_id: Optional[str] = None) -> None:
+        """Drop one project's tree, or every tree when project_id is None."""
+        with self._lock:
+            if project_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(project_id, None)
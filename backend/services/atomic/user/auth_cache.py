@@ -0,0 +1,168 @@
+"""
+Local verification of Supabase sessions for /checkCookies
+
+- Access tokens are verified in-process instead of asking Supabase: HS256
+  tokens with SUPABASE_JWT_SECRET, asymmetric ones (ES256/RS256) against the
+  project's JWKS, which is fetched once and cached (refetched when a token
+  names a ``kid`` we have not seen, i.e. after a key rotation).
+- Decoded claims are memoized per token until the token expires, so repeated
+  page loads with the same cookies skip signature checks entirely.
+- Concurrent refreshes of the same refresh token share one Supabase call.
+  Supabase refresh tokens are single use, so parallel requests from one
+  browser would otherwise race and all but one would fail.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+import jwt
+from fastapi.concurrency import run_in_threadpool
+from jwt import InvalidTokenError
+
+logger = logging.getLogger(__name__)
+
+ASYMMETRIC_ALGORITHMS = ("ES256", "RS256")
+
+
+class JWKSCache:
+    """Signing keys from the Supabase JWKS endpoint, keyed by kid"""
+
+    def __init__(self, jwks_url: str, ttl: float = 600.0, min_refetch_interval: float = 30.0):
+        self.jwks_url = jwks_url
+        self.ttl = ttl
+        self.min_refetch_interval = min_refetch_interval
+        self._keys: Dict[str, Any] = {}
+        self._fetched_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def get_key(self, kid: Optional[str]):
+        now = time.monotonic()
+        stale = self._fetched_at is None or now - self._fetched_at > self.ttl
+        # Unknown kid: refetch, but not more than once per interval so bad tokens can't hammer Supabase
+        unknown = kid not in self._keys and (self._fetched_at is None or now - self._fetched_at > self.min_refetch_interval)
+        if stale or unknown:
+            with self._lock:
+                if self._fetched_at is None or time.monotonic() - self._fetched_at > self.min_refetch_interval:
+                    self._refresh()
+        return self._keys.get(kid)
+
+    def _refresh(self) -> None:
+        try:
+            response = httpx.get(self.jwks_url, timeout=5.0)
+            response.raise_for_status()
+            keys = {}
+            for jwk in response.json().get("keys", []):
+                try:
+                    keys[jwk.get("kid")] = jwt.PyJWK(jwk).key
+                except Exception as e:
+                    logger.warning("Skipping unusable JWK %s: %s", jwk.get("kid"), e)
+            self._keys = keys
+        except Exception as e:
+            # Keep serving the keys we already have
+            logger.warning("Failed to fetch JWKS from %s: %s", self.jwks_url, e)
+        self._fetched_at = time.monotonic()
+
+
+class TokenVerifier:
+    """
+    Verify JWTs and memoize their claims until they expire.
+
+    Tokens without an ``exp`` claim (the user_data cookie) are memoized for
+    ``default_ttl`` seconds.
+    """
+
+    def __init__(self, secret: Optional[str], jwks: Optional[JWKSCache] = None, audience: Optional[str] = None,
+                 default_ttl: float = 3600.0, max_entries: int = 10000):
+        self.secret = secret
+        self.jwks = jwks
+        self.audience = audience
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cached(self, token: str) -> Optional[Dict[str, Any]]:
+        """Claims of a previously verified, still valid token, or None"""
+        with self._lock:
+            entry = self._cache.get(token)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._cache[token]
+                return None
+            self._cache.move_to_end(token)
+            return entry[1]
+
+    def verify(self, token: str) -> Dict[str, Any]:
+        """Return the token's claims; raises jwt.ExpiredSignatureError / jwt.InvalidTokenError"""
+        claims = self.cached(token)
+        if claims is not None:
+            return claims
+
+        header = jwt.get_unverified_header(token)
+        algorithm = header.get("alg")
+        if algorithm == "HS256":
+            if not self.secret:
+                raise InvalidTokenError("No JWT secret configured for HS256 tokens")
+            key = self.secret
+        elif algorithm in ASYMMETRIC_ALGORITHMS and self.jwks is not None:
+            key = self.jwks.get_key(header.get("kid"))
+            if key is None:
+                raise InvalidTokenError(f"Unknown signing key {header.get('kid')}")
+        else:
+            raise InvalidTokenError(f"Unsupported token algorithm {algorithm}")
+
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=[algorithm],
+            audience=self.audience,
+            options={"verify_aud": self.audience is not None},
+        )
+        expires_at = claims.get("exp", time.time() + self.default_ttl)
+        with self._lock:
+            self._cache[token] = (expires_at, claims)
+            self._cache.move_to_end(token)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return claims
+
+
+class RefreshCoalescer:
+    """
+    Run at most one refresh per refresh token at a time and hand its result to
+    every caller. The result is also kept for ``result_ttl`` seconds for
+    requests that were already in flight with the old cookies.
+    """
+
+    def __init__(self, refresh: Callable[[str], Any], result_ttl: float = 30.0):
+        self._refresh = refresh
+        self.result_ttl = result_ttl
+        self._inflight: Dict[str, "asyncio.Future[Any]"] = {}
+        self._recent: Dict[str, Tuple[float, Any]] = {}
+
+    async def refresh(self, refresh_token: str) -> Any:
+        recent = self._recent.get(refresh_token)
+        if recent is not None and recent[0] > time.monotonic():
+            return recent[1]
+
+        future = self._inflight.get(refresh_token)
+        if future is None:
+            # The Supabase client is blocking; keep it off the event loop
+            future = asyncio.ensure_future(run_in_threadpool(self._refresh, refresh_token))
+            self._inflight[refresh_token] = future
+            future.add_done_callback(lambda done: self._finished(refresh_token, done))
+        # One caller disconnecting must not cancel the refresh for the others
+        return await asyncio.shield(future)
+
+    def _finished(self, refresh_token: str, future: "asyncio.Future[Any]") -> None:
+        self._inflight.pop(refresh_token, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        now = time.monotonic()
+        self._recent = {token: entry for token, entry in self._recent.items() if entry[0] > now}
+        self._recent[refresh_token] = (now + self.result_ttl, future.result())
@@ -1,20 +1,39 @@
-from typing import List
+from typing import List, Optional
+from functools import partial
 from uuid import UUID
-from fastapi import FastAPI, Path, Request, HTTPException, Header, BackgroundTasks
+from fastapi import FastAPI, Path, Query, Request, HTTPException, Header, BackgroundTasks
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from supabaseClient import SupabaseClient
+from auth_cache import JWKSCache, RefreshCoalescer, TokenVerifier
+from tracing import init_tracing, instrument_app
+from metrics import init_metrics
+from logging_config import setup_logging
+from auth_middleware import install_auth, internal_key_matches
+from audit_trail import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, logs_export, logs_page
 from dotenv import load_dotenv
 import os
+import logging
 import uvicorn
 import jwt
 from jwt import PyJWTError, ExpiredSignatureError, InvalidTokenError
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 load_dotenv()
 
 app = FastAPI(title="User Service")
+
+# Trace requests and outgoing calls (spans are exported when TRACE_EXPORT_DIR is set),
+# and expose latency histograms derived from those spans on GET /metrics
+init_tracing("user")
+instrument_app(app)
+init_metrics(app)
+setup_logging("user", app)
+install_auth(app)
+logger = logging.getLogger(__name__)
+
 supabase = SupabaseClient()
 
 # -----------------------
@@ -38,6 +57,25 @@ app.add_middleware( # pragma: no cover
 JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET") # pragma: no cover
 JWT_ALGORITHM = "HS256"
 
+# Supabase access tokens are verified locally (HS256 with the project secret, or
+# ES256/RS256 against the cached JWKS); claims are memoized until the token expires
+access_token_verifier = TokenVerifier(
+    JWT_SECRET,
+    jwks=JWKSCache(f"{os.getenv('SUPABASE_URL', '').rstrip('/')}/auth/v1/.well-known/jwks.json"),
+    audience="authenticated",
+)
+user_data_verifier = TokenVerifier(JWT_SECRET, default_ttl=3600)
+# Lifetime of the user_data cookie and of the token inside it
+USER_DATA_TTL_SECONDS = 3600
+
+
+def sign_user_data(identity: dict) -> str:
+    """user_data JWT for the identity, valid as long as its cookie (the middlewares require exp)"""
+    now = datetime.now(timezone.utc)
+    claims = {**identity, "iat": now, "exp": now + timedelta(seconds=USER_DATA_TTL_SECONDS)}
+    return jwt.encode(claims, JWT_SECRET, algorithm=JWT_ALGORITHM)
+session_refresher = RefreshCoalescer(lambda refresh_token: supabase.refresh_session(refresh_token))
+
 # -----------------------
 # Models
 # -----------------------
@@ -68,7 +106,7 @@ async def login(req: LoginRequest):
     """
     try:
         # Authenticate with Supabase
-        resp = supabase.sign_in_with_password(req.email, req.password)
+        resp = await run_in_threadpool(supabase.sign_in_with_password, req.email, req.password)
         if not resp.session:
             return JSONResponse(status_code=401, content={"detail": "Invalid email or password"})
         
@@ -77,7 +115,7 @@ async def login(req: LoginRequest):
         
         # Fetch user data from USER database
         auth_id = resp.user.id ##id here is auth id
-        user_data = supabase.get_user_by_auth_id(auth_id)
+        user_data = await run_in_threadpool(supabase.get_user_by_auth_id, auth_id)
         
         if not user_data.data:
             return JSONResponse(status_code=404, content={"detail": "User not found"})
@@ -93,7 +131,7 @@ async def login(req: LoginRequest):
             "department": user["department"],
         }
         
-        user_data_jwt = jwt.encode(custom_payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+        user_data_jwt = sign_user_data(custom_payload)
         
         response = JSONResponse(
             status_code=200,
@@ -131,7 +169,7 @@ async def login(req: LoginRequest):
             httponly=True,
             secure=False,
             samesite="lax",
-            max_age=3600  # Same as access_token
+            max_age=USER_DATA_TTL_SECONDS  # Same as access_token
         )
         
         return response
@@ -168,7 +206,7 @@ async def logout(request: Request, background_tasks: BackgroundTasks):
                     supabase.set_session(access_token, refresh_token)
                     supabase.sign_out(scope='local')
                 except Exception as supabase_error:
-                    print(f"Supabase sign out error: {supabase_error}")
+                    logger.warning("Supabase sign out error: %s", supabase_error)
             
             background_tasks.add_task(supabase_signout)
         
@@ -226,14 +264,18 @@ async def logout(request: Request, background_tasks: BackgroundTasks):
 # user details can be passed to the middleware and be called by front end using useState.
 
 @app.get("/checkCookies")  
-def check_cookies(request: Request):
+async def check_cookies(request: Request):
     """
     Check cookies for authentication:
     - If access_token valid → return decoded user_data.
-    - If access_token expired but refresh_token valid → refresh session,
+    - If access_token (or user_data) expired but refresh_token valid → refresh session,
       update all cookies including user_data, return updated user_data.
     - If neither valid or no cookies → force login and clear cookies.
 
+    Tokens are verified locally and memoized until expiry, so a valid session
+    costs no Supabase round-trip. Concurrent refreshes of the same refresh
+    token share one Supabase call.
+
     No request body or parameters are required. Cookies are automatically sent by the browser.
     """
     access_token = request.cookies.get("access_token")
@@ -244,14 +286,16 @@ def check_cookies(request: Request):
     if not access_token or not refresh_token or not user_data_cookie:
         raise HTTPException(status_code=401, detail="No valid cookies found, login required")
 
-    # Just decode user_data cookie - it contains all the info we need
     try:
-        payload = jwt.decode(user_data_cookie, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        if access_token_verifier.cached(access_token) is None:
+            # Cache miss may need a JWKS fetch; keep it off the event loop
+            await run_in_threadpool(access_token_verifier.verify, access_token)
+        payload = user_data_verifier.verify(user_data_cookie)
         return JSONResponse(status_code=200, content={"user": payload})
     except ExpiredSignatureError:
-        # If user_data expired, try to refresh using refresh_token
+        # If the session expired, try to refresh using refresh_token
         try:
-            new_session = supabase.refresh_session(refresh_token)
+            new_session = await session_refresher.refresh(refresh_token)
 
             if not new_session or not new_session.session:
                 raise HTTPException(status_code=401, detail="Invalid refresh token")
@@ -273,7 +317,7 @@ def check_cookies(request: Request):
             }
 
             # Encode new user_data JWT
-            user_data_data = jwt.encode(custom_payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+            user_data_data = sign_user_data(custom_payload)
 
             # Send updated cookies
             response = JSONResponse(status_code=200, content={"user": custom_payload})
@@ -300,7 +344,7 @@ def check_cookies(request: Request):
                 httponly=True,
                 secure=False,
                 samesite="lax",
-                max_age=3600
+                max_age=USER_DATA_TTL_SECONDS
             )
 
             return response
@@ -313,6 +357,14 @@ def check_cookies(request: Request):
             response.delete_cookie("user_data")
             return response
 
+    except InvalidTokenError as e:
+        # Tampered or foreign token: same as being logged out
+        response = JSONResponse(status_code=401, content={"detail": f"Invalid session: {str(e)}"})
+        response.delete_cookie("access_token")
+        response.delete_cookie("refresh_token")
+        response.delete_cookie("user_data")
+        return response
+
     except HTTPException:
         raise
 
@@ -400,7 +452,7 @@ def verify_internal_api_key(x_internal_api_key: str = Header(None, convert_under
         # Fail fast so you don’t silently compare against None
         raise HTTPException(status_code=500, detail="INTERNAL_API_KEY is not set on the server")
 
-    if not x_internal_api_key or x_internal_api_key != INTERNAL_API_KEY:
+    if not internal_key_matches(x_internal_api_key, INTERNAL_API_KEY):
         raise HTTPException(status_code=401, detail="Invalid or missing internal API key")
 
     return True
@@ -451,10 +503,38 @@ def validate_user_internal(user_id: str):
 def read_root():
     return JSONResponse(status_code=200, content={"message": "User Service is running"})
 
-@app.get("/logs", summary="Get all logs")  # pragma: no cover
-async def get_all_logs():
-    logs = supabase.get_all_logs()
-    return {"message": f"{len(logs)} log(s) retrieved", "logs": logs}
+@app.get("/logs", summary="Query the user audit trail")
+async def get_all_logs(
+    record_id: Optional[str] = Query(None, description="Only changes to this record"),
+    actor: Optional[str] = Query(None, description="Only changes made by this user ID"),
+    since: Optional[datetime] = Query(None, description="Changes at or after this time (ISO 8601)"),
+    until: Optional[datetime] = Query(None, description="Changes before this time (ISO 8601)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+):
+    """Newest first; follow next_cursor until it is null to walk the whole trail"""
+    fetch = _audit_fetch(record_id, actor, since, until)
+    page = logs_page(fetch, cursor, limit)
+    return {"message": f"{len(page['logs'])} log(s) retrieved", **page}
+
+@app.get("/logs/export", summary="Stream the user audit trail as NDJSON")
+async def export_logs(
+    record_id: Optional[str] = Query(None, description="Only changes to this record"),
+    actor: Optional[str] = Query(None, description="Only changes made by this user ID"),
+    since: Optional[datetime] = Query(None, description="Changes at or after this time (ISO 8601)"),
+    until: Optional[datetime] = Query(None, description="Changes before this time (ISO 8601)"),
+):
+    return logs_export(_audit_fetch(record_id, actor, since, until), filename="user_audit_trail.ndjson")
+
+def _audit_fetch(record_id, actor, since, until):
+    """get_logs_page with the request's filters bound; audit_trail supplies after/limit"""
+    return partial(
+        supabase.get_logs_page,
+        record_id=record_id,
+        actor=actor,
+        since=since.isoformat() if since else None,
+        until=until.isoformat() if until else None,
+    )
 
 @app.get("/logs/{uid}", summary="Get a log by its ID")
 async def get_log(
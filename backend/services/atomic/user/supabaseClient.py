@@ -77,4 +77,26 @@ class SupabaseClient:
         if filter_by:
             query = query.eq("record_id", filter_by)
         resp = query.execute()
-        return getattr(resp, "data", None) or []
\ No newline at end of file
+        return getattr(resp, "data", None) or []
+
+    def get_logs_page(self, record_id: str = None, actor: str = None, since: str = None, until: str = None,
+                      after: tuple = None, limit: int = 100):
+        """
+        One page of audit logs, newest first, ordered by (timestamp, id).
+        since is inclusive and until exclusive (ISO timestamps); actor matches changed_by.
+        after: (timestamp, id) of the last row already returned (keyset pagination)
+        """
+        query = self.client.table("AUDIT_TRAIL").select("*").eq("table_name", "USER")
+        if record_id:
+            query = query.eq("record_id", record_id)
+        if actor:
+            query = query.eq("changed_by", actor)
+        if since:
+            query = query.gte("timestamp", since)
+        if until:
+            query = query.lt("timestamp", until)
+        if after:
+            timestamp, last_id = after
+            query = query.or_(f'timestamp.lt."{timestamp}",and(timestamp.eq."{timestamp}",id.lt."{last_id}")')
+        resp = query.order("timestamp", desc=True).order("id", desc=True).limit(limit).execute()
+        return getattr(resp, "data", None) or []
@@ -0,0 +1,122 @@
+"""
+Shared request authentication for SPM FastAPI services
+
+- Caller identity: the signed ``user_data`` cookie set by the user service's
+  /login is verified (HS256, SUPABASE_JWT_SECRET) and exposed as
+  ``request.state.user`` ({id, email, role, name, department}), or None when
+  the cookie is missing or invalid. Handlers use it instead of asking the user
+  service for the caller's own profile.
+- Internal calls: an ``X-Internal-API-Key`` header that does not match
+  INTERNAL_API_KEY is rejected with 401 before any handler runs; paths listed
+  in ``internal_paths`` additionally require the header. Keys are compared in
+  constant time. With INTERNAL_API_KEY unset (local development) nothing is
+  enforced.
+"""
+import hashlib
+import hmac
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import jwt
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+INTERNAL_KEY_HEADER = "X-Internal-API-Key"
+USER_DATA_COOKIE = "user_data"
+_IDENTITY_FIELDS = ("id", "email", "role", "name", "department")
+
+# user_data cookies are re-sent on every request; verify each one once and keep
+# the answer until the token's exp. Only valid tokens are kept, so junk cookies
+# cannot push real identities out.
+_verified: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_MAX_VERIFIED = 4096
+
+
+def internal_key_matches(candidate: Optional[str], expected: Optional[str] = None) -> bool:
+    """Constant-time comparison; digests are compared so the key length does not leak either"""
+    expected = expected if expected is not None else os.getenv("INTERNAL_API_KEY")
+    if not candidate or not expected:
+        return False
+    return hmac.compare_digest(
+        hashlib.sha256(candidate.encode("utf-8")).digest(),
+        hashlib.sha256(expected.encode("utf-8")).digest(),
+    )
+
+
+def decode_user_data(token: Optional[str], secret: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Identity from a user_data cookie, or None when it is missing, forged, expired or has no exp"""
+    if not token:
+        return None
+    now = time.time()
+    entry = _verified.get(token)
+    if entry is not None:
+        if entry[0] > now:
+            _verified.move_to_end(token)
+            return entry[1]
+        del _verified[token]
+    secret = secret or os.getenv("SUPABASE_JWT_SECRET")
+    if not secret:
+        return None
+    try:
+        # Tokens without exp (signed before login added it) would be valid forever
+        claims = jwt.decode(token, secret, algorithms=["HS256"], options={"require": ["exp"]})
+    except jwt.ExpiredSignatureError:
+        return None
+    except jwt.InvalidTokenError as e:
+        logger.debug("Ignoring invalid user_data cookie: %s", e)
+        return None
+    identity = {field: claims.get(field) for field in _IDENTITY_FIELDS}
+    if isinstance(identity["role"], str):
+        identity["role"] = identity["role"].lower()
+    _verified[token] = (float(claims["exp"]), identity)
+    while len(_verified) > _MAX_VERIFIED:
+        _verified.popitem(last=False)
+    return identity
+
+
+def current_user(request) -> Optional[Dict[str, Any]]:
+    """The authenticated caller for this request (set by install_auth), or None"""
+    return getattr(getattr(request, "state", None), "user", None)
+
+
+def caller_profile(request, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """The caller's identity when the request is about their own user_id, else None"""
+    user = current_user(request)
+    if user and user_id and user.get("id") == user_id:
+        return user
+    return None
+
+
+class _Authenticate:
+    """Plain ASGI middleware, so authentication adds no task group or body streams per request"""
+
+    def __init__(self, app, internal_paths: Sequence[str] = ()):
+        self.app = app
+        self.internal_paths = internal_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request = Request(scope)
+        expected = os.getenv("INTERNAL_API_KEY")
+        if expected:
+            provided = request.headers.get(INTERNAL_KEY_HEADER)
+            required = any(request.url.path.startswith(prefix) for prefix in self.internal_paths)
+            if (provided is not None or required) and not internal_key_matches(provided, expected):
+                response = JSONResponse(status_code=401, content={"detail": "Invalid or missing internal API key"})
+                await response(scope, receive, send)
+                return
+
+        request.state.user = decode_user_data(request.cookies.get(USER_DATA_COOKIE))
+        await self.app(scope, receive, send)
+
+
+def install_auth(app, internal_paths: Sequence[str] = ()) -> None:
+    """Reject bad internal keys and attach the caller's identity to request.state.user"""
+    app.add_middleware(_Authenticate, internal_paths=internal_paths)
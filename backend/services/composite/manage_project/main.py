@@ -1,14 +1,35 @@
-from fastapi import FastAPI, HTTPException, Path
+from fastapi import FastAPI, HTTPException, Path, Request
+from typing import Any, Dict, Optional
 import httpx
 import asyncio
+import logging
 import os
 from dotenv import load_dotenv
 
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from tracing import init_tracing, instrument_app
+from metrics import init_metrics
+from logging_config import setup_logging
+from auth_middleware import caller_profile, install_auth
+from task_projection import parse_projection, project_task
 
 load_dotenv()
 
-app = FastAPI(title="Composite Microservice: manage-project Service")
+app = FastAPI(title="Composite Microservice: manage-project Service", default_response_class=ORJSONResponse)
+
+# Compress large list payloads (clients send Accept-Encoding: gzip)
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=6)
+
+# Trace requests and outgoing calls (spans are exported when TRACE_EXPORT_DIR is set),
+# and expose latency histograms derived from those spans on GET /metrics
+init_tracing("manage-project")
+instrument_app(app)
+init_metrics(app)
+setup_logging("manage-project", app)
+install_auth(app)
+logger = logging.getLogger(__name__)
 
 DEFAULT_ORIGINS = [
     "http://localhost:3000",
@@ -62,217 +83,126 @@ async def get_favicon():
     from fastapi.responses import Response
     return Response(status_code=204)
 
+# ==================== Helper Function: Extract User Name ====================
+def extract_user_name(payload: dict) -> str:
+    return (
+        payload.get("name")
+        or payload.get("data", {}).get("name")
+        or payload.get("user", {}).get("name")
+        or (payload.get("email") or "").split("@")[0]
+        or "Unknown User"
+    )
+
+
+async def resolve_visible_projects(client: httpx.AsyncClient, uid: str, internal_headers: Optional[dict],
+                                   profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Resolve the user's name, role and department, then the projects visible to them:
+    - HR/Admin: ALL projects
+    - Staff: owned projects + projects where the user is a member
+    - Manager: staff visibility + projects whose owner is in the same department
+    Returns user_name, user_role, user_dept and projects_by_id (each project with an empty tasks list).
+
+    ``profile`` is the caller's identity from their user_data cookie; when the
+    caller asks about themselves the Users MS lookup is skipped.
+    """
+    # ==================== STEP 1: Fetch User Info (Name, Role, Department) ====================
+    logger.debug("Starting project fetch for uid: %s", uid)
+    user_name = "Unknown User"
+    user_role = "staff"  # default role
+    user_dept = None
+
+    try:
+        if profile and profile.get("role") and profile.get("department"):
+            user_name = extract_user_name(profile)
+            user_role = (profile.get("role") or "staff").lower()
+            user_dept = profile.get("department")
+        else:
+            logger.debug("Fetching user info from: %s/internal/%s", USERS_SERVICE_URL, uid)
+            r_user = await client.get(f"{USERS_SERVICE_URL}/internal/{uid}", headers=internal_headers)
+            if r_user.status_code == 200:
+                user_data = r_user.json()
+
+                user_name = extract_user_name(user_data)
+
+                # Extract role (check multiple possible locations)
+                user_role = (
+                    user_data.get("role")
+                    or user_data.get("data", {}).get("role")
+                    or user_data.get("user", {}).get("role")
+                    or "staff"
+                ).lower()
+
+                # Extract department
+                user_dept = (
+                    user_data.get("dept")
+                    or user_data.get("department")
+                    or user_data.get("data", {}).get("dept")
+                    or user_data.get("data", {}).get("department")
+                    or user_data.get("user", {}).get("dept")
+                    or user_data.get("user", {}).get("department")
+                )
+
+                logger.debug("Extracted - Name: %s, Role: %s, Dept: %s", user_name, user_role, user_dept)
+            else:
+                logger.debug("User fetch returned status: %s", r_user.status_code)
+    except Exception as e:
+        logger.error("User fetch failed for %s: %s", uid, e)
+
+    # ==================== STEP 2: Role-Based Project Retrieval ====================
+    # One Project MS call: owned + member (+ same-department for managers, all for HR/Admin).
+    # The Project MS resolves uid's role and department itself, so none are sent; a failed
+    # call propagates (httpx errors are mapped to a status by the caller)
+    logger.debug("Fetching projects visible to %s", uid)
+    visible_resp = await client.get(f"{PROJECTS_SERVICE_URL}/uid/{uid}/visible", headers=internal_headers)
+    visible_resp.raise_for_status()
+    visible_json = visible_resp.json()
+    visible_projects = visible_json.get("project", []) or visible_json.get("projects", []) or []
+    projects_by_id = {p.get("id"): {**p, "tasks": []} for p in visible_projects if p.get("id")}
+    logger.debug("Retrieved %s visible projects", len(projects_by_id))
+
+    return {
+        "user_name": user_name,
+        "user_role": user_role,
+        "user_dept": user_dept,
+        "projects_by_id": projects_by_id,
+    }
+
+
 # ==================== Get All Projects by User (Role-Based) ====================
 @app.get(
     "/uid/{uid}",
     summary="Get all projects by user via composite service (role-based access)",
     response_description="List of all projects with Tasks based on user role"
 )
-async def get_project_with_tasks(uid: str):
+async def get_project_with_tasks(uid: str, fields: Optional[str] = None, include: Optional[str] = None,
+                                 request: Request = None):
     """
     Role-based project retrieval:
-    1) Fetch user info including role from Users MS
+    1) Fetch user info including role from Users MS (taken from the caller's user_data cookie when uid is the caller)
     2) HR/Admin: Get ALL projects from Project MS
     3) Staff: Get owned projects + projects where user is a member
     4) Manager: Get owned projects + projects where user is a member + department projects
     5) For each final project, get raw task IDs via Task MS, then enrich each task via Manage-Task
     6) Return structured response with user info and enriched tasks
-    """
-    
-    # ==================== Helper Function: Extract User Name ====================
-    def extract_user_name(payload: dict) -> str:
-        return (
-            payload.get("name")
-            or payload.get("data", {}).get("name")
-            or payload.get("user", {}).get("name")
-            or (payload.get("email") or "").split("@")[0]
-            or "Unknown User"
-        )
 
+    Optional query params (list views):
+    - fields: comma-separated task keys to return, e.g. "name,status,deadline"
+    - include: heavy sub-collections to keep, e.g. "time_entries" (messages/time_entries are dropped otherwise)
+    """
     internal_headers = {"X-Internal-API-Key": INTERNAL_API_KEY} if INTERNAL_API_KEY else None
 
     async with httpx.AsyncClient(timeout=10.0) as client:
         try:
-            # ==================== STEP 1: Fetch User Info (Name, Role, Department) ====================
-            print(f"\n[DEBUG] Starting project fetch for uid: {uid}")
-            user_name = "Unknown User"
-            user_role = "staff"  # default role
-            user_dept = None
-            
-            try:
-                print(f"[DEBUG] Fetching user info from: {USERS_SERVICE_URL}/internal/{uid}")
-                r_user = await client.get(f"{USERS_SERVICE_URL}/internal/{uid}", headers=internal_headers)
-                if r_user.status_code == 200:
-                    user_data = r_user.json()
-                    print(f"[DEBUG] User data retrieved: {user_data}")
-                    
-                    user_name = extract_user_name(user_data)
-                    
-                    # Extract role (check multiple possible locations)
-                    user_role = (
-                        user_data.get("role")
-                        or user_data.get("data", {}).get("role")
-                        or user_data.get("user", {}).get("role")
-                        or "staff"
-                    ).lower()
-                    
-                    # Extract department
-                    user_dept = (
-                        user_data.get("dept")
-                        or user_data.get("department")
-                        or user_data.get("data", {}).get("dept")
-                        or user_data.get("data", {}).get("department")
-                        or user_data.get("user", {}).get("dept")
-                        or user_data.get("user", {}).get("department")
-                    )
-                    
-                    print(f"[DEBUG] Extracted - Name: {user_name}, Role: {user_role}, Dept: {user_dept}")
-                else:
-                    print(f"[DEBUG] User fetch returned status: {r_user.status_code}")
-            except Exception as e:
-                print(f"[ERROR] User fetch failed for {uid}: {e}")
-
-            projects_by_id = {}
-            project_ids = set()
-
-            # ==================== STEP 2: Role-Based Project Retrieval ====================
-            
-            # --- HR or Admin: Get ALL projects ---
-            if user_role in ["hr", "admin"]:
-                print(f"[DEBUG] User role is {user_role} - fetching ALL projects")
-                try:
-                    all_projects_resp = await client.get(f"{PROJECTS_SERVICE_URL}/all", headers=internal_headers)
-                    all_projects_resp.raise_for_status()
-                    all_projects_json = all_projects_resp.json()
-                    print(f"[DEBUG] All projects response: {all_projects_json}")
-                    
-                    all_projects = all_projects_json.get("project", []) or all_projects_json.get("projects", []) or []
-                    print(f"[DEBUG] Retrieved {len(all_projects)} total projects")
-                    
-                    projects_by_id = {p.get("id"): {**p, "tasks": []} for p in all_projects if p.get("id")}
-                    project_ids = set(projects_by_id.keys())
-                    print(f"[DEBUG] Processed {len(project_ids)} unique projects")
-                    
-                except Exception as e:
-                    print(f"[ERROR] Failed to fetch all projects: {e}")
-                    raise HTTPException(status_code=500, detail=f"Failed to fetch all projects: {str(e)}")
-            
-            # --- Staff or Manager: Get owned + member projects ---
-            else:
-                print(f"[DEBUG] User role is {user_role} - fetching owned and member projects")
-                
-                # Get owned projects
-                try:
-                    print(f"[DEBUG] Fetching owned projects from: {PROJECTS_SERVICE_URL}/uid/{uid}")
-                    owned_resp = await client.get(f"{PROJECTS_SERVICE_URL}/uid/{uid}", headers=internal_headers)
-                    owned_resp.raise_for_status()
-                    owned_json = owned_resp.json()
-                    owned_projects = owned_json.get("project", []) or []
-                    print(f"[DEBUG] Retrieved {len(owned_projects)} owned projects")
-
-                    projects_by_id = {p.get("id"): {**p, "tasks": []} for p in owned_projects if p.get("id")}
-                    project_ids = set(projects_by_id.keys())
-                except Exception as e:
-                    print(f"[ERROR] Failed to fetch owned projects: {e}")
-                    owned_projects = []
-                    projects_by_id = {}
-                    project_ids = set()
-
-                # Get ALL projects to check members[] array
-                print(f"[DEBUG] Fetching all projects to check members[] array")
-                all_projects_for_member_check = []
-                try:
-                    all_resp = await client.get(f"{PROJECTS_SERVICE_URL}/all", headers=internal_headers)
-                    if all_resp.status_code == 200:
-                        all_json = all_resp.json()
-                        all_projects_for_member_check = all_json.get("project", []) or all_json.get("projects", []) or []
-                        print(f"[DEBUG] Retrieved {len(all_projects_for_member_check)} total projects for member check")
-                except Exception as e:
-                    print(f"[ERROR] Failed to fetch all projects for member check: {e}")
-
-                # Filter projects where uid is in members[] array
-                for proj in all_projects_for_member_check:
-                    pid = proj.get("id")
-                    members = proj.get("members", []) or []
-                    
-                    # Check if uid is in members array
-                    if pid and pid not in project_ids and uid in members:
-                        print(f"[DEBUG] Found user {uid} in members[] of project {pid}")
-                        projects_by_id[pid] = {**proj, "tasks": []}
-                        project_ids.add(pid)
-
-                print(f"[DEBUG] After checking members[]: {len(project_ids)} total projects")
-
-                # --- Manager: Also get projects where owner is in the same department ---
-                if user_role == "manager" and user_dept:
-                    print(f"[DEBUG] User is manager in dept: {user_dept} - checking for projects with owners in same dept")
-                    
-                    # OPTIMIZATION: Collect all unique owner UIDs first, then batch fetch departments
-                    owner_uids_to_check = set()
-                    projects_by_owner = {}  # owner_uid -> list of projects
-                    
-                    for proj in all_projects_for_member_check:
-                        pid = proj.get("id")
-                        owner_uid = proj.get("uid") or proj.get("user_id")
-                        
-                        if pid and pid not in project_ids and owner_uid:
-                            owner_uids_to_check.add(owner_uid)
-                            if owner_uid not in projects_by_owner:
-                                projects_by_owner[owner_uid] = []
-                            projects_by_owner[owner_uid].append(proj)
-                    
-                    # Batch fetch all owner departments concurrently
-                    if owner_uids_to_check:
-                        print(f"[DEBUG] Batch fetching departments for {len(owner_uids_to_check)} unique owners")
-                        owner_dept_requests = [
-                            client.get(f"{USERS_SERVICE_URL}/internal/{owner_uid}", headers=internal_headers)
-                            for owner_uid in owner_uids_to_check
-                        ]
-                        owner_dept_responses = await asyncio.gather(*owner_dept_requests, return_exceptions=True)
-                        
-                        # Create mapping: owner_uid -> department
-                        owner_dept_map = {}
-                        for owner_uid, resp in zip(owner_uids_to_check, owner_dept_responses):
-                            if isinstance(resp, Exception):
-                                print(f"[ERROR] Failed to fetch dept for owner {owner_uid}: {resp}")
-                                continue
-                            
-                            if resp.status_code == 200:
-                                try:
-                                    owner_data = resp.json()
-                                    owner_dept = (
-                                        owner_data.get("dept")
-                                        or owner_data.get("department")
-                                        or owner_data.get("data", {}).get("dept")
-                                        or owner_data.get("data", {}).get("department")
-                                        or owner_data.get("user", {}).get("dept")
-                                        or owner_data.get("user", {}).get("department")
-                                    )
-                                    if owner_dept:
-                                        owner_dept_map[owner_uid] = owner_dept
-                                except Exception as e:
-                                    print(f"[ERROR] Failed to parse dept for owner {owner_uid}: {e}")
-                        
-                        # Now check which projects have owners in the same department
-                        dept_match_count = 0
-                        for owner_uid, owner_dept in owner_dept_map.items():
-                            if owner_dept == user_dept:
-                                # Add all projects owned by this user
-                                for proj in projects_by_owner.get(owner_uid, []):
-                                    pid = proj.get("id")
-                                    if pid and pid not in project_ids:
-                                        print(f"[DEBUG] Found project {pid} with owner in same dept: {user_dept}")
-                                        projects_by_id[pid] = {**proj, "tasks": []}
-                                        project_ids.add(pid)
-                                        dept_match_count += 1
-                        
-                        print(f"[DEBUG] Added {dept_match_count} projects from same department")
-                    
-                    print(f"[DEBUG] After checking department projects: {len(project_ids)} total projects")
+            # ==================== STEP 1-2: Resolve User and Visible Projects ====================
+            visible = await resolve_visible_projects(client, uid, internal_headers, caller_profile(request, uid))
+            user_name, user_role, user_dept = visible["user_name"], visible["user_role"], visible["user_dept"]
+            projects_by_id = visible["projects_by_id"]
+            project_ids = set(projects_by_id.keys())
 
             # ==================== STEP 3: Check if No Projects Found ====================
             if not projects_by_id:
-                print(f"[DEBUG] No projects found for user {uid} with role {user_role}")
+                logger.debug("No projects found for user %s with role %s", uid, user_role)
                 return {
                     "message": "No projects found for this user",
                     "user_id": uid,
@@ -283,7 +213,7 @@ async def get_project_with_tasks(uid: str):
                 }
 
             # ==================== STEP 4: Fetch Raw Tasks for All Projects ====================
-            print(f"[DEBUG] Fetching tasks for {len(project_ids)} projects")
+            logger.debug("Fetching tasks for %s projects", len(project_ids))
             all_pids = list(project_ids)
             task_requests = [client.get(f"{TASK_SERVICE_URL}/pid/{pid}", headers=internal_headers) for pid in all_pids]
             task_responses = await asyncio.gather(*task_requests, return_exceptions=True)
@@ -292,17 +222,17 @@ async def get_project_with_tasks(uid: str):
             for i, resp in enumerate(task_responses):
                 pid = all_pids[i]
                 if isinstance(resp, Exception):
-                    print(f"[ERROR] Error fetching tasks for project {pid}: {resp}")
+                    logger.error("Error fetching tasks for project %s: %s", pid, resp)
                     continue
                 if resp.status_code == 200:
                     td = resp.json()
                     tasks = td.get("tasks", []) if isinstance(td, dict) else td
                     if isinstance(tasks, list):
                         project_tasks_map[pid] = [t for t in tasks if isinstance(t, dict) and t.get("id")]
-                        print(f"[DEBUG] Project {pid}: found {len(project_tasks_map[pid])} tasks")
+                        logger.debug("Project %s: found %s tasks", pid, len(project_tasks_map[pid]))
 
             # ==================== STEP 5: Enrich Tasks via Manage-Task Service ====================
-            print(f"[DEBUG] Starting task enrichment via Manage-Task service")
+            logger.debug("Starting task enrichment via Manage-Task service")
             
             # Helper function to process tasks in batches to avoid overwhelming the service
             async def enrich_tasks_batch(tids: list, raw_tasks: list, batch_size: int = 20):
@@ -310,7 +240,7 @@ async def get_project_with_tasks(uid: str):
                 enriched = []
                 for i in range(0, len(tids), batch_size):
                     batch = tids[i:i + batch_size]
-                    print(f"[DEBUG] Processing batch {i//batch_size + 1} ({len(batch)} tasks)")
+                    logger.debug("Processing batch %s (%s tasks)", i//batch_size + 1, len(batch))
                     
                     reqs = [client.get(f"{MANAGE_TASK_URL}/tasks/{tid}", headers=internal_headers) for tid in batch]
                     results = await asyncio.gather(*reqs, return_exceptions=True)
@@ -319,7 +249,7 @@ async def get_project_with_tasks(uid: str):
                         fallback = next((t for t in raw_tasks if t.get("id") == tid), {})
                         
                         if isinstance(res, Exception):
-                            print(f"[ERROR] Manage-Task call failed for task {tid}: {res}")
+                            logger.error("Manage-Task call failed for task %s: %s", tid, res)
                             enriched.append(fallback)
                             continue
                             
@@ -332,15 +262,14 @@ async def get_project_with_tasks(uid: str):
                                 if isinstance(task_obj, dict) and task_obj:
                                     task_obj = {**fallback, **task_obj}
                                     enriched.append(task_obj)
-                                    print(f"[DEBUG] Successfully enriched task {tid}")
                                 else:
-                                    print(f"[WARN] Unexpected task shape for {tid}, using fallback")
+                                    logger.warning("Unexpected task shape for %s, using fallback", tid)
                                     enriched.append(fallback)
                             except Exception as e:
-                                print(f"[ERROR] Failed parsing Manage-Task response for {tid}: {e}")
+                                logger.error("Failed parsing Manage-Task response for %s: %s", tid, e)
                                 enriched.append(fallback)
                         else:
-                            print(f"[WARN] Manage-Task returned {res.status_code} for {tid}")
+                            logger.warning("Manage-Task returned %s for %s", res.status_code, tid)
                             enriched.append(fallback)
                     
                     # Small delay between batches to prevent overwhelming the service
@@ -349,6 +278,7 @@ async def get_project_with_tasks(uid: str):
                 
                 return enriched
             
+            field_set, include_set = parse_projection(fields), parse_projection(include)
             for pid in all_pids:
                 raw_tasks = project_tasks_map.get(pid, [])
                 if not raw_tasks:
@@ -356,13 +286,13 @@ async def get_project_with_tasks(uid: str):
                     continue
 
                 tids = [t["id"] for t in raw_tasks if t.get("id")]
-                print(f"[DEBUG] Enriching {len(tids)} tasks for project {pid}")
+                logger.debug("Enriching %s tasks for project %s", len(tids), pid)
                 
                 enriched = await enrich_tasks_batch(tids, raw_tasks, batch_size=20)
-                projects_by_id[pid]["tasks"] = enriched
+                projects_by_id[pid]["tasks"] = [project_task(t, field_set, include_set) for t in enriched]
 
             # ==================== STEP 6: Return Final Response ====================
-            print(f"[DEBUG] Successfully completed. Returning {len(projects_by_id)} projects for user {uid}")
+            logger.debug("Successfully completed. Returning %s projects for user %s", len(projects_by_id), uid)
             return {
                 "message": "Projects retrieved successfully",
                 "user_id": uid,
@@ -373,19 +303,21 @@ async def get_project_with_tasks(uid: str):
             }
 
         except httpx.HTTPStatusError as e:
-            print(f"[ERROR] HTTP Status Error: {e.response.status_code} - {e.response.text}")
+            logger.error("HTTP Status Error: %s - %s", e.response.status_code, e.response.text)
             raise HTTPException(
                 status_code=e.response.status_code,
                 detail=f"Project service error: {e.response.text}"
             )
         except httpx.RequestError as e:
-            print(f"[ERROR] Request Error: {str(e)}")
+            logger.error("Request Error: %s", e)
             raise HTTPException(
                 status_code=503,
                 detail=f"Project service unavailable: {str(e)}"
             )
+        except HTTPException:
+            raise
         except Exception as e:
-            print(f"[ERROR] Unexpected error: {type(e).__name__}: {e}")
+            logger.error("Unexpected error: %s: %s", type(e).__name__, e)
             import traceback
             traceback.print_exc()
             raise HTTPException(
@@ -401,7 +333,9 @@ async def get_project_with_tasks(uid: str):
     response_description="Project row with tasks (enriched via Manage-Task) and owner name"
 )
 async def get_project(
-    project_id: str = Path(..., description="Project ID")
+    project_id: str = Path(..., description="Project ID"),
+    fields: Optional[str] = None,
+    include: Optional[str] = None,
 ):
     try:
         # Header for internal routes (e.g., Users MS /internal/*, and any other internal endpoints)
@@ -437,7 +371,7 @@ async def get_project(
                         or "Unknown User"
                     )
                 except Exception as e:
-                    print(f"⚠️ Users MS lookup failed for {user_id}: {e}")
+                    logger.warning("Users MS lookup failed for %s: %s", user_id, e)
             project["owner_name"] = user_name
 
             # === 3) Fetch raw tasks for the project ===
@@ -461,7 +395,7 @@ async def get_project(
                 for idx, res in enumerate(results):
                     tid = task_ids[idx]
                     if isinstance(res, Exception):
-                        print(f"⚠️ Manage-Task call failed for task {tid}: {res}")
+                        logger.warning("Manage-Task call failed for task %s: %s", tid, res)
                         # Fallback to original raw task if available
                         fallback = next((t for t in raw_tasks if t.get("id") == tid), None)
                         if fallback:
@@ -496,17 +430,18 @@ async def get_project(
                                 if fallback:
                                     enriched_tasks.append(fallback)
                         except Exception as e:
-                            print(f"⚠️ Failed parsing Manage-Task response for {tid}: {e}")
+                            logger.warning("Failed parsing Manage-Task response for %s: %s", tid, e)
                             fallback = next((t for t in raw_tasks if t.get("id") == tid), None)
                             if fallback:
                                 enriched_tasks.append(fallback)
                     else:
-                        print(f"⚠️ Manage-Task returned {res.status_code} for task {tid}")
+                        logger.warning("Manage-Task returned %s for task %s", res.status_code, tid)
                         fallback = next((t for t in raw_tasks if t.get("id") == tid), None)
                         if fallback:
                             enriched_tasks.append(fallback)
 
-                project["tasks"] = enriched_tasks
+                field_set, include_set = parse_projection(fields), parse_projection(include)
+                project["tasks"] = [project_task(t, field_set, include_set) for t in enriched_tasks]
             else:
                 project["tasks"] = []
 
@@ -528,6 +463,112 @@ async def get_project(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+
+# ==================== Project Dashboard Stats ====================
+def empty_project_stats() -> Dict[str, Any]:
+    return {
+        "task_count": 0,
+        "status_counts": {},
+        "overdue_count": 0,
+        "time_spent": {"hours": 0, "minutes": 0, "total_minutes": 0},
+    }
+
+
+def merge_project_stats(stats_list: list) -> Dict[str, Any]:
+    """Add up per-project stats from the Task MS /stats endpoint."""
+    total = empty_project_stats()
+    for stats in stats_list:
+        total["task_count"] += stats.get("task_count", 0)
+        total["overdue_count"] += stats.get("overdue_count", 0)
+        for status, count in (stats.get("status_counts") or {}).items():
+            total["status_counts"][status] = total["status_counts"].get(status, 0) + count
+        total["time_spent"]["total_minutes"] += (stats.get("time_spent") or {}).get("total_minutes", 0)
+    total["time_spent"]["hours"], total["time_spent"]["minutes"] = divmod(total["time_spent"]["total_minutes"], 60)
+    return total
+
+
+async def fetch_task_stats(client: httpx.AsyncClient, project_ids: list, internal_headers: Optional[dict]) -> Dict[str, Any]:
+    """
+    One Task MS call for all projects. Aggregates are computed (and cached per
+    project until one of its tasks changes) by the Task MS, so task bodies
+    never cross the wire.
+    """
+    r_stats = await client.get(
+        f"{TASK_SERVICE_URL}/stats", params={"pids": ",".join(project_ids)}, headers=internal_headers
+    )
+    r_stats.raise_for_status()
+    return (r_stats.json() or {}).get("stats", {}) or {}
+
+
+@app.get(
+    "/projects/stats",
+    summary="Get dashboard stats for every project visible to a user",
+    response_description="Per-project and combined task counts by status, overdue count and logged time"
+)
+async def get_user_project_stats(uid: str, request: Request = None):
+    internal_headers = {"X-Internal-API-Key": INTERNAL_API_KEY} if INTERNAL_API_KEY else None
+    try:
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            visible = await resolve_visible_projects(client, uid, internal_headers, caller_profile(request, uid))
+            projects_by_id = visible["projects_by_id"]
+            if not projects_by_id:
+                return {
+                    "message": "No projects found for this user",
+                    "user_id": uid,
+                    "projects": [],
+                    "totals": empty_project_stats(),
+                }
+
+            stats_by_pid = await fetch_task_stats(client, list(projects_by_id.keys()), internal_headers)
+
+        projects = [
+            {
+                "id": pid,
+                "name": project.get("name"),
+                "stats": stats_by_pid.get(pid) or empty_project_stats(),
+            }
+            for pid, project in projects_by_id.items()
+        ]
+        return {
+            "message": "Project stats retrieved successfully",
+            "user_id": uid,
+            "projects": projects,
+            "totals": merge_project_stats([p["stats"] for p in projects]),
+        }
+
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(
+            status_code=e.response.status_code,
+            detail=f"Task service error: {e.response.text}"
+        )
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=503, detail=f"Task service unavailable: {str(e)}")
+
+
+@app.get(
+    "/projects/{pid}/stats",
+    summary="Get dashboard stats for a project",
+    response_description="Task counts by status, overdue count and logged time"
+)
+async def get_project_stats(pid: str = Path(..., description="Project ID")):
+    internal_headers = {"X-Internal-API-Key": INTERNAL_API_KEY} if INTERNAL_API_KEY else None
+    try:
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            stats_by_pid = await fetch_task_stats(client, [pid], internal_headers)
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(
+            status_code=e.response.status_code,
+            detail=f"Task service error: {e.response.text}"
+        )
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=503, detail=f"Task service unavailable: {str(e)}")
+
+    return {
+        "message": "Project stats retrieved successfully",
+        "project_id": pid,
+        "stats": stats_by_pid.get(pid) or empty_project_stats(),
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=4100)
\ No newline at end of file
@@ -0,0 +1,41 @@
+"""
+fields= / include= projection of task dicts for the composite list views
+
+Copied as-is into each composite service that returns task lists
+(manage_task, manage_project); keep the copies identical.
+
+- ``fields``: keep only these task keys; ``id`` and ``subtasks`` are always kept.
+- ``include``: the heavy sub-collections (HEAVY_TASK_FIELDS) to keep. When it is
+  given, even empty, the ones it does not name are dropped. When it is not
+  given they are returned, so existing callers keep getting them.
+"""
+from typing import Any, Dict, Optional
+
+# Sub-collections that dominate list payloads; dropped when include= is given and does not name them
+HEAVY_TASK_FIELDS = {"messages", "time_entries"}
+
+
+def parse_projection(value: Optional[str]) -> Optional[set]:
+    """Parse a comma-separated fields=/include= query value (None when not given)."""
+    if value is None:
+        return None
+    return {v.strip() for v in value.split(",") if v.strip()}
+
+
+def project_task(task: Dict[str, Any], fields: Optional[set], include: Optional[set]) -> Dict[str, Any]:
+    """
+    Trim a task dict for list views, subtasks included.
+    Returns the task untouched when neither fields nor include is given.
+    """
+    if not isinstance(task, dict) or (fields is None and include is None):
+        return task
+    projected = {}
+    for key, value in task.items():
+        if fields is not None and key not in fields and key not in ("id", "subtasks"):
+            continue
+        if include is not None and key in HEAVY_TASK_FIELDS and key not in include:
+            continue
+        if key == "subtasks" and isinstance(value, list):
+            value = [project_task(sub, fields, include) for sub in value]
+        projected[key] = value
+    return projected
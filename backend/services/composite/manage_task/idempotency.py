@@ -0,0 +1,230 @@
+"""
+Idempotency-Key support for manage_task's create endpoints
+
+A client that times out and retries a create used to run the whole workflow
+again: a second task with its own schedule, member sync and Kafka events, or a
+second chat message. Requests that send an ``Idempotency-Key`` header now run
+at most once per key:
+  - The first request runs; its result is kept for IDEMPOTENCY_TTL_SECONDS.
+  - A repeat gets the kept result back, marked with ``Idempotent-Replayed: true``.
+  - A duplicate that arrives while the first is still running waits for it and
+    gets the same result, so concurrent retries collapse into one execution.
+  - Reusing a key for a different request body is rejected with 422.
+  - Server errors (5xx and unexpected exceptions) are not kept, so the client
+    can retry them with the same key. Client errors (4xx) are kept.
+
+Keys are scoped to the caller and the request path. A keyed request without a
+caller identity (no valid user_data cookie) is rejected with 401, so anonymous
+clients cannot replay or block each other's keys.
+
+Keys live in a SQLite file (IDEMPOTENCY_DB) that every uvicorn worker of the
+container opens, on the same volume as the saga log, so a retry that lands on
+another worker or arrives after a restart is still recognised. The first
+request claims its key by inserting the key's row; a duplicate on another
+worker finds the row and polls it until the result is written. A claim that is
+never completed (the worker died) lapses after IDEMPOTENCY_LEASE_SECONDS, and
+the next duplicate runs the request. Duplicates on the same worker wait on the
+first request directly instead of polling.
+"""
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+IDEMPOTENCY_DB = os.getenv("IDEMPOTENCY_DB", "/tmp/manage_task_idempotency.sqlite")
+TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "3600"))
+# Longest a request may run before a duplicate stops waiting for it and runs itself
+LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "120"))
+POLL_SECONDS = 0.05
+MAX_KEY_LENGTH = 255
+
+# Row: claim is set while the first request runs and cleared once its outcome is
+# stored; status is 200 for a kept result (body) or the code of a kept 4xx (detail)
+Row = Tuple[str, Optional[str], Optional[int], Optional[str]]
+
+
+class IdempotencyStore:
+    """Results of keyed requests, in flight or completed, in a SQLite file shared by the workers"""
+
+    def __init__(self, path: str = IDEMPOTENCY_DB, ttl_seconds: float = TTL_SECONDS,
+                 lease_seconds: float = LEASE_SECONDS, poll_seconds: float = POLL_SECONDS,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.clock = clock
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        # Requests of this worker still running, so local duplicates need not poll
+        self._running: Dict[str, asyncio.Future] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute("pragma journal_mode=wal")
+            db.execute("pragma synchronous=normal")
+            db.execute("create table if not exists idempotency_keys (key text primary key, "
+                       "fingerprint text not null, claim text, status integer, body text, expires real not null)")
+            db.execute("create index if not exists idempotency_keys_expires on idempotency_keys (expires)")
+            self._db = db
+        return self._db
+
+    @contextmanager
+    def _transaction(self):
+        with self._db_lock:
+            db = self._connection()
+            db.execute("begin immediate")
+            try:
+                yield db
+            except BaseException:
+                db.execute("rollback")
+                raise
+            db.execute("commit")
+
+    def claim(self, key: str, fingerprint: str, claim: str) -> Optional[Row]:
+        """
+        Insert the key's row with ``claim`` and return None, or return the row
+        already there. Rows past their expiry (kept outcomes past the TTL, claims
+        past their lease) are dropped first.
+        """
+        now = self.clock()
+        with self._transaction() as db:
+            db.execute("delete from idempotency_keys where expires <= ?", (now,))
+            try:
+                db.execute("insert into idempotency_keys (key, fingerprint, claim, expires) values (?, ?, ?, ?)",
+                           (key, fingerprint, claim, now + self.lease_seconds))
+                return None
+            except sqlite3.IntegrityError:
+                return db.execute("select fingerprint, claim, status, body from idempotency_keys where key = ?",
+                                  (key,)).fetchone()
+
+    def complete(self, key: str, claim: str, status: int, body: Any) -> None:
+        """Keep the outcome of the claimed request for the TTL"""
+        with self._transaction() as db:
+            db.execute("update idempotency_keys set claim = null, status = ?, body = ?, expires = ? "
+                       "where key = ? and claim = ?",
+                       (status, json.dumps(body), self.clock() + self.ttl_seconds, key, claim))
+
+    def release(self, key: str, claim: str) -> None:
+        """Drop the claim, so the next request with the key runs"""
+        with self._transaction() as db:
+            db.execute("delete from idempotency_keys where key = ? and claim = ?", (key, claim))
+
+    async def run(self, key: str, fingerprint: str, execute: Callable[[], Awaitable[Any]]) -> Tuple[bool, Any]:
+        """
+        (replayed, result) of the request identified by ``key``: ``execute()`` is
+        awaited only if no request with this key is in flight or kept
+        """
+        token = uuid.uuid4().hex
+        while True:
+            running = self._running.get(key)
+            if running is not None:
+                # shield: a duplicate that gives up must not cancel the shared wait
+                await asyncio.shield(running)
+                continue
+            row = await asyncio.to_thread(self.claim, key, fingerprint, token)
+            if row is None:
+                break
+            stored_fingerprint, holder, status, body = row
+            if stored_fingerprint != fingerprint:
+                raise HTTPException(status_code=422, detail=f"{IDEMPOTENCY_HEADER} was already used for a different request")
+            if holder is None:
+                if status != 200:
+                    raise HTTPException(status_code=status, detail=json.loads(body))
+                return True, json.loads(body)
+            # Running on another worker
+            await asyncio.sleep(self.poll_seconds)
+
+        done = asyncio.get_running_loop().create_future()
+        self._running[key] = done
+        try:
+            result = jsonable_encoder(await execute())
+            await self._settle(self.complete, key, token, 200, result)
+        except HTTPException as e:
+            if e.status_code >= 500:
+                await self._settle(self.release, key, token)
+            else:
+                await self._settle(self.complete, key, token, e.status_code, jsonable_encoder(e.detail))
+            raise
+        except BaseException:
+            # Unexpected errors and cancellation are not kept either; released
+            # without awaiting, as a cancelled task may not get to run again
+            self._settle_now(self.release, key, token)
+            raise
+        finally:
+            del self._running[key]
+            done.set_result(None)
+        return False, result
+
+    async def _settle(self, write: Callable[..., None], *args) -> None:
+        try:
+            await asyncio.to_thread(write, *args)
+        except sqlite3.Error:
+            # The request itself went through; duplicates wait for the lease instead
+            logger.exception("Could not store the outcome of idempotency key %s", args[0])
+
+    def _settle_now(self, write: Callable[..., None], *args) -> None:
+        try:
+            write(*args)
+        except sqlite3.Error:
+            logger.exception("Could not release idempotency key %s", args[0])
+
+    def __len__(self) -> int:
+        with self._transaction() as db:
+            return db.execute("select count(*) from idempotency_keys where expires > ?", (self.clock(),)).fetchone()[0]
+
+
+def _fingerprint(arguments) -> str:
+    body = jsonable_encoder({name: value for name, value in arguments.items() if name != "request"})
+    return hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def idempotent(store: IdempotencyStore):
+    """
+    Run a FastAPI handler at most once per Idempotency-Key. The handler must take
+    ``request: Request``; requests without the header run as before.
+    """
+    def decorate(handler):
+        signature = inspect.signature(handler)
+
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            request = bound.arguments.get("request")
+            key = request.headers.get(IDEMPOTENCY_HEADER) if request is not None else None
+            if not key:
+                return await handler(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                raise HTTPException(status_code=400, detail=f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters")
+
+            user = getattr(request.state, "user", None) or {}
+            if not user.get("id"):
+                raise HTTPException(status_code=401, detail=f"{IDEMPOTENCY_HEADER} requires a signed-in caller")
+            scope = f"{user['id']}:{request.method}:{request.url.path}:{key}"
+            replayed, result = await store.run(scope, _fingerprint(bound.arguments), lambda: handler(*args, **kwargs))
+            if replayed:
+                return ORJSONResponse(result, headers={REPLAYED_HEADER: "true"})
+            return result
+
+        return wrapper
+
+    return decorate
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, Path, Body, Query
+from fastapi import FastAPI, HTTPException, Path, Body, Query, Request
 from typing import Dict, Any, List, Optional
 import httpx
 from datetime import datetime, timezone
@@ -10,9 +10,21 @@ import uuid
 import asyncio
 import json
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
 
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from kafka_client import KafkaEventPublisher, EventTypes, Topics
+from tracing import init_tracing, instrument_app
+from metrics import init_metrics
+from logging_config import setup_logging
+from auth_middleware import caller_profile, install_auth
+from audit_trail import encode_cursor as encode_audit_cursor
+from idempotency import IdempotencyStore, idempotent
+from task_projection import parse_projection, project_task
+from saga import Saga, SagaLog, SagaRunner, Step
+import timeline
 
 
 load_dotenv()
@@ -27,7 +39,29 @@ UTC_PLUS_8 = pytz.timezone('Asia/Singapore')
 # Initialize Kafka publisher
 kafka_publisher = KafkaEventPublisher()
 
-app = FastAPI(title="Composite Microservice: manage-task Service")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Finish sagas cut off by a crash or restart, and let background steps finish on shutdown"""
+    recovery = asyncio.create_task(sagas.recover_forever())
+
+    yield  # This is where the app runs
+
+    recovery.cancel()
+    await sagas.drain()
+
+app = FastAPI(title="Composite Microservice: manage-task Service", default_response_class=ORJSONResponse, lifespan=lifespan)
+
+# Compress large list payloads (clients send Accept-Encoding: gzip)
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=6)
+
+# Trace requests and outgoing calls (spans are exported when TRACE_EXPORT_DIR is set),
+# and expose latency histograms derived from those spans on GET /metrics
+init_tracing("manage-task")
+instrument_app(app)
+init_metrics(app)
+setup_logging("manage-task", app)
+install_auth(app)
 
 DEFAULT_ORIGINS = [
     "http://localhost:3000",
@@ -68,6 +102,13 @@ SCHEDULE_SERVICE_URL = "http://schedule:5300"
 # for validating user
 INTERNAL_API_KEY = os.getenv("INTERNAL_API_KEY")
 
+# Results of create requests sent with an Idempotency-Key, so a retried create runs once
+idempotency_store = IdempotencyStore()
+
+# Create, update and delete run as sagas; their step log lives in SAGA_LOG_DB
+sagas = SagaRunner(SagaLog())
+
+
 class MessageAttachment(BaseModel):
     name: str
     url: str
@@ -99,7 +140,7 @@ async def get_task_participants(task_id) -> List[Dict[str, Any]]:
             if response.status_code == 200:
                 participants_data = response.json()
                 participants_data = participants_data.get("participants", [])
-                logger.info(f"Retrieved participants for task {task_id}: {participants_data}")
+                logger.debug("Retrieved participants for task %s: %s", task_id, participants_data)
                 return participants_data
             else:
                 logger.error(f"Failed to get participants for task {task_id}: {response.status_code}")
@@ -192,14 +233,14 @@ async def notify_task_participants(task_id, task_data: Dict[str, Any]) -> bool:
             "timestamp": datetime.now(UTC_PLUS_8).isoformat()
         }
         
-        logger.info(f"📝 Prepared event data: {event_data}")
+        logger.debug("📝 Prepared event data: %s", event_data)
         
         # Send events to all participants
         failed_count = 0
         success_count = 0
         
         for i, participant in enumerate(participants):
-            logger.info(f"📤 Sending notification {i+1}/{len(participants)} to participant {participant.get('user_id')}")
+            logger.debug("📤 Sending notification %d/%d to participant %s", i + 1, len(participants), participant.get('user_id'))
             
             local_event_data = event_data.copy()
             local_event_data["uid"] = participant.get("user_id")
@@ -222,7 +263,7 @@ async def notify_task_participants(task_id, task_data: Dict[str, Any]) -> bool:
             
             if success:
                 success_count += 1
-                logger.info(f"✅ Successfully sent notification to participant {participant.get('user_id')}")
+                logger.debug("✅ Successfully sent notification to participant %s", participant.get('user_id'))
             else:
                 failed_count += 1
                 logger.error(f"❌ Failed to send notification to participant {participant.get('user_id')}")
@@ -293,14 +334,14 @@ async def notify_task_status_change(task_id: str, old_status: Optional[str], new
             "timestamp": datetime.now(UTC_PLUS_8).isoformat()
         }
         
-        logger.info(f"📝 Prepared event data: {event_data}")
+        logger.debug("📝 Prepared event data: %s", event_data)
         
         # Send events to all participants
         failed_count = 0
         success_count = 0
         
         for i, participant in enumerate(participants):
-            logger.info(f"📤 Sending notification {i+1}/{len(participants)} to participant {participant.get('user_id')}")
+            logger.debug("📤 Sending notification %d/%d to participant %s", i + 1, len(participants), participant.get('user_id'))
             
             local_event_data = event_data.copy()
             local_event_data["uid"] = participant.get("user_id") or participant.get("id")
@@ -323,7 +364,7 @@ async def notify_task_status_change(task_id: str, old_status: Optional[str], new
             
             if success:
                 success_count += 1
-                logger.info(f"✅ Successfully sent notification to participant {participant.get('user_id')}")
+                logger.debug("✅ Successfully sent notification to participant %s", participant.get('user_id'))
             else:
                 failed_count += 1
                 logger.error(f"❌ Failed to send notification to participant {participant.get('user_id')}")
@@ -359,9 +400,6 @@ def read_root():
         "service": "manage-task-composite",
     }
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
 # Favicon handler
 @app.get("/favicon.ico")
 async def get_favicon():
@@ -379,7 +417,10 @@ async def get_favicon():
 async def get_tasks_by_user_composite(
     user_id: str = Path(
         ..., description="User ID to fetch tasks for (where user is a collaborator)"
-    )
+    ),
+    fields: Optional[str] = None,
+    include: Optional[str] = None,
+    request: Request = None,
 ):
     """
     Composite endpoint:
@@ -389,32 +430,43 @@ async def get_tasks_by_user_composite(
     4. Flatten key schedule fields (status, deadline) directly into task object
     5. Nest subtasks under parent tasks
     6. Fetch user's display name from Users MS and include in response
+       (taken from the caller's user_data cookie when user_id is the caller)
+
+    Optional query params (list views):
+    - fields: comma-separated task keys to return, e.g. "name,status,deadline"
+    - include: heavy sub-collections to keep, e.g. "time_entries" (messages/time_entries are dropped otherwise)
     """
     async with httpx.AsyncClient() as client:
         try:
-            # ---- 0) Fetch user info (for name) ----
+            # ---- 0) Fetch user info (for name); the caller's own name comes from their cookie ----
             user_name: str | None = None
-            try:
-                user_resp = await client.get(f"{USERS_SERVICE_URL}/internal/{user_id}")
-                if user_resp.status_code == 200:
-                    u = user_resp.json() or {}
-                    if u.get("name"):
-                        user_name = u["name"]
-                    elif u.get("email"):
-                        user_name = u["email"].split("@")[0]
+            profile = caller_profile(request, user_id)
+            if profile:
+                user_name = profile.get("name") or (profile.get("email") or "").split("@")[0] or user_id
+            else:
+                try:
+                    user_resp = await client.get(
+                        f"{USERS_SERVICE_URL}/internal/{user_id}",
+                        headers={"X-Internal-API-Key": INTERNAL_API_KEY}
+                    )
+                    if user_resp.status_code == 200:
+                        u = user_resp.json() or {}
+                        if u.get("name"):
+                            user_name = u["name"]
+                        elif u.get("email"):
+                            user_name = u["email"].split("@")[0]
+                        else:
+                            user_name = user_id
                     else:
                         user_name = user_id
-                else:
+                except Exception:
                     user_name = user_id
-            except Exception:
-                user_name = user_id
 
             # ---- 1) Get all tasks from Task MS ----
-            print(f"Fetching tasks from: {TASK_SERVICE_URL}/tasks")
+            logger.debug("Fetching tasks from: %s/tasks", TASK_SERVICE_URL)
             tasks_response = await client.get(f"{TASK_SERVICE_URL}/tasks")
             tasks_response.raise_for_status()
             response_data = tasks_response.json()
-            print(f"Received response: {response_data}")
 
             all_tasks = response_data.get("tasks", [])
             if not isinstance(all_tasks, list):
@@ -422,22 +474,18 @@ async def get_tasks_by_user_composite(
                     status_code=500, detail="Unexpected response format from Task MS"
                 )
 
-            print(f"Total tasks found: {len(all_tasks)}")
-
             # ---- 2) Filter tasks where user_id is in collaborators ----
             user_tasks = []
             for task in all_tasks:
                 collaborators = task.get("collaborators")
-                print(f"Task {task.get('id')}: collaborators = {collaborators}")
                 if (
                     collaborators
                     and isinstance(collaborators, list)
                     and user_id in collaborators
                 ):
                     user_tasks.append(task)
-                    print(f"✓ User {user_id} found in task {task.get('id')}")
 
-            print(f"Total user tasks found: {len(user_tasks)}")
+            logger.debug("User %s is a collaborator on %d of %d tasks", user_id, len(user_tasks), len(all_tasks))
 
             if not user_tasks:
                 return {
@@ -453,25 +501,28 @@ async def get_tasks_by_user_composite(
                 }
 
             # ---- 3) Enrich each task with schedule and project data ----
-            enriched_tasks = []
-            for task in user_tasks:
-                task_id = task.get("id")
-
-                # schedule - extract status and deadline
-                schedule_status = None
-                schedule_deadline = None
+            # Latest schedules of all the user's tasks, up to 1000 per lookup
+            schedules = {}
+            task_ids = [t["id"] for t in user_tasks if t.get("id")]
+            for i in range(0, len(task_ids), 1000):
                 try:
-                    schedule_response = await client.get(
-                        f"{SCHEDULE_SERVICE_URL}/tid/{task_id}/latest"
+                    schedule_response = await client.post(
+                        f"{SCHEDULE_SERVICE_URL}/latest", json={"tids": task_ids[i:i + 1000]}
                     )
                     if schedule_response.status_code == 200:
-                        schedule_resp = schedule_response.json()
-                        schedule_data = schedule_resp.get("data", schedule_resp)
-                        schedule_status = schedule_data.get("status")
-                        schedule_deadline = schedule_data.get("deadline")
+                        schedules.update(schedule_response.json().get("data") or {})
                 except Exception:
                     pass
 
+            enriched_tasks = []
+            for task in user_tasks:
+                task_id = task.get("id")
+
+                # schedule - extract status and deadline
+                schedule_data = schedules.get(task_id) or {}
+                schedule_status = schedule_data.get("status")
+                schedule_deadline = schedule_data.get("deadline")
+
                 # project
                 project_data = None
                 if task.get("pid"):
@@ -537,6 +588,17 @@ async def get_tasks_by_user_composite(
                     )
                     entry["task"]["progress"] = round((completed / total) * 100, 2)
 
+            # ---- 5c) Apply fields=/include= projection ----
+            field_set, include_set = parse_projection(fields), parse_projection(include)
+            if field_set is not None or include_set is not None:
+                def _project_entry(entry):
+                    entry["task"] = project_task(entry["task"], field_set, include_set)
+                    for sub in entry.get("subtasks", []):
+                        _project_entry(sub)
+                    return entry
+
+                nested_tasks = [_project_entry(entry) for entry in nested_tasks]
+
             # ✅ 6) Return with nested tasks and user info
             return {
                 "user_id": user_id,
@@ -550,18 +612,18 @@ async def get_tasks_by_user_composite(
             }
 
         except httpx.HTTPStatusError as e:
-            print(f"HTTPStatusError: {e}")
+            logger.error("HTTPStatusError: %s", e)
             raise HTTPException(
                 status_code=e.response.status_code,
                 detail=f"Task MS returned an error: {e.response.text}",
             )
         except httpx.RequestError as e:
-            print(f"RequestError: {e}")
+            logger.error("RequestError: %s", e)
             raise HTTPException(
                 status_code=503, detail=f"Failed to connect to services: {str(e)}"
             )
         except Exception as e:
-            print(f"Unexpected error: {type(e).__name__}: {e}")
+            logger.error("Unexpected error: %s: %s", type(e).__name__, e)
             import traceback
 
             traceback.print_exc()
@@ -576,14 +638,15 @@ async def get_tasks_by_user_composite(
     response_description="Returns task with schedule, project, creator, collaborators, and parent task names",
 )
 async def get_task_composite(
-    task_id: str = Path(..., description="UUID of the task to retrieve")
+    task_id: str = Path(..., description="UUID of the task to retrieve"),
+    request: Request = None,
 ):
     """
     Composite endpoint:
     1. Fetch task from Task MS (unwrap inner task object if needed)
     2. Fetch schedule info from Schedule MS
     3. Fetch project name via pid (from Project MS)
-    4. Fetch creator name via created_by_uid (from Users MS)
+    4. Fetch creator name via created_by_uid (from Users MS, or the caller's cookie if they created it)
     5. Fetch collaborators[] names via User MS
     6. Fetch parent task name if parentTaskId exists
     """
@@ -652,10 +715,17 @@ async def get_task_composite(
 
             # === 4. Get Creator ===
             created_by = None
-            if task_data.get("created_by_uid"):
+            creator_profile = caller_profile(request, task_data.get("created_by_uid"))
+            if creator_profile:
+                created_by = {
+                    "id": creator_profile["id"],
+                    "name": creator_profile.get("name") or (creator_profile.get("email") or "").split("@")[0],
+                }
+            elif task_data.get("created_by_uid"):
                 try:
                     user_resp = await client.get(
-                        f"{USERS_SERVICE_URL}/internal/{task_data['created_by_uid']}"
+                        f"{USERS_SERVICE_URL}/internal/{task_data['created_by_uid']}",
+                        headers={"X-Internal-API-Key": INTERNAL_API_KEY}
                     )
                     if user_resp.status_code == 200:
                         user_json = user_resp.json()
@@ -670,9 +740,7 @@ async def get_task_composite(
                             "name": "Unknown User",
                         }
                 except Exception as e:
-                    print(
-                        f"[ERROR] User fetch failed for {task_data['created_by_uid']}: {e}"
-                    )
+                    logger.error("User fetch failed for %s: %s", task_data['created_by_uid'], e)
                     created_by = {
                         "id": task_data["created_by_uid"],
                         "name": "Unavailable",
@@ -682,7 +750,10 @@ async def get_task_composite(
             collaborators_info = []
             for cid in task_data.get("collaborators") or []:
                 try:
-                    c_resp = await client.get(f"{USERS_SERVICE_URL}/internal/{cid}")
+                    c_resp = await client.get(
+                        f"{USERS_SERVICE_URL}/internal/{cid}",
+                        headers={"X-Internal-API-Key": INTERNAL_API_KEY}
+                    )
                     if c_resp.status_code == 200:
                         c_json = c_resp.json()
                         collaborators_info.append(
@@ -695,7 +766,7 @@ async def get_task_composite(
                     else:
                         collaborators_info.append({"id": cid, "name": "Unknown User"})
                 except Exception as e:
-                    print(f"[ERROR] Collaborator fetch failed for {cid}: {e}")
+                    logger.error("Collaborator fetch failed for %s: %s", cid, e)
                     collaborators_info.append({"id": cid, "name": "Unavailable"})
 
             # === 6. Get Parent Task (id + name only) ===
@@ -763,123 +834,236 @@ async def get_task_composite(
 
 
 # Helper function to sync project members
-async def sync_project_members(project_id: str, user_ids: List[str], action: str = "add"):
+async def sync_project_members(project_id: str, user_ids: List[str], action: str = "add") -> Optional[Dict[str, Any]]:
     """
-    Simple member sync:
-    - "add": Add users to project.members (merge, don't overwrite)
-    - "remove": Remove users from project.members
+    Idempotent member sync via the Project MS (set union/difference happens in the DB):
+    - "add": Add users to project.members
+    - "remove": Remove users from project.members, keeping anyone who still
+      owns or collaborates on another task of the project
+    Returns the Project MS response ({"project": {...}, "changed": [...]}) or None on failure.
     """
+    user_ids = [u for u in dict.fromkeys(user_ids or []) if u]
+    if not project_id or not user_ids:
+        return None
     try:
         async with httpx.AsyncClient(timeout=10.0) as client:
-            # Get current members
-            resp = await client.get(f"{PROJECTS_SERVICE_URL}/pid/{project_id}")
-            if resp.status_code != 200:
-                return
-            
-            proj = resp.json()
-            if proj is None:
-                proj = {}
-            current = proj.get("project", {}) or {}
-            if not isinstance(current, dict):
-                current = {}
-            current = current.get("members", [])
-            
-            if action == "add":
-                # Add new members (union)
-                updated = list(set(current + user_ids))
-            else:  # remove
-                # Remove specified members
-                updated = [m for m in current if m not in user_ids]
-            
-            # Update project
-            await client.put(
-                f"{PROJECTS_SERVICE_URL}/pid/{project_id}",
-                json={"members": updated}
+            resp = await client.post(
+                f"{PROJECTS_SERVICE_URL}/pid/{project_id}/members/{action}",
+                json={"user_ids": user_ids},
             )
+            if resp.status_code != 200:
+                logger.warning("[MEMBERS_SYNC] %s failed for project %s: %s", action, project_id, resp.status_code)
+                return None
+            return resp.json() or {}
     except Exception as e:
-        print(f"Member sync failed: {e}")
+        logger.warning("Member sync failed: %s", e)
+        return None
+
 
 async def ensure_members_present(project_id: str, user_ids: List[str]):
     """
     Ensure each user_id in `user_ids` exists in project's members, without overwriting.
-    Strategy:
-      1) GET current project -> read existing members (handles nested {project:{members:[]}} too)
-      2) Compute to_add (only missing IDs)
-      3) Try additive POST endpoint (bulk add) if available:
-           POST /pid/{project_id}/members/add  body: { "user_ids": [...] }
-         If not available (404/405), fallback to merge-PUT of the *union*.
+    Returns the IDs that were not members before.
     """
-    if not user_ids:
-        return
+    result = await sync_project_members(project_id, user_ids, action="add")
+    return (result or {}).get("changed", [])
 
+
+# ===================================================================
+# Task workflows as sagas (see saga.py). Each step takes the saga's context:
+# its input plus the result of every step finished so far, by step name.
+# ===================================================================
+def _extract_task_id_from_json(obj: Any) -> Optional[str]:
+    keys = ("id", "task_id", "tid", "uuid")
+
+    def pick(d: Dict[str, Any]) -> Optional[str]:
+        for k in keys:
+            v = d.get(k)
+            if isinstance(v, str) and len(v) >= 8:
+                return v
+        return None
+
+    if isinstance(obj, dict):
+        v = pick(obj)
+        if v:
+            return v
+        for container in ("task", "data", "result", "item"):
+            sub = obj.get(container)
+            if isinstance(sub, dict):
+                v = pick(sub)
+                if v:
+                    return v
+    return None
+
+
+async def _validated(check) -> bool:
+    """Await a validation; any failure other than a ValidationError is wrapped in one"""
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(10.0)) as client:
-            # -- 1) Read current members
-            proj_resp = await client.get(f"{PROJECTS_SERVICE_URL}/pid/{project_id}")
-            if proj_resp.status_code != 200:
-                print(
-                    f"[members.ensure] WARN project {project_id} fetch -> {proj_resp.status_code}"
-                )
-                return
-
-            proj_json = proj_resp.json() or {}
-            # Handle both { project: {..., members: [...] } } and { members: [...] }
-            current_members = (
-                (proj_json.get("project") or {}).get("members")
-                if isinstance(proj_json.get("project"), dict)
-                else proj_json.get("members")
-            ) or []
-
-            # Normalize to strings and uniquify
-            existing = set(str(m) for m in current_members if isinstance(m, str))
-            to_add = [
-                uid for uid in (str(u) for u in user_ids) if uid and uid not in existing
-            ]
-
-            if not to_add:
-                print(f"[members.ensure] nothing to add for project {project_id}")
-                return
-
-            # -- 2) Preferred: additive POST (bulk) if your Project MS supports it
-            #    e.g. Flask route idea: POST /projects/<pid>/members/add  { "user_ids": [...] }
-            add_url_candidates = [
-                f"{PROJECTS_SERVICE_URL}/pid/{project_id}/members/add",
-                f"{PROJECTS_SERVICE_URL}/projects/{project_id}/members/add",
-            ]
-            for add_url in add_url_candidates:
-                try:
-                    add_resp = await client.post(add_url, json={"user_ids": to_add})
-                    if add_resp.status_code in (200, 201, 204):
-                        print(f"[members.ensure] added via POST {add_url}: {to_add}")
-                        return
-                    if add_resp.status_code in (404, 405):
-                        # try next candidate or fallback
-                        continue
-                    # other non-2xx: treat as failure and try fallback
-                except Exception as e:
-                    print(f"[members.ensure] POST {add_url} failed: {e}")
-
-            # -- 3) Fallback: merge-PUT (send union; DO NOT drop any existing members)
-            merged = list(existing.union(to_add))
-            # Choose a stable update endpoint you already use
-            put_url_candidates = [
-                f"{PROJECTS_SERVICE_URL}/{project_id}",
-            ]
-            for put_url in put_url_candidates:
-                try:
-                    put_resp = await client.put(put_url, json={"members": merged})
-                    if put_resp.status_code in (200, 204):
-                        print(f"[members.ensure] merged via PUT {put_url}: +{to_add}")
-                        return
-                except Exception as e:
-                    print(f"[members.ensure] PUT {put_url} failed: {e}")
+        await check
+    except ValidationError:
+        raise
+    except Exception as e:
+        raise ValidationError(f"Validation error: {str(e)}")
+    return True
 
-            print(
-                f"[members.ensure] WARN: could not add members for project {project_id}: {to_add}"
-            )
 
+def _background_summary(name: str, saga_id: str) -> Dict[str, Any]:
+    """Where a client can follow the background steps of a saga it started"""
+    return {"id": saga_id, "background": [step.name for step in sagas.sagas[name].background]}
+
+
+async def _create_task_step(ctx):
+    try:
+        task_response = await create_task_service(ctx["task_json"])
+    except HTTPException as e:
+        # Directly bubble up atomic service errors (e.g., "Task name already exist")
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        # General fallback for network or internal issues
+        raise HTTPException(
+            status_code=502,
+            detail={"service": "task", "message": f"Task service failed: {str(e)}"},
+        )
+
+    # Handle downstream error bodies (e.g., {"detail": "Task name already exist"})
+    if isinstance(task_response, dict) and "detail" in task_response:
+        raise HTTPException(
+            status_code=400,
+            detail={"service": "task", "message": task_response["detail"]},
+        )
+
+    task_id = _extract_task_id_from_json(task_response)
+    if not task_id:
+        raise HTTPException(
+            status_code=502,
+            detail={
+                "service": "task",
+                "message": "Task created but no ID returned (no id/task_id/tid/uuid found in response body).",
+                "task_service_body": task_response,
+            },
+        )
+    return {"task_id": task_id, "response": task_response}
+
+
+async def _delete_created_task(ctx):
+    await delete_task_service(ctx["task"]["task_id"])
+
+
+async def _create_schedule_step(ctx):
+    task_id = ctx["task"]["task_id"]
+    try:
+        schedule_response = await create_schedule_service(task_id, ctx["schedule"])
+    except Exception as e:
+        raise HTTPException(
+            status_code=502,
+            detail={
+                "service": "schedule",
+                "message": "Schedule service failed. Task creation rolled back.",
+                "error": str(e),
+                "task_id_rolled_back": task_id,
+            },
+        )
+    if isinstance(schedule_response, dict) and schedule_response.get("status") == "failed":
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "service": "schedule",
+                "message": "Schedule creation failed. Task creation rolled back.",
+                "error": schedule_response.get("error"),
+                "task_id_rolled_back": task_id,
+            },
+        )
+    return schedule_response
+
+
+async def _project_info_step(ctx):
+    try:
+        async with httpx.AsyncClient() as client:
+            proj_resp = await client.get(f"{PROJECTS_SERVICE_URL}/pid/{ctx['task_json']['pid']}")
+            if proj_resp.status_code == 200:
+                return proj_resp.json()
+    except Exception as e:
+        logger.warning("Failed to fetch project info: %s", e)
+    return None
+
+
+async def _collaborator_info_step(ctx):
+    collaborator_info = []
+    try:
+        async with httpx.AsyncClient() as client:
+            responses = await asyncio.gather(*[
+                client.get(f"{USERS_SERVICE_URL}/internal/{collab_id}", headers={"X-Internal-API-Key": INTERNAL_API_KEY})
+                for collab_id in ctx["task_json"]["collaborators"]
+            ])
+        for user_resp in responses:
+            if user_resp.status_code == 200:
+                user_data = user_resp.json()
+                collaborator_info.append({
+                    "id": user_data.get("id"),
+                    "name": user_data.get("name") or user_data.get("email", "").split("@")[0]
+                })
     except Exception as e:
-        print(f"[members.ensure] ERROR: {e}")
+        logger.warning("Failed to fetch collaborator info: %s", e)
+    return collaborator_info
+
+
+async def _add_task_members_step(ctx):
+    task_json = ctx["task_json"]
+    # Owner + collaborators; the Project MS unions them into members in one call
+    users_to_add = [task_json.get("created_by_uid")] + [c for c in (task_json.get("collaborators") or []) if c]
+    sync_result = await sync_project_members(task_json["pid"], users_to_add, action="add")
+    if sync_result is None:
+        raise RuntimeError(f"Project member sync failed for project {task_json['pid']}")
+    to_add = sync_result.get("changed") or []
+    logger.debug("[MEMBERS_SYNC] Project %s new members: %s", task_json["pid"], to_add)
+    return {"added": to_add, "project_name": (sync_result.get("project") or {}).get("name", "Unknown Project")}
+
+
+async def _notify_added_members_step(ctx):
+    task_json = ctx["task_json"]
+    notification_success = await notify_project_members_added(
+        project_id=task_json["pid"],
+        project_name=ctx["members"]["project_name"],
+        added_member_ids=ctx["members"]["added"],
+        task_name=task_json.get("name", "Unknown Task"),
+        added_by_user_id=task_json.get("created_by_uid"),
+        added_by_profile=ctx["caller"],
+    )
+    if not notification_success:
+        raise RuntimeError("Some project member notifications failed")
+    return True
+
+
+async def _notify_participants_step(ctx):
+    task_id = ctx["task"]["task_id"]
+    logger.info(f"Notifying participants about new task {task_id}")
+    if not await notify_task_participants(task_id, ctx["task_json"]):
+        raise RuntimeError(f"Failed to notify participants about task {task_id}")
+    return True
+
+
+sagas.register(Saga("create_task", [
+    Step("validate_parent", lambda ctx: _validated(validate_parent_task_id(ctx["task_json"]["parentTaskId"])),
+         when=lambda ctx: bool(ctx["task_json"].get("parentTaskId"))),
+    Step("validate_collaborators", lambda ctx: _validated(validate_collaborators(ctx["task_json"]["collaborators"])),
+         when=lambda ctx: bool(ctx["task_json"].get("collaborators"))),
+    Step("validate_project", lambda ctx: _validated(validate_project_id(ctx["task_json"]["pid"])),
+         when=lambda ctx: bool(ctx["task_json"].get("pid"))),
+    # Nothing is written until every validation has passed
+    Step("task", _create_task_step, compensate=_delete_created_task,
+         after=["validate_parent", "validate_collaborators", "validate_project"]),
+    Step("schedule", _create_schedule_step, after=["task"], when=lambda ctx: bool(ctx["schedule"])),
+    # Response enrichment only reads, so it runs alongside the writes
+    Step("project_info", _project_info_step, after=["validate_project"],
+         when=lambda ctx: bool(ctx["schedule"]) and bool(ctx["task_json"].get("pid"))),
+    Step("collaborator_info", _collaborator_info_step, after=["validate_collaborators"],
+         when=lambda ctx: bool(ctx["schedule"]) and bool(ctx["task_json"].get("collaborators"))),
+    Step("members", _add_task_members_step, after=["schedule"], background=True,
+         when=lambda ctx: bool(ctx["schedule"]) and bool(ctx["task_json"].get("pid"))),
+    Step("notify_members", _notify_added_members_step, after=["members"], background=True,
+         when=lambda ctx: bool((ctx["members"] or {}).get("added"))),
+    Step("notify_participants", _notify_participants_step, after=["schedule"], background=True),
+]))
 
 
 @app.post(
@@ -887,6 +1071,7 @@ async def ensure_members_present(project_id: str, user_ids: List[str]):
     summary="Create task via composite service with full workflow",
     response_description="Created task with schedule and notifications",
 )
+@idempotent(idempotency_store)
 async def create_task_composite(
     task_json: Dict[str, Any] = Body(
         ...,
@@ -906,95 +1091,23 @@ async def create_task_composite(
                     "is_recurring": False
                 }
             },
-    )
+    ),
+    request: Request = None,
 ):
     """
-    Composite function to create a task with full workflow:
-    1) Validate ALL inputs (parentTaskId, collaborators, project ID)
-    2) Validate schedule data requirements BEFORE creating task
-    3) Create the task in Task MS (only after ALL validations pass)
-    4) Create schedule entry in Schedule MS (if provided)
-    5) ROLLBACK task if schedule creation fails
-    6) Sync project members (add task owner and collaborators if not already members)
-    7) Return enriched response (project & collaborators info)
+    Composite function to create a task, run as the create_task saga:
+    1) Validate the schedule data, then parentTaskId, collaborators and project ID (concurrently)
+    2) Create the task in Task MS (only after ALL validations pass)
+    3) Create schedule entry in Schedule MS (if provided); the task is deleted again if this fails
+    4) Fetch project & collaborators info for the response, alongside 2) and 3)
+    Once the response is sent, in the background:
+    5) Sync project members (add task owner and collaborators) and notify the ones added
+    6) Notify task participants via Kafka
     """
-
-    def _extract_task_id_from_json(obj: Any) -> Optional[str]:
-        keys = ("id", "task_id", "tid", "uuid")
-
-        def pick(d: Dict[str, Any]) -> Optional[str]:
-            for k in keys:
-                v = d.get(k)
-                if isinstance(v, str) and len(v) >= 8:
-                    return v
-            return None
-
-        if isinstance(obj, dict):
-            v = pick(obj)
-            if v:
-                return v
-            for container in ("task", "data", "result", "item"):
-                sub = obj.get(container)
-                if isinstance(sub, dict):
-                    v = pick(sub)
-                    if v:
-                        return v
-        return None
-
     try:
-        # 0) Peel off schedule if present
+        # Peel off schedule if present; a simple field check, not an HTTP call
         schedule_data = task_json.pop("schedule", None)
-
-        # ===================================================================
-        # STEP 1: COMPLETE ALL VALIDATIONS BEFORE ANY CREATION OPERATIONS
-        # Run all validations in parallel for better performance
-        # ===================================================================
-        validation_results = {
-            "parentTaskId": False,
-            "collaborators": False,
-            "project": False,
-            "schedule_data": False,
-        }
-
-        # Collect all validation tasks to run in parallel
-        validation_tasks = []
-        validation_keys = []
-
-        # Validate parent task ID
-        # Note: Calling async function without await creates a coroutine (doesn't execute yet)
-        if task_json.get("parentTaskId"):
-            validation_tasks.append(validate_parent_task_id(task_json["parentTaskId"]))
-            validation_keys.append("parentTaskId")
-
-        # Validate collaborators
-        if task_json.get("collaborators"):
-            validation_tasks.append(validate_collaborators(task_json["collaborators"]))
-            validation_keys.append("collaborators")
-
-        # Validate project ID
-        if task_json.get("pid"):
-            validation_tasks.append(validate_project_id(task_json["pid"]))
-            validation_keys.append("project")
-
-        # Run all HTTP validations simultaneously
-        # asyncio.gather() will execute all coroutines in parallel
-        if validation_tasks:
-            try:
-                # Execute all validations in parallel
-                await asyncio.gather(*validation_tasks)
-                # If all passed, mark them as validated
-                for key in validation_keys:
-                    validation_results[key] = True
-            except ValidationError as e:
-                # Re-raise validation errors (they contain specific error messages)
-                raise
-            except Exception as e:
-                # Wrap unexpected errors
-                raise ValidationError(f"Validation error: {str(e)}")
-
-        # Validate schedule data (if provided) - this is a simple field check, not an HTTP call
         if schedule_data:
-            # Check required fields for schedule
             if not schedule_data.get("deadline"):
                 raise HTTPException(
                     status_code=400, detail="Schedule requires 'deadline' field"
@@ -1004,326 +1117,36 @@ async def create_task_composite(
             if "is_recurring" not in schedule_data:
                 schedule_data["is_recurring"] = False
 
-            validation_results["schedule_data"] = True
-
-        # ===================================================================
-        # STEP 2: CREATE TASK (only after all validations pass)
-        # ===================================================================
-        task_id = None  # Initialize for potential rollback
-
-        try:
-            task_response = await create_task_service(task_json)
-        except HTTPException as e:
-            # Directly bubble up atomic service errors (e.g., "Task name already exist")
-            raise HTTPException(status_code=e.status_code, detail=e.detail)
-        except Exception as e:
-            # General fallback for network or internal issues
-            raise HTTPException(
-                status_code=502,
-                detail={"service": "task", "message": f"Task service failed: {str(e)}"},
-            )
-
-        # Handle downstream error bodies (e.g., {"detail": "Task name already exist"})
-        if isinstance(task_response, dict) and "detail" in task_response:
-            raise HTTPException(
-                status_code=400,
-                detail={"service": "task", "message": task_response["detail"]},
-            )
-
-        # Extract ID
-        task_id = _extract_task_id_from_json(task_response)
-        if not task_id:
-            raise HTTPException(
-                status_code=502,
-                detail={
-                    "service": "task",
-                    "message": "Task created but no ID returned (no id/task_id/tid/uuid found in response body).",
-                    "task_service_body": task_response,
-                },
-            )
-
-        # ===================================================================
-        # STEP 3: CREATE SCHEDULE (CRITICAL - ROLLBACK ON FAILURE)
-        # ===================================================================
-        schedule_response = None
-        if schedule_data:
-            try:
-                schedule_response = await create_schedule_service(
-                    task_id, schedule_data
-                )
-
-                # Check if schedule creation actually failed
-                if (
-                    isinstance(schedule_response, dict)
-                    and schedule_response.get("status") == "failed"
-                ):
-                    # ROLLBACK: Delete the task that was just created
-                    try:
-                        await delete_task_service(task_id)
-                    except Exception as rollback_error:
-                        print(
-                            f"CRITICAL: Failed to rollback task {task_id}: {rollback_error}"
-                        )
-
-                    # Raise error with schedule failure details
-                    raise HTTPException(
-                        status_code=400,
-                        detail={
-                            "service": "schedule",
-                            "message": "Schedule creation failed. Task creation rolled back.",
-                            "error": schedule_response.get("error"),
-                            "task_id_rolled_back": task_id,
-                        },
-                    )
-
-            except HTTPException:
-                # Re-raise HTTPException (including rollback errors from above)
-                raise
-            except Exception as e:
-                # ROLLBACK: Delete the task that was just created
-                try:
-                    await delete_task_service(task_id)
-                except Exception as rollback_error:
-                    print(
-                        f"CRITICAL: Failed to rollback task {task_id}: {rollback_error}"
-                    )
-
-                raise HTTPException(
-                    status_code=502,
-                    detail={
-                        "service": "schedule",
-                        "message": f"Schedule service failed. Task creation rolled back.",
-                        "error": str(e),
-                        "task_id_rolled_back": task_id,
-                    },
-                )
-
-            # ===================================================================
-            # STEP 4: SYNC PROJECT MEMBERS (Add task owner and collaborators)
-            # ===================================================================
-            project_id = task_json.get("pid")
-            members_synced = {"added": []}
+        saga_id, results = await sagas.run("create_task", {
+            "task_json": task_json,
+            "schedule": schedule_data,
+            "caller": caller_profile(request, task_json.get("created_by_uid")),
+        })
 
-            if project_id:
-                print(f"[MEMBERS_SYNC] Starting member sync for project {project_id}")
-                try:
-                    async with httpx.AsyncClient(timeout=10.0) as client:
-                        # Get current project members
-                        print(f"[MEMBERS_SYNC] Fetching project from: {PROJECTS_SERVICE_URL}/pid/{project_id}")
-                        proj_resp = await client.get(f"{PROJECTS_SERVICE_URL}/pid/{project_id}")
-                        print(f"[MEMBERS_SYNC] GET response status: {proj_resp.status_code}")
-                        
-                        if proj_resp.status_code == 200:
-                            proj_data = proj_resp.json()
-                            print(f"[MEMBERS_SYNC] Full GET response: {proj_data}")
-                            
-                            # ⭐ FIX: Extract members from project field (data is None)
-                            current_members = []
-                            
-                            # Check project field first (this is where members are!)
-                            if proj_data.get("project") and isinstance(proj_data.get("project"), dict):
-                                current_members = proj_data["project"].get("members", [])
-                            
-                            # Fallback to data if it exists
-                            elif proj_data.get("data") and isinstance(proj_data.get("data"), dict):
-                                current_members = proj_data["data"].get("members", [])
-                            
-                            # Fallback to root
-                            else:
-                                current_members = proj_data.get("members", [])
-                            
-                            # Ensure it's a list
-                            if not isinstance(current_members, list):
-                                current_members = []
-                            
-                            print(f"[MEMBERS_SYNC] Current members in DB: {current_members}")
-                            
-                            # Collect users to check (owner + collaborators)
-                            users_to_check = []
-                            
-                            created_by_uid = task_json.get("created_by_uid")
-                            if created_by_uid:
-                                users_to_check.append(created_by_uid)
-                            
-                            collaborators = task_json.get("collaborators") or []
-                            if isinstance(collaborators, list):
-                                users_to_check.extend([c for c in collaborators if c])
-                            
-                            print(f"[MEMBERS_SYNC] Users to check: {users_to_check}")
-                            
-                            # Find users NOT in current members
-                            to_add = [uid for uid in users_to_check if uid not in current_members]
-                            print(f"[MEMBERS_SYNC] Users to ADD (not already in members): {to_add}")
-                            
-                            if to_add:
-                                # MERGE: old members + new members (preserve existing)
-                                updated_members = current_members + to_add
-                                print(f"[MEMBERS_SYNC] Merged members array: {updated_members}")
-                                
-                                # Send ONLY members field
-                                update_payload = {"members": updated_members}
-                                
-                                print(f"[MEMBERS_SYNC] Sending PUT to: {PROJECTS_SERVICE_URL}/{project_id}")
-                                print(f"[MEMBERS_SYNC] Payload: {update_payload}")
-                                
-                                update_resp = await client.put(
-                                    f"{PROJECTS_SERVICE_URL}/{project_id}",
-                                    json=update_payload,
-                                    headers={"Content-Type": "application/json"}
-                                )
-                                
-                                print(f"[MEMBERS_SYNC] PUT response status: {update_resp.status_code}")
-                                print(f"[MEMBERS_SYNC] PUT response body: {update_resp.text}")
-                                
-                                if update_resp.status_code in [200, 204]:
-                                    print(f"[MEMBERS_SYNC] ✅ PUT request successful")
-                                    
-                                    # VERIFY: Re-fetch to check if DB actually updated
-                                    print(f"[MEMBERS_SYNC] Verifying database update with fresh GET...")
-                                    verify_resp = await client.get(f"{PROJECTS_SERVICE_URL}/pid/{project_id}")
-                                    
-                                    if verify_resp.status_code == 200:
-                                        verify_data = verify_resp.json()
-                                        print(f"[MEMBERS_SYNC] 🔍 Full verify response: {verify_data}")
-                                        
-                                        # Extract members from project field
-                                        verify_members = []
-                                        
-                                        if verify_data.get("project") and isinstance(verify_data.get("project"), dict):
-                                            verify_members = verify_data["project"].get("members", [])
-                                        elif verify_data.get("data") and isinstance(verify_data.get("data"), dict):
-                                            verify_members = verify_data["data"].get("members", [])
-                                        else:
-                                            verify_members = verify_data.get("members", [])
-                                        
-                                        if not isinstance(verify_members, list):
-                                            verify_members = []
-                                        
-                                        print(f"[MEMBERS_SYNC] 🔍 Members in DB after PUT: {verify_members}")
-                                        print(f"[MEMBERS_SYNC] 🔍 Expected members: {updated_members}")
-                                        
-                                        # Check if all expected members are present
-                                        if set(verify_members) == set(updated_members):
-                                            members_synced["added"] = to_add
-                                            print(f"[MEMBERS_SYNC] ✅ DATABASE VERIFIED: All members present")
-                                            
-                                            # ===================================================================
-                                            # STEP 4.5: NOTIFY NEWLY ADDED PROJECT MEMBERS
-                                            # ===================================================================
-                                            if to_add:
-                                                print(f"[MEMBERS_SYNC] 📧 Notifying {len(to_add)} newly added project members...")
-                                                try:
-                                                    # Get project name for notification
-                                                    project_name = "Unknown Project"
-                                                    if proj_data.get("project") and isinstance(proj_data.get("project"), dict):
-                                                        project_name = proj_data["project"].get("name", "Unknown Project")
-                                                    elif proj_data.get("data") and isinstance(proj_data.get("data"), dict):
-                                                        project_name = proj_data["data"].get("name", "Unknown Project")
-                                                    else:
-                                                        project_name = proj_data.get("name", "Unknown Project")
-                                                    
-                                                    # Notify newly added members
-                                                    notification_success = await notify_project_members_added(
-                                                        project_id=project_id,
-                                                        project_name=project_name,
-                                                        added_member_ids=to_add,
-                                                        task_name=task_json.get("name", "Unknown Task"),
-                                                        added_by_user_id=task_json.get("created_by_uid")
-                                                    )
-                                                    
-                                                    if notification_success:
-                                                        print(f"[MEMBERS_SYNC] ✅ Project member notifications sent successfully")
-                                                    else:
-                                                        print(f"[MEMBERS_SYNC] ⚠️ Some project member notifications failed")
-                                                        
-                                                except Exception as e:
-                                                    print(f"[MEMBERS_SYNC] ❌ Error sending project member notifications: {str(e)}")
-                                                    import traceback
-                                                    traceback.print_exc()
-                                        else:
-                                            print(f"[MEMBERS_SYNC] ⚠️ DATABASE MISMATCH!")
-                                            print(f"[MEMBERS_SYNC] ⚠️ Missing: {set(updated_members) - set(verify_members)}")
-                                            print(f"[MEMBERS_SYNC] ⚠️ Extra: {set(verify_members) - set(updated_members)}")
-                                    else:
-                                        print(f"[MEMBERS_SYNC] ⚠️ Could not verify (GET failed with {verify_resp.status_code})")
-                                else:
-                                    print(f"[MEMBERS_SYNC] ❌ PUT failed with status: {update_resp.status_code}")
-                            else:
-                                print(f"[MEMBERS_SYNC] ✅ All users already in members, skipping update")
-                        else:
-                            print(f"[MEMBERS_SYNC] ❌ Failed to GET project: {proj_resp.status_code}")
-                                
-                except Exception as e:
-                    print(f"[MEMBERS_SYNC] ❌ Exception: {type(e).__name__}: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
-
-            # ===================================================================
-            # STEP 5: ENRICH RESPONSE WITH ADDITIONAL DATA
-            # ===================================================================
-            project_info = None
-            collaborator_info = []
-
-            if project_id:
-                try:
-                    async with httpx.AsyncClient() as client:
-                        proj_resp = await client.get(f"{PROJECTS_SERVICE_URL}/pid/{project_id}")
-                        if proj_resp.status_code == 200:
-                            project_info = proj_resp.json()
-                except Exception as e:
-                    print(f"Warning: Failed to fetch project info: {e}")
-
-            if task_json.get("collaborators"):
-                try:
-                    async with httpx.AsyncClient() as client:
-                        for collab_id in task_json["collaborators"]:
-                            user_resp = await client.get(
-                                f"{USERS_SERVICE_URL}/internal/{collab_id}",
-                                headers={"X-Internal-API-Key": INTERNAL_API_KEY}
-                            )
-                            if user_resp.status_code == 200:
-                                user_data = user_resp.json()
-                                collaborator_info.append({
-                                    "id": user_data.get("id"),
-                                    "name": user_data.get("name") or user_data.get("email", "").split("@")[0]
-                                })
-                except Exception as e:
-                    print(f"Warning: Failed to fetch collaborator info: {e}")
-
-        # ===================================================================
-        # STEP 6: NOTIFY TASK PARTICIPANTS VIA KAFKA
-        # ===================================================================
-        notification_success = False
-        try:
-            logger.info(f"Notifying participants about new task {task_id}")
-            notification_success = await notify_task_participants(task_id, task_json)
-            if notification_success:
-                logger.info(f"Successfully notified participants about task {task_id}")
-            else:
-                logger.warning(f"Failed to notify participants about task {task_id}")
-        except Exception as e:
-            logger.error(f"Error notifying participants about task {task_id}: {str(e)}")
-
-        # ===================================================================
-        # STEP 7: COMPOSE FINAL RESPONSE
-        # ===================================================================
+        schedule_response = results["schedule"]
+        project_info = results["project_info"]
+        collaborator_info = results["collaborator_info"] or []
         return {
             "message": "Task created successfully via composite service",
-            "task_id": task_id,
-            "task": task_response,
+            "task_id": results["task"]["task_id"],
+            "task": results["task"]["response"],
             "schedule": schedule_response,
             "project_info": project_info,
             "collaborator_info": collaborator_info,
-            "members_synced": members_synced,  # List of users added to project
-            "notification_sent": notification_success,  # Kafka notification status
-            "validations_passed": validation_results,
+            "validations_passed": {
+                "parentTaskId": bool(results["validate_parent"]),
+                "collaborators": bool(results["validate_collaborators"]),
+                "project": bool(results["validate_project"]),
+                "schedule_data": bool(schedule_data),
+            },
             "services_used": {
                 "task_service": True,
                 "schedule_service": schedule_response is not None,
                 "project_service": project_info is not None,
                 "users_service": len(collaborator_info) > 0,
-                "kafka_notification": notification_success,
             },
+            # Member sync and notifications finish after this response
+            "saga": _background_summary("create_task", saga_id),
             "created_at": datetime.now(UTC_PLUS_8).isoformat(),
         }
 
@@ -1362,16 +1185,14 @@ async def create_schedule_service(task_id: str, schedule_data: Dict[str, Any]):
                     "data": response.json(),
                 }
             else:
-                print(
-                    f"Warning: Schedule creation failed with status {response.status_code}: {response.text}"
-                )
+                logger.warning("Schedule creation failed with status %s: %s", response.status_code, response.text)
                 return {
                     "status": "failed",
                     "message": f"Schedule service returned {response.status_code}",
                     "error": response.text,
                 }
         except httpx.RequestError as e:
-            print(f"Warning: Failed to connect to schedule service: {str(e)}")
+            logger.warning("Failed to connect to schedule service: %s", e)
             raise Exception(f"Schedule service unavailable: {str(e)}")
 
 
@@ -1385,58 +1206,10 @@ async def delete_task_service(task_id: str):
         return response.json() if response.status_code == 200 else None
 
 
-@app.put(
-    "/{task_id}",
-    summary="Update task via composite service",
-    response_description="Updated task with validation",
-)
-
-async def update_task_composite(
-    task_id: str = Path(..., description="Primary key of the task (uuid)"),
-    updates: Dict[str, Any] = Body(
-        ...,
-        examples={
-            "example": {
-                "name": "Update task from composite service",
-                "parentTaskId": "33949f99-20d0-423d-9b26-f09292b2e40d",
-            "collaborators": [
-                "655a9260-f871-480f-abea-ded735b2170a",
-                "d568296e-3644-4ac0-9714-dcaa0aaa5fb0",
-            ],
-            "pid": "695d5107-0229-481a-9301-7c0562ea52d1",
-            "desc": "Set up the initial project structure and dependencies",
-            "notes": "Remember to update the README file",
-            "status": "in_progress",
-            "deadline": "2024-12-31T23:59:59Z",
-            "priorityLevel": 2,
-            "label": "SetupUpdated",
-            "created_by_uid": "655a9260-f871-480f-abea-ded735b2170a",
-        },
-}
-    ),
-):
-    """
-    Composite function to update a task with comprehensive validation:
-    1. Validates and filters payload fields
-    2. Validates ALL inputs (parentTaskId, collaborators, project ID, created_by_uid)
-    3. Updates task via task service (only after all validations pass)
-    4. Updates schedule service (status, deadline)
-    5. Syncs project members (adds new collaborators, removes users no longer involved)
-    """
-
-    # ===================================================================
-    # STEP 0: GET CURRENT TASK DATA TO TRACK CHANGES
-    # ===================================================================
-    print(f"[DEBUG] Received updates for task {task_id}:")
-    print(f"[DEBUG] Raw payload: {updates}")
-    
-    # Initialize variables for tracking changes
+async def _current_task_step(ctx):
+    """The task as it is before the update, and its current status if that is being changed"""
+    task_id = ctx["task_id"]
     old_status = None
-    old_collaborators = set()
-    old_owner = None
-    project_id = None
-    current_task = None
-    
     try:
         async with httpx.AsyncClient(timeout=10.0) as client:
             current_task_resp = await client.get(f"{TASK_SERVICE_URL}/tid/{task_id}")
@@ -1444,20 +1217,16 @@ async def update_task_composite(
                 error_detail = current_task_resp.text if current_task_resp.text else f"Task {task_id} not found"
                 logger.error(f"Task service returned status {current_task_resp.status_code}: {error_detail}")
                 raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
-            
+
             response_data = current_task_resp.json()
             current_task = response_data.get("task")
-            
+
             if not current_task:
                 logger.error(f"Task {task_id} not found in response: {response_data}")
                 raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
-            
-            old_collaborators = set(current_task.get("collaborators") or [])
-            old_owner = current_task.get("created_by_uid")
-            project_id = current_task.get("pid")
-            
+
             # Get old status from schedule if status is being updated
-            if "status" in updates:
+            if "status" in ctx["schedule_updates"]:
                 try:
                     schedule_resp = await client.get(f"{SCHEDULE_SERVICE_URL}/tid/{task_id}/latest")
                     if schedule_resp.status_code == 200:
@@ -1480,11 +1249,125 @@ async def update_task_composite(
         raise
     except Exception as e:
         logger.error(f"Unexpected error fetching task {task_id}: {type(e).__name__}: {str(e)}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
         raise HTTPException(
             status_code=500, detail=f"Failed to fetch current task: {type(e).__name__}: {str(e)}"
         )
+    return {"task": current_task, "old_status": old_status}
+
+
+async def _restore_task_fields(ctx):
+    """Put back the fields the update overwrote, as they were before it"""
+    current_task = ctx["current"]["task"]
+    await update_task_service(ctx["task_id"], {key: current_task.get(key) for key in ctx["updates"]})
+
+
+async def _status_event_step(ctx):
+    current = ctx["current"]
+    new_status = ctx["schedule_updates"]["status"]
+    if not await notify_task_status_change(ctx["task_id"], current["old_status"], new_status, current["task"]):
+        raise RuntimeError(f"Failed to publish status change of task {ctx['task_id']}")
+    return True
+
+
+def _collaborator_changes(ctx):
+    """(added, removed) collaborators of an update that sets them"""
+    if "collaborators" not in ctx["updates"]:
+        return set(), set()
+    old_collaborators = set(ctx["current"]["task"].get("collaborators") or [])
+    new_collaborators = set(ctx["updates"].get("collaborators") or [])
+    return new_collaborators - old_collaborators, old_collaborators - new_collaborators
+
+
+async def _update_members_step(ctx):
+    project_id = ctx["current"]["task"].get("pid")
+    added_collaborators, removed_collaborators = _collaborator_changes(ctx)
+    logger.debug("[MEMBERS_SYNC] Added collaborators: %s", added_collaborators)
+    logger.debug("[MEMBERS_SYNC] Removed collaborators: %s", removed_collaborators)
+    members_synced = {"added": [], "removed": [], "skipped": []}
+
+    if added_collaborators:
+        add_result = await sync_project_members(project_id, list(added_collaborators), action="add")
+        if add_result is None:
+            raise RuntimeError(f"Project member sync failed for project {project_id}")
+        members_synced["added"] = add_result.get("changed") or []
+        members_synced["skipped"] = [uid for uid in added_collaborators if uid not in members_synced["added"]]
+
+    # The Project MS keeps anyone still referenced by another task of the
+    # project (per-(pid, uid) task count), so no task scan is needed here
+    if removed_collaborators:
+        remove_result = await sync_project_members(project_id, list(removed_collaborators), action="remove")
+        if remove_result is None:
+            raise RuntimeError(f"Project member sync failed for project {project_id}")
+        members_synced["removed"] = remove_result.get("changed") or []
+    return members_synced
+
+
+sagas.register(Saga("update_task", [
+    # The current task is read while the new values are validated
+    Step("current", _current_task_step),
+    Step("validate_parent", lambda ctx: _validated(validate_parent_task_id(ctx["updates"]["parentTaskId"])),
+         when=lambda ctx: bool(ctx["updates"].get("parentTaskId"))),
+    Step("validate_collaborators", lambda ctx: _validated(validate_collaborators(ctx["updates"]["collaborators"])),
+         when=lambda ctx: bool(ctx["updates"].get("collaborators"))),
+    Step("validate_project", lambda ctx: _validated(validate_project_id(ctx["updates"]["pid"])),
+         when=lambda ctx: bool(ctx["updates"].get("pid"))),
+    # The authenticated caller obviously exists, so only someone else's uid is checked
+    Step("validate_created_by", lambda ctx: _validated(validate_user_exists(ctx["updates"]["created_by_uid"])),
+         when=lambda ctx: ctx["check_created_by"]),
+    Step("task", lambda ctx: update_task_service(ctx["task_id"], ctx["updates"]), compensate=_restore_task_fields,
+         after=["current", "validate_parent", "validate_collaborators", "validate_project", "validate_created_by"],
+         when=lambda ctx: bool(ctx["updates"])),
+    Step("schedule", lambda ctx: update_schedule_service(ctx["task_id"], ctx["schedule_updates"]), after=["task"],
+         when=lambda ctx: bool(ctx["schedule_updates"])),
+    Step("status_event", _status_event_step, after=["schedule"], background=True,
+         when=lambda ctx: "status" in ctx["schedule_updates"]),
+    Step("members", _update_members_step, after=["task"], background=True,
+         when=lambda ctx: bool(ctx["current"]["task"].get("pid")) and any(_collaborator_changes(ctx))),
+]))
+
+
+@app.put(
+    "/{task_id}",
+    summary="Update task via composite service",
+    response_description="Updated task with validation",
+)
+
+async def update_task_composite(
+    task_id: str = Path(..., description="Primary key of the task (uuid)"),
+    updates: Dict[str, Any] = Body(
+        ...,
+        examples={
+            "example": {
+                "name": "Update task from composite service",
+                "parentTaskId": "33949f99-20d0-423d-9b26-f09292b2e40d",
+            "collaborators": [
+                "655a9260-f871-480f-abea-ded735b2170a",
+                "d568296e-3644-4ac0-9714-dcaa0aaa5fb0",
+            ],
+            "pid": "695d5107-0229-481a-9301-7c0562ea52d1",
+            "desc": "Set up the initial project structure and dependencies",
+            "notes": "Remember to update the README file",
+            "status": "in_progress",
+            "deadline": "2024-12-31T23:59:59Z",
+            "priorityLevel": 2,
+            "label": "SetupUpdated",
+            "created_by_uid": "655a9260-f871-480f-abea-ded735b2170a",
+        },
+}
+    ),
+    request: Request = None,
+):
+    """
+    Composite function to update a task with comprehensive validation, run as the update_task saga:
+    1. Validates and filters payload fields
+    2. Reads the current task while validating ALL inputs (parentTaskId, collaborators, project ID, created_by_uid)
+    3. Updates task via task service (only after all validations pass)
+    4. Updates schedule service (status, deadline); the task fields are put back if this fails
+    Once the response is sent, in the background:
+    5. Publishes the status change, if any
+    6. Syncs project members (adds new collaborators, removes users no longer involved)
+    """
+    logger.debug("Received updates for task %s: %s", task_id, updates)
 
     # ===================================================================
     # STEP 1: VALIDATE AND FILTER PAYLOAD
@@ -1512,196 +1395,40 @@ async def update_task_composite(
         elif key in schedule_fields:
             schedule_updates[key] = value
 
-    print(f"[DEBUG] Filtered task updates: {filtered_updates}")
-    print(f"[DEBUG] Filtered schedule updates: {schedule_updates}")
+    logger.debug("Task %s updates: task=%s schedule=%s", task_id, filtered_updates, schedule_updates)
 
     try:
-        # ===================================================================
-        # STEP 2: COMPLETE ALL VALIDATIONS BEFORE ANY UPDATE OPERATIONS
-        # Run all validations in parallel for better performance
-        # ===================================================================
-        validation_results = {
-            "parentTaskId": False,
-            "collaborators": False,
-            "project": False,
-            "created_by_uid": False,
-        }
-
-        # Collect all validation tasks to run in parallel
-        validation_tasks = []
-        validation_keys = []
-
-        # Validate parent task ID
-        if "parentTaskId" in filtered_updates and filtered_updates["parentTaskId"]:
-            validation_tasks.append(validate_parent_task_id(filtered_updates["parentTaskId"]))
-            validation_keys.append("parentTaskId")
-
-        # Validate collaborators exist in Users DB
-        if "collaborators" in filtered_updates and filtered_updates["collaborators"]:
-            validation_tasks.append(validate_collaborators(filtered_updates["collaborators"]))
-            validation_keys.append("collaborators")
-
-        # Validate project ID exists
-        if "pid" in filtered_updates and filtered_updates["pid"]:
-            validation_tasks.append(validate_project_id(filtered_updates["pid"]))
-            validation_keys.append("project")
-
-        # Validate created_by_uid exists in Users DB
-        if "created_by_uid" in filtered_updates and filtered_updates["created_by_uid"]:
-            validation_tasks.append(validate_user_exists(filtered_updates["created_by_uid"]))
-            validation_keys.append("created_by_uid")
-
-        # Run all validations simultaneously
-        if validation_tasks:
-            try:
-                # Execute all validations in parallel
-                await asyncio.gather(*validation_tasks)
-                # If all passed, mark them as validated
-                for key in validation_keys:
-                    validation_results[key] = True
-            except ValidationError as e:
-                # Re-raise validation errors (they contain specific error messages)
-                raise
-            except Exception as e:
-                # Wrap unexpected errors
-                raise ValidationError(f"Validation error: {str(e)}")
-
-        # ===================================================================
-        # STEP 3: UPDATE TASK (only after all validations pass)
-        # ===================================================================
-        task_response = None
-        if filtered_updates:
-            task_response = await update_task_service(task_id, filtered_updates)
-
-        # ===================================================================
-        # STEP 4: UPDATE SCHEDULE (only after task update succeeds)
-        # ===================================================================
-        schedule_response = None
-        if schedule_updates:
-            schedule_response = await update_schedule_service(task_id, schedule_updates)
-            
-            # Publish Kafka event for status changes
-            if "status" in schedule_updates:
-                new_status = schedule_updates["status"]
-                # Don't fail the update if Kafka publishing fails
-                await notify_task_status_change(task_id, old_status, new_status, current_task)
-
-        # ===================================================================
-        # STEP 5: SYNC PROJECT MEMBERS (Handle collaborator additions and removals)
-        # ===================================================================
-        members_synced = {"added": [], "removed": [], "skipped": []}
-        
-        # Only process if collaborators field was updated
-        if "collaborators" in filtered_updates:
-            new_collaborators = set(filtered_updates.get("collaborators", []))
-            added_collaborators = new_collaborators - old_collaborators
-            removed_collaborators = old_collaborators - new_collaborators
-            
-            if project_id and (added_collaborators or removed_collaborators):
-                try:
-                    async with httpx.AsyncClient(timeout=10.0) as client:
-                        # Get current project members
-                        proj_resp = await client.get(f"{PROJECTS_SERVICE_URL}/pid/{project_id}")
-                        
-                        if proj_resp.status_code == 200:
-                            proj_data = proj_resp.json()
-                            
-                            # Extract members from project field
-                            current_members = []
-                            if proj_data.get("project") and isinstance(proj_data.get("project"), dict):
-                                current_members = proj_data["project"].get("members", [])
-                            elif proj_data.get("data") and isinstance(proj_data.get("data"), dict):
-                                current_members = proj_data["data"].get("members", [])
-                            else:
-                                current_members = proj_data.get("members", [])
-                            
-                            if not isinstance(current_members, list):
-                                current_members = []
-                            
-                            print(f"[MEMBERS_SYNC] Current members: {current_members}")
-                            print(f"[MEMBERS_SYNC] Added collaborators: {added_collaborators}")
-                            print(f"[MEMBERS_SYNC] Removed collaborators: {removed_collaborators}")
-                            
-                            # --- HANDLE ADDITIONS ---
-                            # Check if added collaborators already exist in members, if not, append
-                            to_add = [uid for uid in added_collaborators if uid not in current_members]
-                            
-                            if to_add:
-                                members_synced["added"] = to_add
-                                print(f"[MEMBERS_SYNC] Adding new members: {to_add}")
-                            else:
-                                members_synced["skipped"] = list(added_collaborators)
-                                print(f"[MEMBERS_SYNC] All added collaborators already in members, skipping")
-                            
-                            # --- HANDLE REMOVALS ---
-                            # For each removed collaborator, call /tasks/user/{user_id}
-                            # If results = 0, remove from members, else keep
-                            to_remove = []
-                            for uid in removed_collaborators:
-                                try:
-                                    # Check if user has any other tasks in this project
-                                    tasks_resp = await client.get(f"http://manage-task:4000/tasks/user/{uid}")
-                                    
-                                    if tasks_resp.status_code == 200:
-                                        tasks_data = tasks_resp.json()
-                                        
-                                        # Filter tasks for this specific project
-                                        user_tasks_in_project = [
-                                            task for task in tasks_data.get("tasks", [])
-                                            if task.get("task", {}).get("pid") == project_id
-                                        ]
-                                        
-                                        if len(user_tasks_in_project) == 0:
-                                            # User has no other tasks in this project, safe to remove
-                                            to_remove.append(uid)
-                                            print(f"[MEMBERS_SYNC] User {uid} has no other tasks in project, will remove")
-                                        else:
-                                            print(f"[MEMBERS_SYNC] User {uid} still has {len(user_tasks_in_project)} task(s) in project, keeping in members")
-                                except Exception as e:
-                                    print(f"[MEMBERS_SYNC] Error checking tasks for user {uid}: {e}")
-                            
-                            if to_remove:
-                                members_synced["removed"] = to_remove
-                                print(f"[MEMBERS_SYNC] Removing members: {to_remove}")
-                            
-                            # --- UPDATE PROJECT MEMBERS ---
-                            if to_add or to_remove:
-                                # Calculate final members list
-                                updated_members = [m for m in current_members if m not in to_remove]
-                                updated_members.extend(to_add)
-                                
-                                print(f"[MEMBERS_SYNC] Final members list: {updated_members}")
-                                
-                                # Send update
-                                update_payload = {"members": updated_members}
-                                update_resp = await client.put(
-                                    f"{PROJECTS_SERVICE_URL}/{project_id}",
-                                    json=update_payload,
-                                    headers={"Content-Type": "application/json"}
-                                )
-                                
-                                if update_resp.status_code in [200, 204]:
-                                    print(f"[MEMBERS_SYNC] ✅ Members updated successfully")
-                                else:
-                                    print(f"[MEMBERS_SYNC] ❌ Update failed: {update_resp.status_code}")
-                        
-                except Exception as e:
-                    print(f"[MEMBERS_SYNC] ❌ Exception during member sync: {e}")
-                    import traceback
-                    traceback.print_exc()
+        saga_id, results = await sagas.run("update_task", {
+            "task_id": task_id,
+            "updates": filtered_updates,
+            "schedule_updates": schedule_updates,
+            "check_created_by": bool(
+                filtered_updates.get("created_by_uid")
+                and not caller_profile(request, filtered_updates["created_by_uid"])
+            ),
+        })
+        task_response = results["task"]
+        schedule_response = results["schedule"]
 
         # ===================================================================
-        # STEP 6: COMPOSE RESPONSE
+        # COMPOSE RESPONSE
         # ===================================================================
         response_data = {
             "message": "Task updated successfully via composite service",
             "task_id": task_id,
-            "validations_passed": validation_results,
+            "validations_passed": {
+                "parentTaskId": bool(results["validate_parent"]),
+                "collaborators": bool(results["validate_collaborators"]),
+                "project": bool(results["validate_project"]),
+                "created_by_uid": bool(results["validate_created_by"]),
+            },
             "updates_applied": {
                 "task_fields": list(filtered_updates.keys()),
                 "schedule_fields": list(schedule_updates.keys()),
             },
             "updated_data": {},
+            # Status events and member sync finish after this response
+            "saga": _background_summary("update_task", saga_id),
         }
 
         # Merge task fields into updated_data
@@ -1726,16 +1453,13 @@ async def update_task_composite(
         return response_data
 
     except ValidationError as e:
-        print(f"[ERROR] Validation failed for task {task_id}: {str(e)}")  # ADD THIS
-        logger.error(f"Validation failed for task {task_id}: {str(e)}")   # AND THIS
+        logger.error("Validation failed for task %s: %s", task_id, e)
         raise HTTPException(status_code=400, detail=f"Validation failed: {str(e)}")
     except HTTPException as e:
-        print(f"[ERROR] HTTP exception for task {task_id}: {e.detail}")   # ADD THIS
-        logger.error(f"HTTP exception for task {task_id}: {e.detail}")    # AND THIS
+        logger.error("HTTP exception for task %s: %s", task_id, e.detail)
         raise e
     except Exception as e:
-        print(f"[ERROR] Internal error for task {task_id}: {str(e)}")     # ADD THIS
-        logger.error(f"Internal error for task {task_id}: {str(e)}")      # AND THIS
+        logger.error("Internal error for task %s: %s", task_id, e)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
@@ -1746,7 +1470,10 @@ async def validate_user_exists(user_id: str):
     """
     async with httpx.AsyncClient() as client:
         try:
-            response = await client.get(f"{USERS_SERVICE_URL}/internal/{user_id}")
+            response = await client.get(
+                f"{USERS_SERVICE_URL}/internal/{user_id}",
+                headers={"X-Internal-API-Key": INTERNAL_API_KEY}
+            )
             if response.status_code == 404:
                 raise HTTPException(
                     status_code=404, detail=f"User with ID {user_id} not found"
@@ -1774,7 +1501,10 @@ async def fetch_user_details(user_id: str) -> Dict[str, Any]:
     """
     async with httpx.AsyncClient() as client:
         try:
-            response = await client.get(f"{USERS_SERVICE_URL}/internal/{user_id}")
+            response = await client.get(
+                f"{USERS_SERVICE_URL}/internal/{user_id}",
+                headers={"X-Internal-API-Key": INTERNAL_API_KEY}
+            )
             if response.status_code == 200:
                 user_data = response.json()
                 return {
@@ -1798,10 +1528,12 @@ async def notify_project_members_added(
     project_name: str, 
     added_member_ids: list, 
     task_name: str,
-    added_by_user_id: str = None
+    added_by_user_id: str = None,
+    added_by_profile: Optional[Dict[str, Any]] = None,
 ) -> bool:
     """
     Notify newly added project members via Kafka events.
+    added_by_profile (the caller's cookie identity) saves a Users MS lookup for the adder.
     """
     try:
         logger.info(f"🚀 Starting project member notification for project {project_id}")
@@ -1816,7 +1548,9 @@ async def notify_project_members_added(
         
         # Fetch details for the user who added the members (if provided)
         added_by_name = "System"
-        if added_by_user_id:
+        if added_by_profile:
+            added_by_name = added_by_profile.get("name") or "Unknown User"
+        elif added_by_user_id:
             added_by_details = await fetch_user_details(added_by_user_id)
             if added_by_details:
                 added_by_name = added_by_details.get("name", "Unknown User")
@@ -1825,7 +1559,7 @@ async def notify_project_members_added(
         
         # Send notification to each newly added member
         for member_id in added_member_ids:
-            logger.info(f"📤 Sending project member notification to user {member_id}")
+            logger.debug("📤 Sending project member notification to user %s", member_id)
             
             # Fetch user details for the member
             user_details = await fetch_user_details(member_id)
@@ -1859,7 +1593,7 @@ async def notify_project_members_added(
             
             if success:
                 success_count += 1
-                logger.info(f"✅ Successfully sent project member notification to user {member_id}")
+                logger.debug("✅ Successfully sent project member notification to user %s", member_id)
             else:
                 logger.error(f"❌ Failed to send project member notification to user {member_id}")
         
@@ -1967,18 +1701,16 @@ async def update_schedule_service(task_id: str, schedule_updates: Dict[str, Any]
             )
 
             if response.status_code == 404:
-                print(f"Warning: No schedule found for task {task_id}")
+                logger.warning("No schedule found for task %s", task_id)
                 return {
                     "status": "not_found",
                     "message": f"No schedule found for task {task_id}",
                 }
             elif response.status_code == 400:
-                print(f"Warning: Bad request to schedule service: {response.text}")
+                logger.warning("Bad request to schedule service: %s", response.text)
                 return {"status": "bad_request", "message": "Invalid schedule data"}
             elif response.status_code != 200:
-                print(
-                    f"Warning: Schedule service returned {response.status_code}: {response.text}"
-                )
+                logger.warning("Schedule service returned %s: %s", response.status_code, response.text)
                 return {
                     "status": "error",
                     "message": f"Schedule service error: {response.status_code}",
@@ -1991,7 +1723,7 @@ async def update_schedule_service(task_id: str, schedule_updates: Dict[str, Any]
             }
 
         except httpx.RequestError as e:
-            print(f"Warning: Failed to connect to schedule service: {str(e)}")
+            logger.warning("Failed to connect to schedule service: %s", e)
             return {
                 "status": "service_unavailable",
                 "message": "Schedule service unavailable",
@@ -2027,121 +1759,119 @@ async def create_task_service(task_json: Dict[str, Any]):
             )
 
 
+async def _task_before_delete_step(ctx):
+    """Owner, collaborators and project of the task, or None if it is already gone"""
+    get_task_url = f"{TASK_SERVICE_URL}/tid/{ctx['task_id']}"
+    async with httpx.AsyncClient(timeout=httpx.Timeout(10.0)) as client:
+        get_resp = await client.get(get_task_url)
+
+    if get_resp.status_code == 404:
+        return None
+    if get_resp.status_code != 200:
+        raise HTTPException(
+            status_code=502,
+            detail={
+                "message": "Task service get failed",
+                "status_code": get_resp.status_code,
+                "body": _safe_json(get_resp),
+                "url": get_task_url,
+            },
+        )
+    task_data = (get_resp.json() or {}).get("task", {}) or {}
+    return {
+        "pid": task_data.get("pid"),
+        "created_by_uid": task_data.get("created_by_uid"),
+        "collaborators": task_data.get("collaborators") or [],
+    }
+
+
+async def _delete_task_step(ctx):
+    delete_task_url = f"{TASK_SERVICE_URL}/{ctx['task_id']}"
+    async with httpx.AsyncClient(timeout=httpx.Timeout(10.0)) as client:
+        delete_resp = await client.delete(delete_task_url)
+
+    if delete_resp.status_code not in (200, 204, 404):
+        raise HTTPException(
+            status_code=502,
+            detail={
+                "message": "Task service delete failed",
+                "status_code": delete_resp.status_code,
+                "body": _safe_json(delete_resp),
+                "url": delete_task_url,
+            },
+        )
+    return {
+        "url": delete_task_url,
+        "status_code": delete_resp.status_code,
+        # 404 = deleted in the meantime
+        "result": "already_deleted" if delete_resp.status_code == 404 else _safe_json(delete_resp),
+    }
+
+
+def _task_users(task: Dict[str, Any]) -> List[str]:
+    return ([task["created_by_uid"]] if task["created_by_uid"] else []) + task["collaborators"]
+
+
+async def _remove_task_members_step(ctx):
+    project_id = ctx["current"]["pid"]
+    # Users that still own or collaborate on another task of the project are kept
+    result = await sync_project_members(project_id, _task_users(ctx["current"]), action="remove")
+    if result is None:
+        raise RuntimeError(f"Project member sync failed for project {project_id}")
+    return result.get("changed") or []
+
+
+sagas.register(Saga("delete_task", [
+    # Read BEFORE deletion: the member sync needs the owner, collaborators and project
+    Step("current", _task_before_delete_step),
+    Step("delete", _delete_task_step, after=["current"], when=lambda ctx: ctx["current"] is not None),
+    Step("members", _remove_task_members_step, after=["delete"], background=True,
+         when=lambda ctx: ctx["delete"] is not None and ctx["delete"]["status_code"] != 404
+         and bool(ctx["current"]["pid"]) and bool(_task_users(ctx["current"]))),
+]))
+
+
 # Delete task by task ID
 @app.delete("/{task_id}", summary="Delete a task via composite service")
 async def delete_task_composite(
     task_id: str = Path(..., description="Primary key of the task (uuid)")
 ):
     """
-    Workflow:
+    Workflow, run as the delete_task saga:
       1) GET task details (owner, collaborators, project) BEFORE deletion
       2) DELETE task itself -> TASK_SERVICE_URL/{task_id}
-      3) SYNC project members (check if users should be removed)
+      3) SYNC project members (check if users should be removed), in the background
+         once the response is sent
 
     Notes:
       - 404 from task service is treated as already deleted (idempotent).
       - Any other non-2xx/404 becomes a 502 to the client (downstream error).
     """
-    project_id = None
-    task_owner = None
-    collaborators = []
-
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(10.0)) as client:
-            # 1) Get task details BEFORE deletion (to get project_id, owner, collaborators)
-            # Use /tid/{task_id} for GET (correct endpoint)
-            get_task_url = f"{TASK_SERVICE_URL}/tid/{task_id}"
-            get_resp = await client.get(get_task_url)
-
-            if get_resp.status_code == 200:
-                get_json = get_resp.json()
-                if get_json is None:
-                    get_json = {}
-                task_data = get_json.get("task", {}) or {}
-                project_id = task_data.get("pid")
-                task_owner = task_data.get("created_by_uid")
-                collaborators = task_data.get("collaborators") or []
-            elif get_resp.status_code == 404:
-                # Task already deleted - treat as idempotent success
-                return {
-                    "message": "Task already deleted (idempotent)",
-                    "task_id": task_id,
-                    "task_delete": {
-                        "url": f"{TASK_SERVICE_URL}/{task_id}",
-                        "status_code": 404,
-                        "result": "already_deleted",
-                    },
-                }
-            else:
-                raise HTTPException(
-                    status_code=502,
-                    detail={
-                        "message": "Task service get failed",
-                        "status_code": get_resp.status_code,
-                        "body": _safe_json(get_resp),
-                        "url": get_task_url,
-                    },
-                )
-
-            # 2) Delete the task itself
-            # Use /{task_id} for DELETE (correct endpoint, not /tasks/{task_id})
-            delete_task_url = f"{TASK_SERVICE_URL}/{task_id}"
-            delete_resp = await client.delete(delete_task_url)
-            
-            # Handle idempotent delete (404 = already deleted)
-            if delete_resp.status_code == 404:
-                return {
-                    "message": "Task already deleted (idempotent)",
-                    "task_id": task_id,
-                    "task_delete": {
-                        "url": delete_task_url,
-                        "status_code": 404,
-                        "result": "already_deleted",
-                    },
-                }
-            
-            if delete_resp.status_code not in (200, 204):
-                raise HTTPException(
-                    status_code=502,
-                    detail={
-                        "message": "Task service delete failed",
-                        "status_code": delete_resp.status_code,
-                        "body": _safe_json(delete_resp),
-                        "url": delete_task_url,
-                    },
-                )
+        saga_id, results = await sagas.run("delete_task", {"task_id": task_id})
+        task_delete = results["delete"]
 
-        # 3) Sync project members (check if users should be removed)
-        if project_id:
-            # Collect all user IDs to check for removal
-            users_to_check = []
-            if task_owner:
-                users_to_check.append(task_owner)
-            if collaborators:
-                users_to_check.extend(collaborators)
-            
-            # Check if users should be removed from project members (batch call)
-            # Note: This is a simple removal - for more complex logic (checking if user
-            # has other tasks in project), see the update_task_composite function
-            if users_to_check:
-                await sync_project_members(
-                    project_id, users_to_check, action="remove"
-                )
+        if task_delete is None or task_delete["status_code"] == 404:
+            # Task already deleted - treat as idempotent success
+            return {
+                "message": "Task already deleted (idempotent)",
+                "task_id": task_id,
+                "task_delete": task_delete or {
+                    "url": f"{TASK_SERVICE_URL}/{task_id}",
+                    "status_code": 404,
+                    "result": "already_deleted",
+                },
+            }
 
         return {
-            "message": "Delete workflow completed and project members synced",
+            "message": "Delete workflow completed; project members sync in the background",
             "task_id": task_id,
-            "task_delete": {
-                "url": delete_task_url,
-                "status_code": delete_resp.status_code,
-                "result": _safe_json(delete_resp),
-            },
+            "task_delete": task_delete,
             "members_sync": {
-                "project_id": project_id,
-                "checked_users": (
-                    [task_owner] + collaborators if task_owner else collaborators
-                ),
+                "project_id": results["current"]["pid"],
+                "checked_users": _task_users(results["current"]),
             },
+            "saga": _background_summary("delete_task", saga_id),
         }
 
     except httpx.RequestError as e:
@@ -2159,6 +1889,15 @@ async def delete_task_composite(
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+@app.get("/sagas/{saga_id}", summary="Progress of a create/update/delete workflow")
+async def get_saga_status(saga_id: str = Path(..., description="saga.id from the create/update/delete response")):
+    """Status of the saga and of each of its steps, including the background ones"""
+    saga_status = await asyncio.to_thread(sagas.status, saga_id)
+    if not saga_status:
+        raise HTTPException(status_code=404, detail=f"Saga {saga_id} not found")
+    return saga_status
+
+
 @app.get(
     "/tasks/{task_id}/messages",
     summary="Get all chat messages for a task",
@@ -2249,9 +1988,11 @@ async def get_task_messages(
     summary="Send a new message to task chat",
     response_description="Created message with enriched data"
 )
+@idempotent(idempotency_store)
 async def send_task_message(
     task_id: str = Path(..., description="UUID of the task"),
-    message_data: ChatMessage = Body(...)
+    message_data: ChatMessage = Body(...),
+    request: Request = None,
 ):
     """
     Send a new chat message to a task.
@@ -2264,7 +2005,6 @@ async def send_task_message(
         
         async with httpx.AsyncClient(timeout=10.0) as client:
             # 1. Validate task exists and get current messages
-            print(f"[CHAT] Fetching task {task_id}")
             task_resp = await client.get(
                 f"{TASK_SERVICE_URL}/tid/{task_id}",
                 headers={"X-Internal-API-Key": INTERNAL_API_KEY}
@@ -2275,30 +2015,33 @@ async def send_task_message(
             
             task_resp.raise_for_status()
             task_json = task_resp.json()
-            print(f"[CHAT] Task response: {task_json}")
             
             # Handle nested structure
             task_data = task_json.get("task", task_json)
             current_messages = task_data.get("messages", [])
-            print(f"[CHAT] Current messages count: {len(current_messages)}")
             
-            # 2. Get sender info
+            # 2. Get sender info (from the caller's cookie when they are the sender)
             sender_info = {"name": "Unknown User", "email": None}
-            try:
-                print(f"[CHAT] Fetching sender info for {sender_id}")
-                user_resp = await client.get(
-                    f"{USERS_SERVICE_URL}/internal/{sender_id}",
-                    headers={"X-Internal-API-Key": INTERNAL_API_KEY}
-                )
-                if user_resp.status_code == 200:
-                    user_data = user_resp.json()
-                    sender_info = {
-                        "name": user_data.get("name") or user_data.get("email", "").split("@")[0],
-                        "email": user_data.get("email")
-                    }
-                    print(f"[CHAT] Sender info: {sender_info}")
-            except Exception as e:
-                logger.warning(f"Could not fetch sender info: {e}")
+            sender_profile = caller_profile(request, sender_id)
+            if sender_profile:
+                sender_info = {
+                    "name": sender_profile.get("name") or (sender_profile.get("email") or "").split("@")[0],
+                    "email": sender_profile.get("email")
+                }
+            else:
+                try:
+                    user_resp = await client.get(
+                        f"{USERS_SERVICE_URL}/internal/{sender_id}",
+                        headers={"X-Internal-API-Key": INTERNAL_API_KEY}
+                    )
+                    if user_resp.status_code == 200:
+                        user_data = user_resp.json()
+                        sender_info = {
+                            "name": user_data.get("name") or user_data.get("email", "").split("@")[0],
+                            "email": user_data.get("email")
+                        }
+                except Exception as e:
+                    logger.warning(f"Could not fetch sender info: {e}")
             
             # 3. Create new message object
             new_message = {
@@ -2312,16 +2055,12 @@ async def send_task_message(
                 "edited": False,
                 "edited_at": None
             }
-            print(f"[CHAT] New message created: {new_message}")
             
             # 4. Append to messages array
             updated_messages = current_messages + [new_message]
-            print(f"[CHAT] Updated messages count: {len(updated_messages)}")
             
             # 5. Update task with new messages array
-            print(f"[CHAT] Updating task at: {TASK_SERVICE_URL}/{task_id}")
             update_payload = {"messages": updated_messages}
-            print(f"[CHAT] Update payload: {update_payload}")
             
             update_resp = await client.put(
                 f"{TASK_SERVICE_URL}/{task_id}",
@@ -2329,9 +2068,6 @@ async def send_task_message(
                 headers={"X-Internal-API-Key": INTERNAL_API_KEY}
             )
             
-            print(f"[CHAT] Update response status: {update_resp.status_code}")
-            print(f"[CHAT] Update response body: {update_resp.text}")
-            
             if update_resp.status_code != 200:
                 raise HTTPException(
                     status_code=502,
@@ -2361,7 +2097,7 @@ async def send_task_message(
                 except Exception as e:
                     logger.error(f"Failed to send mention notifications: {e}")
             
-            print(f"[CHAT] Message sent successfully!")
+            logger.debug("[CHAT] Message %s added to task %s (%d messages)", new_message["id"], task_id, len(updated_messages))
             return {
                 "message": "Chat message sent successfully",
                 "data": {
@@ -2525,6 +2261,87 @@ async def get_task_time_entries_composite(
         )
 
 
+async def _audit_rows(client: httpx.AsyncClient, task_id: str, after: Optional[Dict[str, Any]],
+                      before, page_size: int):
+    """The task's audit trail newest first, one keyset page per request as the merge asks for more"""
+    cursor = encode_audit_cursor(after) if after else None
+    while True:
+        params = {"record_id": task_id, "limit": page_size}
+        if cursor:
+            params["cursor"] = cursor
+        resp = await client.get(f"{TASK_SERVICE_URL}/logs", params=params)
+        resp.raise_for_status()
+        data = resp.json()
+        for row in data.get("logs", []):
+            if before is None or timeline.sort_key("audit", row) < before:
+                yield row
+        cursor = data.get("next_cursor")
+        if not cursor:
+            return
+
+
+@app.get(
+    "/tasks/{task_id}/timeline",
+    summary="Get a task's activity timeline",
+    response_description="Audit trail, chat messages and time entries merged newest first"
+)
+async def get_task_timeline(
+    task_id: str = Path(..., description="UUID of the task"),
+    limit: int = Query(20, ge=1, le=100, description="Number of events to return"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page")
+):
+    """
+    One page of a task's history across the audit trail, chat and time log.
+    Follow next_cursor until it is null to walk further back.
+    """
+    try:
+        before, last_audit = timeline.decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    try:
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            messages_resp, entries_resp = await asyncio.gather(
+                client.get(f"{TASK_SERVICE_URL}/tasks/{task_id}/messages"),
+                client.get(f"{TASK_SERVICE_URL}/tasks/{task_id}/time-entries"),
+            )
+            if messages_resp.status_code == 404:
+                raise HTTPException(status_code=404, detail="Task not found")
+            messages_resp.raise_for_status()
+            entries_resp.raise_for_status()
+
+            sources = {
+                # One row beyond the page tells the merge whether more audit history exists
+                "audit": _audit_rows(client, task_id, last_audit, before, page_size=limit + 1),
+                "message": timeline.newest_first(messages_resp.json().get("messages"), "message", before),
+                "time_entry": timeline.newest_first(entries_resp.json().get("time_entries"), "time_entry", before),
+            }
+            events, last_emitted, has_more = await timeline.merge_page(sources, limit)
+
+        next_cursor = None
+        if has_more and events:
+            next_cursor = timeline.encode_cursor(events[-1], last_emitted.get("audit") or last_audit)
+        return {
+            "task_id": task_id,
+            "events": events,
+            "count": len(events),
+            "next_cursor": next_cursor
+        }
+
+    except HTTPException:
+        raise
+    except httpx.RequestError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Failed to connect to task service: {str(e)}"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error: {str(e)}"
+        )
+
+
 @app.post(
     "/tasks/{task_id}/time-entries",
     summary="Add a time entry to a task",
@@ -0,0 +1,455 @@
+"""
+Saga orchestration for manage_task's multi-service workflows
+
+Creating, updating and deleting a task each write to several services (tasks,
+schedule, project members) and then send notifications. A Saga declares those
+calls as steps instead of hand-coding their order and rollback:
+  - A step starts as soon as the steps named in its ``after`` have finished, so
+    steps that do not depend on each other run concurrently.
+  - A step whose ``when`` is false for the context is skipped; the steps after
+    it still run.
+  - If a step fails, the steps still running are cancelled, the ``compensate``
+    actions of the finished steps run newest first, and the step's error is
+    raised to the caller.
+  - ``background`` steps (notifications, member sync) start once the foreground
+    steps have finished and complete after the response has gone out. Their
+    failures are logged, not compensated; the steps after a failed one are skipped.
+
+Steps share one context dict: the saga's input, plus each finished step's
+result under the step's name.
+
+Every saga and step transition is recorded in a SQLite log (SAGA_LOG_DB) along
+with the saga's input and each step's result, so a saga cut off by a crash or
+restart is finished by whichever worker next finds it idle for
+SAGA_RECOVERY_AFTER_SECONDS: one stopped during its foreground steps is
+compensated, one stopped during its background steps has the rest run. Actions
+and compensations may therefore run again, on a context read back from the log.
+
+Records are buffered in memory and written off the request path, all of them in
+one transaction on the log's single connection, at most SAGA_LOG_FLUSH_SECONDS
+after they were made. A crash loses the records of that window, and the sagas
+they belonged to are not recovered.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+SAGA_LOG_DB = os.getenv("SAGA_LOG_DB", "/tmp/manage_task_sagas.sqlite")
+# How long records wait in memory so that one commit covers many of them
+FLUSH_SECONDS = float(os.getenv("SAGA_LOG_FLUSH_SECONDS", "0.05"))
+RECOVERY_AFTER_SECONDS = float(os.getenv("SAGA_RECOVERY_AFTER_SECONDS", "300"))
+# How long shutdown waits for background steps before leaving them to recovery
+DRAIN_SECONDS = float(os.getenv("SAGA_DRAIN_SECONDS", "10"))
+# Finished sagas are only kept for inspection through GET /sagas/{saga_id}
+RETENTION_SECONDS = 7 * 24 * 3600
+
+Context = Dict[str, Any]
+
+
+class Step:
+    """One service call of a saga, with what it waits for and how to undo it"""
+
+    def __init__(self, name: str, action: Callable[[Context], Awaitable[Any]],
+                 compensate: Optional[Callable[[Context], Awaitable[Any]]] = None,
+                 after: Iterable[str] = (), when: Optional[Callable[[Context], bool]] = None,
+                 background: bool = False):
+        self.name = name
+        self.action = action
+        self.compensate = compensate
+        self.after = tuple(after)
+        self.when = when
+        self.background = background
+
+
+class Saga:
+    """A named set of steps; the dependencies must form a DAG"""
+
+    def __init__(self, name: str, steps: List[Step]):
+        self.name = name
+        self.steps = steps
+        by_name = {step.name: step for step in steps}
+        if len(by_name) != len(steps):
+            raise ValueError(f"Saga {name} has duplicate step names")
+        for step in steps:
+            for dependency in step.after:
+                if dependency not in by_name:
+                    raise ValueError(f"Step {step.name} of saga {name} waits for unknown step {dependency}")
+                if by_name[dependency].background and not step.background:
+                    raise ValueError(f"Foreground step {step.name} of saga {name} waits for background step {dependency}")
+
+        ordered: Set[str] = set()
+        remaining = list(steps)
+        while remaining:
+            ready = [step for step in remaining if ordered.issuperset(step.after)]
+            if not ready:
+                raise ValueError(f"Saga {name} has a dependency cycle among {[step.name for step in remaining]}")
+            ordered.update(step.name for step in ready)
+            remaining = [step for step in remaining if step.name not in ordered]
+
+    @property
+    def foreground(self) -> List[Step]:
+        return [step for step in self.steps if not step.background]
+
+    @property
+    def background(self) -> List[Step]:
+        return [step for step in self.steps if step.background]
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, default=str)
+
+
+class SagaLog:
+    """
+    Sagas and their steps in SQLite, on one connection kept for the log's lifetime.
+
+    begin/step/finish only queue their record; flush() writes everything queued in
+    one transaction. Reads flush first, so they see every record made before them.
+    """
+
+    def __init__(self, path: str = SAGA_LOG_DB, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.clock = clock
+        self._db: Optional[sqlite3.Connection] = None
+        # _db_lock: the connection, held across a whole flush or read
+        # _pending_lock: the queue only, so queueing never waits for a commit
+        self._db_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending: List[Tuple[str, tuple]] = []
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            # WAL keeps commits cheap; the log has to survive a worker crash, not a power cut
+            db.execute("pragma journal_mode=wal")
+            db.execute("pragma synchronous=normal")
+            db.execute("create table if not exists sagas (saga_id text primary key, name text not null, "
+                       "status text not null, owner text not null, context text not null, "
+                       "started_at real not null, updated_at real not null)")
+            db.execute("create table if not exists saga_steps (saga_id text not null, step text not null, "
+                       "status text not null, result text, error text, updated_at real not null, "
+                       "primary key (saga_id, step))")
+            db.execute("create index if not exists sagas_status on sagas (status, updated_at)")
+            self._db = db
+        return self._db
+
+    @contextmanager
+    def _transaction(self):
+        """One transaction on the log's connection, after writing out the queued records"""
+        with self._db_lock:
+            db = self._connection()
+            db.execute("begin immediate")
+            try:
+                self._write_pending(db)
+                yield db
+            except BaseException:
+                db.execute("rollback")
+                raise
+            db.execute("commit")
+
+    def _queue(self, sql: str, params: tuple) -> None:
+        with self._pending_lock:
+            self._pending.append((sql, params))
+
+    def _write_pending(self, db: sqlite3.Connection) -> None:
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        for sql, params in pending:
+            db.execute(sql, params)
+
+    def flush(self) -> None:
+        """Write every queued record in one transaction"""
+        if not self._pending:
+            return
+        with self._transaction():
+            pass
+
+    def begin(self, saga_id: str, name: str, owner: str, context: Context) -> None:
+        now = self.clock()
+        self._queue("insert into sagas (saga_id, name, status, owner, context, started_at, updated_at) "
+                    "values (?, ?, 'running', ?, ?, ?, ?)", (saga_id, name, owner, _dumps(context), now, now))
+
+    def step(self, saga_id: str, step: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        now = self.clock()
+        self._queue("insert into saga_steps (saga_id, step, status, result, error, updated_at) "
+                    "values (?, ?, ?, ?, ?, ?) on conflict (saga_id, step) do update set "
+                    "status = excluded.status, result = coalesce(excluded.result, saga_steps.result), "
+                    "error = excluded.error, updated_at = excluded.updated_at",
+                    (saga_id, step, status, None if result is None else _dumps(result), error, now))
+        self._queue("update sagas set updated_at = ? where saga_id = ?", (now, saga_id))
+
+    def finish(self, saga_id: str, status: str) -> None:
+        self._queue("update sagas set status = ?, updated_at = ? where saga_id = ?", (status, self.clock(), saga_id))
+
+    def claim_stale(self, owner: str, idle_seconds: float) -> List[Dict[str, Any]]:
+        """
+        Take over the sagas still running or committed that nobody has touched for
+        ``idle_seconds``, and drop finished sagas past their retention
+        """
+        now = self.clock()
+        with self._transaction() as db:
+            rows = db.execute("select saga_id, name, status, context from sagas "
+                              "where status in ('running', 'committed') and updated_at < ?",
+                              (now - idle_seconds,)).fetchall()
+            claimed = []
+            for saga_id, name, status, context in rows:
+                db.execute("update sagas set owner = ?, updated_at = ? where saga_id = ?", (owner, now, saga_id))
+                steps = db.execute("select step, status, result from saga_steps where saga_id = ? "
+                                   "order by updated_at", (saga_id,)).fetchall()
+                claimed.append({
+                    "saga_id": saga_id, "name": name, "status": status, "context": json.loads(context),
+                    "steps": [{"step": step, "status": step_status, "result": json.loads(result) if result else None}
+                              for step, step_status, result in steps],
+                })
+            expired = "select saga_id from sagas where status not in ('running', 'committed') and updated_at < ?"
+            db.execute(f"delete from saga_steps where saga_id in ({expired})", (now - RETENTION_SECONDS,))
+            db.execute("delete from sagas where status not in ('running', 'committed') and updated_at < ?",
+                       (now - RETENTION_SECONDS,))
+            return claimed
+
+    def get(self, saga_id: str) -> Optional[Dict[str, Any]]:
+        """A saga's status and its steps' statuses; inputs and results are left out"""
+        with self._transaction() as db:
+            saga = db.execute("select name, status, started_at, updated_at from sagas where saga_id = ?",
+                              (saga_id,)).fetchone()
+            if not saga:
+                return None
+            steps = db.execute("select step, status, error, updated_at from saga_steps where saga_id = ? "
+                               "order by updated_at", (saga_id,)).fetchall()
+        return {
+            "saga_id": saga_id, "name": saga[0], "status": saga[1], "started_at": saga[2], "updated_at": saga[3],
+            "steps": [{"step": step, "status": status, "error": error, "updated_at": updated_at}
+                      for step, status, error, updated_at in steps],
+        }
+
+
+class SagaRunner:
+    """Runs registered sagas against one log and keeps their background steps alive"""
+
+    def __init__(self, log: SagaLog, owner: Optional[str] = None, flush_seconds: float = FLUSH_SECONDS):
+        self.log = log
+        self.owner = owner or f"{socket.gethostname()}-{os.getpid()}"
+        self.flush_seconds = flush_seconds
+        self.sagas: Dict[str, Saga] = {}
+        self._background: Set[asyncio.Task] = set()
+        self._flusher: Optional[asyncio.Task] = None
+
+    def register(self, saga: Saga) -> Saga:
+        self.sagas[saga.name] = saga
+        return saga
+
+    async def _record(self, method: str, *args) -> None:
+        # Only queues the record; the flusher writes it out after the request has moved on
+        getattr(self.log, method)(*args)
+        loop = asyncio.get_running_loop()
+        flusher = self._flusher
+        if flusher is None or flusher.done() or flusher.get_loop() is not loop:
+            self._flusher = loop.create_task(self._flush_soon())
+
+    async def _flush_soon(self) -> None:
+        try:
+            await asyncio.sleep(self.flush_seconds)
+        finally:
+            # From here on (or once cancelled) a new record starts the next flusher
+            if self._flusher is asyncio.current_task():
+                self._flusher = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Write the queued log records now"""
+        # The log is a safety net: losing a write must not fail the workflow it describes
+        try:
+            await asyncio.to_thread(self.log.flush)
+        except Exception as e:
+            logger.error(f"Saga log flush failed: {e}")
+
+    async def run(self, name: str, context: Context) -> Tuple[str, Context]:
+        """
+        Run saga ``name``'s foreground steps on ``context`` and return (saga_id, context
+        with each step's result); the background steps are left running
+        """
+        saga = self.sagas[name]
+        saga_id = str(uuid.uuid4())
+        ctx = dict(context)
+        await self._record("begin", saga_id, name, self.owner, context)
+
+        finished: List[Step] = []
+        completed: Set[str] = set()
+        try:
+            await self._execute(saga_id, saga.foreground, ctx, completed, finished, stop_on_error=True)
+        except BaseException:
+            await self._compensate(saga, saga_id, ctx, finished)
+            raise
+
+        if saga.background:
+            await self._record("finish", saga_id, "committed")
+            self._spawn(saga, saga_id, ctx, completed)
+        else:
+            await self._record("finish", saga_id, "completed")
+        return saga_id, ctx
+
+    async def _run_step(self, saga_id: str, step: Step, ctx: Context) -> Tuple[bool, Any]:
+        if step.when is not None and not step.when(ctx):
+            await self._record("step", saga_id, step.name, "skipped")
+            return False, None
+        await self._record("step", saga_id, step.name, "running")
+        try:
+            result = await step.action(ctx)
+        except asyncio.CancelledError:
+            await self._record("step", saga_id, step.name, "cancelled")
+            raise
+        except Exception as e:
+            await self._record("step", saga_id, step.name, "failed", None, str(e) or type(e).__name__)
+            raise
+        await self._record("step", saga_id, step.name, "done", result)
+        return True, result
+
+    async def _execute(self, saga_id: str, steps: List[Step], ctx: Context, completed: Set[str],
+                       finished: List[Step], stop_on_error: bool) -> None:
+        """
+        Run ``steps`` as their dependencies complete. Finished steps are added to
+        ``completed`` (skipped ones too) and, if they ran, to ``finished`` in the order
+        they finished. With ``stop_on_error`` the first failure cancels the rest and
+        is raised; otherwise the steps after a failed one are skipped.
+        """
+        waiting = list(steps)
+        failed: Set[str] = set()
+        running: Dict[asyncio.Task, Step] = {}
+        try:
+            while waiting or running:
+                changed = True
+                while changed:
+                    changed = False
+                    for step in list(waiting):
+                        if failed.intersection(step.after):
+                            waiting.remove(step)
+                            failed.add(step.name)
+                            changed = True
+                            await self._record("step", saga_id, step.name, "skipped", None, "an earlier step failed")
+                        elif completed.issuperset(step.after):
+                            waiting.remove(step)
+                            running[asyncio.ensure_future(self._run_step(saga_id, step, ctx))] = step
+                if not running:
+                    if waiting:
+                        raise RuntimeError(f"Steps {[step.name for step in waiting]} of saga {saga_id} "
+                                           f"wait for steps that never ran")
+                    break
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                error = None
+                for task in done:
+                    step = running.pop(task)
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        failed.add(step.name)
+                        if not stop_on_error:
+                            logger.warning(f"Background step {step.name} of saga {saga_id} failed: {task.exception()}")
+                        continue
+                    ran, ctx[step.name] = task.result()
+                    completed.add(step.name)
+                    if ran:
+                        finished.append(step)
+                if error is not None and stop_on_error:
+                    raise error
+        finally:
+            if running:
+                for task in running:
+                    task.cancel()
+                outcomes = await asyncio.gather(*running, return_exceptions=True)
+                # A step that finished while the others were being cancelled still needs compensating
+                for step, outcome in zip(running.values(), outcomes):
+                    if not isinstance(outcome, BaseException):
+                        ran, ctx[step.name] = outcome
+                        completed.add(step.name)
+                        if ran:
+                            finished.append(step)
+
+    async def _compensate(self, saga: Saga, saga_id: str, ctx: Context, finished: List[Step]) -> None:
+        status = "compensated"
+        for step in reversed(finished):
+            if step.compensate is None:
+                continue
+            try:
+                await step.compensate(ctx)
+            except Exception as e:
+                logger.error(f"CRITICAL: Failed to compensate step {step.name} of {saga.name} saga {saga_id}: {e}")
+                await self._record("step", saga_id, step.name, "compensation_failed", None, str(e))
+                status = "compensation_failed"
+            else:
+                await self._record("step", saga_id, step.name, "compensated")
+        await self._record("finish", saga_id, status)
+
+    def _spawn(self, saga: Saga, saga_id: str, ctx: Context, completed: Set[str]) -> None:
+        task = asyncio.get_running_loop().create_task(self._run_background(saga, saga_id, ctx, completed))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _run_background(self, saga: Saga, saga_id: str, ctx: Context, completed: Set[str]) -> None:
+        steps = [step for step in saga.background if step.name not in completed]
+        # Cancelled at shutdown: the saga stays committed and recovery runs the rest
+        await self._execute(saga_id, steps, ctx, completed, [], stop_on_error=False)
+        await self._record("finish", saga_id, "completed")
+
+    async def drain(self, timeout: Optional[float] = DRAIN_SECONDS) -> None:
+        """
+        Wait for the background steps in flight, cancelling whatever is left after
+        ``timeout``, then write out the log
+        """
+        pending = set(self._background)
+        if pending:
+            _, unfinished = await asyncio.wait(pending, timeout=timeout)
+            for task in unfinished:
+                task.cancel()
+            if unfinished:
+                await asyncio.gather(*unfinished, return_exceptions=True)
+        await self.flush()
+
+    async def recover(self, idle_seconds: float = RECOVERY_AFTER_SECONDS) -> int:
+        """Finish the sagas left idle in the log; returns how many were taken over"""
+        claimed = await asyncio.to_thread(self.log.claim_stale, self.owner, idle_seconds)
+        for entry in claimed:
+            saga = self.sagas.get(entry["name"])
+            if saga is None:
+                logger.error(f"Cannot recover saga {entry['saga_id']}: no saga named {entry['name']} is registered")
+                continue
+
+            by_name = {step.name: step for step in saga.steps}
+            ctx = dict(entry["context"])
+            finished: List[Step] = []
+            completed: Set[str] = set()
+            for row in entry["steps"]:
+                if row["status"] in ("done", "skipped") and row["step"] in by_name:
+                    ctx[row["step"]] = row["result"]
+                    completed.add(row["step"])
+                    if row["status"] == "done":
+                        finished.append(by_name[row["step"]])
+
+            if entry["status"] == "running":
+                logger.warning(f"Compensating {saga.name} saga {entry['saga_id']} left unfinished")
+                await self._compensate(saga, entry["saga_id"], ctx, finished)
+            else:
+                logger.warning(f"Resuming background steps of {saga.name} saga {entry['saga_id']}")
+                self._spawn(saga, entry["saga_id"], ctx, completed)
+        return len(claimed)
+
+    async def recover_forever(self, idle_seconds: float = RECOVERY_AFTER_SECONDS) -> None:
+        """Recover idle sagas now and then every ``idle_seconds`` until cancelled"""
+        while True:
+            try:
+                await self.recover(idle_seconds)
+            except Exception as e:
+                logger.error(f"Error recovering sagas: {e}")
+            await asyncio.sleep(idle_seconds)
+
+    def status(self, saga_id: str) -> Optional[Dict[str, Any]]:
+        return self.log.get(saga_id)
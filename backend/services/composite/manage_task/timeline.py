@@ -0,0 +1,142 @@
+"""
+Task activity timeline for the manage-task composite service.
+
+Audit trail rows, chat messages and time entries each arrive newest first.
+They are merged lazily with a k-way heap merge, so building a page of N events
+costs O(N log k) heap operations for k sources. Only as many audit pages are
+fetched as that page needs.
+"""
+import base64
+import heapq
+import json
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+# Event type -> field holding the event's time
+TIMESTAMP_FIELDS = {
+    "audit": "timestamp",
+    "message": "timestamp",
+    "time_entry": "date",
+}
+
+_OLDEST = datetime.min.replace(tzinfo=timezone.utc)
+
+SortKey = Tuple[datetime, str]
+
+
+def _parse_timestamp(value: Any) -> datetime:
+    """Aware datetime for an ISO timestamp; unparseable values sort oldest"""
+    if not value:
+        return _OLDEST
+    try:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return _OLDEST
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def sort_key(kind: str, item: Dict[str, Any]) -> SortKey:
+    """(time, id): sources mix UTC and UTC+8 offsets, so compare parsed datetimes rather than strings"""
+    return _parse_timestamp(item.get(TIMESTAMP_FIELDS[kind])), str(item.get("id") or "")
+
+
+def to_event(kind: str, item: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": kind,
+        "id": item.get("id"),
+        "timestamp": item.get(TIMESTAMP_FIELDS[kind]),
+        "data": item,
+    }
+
+
+class _Newest:
+    """Heap entry that inverts ordering so heapq (a min-heap) pops the newest event first"""
+
+    __slots__ = ("key", "kind", "item")
+
+    def __init__(self, key: SortKey, kind: str, item: Dict[str, Any]):
+        self.key = key
+        self.kind = kind
+        self.item = item
+
+    def __lt__(self, other: "_Newest") -> bool:
+        return self.key > other.key
+
+
+async def newest_first(
+    items: Optional[List[Dict[str, Any]]],
+    kind: str,
+    before: Optional[SortKey] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    An append-ordered JSON array (messages, time_entries) walked backwards, so
+    it is already newest first. When resuming from a cursor only items older
+    than ``before`` are yielded.
+    """
+    for item in reversed(items or []):
+        if before is None or sort_key(kind, item) < before:
+            yield item
+
+
+async def merge_page(
+    sources: Dict[str, AsyncIterator[Dict[str, Any]]],
+    limit: int,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]], bool]:
+    """
+    Pop the ``limit`` newest events across newest-first ``sources``.
+
+    Returns the events, the last item emitted per source (for the cursor) and
+    whether any source still has events left.
+    """
+    heap: List[_Newest] = []
+
+    async def advance(kind: str) -> None:
+        try:
+            item = await sources[kind].__anext__()
+        except StopAsyncIteration:
+            return
+        heapq.heappush(heap, _Newest(sort_key(kind, item), kind, item))
+
+    for kind in sources:
+        await advance(kind)
+
+    events: List[Dict[str, Any]] = []
+    last_emitted: Dict[str, Dict[str, Any]] = {}
+    while heap and len(events) < limit:
+        entry = heapq.heappop(heap)
+        events.append(to_event(entry.kind, entry.item))
+        last_emitted[entry.kind] = entry.item
+        await advance(entry.kind)
+
+    return events, last_emitted, bool(heap)
+
+
+def encode_cursor(last_event: Dict[str, Any], last_audit: Optional[Dict[str, Any]]) -> str:
+    """
+    Everything newer than the last event has been returned. The last audit row
+    is kept separately so the audit trail can resume with its own keyset cursor.
+    """
+    key_time, key_id = sort_key(last_event["type"], last_event["data"])
+    state = {
+        "k": [key_time.isoformat(), key_id],
+        "a": [last_audit.get("timestamp"), last_audit.get("id")] if last_audit else None,
+    }
+    raw = json.dumps(state, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Tuple[Optional[SortKey], Optional[Dict[str, Any]]]:
+    """(sort key to resume before, last audit row seen); raises ValueError on a malformed cursor"""
+    if not cursor:
+        return None, None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        key_time, key_id = state["k"]
+        audit = state.get("a")
+        last_audit = {"timestamp": audit[0], "id": audit[1]} if audit else None
+        return (_parse_timestamp(key_time), str(key_id)), last_audit
+    except (ValueError, TypeError, KeyError, IndexError) as e:
+        raise ValueError(f"Invalid timeline cursor: {e}")
@@ -0,0 +1,136 @@
+"""
+Asyncio executor for the notify_user scheduler
+
+APScheduler's default executor runs each job on a 10-thread pool, and the
+deadline and recurring callbacks spend nearly all their time waiting on HTTP
+and Kafka acks. When many deadlines fall on the same minute (17:00 is common)
+the pool saturates, jobs wait past their misfire grace and are dropped.
+
+AsyncJobExecutor runs coroutine jobs on one event loop in its own thread
+instead, so a waiting job costs a coroutine rather than a thread:
+  - At most NOTIFY_JOB_CONCURRENCY jobs run at once; the rest wait in order.
+  - Jobs that waited past their misfire grace (NOTIFY_JOB_MISFIRE_GRACE_SECONDS,
+    set as the scheduler's job default) are reported missed rather than run late.
+  - ``queue_depth`` and ``running`` feed the scheduler_job_queue_depth and
+    scheduler_jobs_running gauges through ``on_load_change``, called after
+    every change.
+
+Code outside the loop (endpoints, the schedule-events consumer, the shard
+coordinator) runs the same coroutines through ``submit`` / ``run`` so they share
+the loop's HTTP client and concurrency limit.
+"""
+import asyncio
+import concurrent.futures
+import logging
+import os
+import sys
+import threading
+from typing import Any, Callable, Coroutine, Optional
+
+from apscheduler.executors.base import BaseExecutor, run_coroutine_job, run_job
+from apscheduler.util import iscoroutinefunction_partial
+
+logger = logging.getLogger(__name__)
+
+JOB_CONCURRENCY = int(os.getenv("NOTIFY_JOB_CONCURRENCY", "50"))
+MISFIRE_GRACE_SECONDS = int(os.getenv("NOTIFY_JOB_MISFIRE_GRACE_SECONDS", "3600"))
+
+
+class AsyncJobExecutor(BaseExecutor):
+    """Runs APScheduler jobs as coroutines on a dedicated event loop thread"""
+
+    def __init__(self, concurrency: int = JOB_CONCURRENCY):
+        super().__init__()
+        self.concurrency = concurrency
+        self.queue_depth = 0
+        self.running = 0
+        self.on_load_change: Optional[Callable[[], None]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._slots = asyncio.Semaphore(self.concurrency)
+                self._thread = threading.Thread(target=self._loop.run_forever, name="scheduler-jobs", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def start(self, scheduler, alias):
+        super().start(scheduler, alias)
+        self._ensure_loop()
+
+    def shutdown(self, wait=True):
+        loop, thread = self._loop, self._thread
+        if loop is None:
+            return
+        if wait and self._pending:
+            concurrent.futures.wait(list(self._pending), timeout=30)
+        for future in list(self._pending):
+            future.cancel()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+        loop.close()
+        with self._lock:
+            self._loop = self._thread = self._slots = None
+
+    def _load_changed(self) -> None:
+        if self.on_load_change is not None:
+            try:
+                self.on_load_change()
+            except Exception as e:
+                logger.debug(f"Executor load listener failed: {e}")
+
+    async def _limited(self, coro: Coroutine) -> Any:
+        self.queue_depth += 1
+        self._load_changed()
+        try:
+            await self._slots.acquire()
+        except BaseException:
+            self.queue_depth -= 1
+            self._load_changed()
+            coro.close()
+            raise
+        self.queue_depth -= 1
+        self.running += 1
+        self._load_changed()
+        try:
+            return await coro
+        finally:
+            self.running -= 1
+            self._slots.release()
+            self._load_changed()
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """Run a coroutine on the job loop, within the concurrency limit"""
+        future = asyncio.run_coroutine_threadsafe(self._limited(coro), self._ensure_loop())
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        return future
+
+    def run(self, coro: Coroutine) -> Any:
+        """Run a coroutine on the job loop and wait for its result; not callable from the loop itself"""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("AsyncJobExecutor.run() called from a job; await the coroutine instead")
+        return self.submit(coro).result()
+
+    def _do_submit_job(self, job, run_times):
+        def callback(future):
+            try:
+                events = future.result()
+            except BaseException:
+                self._run_job_error(job.id, *sys.exc_info()[1:])
+            else:
+                self._run_job_success(job.id, events)
+
+        if iscoroutinefunction_partial(job.func):
+            # Misfire grace is checked when the job gets a slot, so time spent queued counts against it
+            coro = run_coroutine_job(job, job._jobstore_alias, run_times, self._logger.name)
+        else:
+            coro = asyncio.to_thread(run_job, job, job._jobstore_alias, run_times, self._logger.name)
+        self.submit(coro).add_done_callback(callback)
@@ -1,14 +1,18 @@
 """
 Shared Kafka client utilities for SPM microservices using kafka-python
 """
+import asyncio
 import json
 import logging
-from typing import Dict, Any, Optional, Callable
-from kafka import KafkaProducer, KafkaConsumer
+import threading
+from typing import Dict, Any, List, Optional, Callable
+from kafka import KafkaProducer, KafkaConsumer, TopicPartition
 from kafka.errors import KafkaError
 import os
 from datetime import datetime
 import pytz
+from tracing import extract, kafka_headers, start_span
+from metrics import observe_consumer_lag
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,6 +21,22 @@ logger = logging.getLogger(__name__)
 # Define UTC+8 timezone (Singapore time)
 UTC_PLUS_8 = pytz.timezone('Asia/Singapore')
 
+# Fields that identify the entity an event is about, most specific first.
+# Events keyed by the same entity land on the same partition, so they are
+# consumed in the order they were published.
+PARTITION_KEY_FIELDS = ("tid", "task_id", "sid", "schedule_id", "pid", "project_id", "uid", "user_id")
+
+
+def partition_key(data: Dict[str, Any]) -> Optional[str]:
+    """Default message key for an event payload, or None when it names no entity"""
+    if not isinstance(data, dict):
+        return None
+    for field in PARTITION_KEY_FIELDS:
+        value = data.get(field)
+        if value:
+            return str(value)
+    return None
+
 class KafkaEventPublisher:
     """Kafka event publisher for sending events to topics"""
     
@@ -50,7 +70,8 @@ class KafkaEventPublisher:
             topic: Kafka topic name
             event_type: Type of event (e.g., 'task_created', 'user_updated')
             data: Event data payload
-            key: Optional message key for partitioning
+            key: Optional message key for partitioning; derived from the task,
+                 schedule, project or user id in data when omitted
             partition: Optional partition number
         """
         if not self.producer:
@@ -60,6 +81,9 @@ class KafkaEventPublisher:
                 logger.error("Failed to initialize producer")
                 return False
         
+        if key is None and partition is None:
+            key = partition_key(data)
+
         try:
             event = {
                 'event_type': event_type,
@@ -67,17 +91,20 @@ class KafkaEventPublisher:
                 'data': data
             }
             
-            future = self.producer.send(
-                topic, 
-                value=event, 
-                key=key,
-                partition=partition
-            )
-            
-            # Wait for the message to be sent
-            record_metadata = future.get(timeout=10)
+            with start_span(f"produce {topic}", "producer",
+                            {"messaging.system": "kafka", "messaging.destination": topic, "event_type": event_type}):
+                future = self.producer.send(
+                    topic, 
+                    value=event, 
+                    key=key,
+                    partition=partition,
+                    headers=kafka_headers()
+                )
+                
+                # Wait for the message to be sent
+                record_metadata = future.get(timeout=10)
             
-            logger.info(f"Event published to {topic}: {event_type} at partition {record_metadata.partition}")
+            logger.debug("Event published to %s: %s at partition %s", topic, event_type, record_metadata.partition)
             return True
             
         except KafkaError as e:
@@ -87,6 +114,64 @@ class KafkaEventPublisher:
             logger.error(f"Unexpected error publishing event: {e}")
             return False
     
+    async def publish_event_async(self, topic: str, event_type: str, data: Dict[str, Any],
+                                  key: Optional[str] = None, partition: Optional[int] = None) -> bool:
+        """
+        publish_event for coroutines: the broker ack is awaited instead of
+        blocking the thread on it, so one event loop can have many events in flight
+        """
+        if not self.producer:
+            logger.warning("Producer not initialized, attempting to connect...")
+            self._connect()
+            if not self.producer:
+                logger.error("Failed to initialize producer")
+                return False
+
+        if key is None and partition is None:
+            key = partition_key(data)
+
+        loop = asyncio.get_running_loop()
+        acked = loop.create_future()
+
+        def settle(metadata=None, error=None):
+            if acked.done():
+                return
+            if error is not None:
+                acked.set_exception(error)
+            else:
+                acked.set_result(metadata)
+
+        try:
+            event = {
+                'event_type': event_type,
+                'timestamp': datetime.now(UTC_PLUS_8).isoformat(),
+                'data': data
+            }
+
+            with start_span(f"produce {topic}", "producer",
+                            {"messaging.system": "kafka", "messaging.destination": topic, "event_type": event_type}):
+                future = self.producer.send(
+                    topic,
+                    value=event,
+                    key=key,
+                    partition=partition,
+                    headers=kafka_headers()
+                )
+                # The producer's I/O thread resolves the send; hand the result back to this loop
+                future.add_callback(lambda metadata: loop.call_soon_threadsafe(settle, metadata))
+                future.add_errback(lambda error: loop.call_soon_threadsafe(settle, None, error))
+                record_metadata = await asyncio.wait_for(acked, timeout=10)
+
+            logger.debug("Event published to %s: %s at partition %s", topic, event_type, record_metadata.partition)
+            return True
+
+        except KafkaError as e:
+            logger.error(f"Failed to publish event to {topic}: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"Unexpected error publishing event: {e}")
+            return False
+
     def close(self):
         """Close the producer connection"""
         if self.producer:
@@ -96,9 +181,10 @@ class KafkaEventPublisher:
 class KafkaEventConsumer:
     """Kafka event consumer for receiving events from topics"""
     
-    def __init__(self, bootstrap_servers: str = None, group_id: str = None):
+    def __init__(self, bootstrap_servers: str = None, group_id: str = None, join_group: bool = True):
         self.bootstrap_servers = bootstrap_servers or os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'kafka:9093')
-        self.group_id = group_id or os.getenv('KAFKA_GROUP_ID', 'spm-consumer-group')
+        # join_group=False: no group and no commits; partitions are taken with assign_all_partitions
+        self.group_id = (group_id or os.getenv('KAFKA_GROUP_ID', 'spm-consumer-group')) if join_group else None
         self.consumer = None
     
     def _connect(self):
@@ -110,7 +196,7 @@ class KafkaEventConsumer:
                 value_deserializer=lambda m: json.loads(m.decode('utf-8')),
                 key_deserializer=lambda k: k.decode('utf-8') if k else None,
                 auto_offset_reset='latest',
-                enable_auto_commit=True,
+                enable_auto_commit=self.group_id is not None,
                 auto_commit_interval_ms=1000,
                 consumer_timeout_ms=1000
             )
@@ -133,6 +219,31 @@ class KafkaEventConsumer:
             logger.error(f"Failed to subscribe to topics: {e}")
             return False
     
+    def assign_all_partitions(self, topic: str, at_end: bool = True) -> Optional[Dict[int, int]]:
+        """
+        Read every partition of a topic directly, outside any consumer group,
+        from the partitions' current end offsets (or their beginning)
+
+        Returns {partition: offset}, or None while the topic does not exist yet.
+        """
+        if not self.consumer:
+            logger.error("Consumer not initialized")
+            return None
+
+        partitions = self.consumer.partitions_for_topic(topic)
+        if not partitions:
+            return None
+        topic_partitions = [TopicPartition(topic, partition) for partition in sorted(partitions)]
+        self.consumer.assign(topic_partitions)
+        if at_end:
+            offsets = self.consumer.end_offsets(topic_partitions)
+        else:
+            offsets = self.consumer.beginning_offsets(topic_partitions)
+        for topic_partition, offset in offsets.items():
+            self.consumer.seek(topic_partition, offset)
+        logger.info(f"Assigned {len(offsets)} partition(s) of {topic}")
+        return {topic_partition.partition: offset for topic_partition, offset in offsets.items()}
+
     def consume_events(self, handler: Callable[[Dict[str, Any]], None], 
                       timeout_ms: int = 1000):
         """
@@ -150,8 +261,14 @@ class KafkaEventConsumer:
             for message in self.consumer:
                 try:
                     event = message.value
-                    logger.info(f"Received event: {event.get('event_type')} from {message.topic}")
-                    handler(event)
+                    logger.debug("Received event: %s from %s", event.get('event_type'), message.topic)
+                    # Continue the producer's trace so consumer work shows up under the originating request
+                    with start_span(f"consume {message.topic}", "consumer",
+                                    {"messaging.system": "kafka", "messaging.destination": message.topic,
+                                     "event_type": event.get('event_type')},
+                                    parent=extract(message.headers)):
+                        handler(event)
+                    observe_consumer_lag(self.consumer, message)
                 except Exception as e:
                     logger.error(f"Error processing message: {e}")
                             
@@ -160,6 +277,44 @@ class KafkaEventConsumer:
         except Exception as e:
             logger.error(f"Error consuming events: {e}")
     
+    def consume_batches(self, handler: Callable[[List[Dict[str, Any]]], None],
+                        timeout_ms: int = 1000, max_records: int = 500,
+                        stop: Optional[threading.Event] = None):
+        """
+        Consume events a poll at a time and call handler once per poll with the
+        events in offset order (per partition)
+
+        In a group, offsets are auto-committed on the following poll, after the
+        handler has returned, so a crash mid-batch replays the batch instead of
+        dropping it. Handlers must therefore be idempotent.
+
+        Args:
+            handler: Function to handle a list of events
+            timeout_ms: Polling timeout in milliseconds
+            max_records: Upper bound on events per batch
+            stop: Optional event that ends the loop once set
+        """
+        if not self.consumer:
+            logger.error("Consumer not initialized")
+            return
+
+        while stop is None or not stop.is_set():
+            try:
+                message_batch = self.consumer.poll(timeout_ms=timeout_ms, max_records=max_records)
+                if not message_batch:
+                    continue
+                messages = [message for records in message_batch.values() for message in records]
+                topic = messages[0].topic
+                with start_span(f"consume {topic}", "consumer",
+                                {"messaging.system": "kafka", "messaging.destination": topic,
+                                 "messaging.batch.message_count": len(messages)},
+                                parent=extract(messages[0].headers)):
+                    handler([message.value for message in messages])
+                for records in message_batch.values():
+                    observe_consumer_lag(self.consumer, records[-1])
+            except Exception as e:
+                logger.error(f"Error consuming event batch: {e}")
+
     def close(self):
         """Close the consumer connection"""
         if self.consumer:
@@ -204,6 +359,6 @@ class EventTypes:
 class Topics:
     # TASK_EVENTS = "task-events"
     # PROJECT_EVENTS = "project-events"
-    # SCHEDULE_EVENTS = "schedule-events"
+    SCHEDULE_EVENTS = "schedule-events"
     # USER_EVENTS = "user-events"
     NOTIFICATION_EVENTS = "notification-events"
\ No newline at end of file
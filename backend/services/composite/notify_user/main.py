@@ -3,8 +3,14 @@ from typing import Dict, Any
 from fastapi.responses import Response
 from recurring_processor import recurring_processor
 from schedule_client import ScheduleClient
+from schedule_events import ScheduleEventConsumer
+from tracing import init_tracing, instrument_app
+from metrics import init_metrics
+from logging_config import setup_logging
+from auth_middleware import install_auth
 import uvicorn
-from datetime import datetime, timezone, timedelta
+import asyncio
+from datetime import datetime, timezone
 from contextlib import asynccontextmanager
 import logging
 import pytz
@@ -16,7 +22,7 @@ logger = logging.getLogger(__name__)
 # Define UTC+8 timezone (Singapore time)
 UTC_PLUS_8 = pytz.timezone('Asia/Singapore')
 
-async def process_overdue_tasks(all_schedules: list):
+async def process_overdue_tasks():
     """Process any overdue tasks - used for both startup and manual triggers"""
     try:
         logger.info("🔍 Checking for overdue tasks...")
@@ -27,88 +33,121 @@ async def process_overdue_tasks(all_schedules: list):
             logger.error("Failed to initialize Kafka for overdue task processing")
             return
         
+        # Only schedules already past their deadline and not yet processed, from the deadline index
         current_time = datetime.now(UTC_PLUS_8)
-        overdue_count = 0
-        processed_count = 0
+        overdue = schedule_client.fetch_due_schedules(
+            before=current_time.isoformat(), status_not=["overdue", "completed", "cancelled"]
+        )
+        # In sharded mode each process handles the schedules of its own shards
+        overdue_sids = [schedule["sid"] for schedule in overdue
+                        if schedule.get("sid") and recurring_processor.owns(schedule["sid"])]
+        for sid in overdue_sids:
+            logger.warning(f"🚨 Found overdue task {sid}")
         
-        for schedule in all_schedules:
-            deadline_str = schedule.get("deadline")
-            status = schedule.get("status", "").lower()
-            sid = schedule.get("sid")
-            
-            # Skip if no deadline, no sid, or already processed
-            if not deadline_str or not sid or status in ["overdue", "completed", "cancelled"]:
-                continue
-            
-            try:
-                deadline_dt = datetime.fromisoformat(deadline_str.replace('Z', '+00:00'))
-                # Ensure deadline is in UTC+8 timezone
-                if deadline_dt.tzinfo is None:
-                    deadline_dt = UTC_PLUS_8.localize(deadline_dt)
+        overdue_count = len(overdue_sids)
+        processed_count = 0
+        if overdue_sids:
+            # Mark every overdue schedule in one batch write, then notify per schedule
+            marked = {row.get("sid") for row in schedule_client.update_schedules(overdue_sids, {"status": "overdue"})}
+            for sid in overdue_sids:
+                if sid not in marked:
+                    logger.error(f"❌ Failed to mark task {sid} overdue")
+            notify_sids = [sid for sid in overdue_sids if sid in marked]
+            # Notifications run on the scheduler's job loop, as many at once as its concurrency allows
+            results = await asyncio.gather(*(
+                asyncio.wrap_future(recurring_processor.executor.submit(
+                    recurring_processor.process_deadline_reached(sid, mark_overdue=False)
+                ))
+                for sid in notify_sids
+            ))
+            for sid, processed in zip(notify_sids, results):
+                if processed:
+                    processed_count += 1
+                    logger.info(f"✅ Processed overdue task {sid}")
                 else:
-                    deadline_dt = deadline_dt.astimezone(UTC_PLUS_8)
-                
-                if deadline_dt < current_time:
-                    overdue_count += 1
-                    logger.warning(f"🚨 Found overdue task {sid}")
-                    
-                    success = recurring_processor.process_deadline_reached(sid)
-                    if success:
-                        processed_count += 1
-                        logger.info(f"✅ Processed overdue task {sid}")
-                    else:
-                        logger.error(f"❌ Failed to process overdue task {sid}")
-                        
-            except Exception as e:
-                logger.error(f"Error processing overdue task {sid}: {str(e)}")
-                continue
+                    logger.error(f"❌ Failed to process overdue task {sid}")
         
         logger.info(f"📊 Overdue processing complete: {processed_count}/{overdue_count} tasks processed")
         
     except Exception as e:
         logger.error(f"Error during overdue task processing: {str(e)}")
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Lifespan event handler for startup and shutdown"""
-    # Startup
+# Progress of the startup load, reported by GET /ready
+startup = {"status": "loading", "schedules": 0, "jobs": 0}
+
+def arm_streamed_schedules():
+    """Arm each schedule's timers as the schedule stream delivers it"""
+    for schedule in schedule_client.iter_all_schedules():
+        startup["jobs"] += recurring_processor.arm_schedules([schedule])
+        startup["schedules"] += 1
+
+async def load_schedules(schedule_events: ScheduleEventConsumer):
+    """Arm every schedule's timers, then follow schedule changes; runs while the app already serves requests"""
+    # Mark the end of schedule-events first, so changes made while loading are applied afterwards
+    await asyncio.to_thread(schedule_events.position)
     try:
-        
-        all_schedules = schedule_client.fetch_all_schedules()
-        # Process overdue tasks first
-        await process_overdue_tasks(all_schedules)
-        
-        # Initialize normal scheduling
-        logger.info("🔄 Initializing normal task scheduling...")
-        
-        scheduled_count = 0
-        for schedule in all_schedules:
-            is_recurring = schedule.get("is_recurring")
-            if is_recurring and schedule.get("next_occurrence") and schedule.get("frequency"):
-                recurring_processor.schedule_recurring_task(schedule)
-                scheduled_count += 1
-            if schedule.get("deadline"):
-                recurring_processor.schedule_deadline_monitoring(schedule)
-                scheduled_count += 1
-        
-        logger.info(f"✅ Initialized {scheduled_count} schedules on startup")
+        if recurring_processor.coordinator:
+            # Sharded mode: arming timers and catching up on overdue deadlines happen
+            # per shard, as this process takes its shards and whenever membership changes
+            recurring_processor.initialize_kafka()
+            await asyncio.to_thread(recurring_processor.coordinator.start)
+            logger.info(f"✅ Scheduler {recurring_processor.coordinator.member_id} holds "
+                        f"{len(recurring_processor.coordinator.owned)} shard(s) on startup")
+        else:
+            # Process overdue tasks first
+            await process_overdue_tasks()
+            
+            # Initialize normal scheduling, a row at a time off the stream
+            logger.info("🔄 Initializing normal task scheduling...")
+            await asyncio.to_thread(arm_streamed_schedules)
+            logger.info(f"✅ Initialized {startup['jobs']} jobs for {startup['schedules']} schedules on startup")
+        startup["status"] = "ready"
         
     except Exception as e:
+        startup["status"] = "failed"
         logger.error(f"❌ Error initializing schedules: {str(e)}")
     
+    # Keep timers in step with schedule changes from here on
+    schedule_events.start()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Lifespan event handler for startup and shutdown"""
+    # Startup: load in the background; GET /ready turns 200 once every schedule is armed
+    schedule_events = ScheduleEventConsumer(recurring_processor)
+    loading = asyncio.create_task(load_schedules(schedule_events))
+    
     yield  # This is where the app runs
     
     # Shutdown
+    loading.cancel()
+    schedule_events.stop()
     logger.info("🛑 Shutting down recurring processor...")
     recurring_processor.shutdown()
 
 app = FastAPI(title="Composite Microservice: Notify User Service", lifespan=lifespan)
+
+# Trace requests and outgoing calls (spans are exported when TRACE_EXPORT_DIR is set),
+# and expose latency histograms derived from those spans on GET /metrics
+init_tracing("notify-user")
+instrument_app(app)
+init_metrics(app)
+setup_logging("notify-user", app)
+install_auth(app)
+
 schedule_client = ScheduleClient()
 
 @app.get("/")
 def read_root():
     return {"message": "Notify User Service is running 🚀😌"}
 
+@app.get("/ready")
+def readiness():
+    """200 once the startup load has armed every schedule's timers, 503 while it is still running or failed"""
+    if startup["status"] != "ready":
+        raise HTTPException(status_code=503, detail=f"Schedules {startup['status']}: {startup['schedules']} armed so far")
+    return startup
+
 # @app.get("/health")
 # def health_check():
 #     """Health check endpoint for service monitoring"""
@@ -148,7 +187,7 @@ def get_scheduled_jobs():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching scheduled jobs: {str(e)}")
 
-# Endpoint for schedule service to notify about new recurring tasks
+# Schedule one task's jobs by hand; the schedule service itself now sends schedule-events
 @app.post("/schedule/update")
 def schedule_new_recurring_task(task_data: Dict[str, Any] = Body(...)):
     """Schedule a new recurring task when notified by the schedule service"""
@@ -200,7 +239,7 @@ def schedule_new_recurring_task(task_data: Dict[str, Any] = Body(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error scheduling recurring task or deadline monitoring: {str(e)}")
 
-# Endpoint for schedule service to notify about cron job updates
+# Re-sync one task's jobs by hand; the schedule service itself now sends schedule-events
 @app.post("/task/recurring/update")
 def update_recurring_task(task_data: Dict[str, Any] = Body(...)):
     """Update a recurring task's cron job when notified by the schedule service"""
@@ -238,26 +277,7 @@ def update_recurring_task(task_data: Dict[str, Any] = Body(...)):
             deadline_success = recurring_processor.schedule_deadline_monitoring(task_data)
             
             # Check if deadline needs immediate processing (overdue or within 3 days)
-            try:
-                deadline_dt = datetime.fromisoformat(deadline.replace('Z', '+00:00'))
-                if deadline_dt.tzinfo is None:
-                    deadline_dt = UTC_PLUS_8.localize(deadline_dt)
-                else:
-                    deadline_dt = deadline_dt.astimezone(UTC_PLUS_8)
-                
-                current_time = datetime.now(UTC_PLUS_8)
-                approaching_dt = deadline_dt - timedelta(days=3)
-                
-                # If deadline is already past, immediately process overdue notification
-                if deadline_dt < current_time:
-                    logger.info(f"Deadline {deadline} is already overdue, immediately processing...")
-                    recurring_processor.process_deadline_reached(sid)
-                # If we're within the 3-day window (approaching notification time has passed), trigger it now
-                elif approaching_dt <= current_time < deadline_dt:
-                    logger.info(f"Deadline {deadline} is within 3 days, immediately processing approaching notification...")
-                    recurring_processor.process_deadline_approaching(sid)
-            except Exception as e:
-                logger.error(f"Error checking if deadline needs immediate processing: {str(e)}")
+            recurring_processor.process_deadline_if_due(sid, deadline)
         
         # Build response
         response = {
@@ -327,8 +347,7 @@ async def process_overdue_tasks_manual():
     """Manually trigger overdue task processing"""
     try:
         logger.info("🔄 Manual overdue task processing triggered")
-        all_schedules = schedule_client.fetch_all_schedules()
-        await process_overdue_tasks(all_schedules)
+        await process_overdue_tasks()
         return {
             "message": "Overdue task processing completed",
             "status": "success"
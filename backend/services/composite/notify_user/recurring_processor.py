@@ -2,12 +2,16 @@ from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.date import DateTrigger
-from dateutil.relativedelta import relativedelta
-from schedule_client import ScheduleClient
+from schedule_client import AsyncScheduleClient, ScheduleClient
+import asyncio
+import concurrent.futures
 import logging
 import pytz
-import requests
+import recurrence
+from async_jobs import AsyncJobExecutor, MISFIRE_GRACE_SECONDS
 from kafka_client import EventTypes, KafkaEventPublisher, Topics
+from metrics import instrument_executor, instrument_scheduler
+from sharding import LeaseStore, ShardCoordinator, shard_of, sharded_mode
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,13 +20,83 @@ logger = logging.getLogger(__name__)
 # Define UTC+8 timezone (Singapore time)
 UTC_PLUS_8 = pytz.timezone('Asia/Singapore')
 
+# Statuses whose deadline notifications have already gone out or no longer apply
+SETTLED_STATUSES = ["overdue", "completed", "cancelled"]
+
 class RecurringTaskProcessor:
-    def __init__(self):
-        self.scheduler = BackgroundScheduler(timezone=UTC_PLUS_8)
+    def __init__(self, sharded: bool = False):
+        # Job callbacks are coroutines, run on one event loop with bounded concurrency (see async_jobs.py)
+        self.executor = AsyncJobExecutor()
+        self.scheduler = BackgroundScheduler(
+            timezone=UTC_PLUS_8,
+            executors={"default": self.executor},
+            job_defaults={"misfire_grace_time": MISFIRE_GRACE_SECONDS, "coalesce": True},
+        )
         self.schedule_client = ScheduleClient()
+        self.async_client = AsyncScheduleClient()
         self.kafka_publisher = KafkaEventPublisher()
+        # Sharded mode: this process only arms and fires the schedules in its shards (see sharding.py)
+        self.coordinator = ShardCoordinator(
+            LeaseStore(), on_gained=self.load_shards, on_lost=self.drop_shards
+        ) if sharded else None
+        instrument_scheduler(self.scheduler)
+        instrument_executor(self.executor)
         self.scheduler.start()
         logger.info("RecurringTaskProcessor initialized and scheduler started with UTC+8 timezone")
+
+    def owns(self, sid: str) -> bool:
+        """Whether this process arms and fires the timers of schedule ``sid``"""
+        return self.coordinator is None or self.coordinator.owns(sid)
+
+    async def fire_once_async(self, kind: str, sid: str, due: Optional[str]) -> bool:
+        """fire_once for the job coroutines; the lease store is SQLite, so it runs off the loop"""
+        if self.coordinator is None:
+            return True
+        return await asyncio.to_thread(self.fire_once, kind, sid, due)
+
+    def fire_once(self, kind: str, sid: str, due: Optional[str]) -> bool:
+        """
+        Fence a timer about to fire: in sharded mode only the shard's lease holder
+        may fire it, and only once per due time across all processes
+        """
+        if self.coordinator is None:
+            return True
+        if self.coordinator.fire_once(f"{kind}:{sid}:{due}", sid):
+            return True
+        logger.info(f"Skipping {kind} for {sid} due {due}: fired elsewhere or shard no longer held")
+        return False
+
+    def arm_schedules(self, schedules) -> int:
+        """Arm the recurring and deadline jobs of these schedules; returns how many jobs"""
+        scheduled_count = 0
+        for schedule in schedules:
+            is_recurring = schedule.get("is_recurring")
+            if is_recurring and schedule.get("next_occurrence") and schedule.get("frequency"):
+                self.schedule_recurring_task(schedule)
+                scheduled_count += 1
+            if schedule.get("deadline"):
+                self.schedule_deadline_monitoring(schedule)
+                scheduled_count += 1
+        return scheduled_count
+
+    def load_shards(self, shards) -> None:
+        """Arm the timers of schedules in newly owned shards and catch up on deadlines missed in the hand-over"""
+        in_shards = lambda schedule: schedule.get("sid") and shard_of(schedule["sid"], self.coordinator.shards) in shards
+        armed = self.arm_schedules(filter(in_shards, self.schedule_client.iter_all_schedules()))
+        logger.info(f"Armed {armed} job(s) for {len(shards)} gained shard(s)")
+
+        # A deadline that passed while the shard had no holder has no timer left to fire it
+        missed = self.schedule_client.fetch_due_schedules(
+            before=datetime.now(UTC_PLUS_8).isoformat(), status_not=SETTLED_STATUSES
+        )
+        concurrent.futures.wait([self.executor.submit(self.process_deadline_reached(schedule["sid"]))
+                                 for schedule in filter(in_shards, missed)])
+
+    def drop_shards(self, shards) -> None:
+        """Remove the jobs of schedules in shards this process no longer owns"""
+        for job in self.scheduler.get_jobs():
+            if job.args and shard_of(job.args[0], self.coordinator.shards) in shards:
+                job.remove()
     
     def initialize_kafka(self):
         """
@@ -40,49 +114,18 @@ class RecurringTaskProcessor:
         """
         Calculate the next occurrence based on frequency and the gap between start and deadline
         """
-        # Ensure both datetimes are in UTC+8 timezone
-        if current_start.tzinfo is None:
-            current_start = UTC_PLUS_8.localize(current_start)
-        else:
-            current_start = current_start.astimezone(UTC_PLUS_8)
-            
-        if current_deadline.tzinfo is None:
-            current_deadline = UTC_PLUS_8.localize(current_deadline)
-        else:
-            current_deadline = current_deadline.astimezone(UTC_PLUS_8)
-        
-        # Calculate the gap between start and deadline
-        gap = current_deadline - current_start
-        
-        if frequency == "Weekly":
-            # Add 1 week to the current start time
-            next_start = current_start + timedelta(weeks=1)
-            return next_start + gap
-            
-        elif frequency == "Monthly":
-            # Add 1 month to the current start time using relativedelta to handle day overflow
-            next_start = current_start + relativedelta(months=1)
-            return next_start + gap
-            
-        elif frequency == "Yearly":
-            # Add 1 year to the current start time using relativedelta
-            next_start = current_start + relativedelta(years=1)
-            return next_start + gap
-            
-        elif frequency == "Immediate":
-            # For immediate, create the next occurrence right after the current deadline
-            return current_deadline + timedelta(minutes=1)
-            
-        else:
-            raise ValueError(f"Unsupported frequency: {frequency}")
+        # Same arithmetic the schedule service uses to expand future occurrences
+        return recurrence.next_start(frequency, current_start, current_deadline)
 
-    def create_recurring_entry(self, original_entry: Dict[str, Any], frequency: str) -> Optional[Dict[str, Any]]:
+    async def rollover_entry(self, original_entry: Dict[str, Any], frequency: str) -> Optional[Dict[str, Any]]:
         """
-        Create a new recurring entry based on the original entry and frequency
+        Complete the original entry and create the next one based on frequency, in one
+        schedule service call. Returns the rollover result (previous and new rows, task
+        name and participants of the new row), or None on failure.
         """
         try:
             # Parse the original entry data
-            tid = original_entry["tid"]
+            sid = original_entry["sid"]
             original_start = datetime.fromisoformat(original_entry["start"].replace('Z', '+00:00'))
             original_deadline = datetime.fromisoformat(original_entry["deadline"].replace('Z', '+00:00'))
             
@@ -93,22 +136,18 @@ class RecurringTaskProcessor:
             # Calculate next occurrence for the new entry
             next_occurrence = self.calculate_next_occurrence(frequency, new_start, new_deadline)
             
-            # Create new schedule entry via schedule service
-            new_entry = self.schedule_client.create_schedule(
-                tid=tid,
+            result = await self.async_client.rollover_schedule(
+                sid,
                 start=new_start.isoformat(),
                 deadline=new_deadline.isoformat(),
-                is_recurring=True,
-                status="ongoing",
                 next_occurrence=next_occurrence.isoformat(),
-                frequency=frequency
             )
-            
-            logger.info(f"Created new recurring entry for task {tid} with frequency {frequency}")
-            return new_entry
+            if result:
+                logger.info(f"Rolled over recurring entry {sid} for task {original_entry.get('tid')} with frequency {frequency}")
+            return result
             
         except Exception as e:
-            logger.error(f"Error creating recurring entry: {str(e)}")
+            logger.error(f"Error rolling over recurring entry: {str(e)}")
             return None
 
     def schedule_recurring_task(self, task_data: Dict[str, Any]):
@@ -124,6 +163,10 @@ class RecurringTaskProcessor:
                 logger.error(f"Missing required fields for task {sid}")
                 return False
             
+            if not self.owns(sid):
+                logger.debug(f"Recurring task {sid} belongs to another scheduler shard")
+                return True
+            
             # Parse the next occurrence datetime
             next_occurrence_dt = datetime.fromisoformat(next_occurrence_str.replace('Z', '+00:00'))
             
@@ -156,6 +199,10 @@ class RecurringTaskProcessor:
                 logger.error(f"Missing required fields for deadline monitoring {sid}")
                 return False
             
+            if not self.owns(sid):
+                logger.debug(f"Deadline monitoring for {sid} belongs to another scheduler shard")
+                return True
+            
             # Parse the deadline datetime and ensure it's in UTC+8
             deadline_dt = datetime.fromisoformat(deadline_str.replace('Z', '+00:00'))
             if deadline_dt.tzinfo is None:
@@ -199,7 +246,58 @@ class RecurringTaskProcessor:
             logger.error(f"Error scheduling deadline monitoring for {sid}: {str(e)}")
             return False
 
-    def process_deadline_approaching(self, sid: str):
+    def sync_schedule_jobs(self, schedule: Dict[str, Any]) -> bool:
+        """
+        Make the recurring and deadline jobs for a schedule match the row, adding
+        or replacing what it needs and cancelling what it no longer does. Job ids
+        come from the sid and replace existing ones, so syncing the same row
+        twice leaves the same jobs.
+        """
+        sid = schedule.get("sid")
+        recurring_success = True
+        deadline_success = True
+
+        if schedule.get("is_recurring") and schedule.get("frequency") and schedule.get("next_occurrence"):
+            recurring_success = self.schedule_recurring_task(schedule)
+        else:
+            self.cancel_recurring_task(sid)
+
+        # Cancel first: a deadline moved inside the 3-day window no longer gets an approaching job
+        self.cancel_deadline_monitoring(sid)
+        if schedule.get("deadline"):
+            deadline_success = self.schedule_deadline_monitoring(schedule)
+
+        return bool(recurring_success and deadline_success)
+
+    def process_deadline_if_due(self, sid: str, deadline_str: str) -> bool:
+        """
+        Send deadline notifications straight away when a changed deadline is
+        already past or less than 3 days off, since those jobs would never fire
+        """
+        try:
+            deadline_dt = datetime.fromisoformat(deadline_str.replace('Z', '+00:00'))
+            if deadline_dt.tzinfo is None:
+                deadline_dt = UTC_PLUS_8.localize(deadline_dt)
+            else:
+                deadline_dt = deadline_dt.astimezone(UTC_PLUS_8)
+
+            current_time = datetime.now(UTC_PLUS_8)
+            approaching_dt = deadline_dt - timedelta(days=3)
+
+            # If deadline is already past, immediately process overdue notification
+            if deadline_dt < current_time:
+                logger.info(f"Deadline {deadline_str} is already overdue, immediately processing...")
+                return self.executor.run(self.process_deadline_reached(sid))
+            # If we're within the 3-day window (approaching notification time has passed), trigger it now
+            if approaching_dt <= current_time:
+                logger.info(f"Deadline {deadline_str} is within 3 days, immediately processing approaching notification...")
+                return self.executor.run(self.process_deadline_approaching(sid))
+            return True
+        except Exception as e:
+            logger.error(f"Error checking if deadline needs immediate processing: {str(e)}")
+            return False
+
+    async def process_deadline_approaching(self, sid: str):
         """
         Process when a task deadline is approaching (3 days before) - broadcast to Kafka
         """
@@ -207,25 +305,18 @@ class RecurringTaskProcessor:
             logger.info(f"Processing deadline approaching for task {sid}")
             
             # Get the current schedule entry
-            current_entry = self.schedule_client.fetch_schedule_by_sid(sid)
+            current_entry = await self.async_client.fetch_schedule_by_sid(sid)
             if not current_entry:
                 logger.error(f"Schedule entry {sid} not found for deadline approaching processing")
                 return False
+            if not await self.fire_once_async("deadline_approaching", sid, current_entry.get("deadline")):
+                return False
             
-            logger.info(f"Current schedule entry for {sid}: {current_entry}")
+            logger.debug("Current schedule entry for %s: %s", sid, current_entry)
             
             # Get task name from task service
-            task_name = "Unknown Task"
             tid = current_entry.get("tid")
-            if tid:
-                try:
-                    task_response = requests.get(f"{self.schedule_client.task_service_url}/tid/{tid}", timeout=5)
-                    if task_response.status_code == 200:
-                        task_data = task_response.json().get("task", {})
-                        task_name = task_data.get("name", "Unknown Task")
-                        logger.info(f"Fetched task name for {tid}: {task_name}")
-                except Exception as e:
-                    logger.warning(f"Could not fetch task name for {tid}: {e}")
+            task_name = (await self.async_client.fetch_task_name(tid) if tid else None) or "Unknown Task"
             
             # Broadcast deadline approaching event to Kafka
             event_data = {
@@ -238,54 +329,50 @@ class RecurringTaskProcessor:
             }
             
             # Call sid and then task to get the user info
-            user_info = self.schedule_client.get_user_info(sid)
+            user_info = await self.async_client.get_user_info(sid)
             if not user_info:
                 logger.error(f"Task info not found for {sid}")
                 return False
             
-            # Broadcast events synchronously
-            return self._broadcast_deadline_approaching_events(user_info, event_data)
+            return await self._broadcast_deadline_approaching_events(user_info, event_data)
                 
         except Exception as e:
             logger.error(f"Error processing deadline approaching for {sid}: {str(e)}")
             return False
 
-    def process_deadline_reached(self, sid: str):
+    async def process_deadline_reached(self, sid: str, mark_overdue: bool = True):
         """
         Process when a task deadline is reached - broadcast to Kafka and update status
+
+        mark_overdue=False skips the status update for callers that already marked
+        a whole batch overdue in one call
         """
         try:
             logger.info(f"Processing deadline reached for task {sid}")
             
             # Get the current schedule entry
-            current_entry = self.schedule_client.fetch_schedule_by_sid(sid)
+            current_entry = await self.async_client.fetch_schedule_by_sid(sid)
             if not current_entry:
                 logger.error(f"Schedule entry {sid} not found for deadline processing")
                 return False
+            if not await self.fire_once_async("deadline", sid, current_entry.get("deadline")):
+                return False
             
-            logger.info(f"Current schedule entry for {sid}: {current_entry}")
+            logger.debug("Current schedule entry for %s: %s", sid, current_entry)
             
             # Update task status to "overdue" via schedule service
-            logger.info(f"Attempting to update schedule {sid} status to 'overdue'")
-            update_success = self.schedule_client.update_schedule(sid, {"status": "overdue"})
-            logger.info(f"Schedule update result for {sid}: {update_success}")
-            
-            if not update_success:
-                logger.error(f"Failed to update task status to overdue for {sid}")
-                return False
+            if mark_overdue:
+                logger.info(f"Attempting to update schedule {sid} status to 'overdue'")
+                update_success = await self.async_client.update_schedule(sid, {"status": "overdue"})
+                logger.info(f"Schedule update result for {sid}: {update_success}")
+                
+                if not update_success:
+                    logger.error(f"Failed to update task status to overdue for {sid}")
+                    return False
             
             # Get task name from task service
-            task_name = "Unknown Task"
             tid = current_entry.get("tid")
-            if tid:
-                try:
-                    task_response = requests.get(f"{self.schedule_client.task_service_url}/tid/{tid}", timeout=5)
-                    if task_response.status_code == 200:
-                        task_data = task_response.json().get("task", {})
-                        task_name = task_data.get("name", "Unknown Task")
-                        logger.info(f"Fetched task name for {tid}: {task_name}")
-                except Exception as e:
-                    logger.warning(f"Could not fetch task name for {tid}: {e}")
+            task_name = (await self.async_client.fetch_task_name(tid) if tid else None) or "Unknown Task"
             
             # Broadcast deadline overdue event to Kafka
             event_data = {
@@ -298,154 +385,79 @@ class RecurringTaskProcessor:
             }
             
             # Call sid and then task to get the user info
-            user_info = self.schedule_client.get_user_info(sid)
+            user_info = await self.async_client.get_user_info(sid)
             if not user_info:
                 logger.error(f"Task info not found for {sid}")
                 return False
             
-            # Broadcast events synchronously
-            return self._broadcast_deadline_events(user_info, event_data)
+            return await self._broadcast_deadline_events(user_info, event_data)
                 
         except Exception as e:
             logger.error(f"Error processing deadline reached for {sid}: {str(e)}")
             return False
 
-    def _broadcast_deadline_approaching_events(self, user_info, event_data) -> bool:
+    async def _broadcast(self, user_info, event_data, event_type: str, label: str) -> bool:
         """
-        Broadcast deadline approaching events to all users synchronously
+        Publish one event per user, all in flight at once, and report whether every one was acked
         """
         try:
             # Ensure Kafka producer is connected
             if not self.kafka_publisher.producer:
                 self.kafka_publisher._connect()
             
-            # Send events to all users
-            failed_count = 0
-            success_count = 0
-            
-            for user in user_info:
-                local_event_data = event_data.copy()
-                local_event_data["uid"] = user.get("user_id")
-                local_event_data["name"] = user.get("user_name")
-                local_event_data["email"] = user.get("user_email")
-                local_event_data["role"] = user.get("user_role")
-                local_event_data["department"] = user.get("department")
-                
-                # Publish event synchronously
-                success = self.kafka_publisher.publish_event(
+            users = list(user_info)
+            results = await asyncio.gather(*(
+                self.kafka_publisher.publish_event_async(
                     topic=Topics.NOTIFICATION_EVENTS,
-                    event_type=EventTypes.DEADLINE_APPROACHING,
-                    data=local_event_data,
+                    event_type=event_type,
+                    data={
+                        **event_data,
+                        "uid": user.get("user_id"),
+                        "name": user.get("user_name"),
+                        "email": user.get("user_email"),
+                        "role": user.get("user_role"),
+                        "department": user.get("department"),
+                    },
                 )
-                
-                if success:
-                    success_count += 1
-                else:
+                for user in users
+            ))
+            
+            failed_count = 0
+            for user, success in zip(users, results):
+                if not success:
                     failed_count += 1
-                    logger.error(f"Failed to broadcast deadline approaching event for user {user.get('user_id')}")
+                    logger.error(f"Failed to broadcast {label} event for user {user.get('user_id')}")
             
             if failed_count > 0:
-                logger.error(f"Failed to broadcast {failed_count} out of {len(user_info)} deadline approaching events")
+                logger.error(f"Failed to broadcast {failed_count} out of {len(users)} {label} events")
                 return False
             
-            logger.info(f"Successfully broadcasted deadline approaching events for {success_count} users")
+            logger.info(f"Successfully broadcasted {label} events for {len(users)} users")
             return True
             
         except Exception as e:
-            logger.error(f"Error broadcasting deadline approaching events: {str(e)}")
+            logger.error(f"Error broadcasting {label} events: {str(e)}")
             return False
 
-    def _broadcast_deadline_events(self, user_info, event_data) -> bool:
+    async def _broadcast_deadline_approaching_events(self, user_info, event_data) -> bool:
         """
-        Broadcast deadline overdue events to all users synchronously
+        Broadcast deadline approaching events to all users
         """
-        try:
-            # Ensure Kafka producer is connected
-            if not self.kafka_publisher.producer:
-                self.kafka_publisher._connect()
-            
-            # Send events to all users
-            failed_count = 0
-            success_count = 0
-            
-            for user in user_info:
-                local_event_data = event_data.copy()
-                local_event_data["uid"] = user.get("user_id")
-                local_event_data["name"] = user.get("user_name")
-                local_event_data["email"] = user.get("user_email")
-                local_event_data["role"] = user.get("user_role")
-                local_event_data["department"] = user.get("department")
-                
-                # Publish event synchronously
-                success = self.kafka_publisher.publish_event(
-                    topic=Topics.NOTIFICATION_EVENTS,
-                    event_type=EventTypes.DEADLINE_OVERDUE,
-                    data=local_event_data,
-                )
-                
-                if success:
-                    success_count += 1
-                else:
-                    failed_count += 1
-                    logger.error(f"Failed to broadcast deadline overdue event for user {user.get('user_id')}")
-            
-            if failed_count > 0:
-                logger.error(f"Failed to broadcast {failed_count} out of {len(user_info)} deadline overdue events")
-                return False
-            
-            logger.info(f"Successfully broadcasted deadline overdue events for {success_count} users")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error broadcasting deadline events: {str(e)}")
-            return False
+        return await self._broadcast(user_info, event_data, EventTypes.DEADLINE_APPROACHING, "deadline approaching")
 
-    def _broadcast_recurring_task_reset_events(self, user_info, event_data) -> bool:
+    async def _broadcast_deadline_events(self, user_info, event_data) -> bool:
         """
-        Broadcast recurring task reset events to all users synchronously
+        Broadcast deadline overdue events to all users
         """
-        try:
-            # Ensure Kafka producer is connected
-            if not self.kafka_publisher.producer:
-                self.kafka_publisher._connect()
-            
-            # Send events to all users
-            failed_count = 0
-            success_count = 0
-            
-            for user in user_info:
-                local_event_data = event_data.copy()
-                local_event_data["uid"] = user.get("user_id")
-                local_event_data["name"] = user.get("user_name")
-                local_event_data["email"] = user.get("user_email")
-                local_event_data["role"] = user.get("user_role")
-                local_event_data["department"] = user.get("department")
-                
-                # Publish event synchronously
-                success = self.kafka_publisher.publish_event(
-                    topic=Topics.NOTIFICATION_EVENTS,
-                    event_type=EventTypes.RECURRING_TASK_RESET,
-                    data=local_event_data,
-                )
-                
-                if success:
-                    success_count += 1
-                else:
-                    failed_count += 1
-                    logger.error(f"Failed to broadcast recurring task reset event for user {user.get('user_id')}")
-            
-            if failed_count > 0:
-                logger.error(f"Failed to broadcast {failed_count} out of {len(user_info)} recurring task reset events")
-                return False
-            
-            logger.info(f"Successfully broadcasted recurring task reset events for {success_count} users")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error broadcasting recurring task reset events: {str(e)}")
-            return False
+        return await self._broadcast(user_info, event_data, EventTypes.DEADLINE_OVERDUE, "deadline overdue")
 
-    def process_recurring_task(self, sid: str, frequency: str):
+    async def _broadcast_recurring_task_reset_events(self, user_info, event_data) -> bool:
+        """
+        Broadcast recurring task reset events to all users
+        """
+        return await self._broadcast(user_info, event_data, EventTypes.RECURRING_TASK_RESET, "recurring task reset")
+
+    async def process_recurring_task(self, sid: str, frequency: str):
         """
         Process a recurring task when its next occurrence time is reached
         """
@@ -453,72 +465,55 @@ class RecurringTaskProcessor:
             logger.info(f"Processing recurring task {sid} with frequency {frequency}")
             
             # Get the current schedule entry via schedule service
-            current_entry = self.schedule_client.fetch_schedule_by_sid(sid)
+            current_entry = await self.async_client.fetch_schedule_by_sid(sid)
             if not current_entry:
                 logger.error(f"Schedule entry {sid} not found")
                 return
+            if not await self.fire_once_async("recurring", sid, current_entry.get("next_occurrence")):
+                return
             
-            # Create new recurring entry
-            new_entry = self.create_recurring_entry(current_entry, frequency)
-            if new_entry:
-                logger.info(f"Successfully created new recurring entry for task {current_entry['tid']}")
-                
-                # Mark the old entry as completed
-                old_status = current_entry.get("status")
-                if old_status not in ["completed", "cancelled"]:
-                    update_success = self.schedule_client.update_schedule(sid, {"status": "completed"})
-                    if update_success:
-                        logger.info(f"Marked old schedule entry {sid} as completed")
-                    else:
-                        logger.warning(f"Failed to mark old schedule entry {sid} as completed")
-                
-                # Get task name from task service
-                task_name = "Unknown Task"
-                tid = current_entry.get("tid")
-                if tid:
-                    try:
-                        task_response = requests.get(f"{self.schedule_client.task_service_url}/tid/{tid}", timeout=5)
-                        if task_response.status_code == 200:
-                            task_data = task_response.json().get("task", {})
-                            task_name = task_data.get("name", "Unknown Task")
-                            logger.info(f"Fetched task name for {tid}: {task_name}")
-                    except Exception as e:
-                        logger.warning(f"Could not fetch task name for {tid}: {e}")
-                
-                # Get user info for notification
-                user_info = self.schedule_client.get_user_info(new_entry["sid"])
-                if user_info:
-                    # Broadcast recurring task reset event to Kafka
-                    event_data = {
-                        "sid": new_entry["sid"],
-                        "tid": tid,
-                        "task_name": task_name,
-                        "start": new_entry.get("start"),
-                        "deadline": new_entry.get("deadline"),
-                        "frequency": frequency,
-                        "next_occurrence": new_entry.get("next_occurrence"),
-                        "status": "ongoing",
-                        "timestamp": datetime.now(UTC_PLUS_8).isoformat()
-                    }
-                    
-                    # Broadcast events synchronously
-                    self._broadcast_recurring_task_reset_events(user_info, event_data)
-                else:
-                    logger.warning(f"Could not get user info for new schedule entry {new_entry['sid']}, skipping notification")
-                
-                # Schedule the next occurrence for the new entry
-                new_sid = new_entry["sid"]
-                new_next_occurrence = datetime.fromisoformat(new_entry["next_occurrence"].replace('Z', '+00:00'))
-                self.schedule_recurring_task({
-                    "sid": new_sid,
+            # Create the next entry and complete this one in a single transaction
+            rollover = await self.rollover_entry(current_entry, frequency)
+            if not rollover:
+                logger.error(f"Failed to create new recurring entry for task {current_entry['tid']}")
+                return
+            
+            new_entry = rollover["schedule"]
+            if not rollover.get("created", True):
+                # Another run already rolled this occurrence over and sent its notifications
+                logger.info(f"Recurring entry {sid} was already rolled over to {new_entry['sid']}")
+                return
+            logger.info(f"Successfully created new recurring entry for task {current_entry['tid']}")
+            
+            tid = current_entry.get("tid")
+            participants = rollover.get("participants")
+            if participants:
+                # Broadcast recurring task reset event to Kafka
+                event_data = {
+                    "sid": new_entry["sid"],
+                    "tid": tid,
+                    "task_name": rollover.get("task_name") or "Unknown Task",
+                    "start": new_entry.get("start"),
+                    "deadline": new_entry.get("deadline"),
                     "frequency": frequency,
-                    "next_occurrence": new_entry["next_occurrence"]
-                })
+                    "next_occurrence": new_entry.get("next_occurrence"),
+                    "status": "ongoing",
+                    "timestamp": datetime.now(UTC_PLUS_8).isoformat()
+                }
                 
-                # Also schedule deadline monitoring for the new entry
-                self.schedule_deadline_monitoring(new_entry)
+                await self._broadcast_recurring_task_reset_events(participants, event_data)
             else:
-                logger.error(f"Failed to create new recurring entry for task {current_entry['tid']}")
+                logger.warning(f"No participants for new schedule entry {new_entry['sid']}, skipping notification")
+            
+            # Schedule the next occurrence for the new entry
+            self.schedule_recurring_task({
+                "sid": new_entry["sid"],
+                "frequency": frequency,
+                "next_occurrence": new_entry["next_occurrence"]
+            })
+            
+            # Also schedule deadline monitoring for the new entry
+            self.schedule_deadline_monitoring(new_entry)
                 
         except Exception as e:
             logger.error(f"Error processing recurring task {sid}: {str(e)}")
@@ -592,8 +587,10 @@ class RecurringTaskProcessor:
         """
         Shutdown the scheduler
         """
+        if self.coordinator:
+            self.coordinator.stop()
         self.scheduler.shutdown()
         logger.info("RecurringTaskProcessor shutdown")
 
 # Global instance
-recurring_processor = RecurringTaskProcessor()
+recurring_processor = RecurringTaskProcessor(sharded=sharded_mode())
@@ -4,13 +4,19 @@ Schedule Client
 This module provides a client for interacting with the schedule service
 """
 
+import asyncio
+import httpx
+import json
 import requests
 import logging
 import time
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional
 
 logger = logging.getLogger(__name__)
 
+# Matches MAX_BATCH_SIZE of the schedule service's /batch endpoint
+BATCH_SIZE = 500
+
 class ScheduleClient:
     def __init__(self, schedule_service_url: str = "http://schedule:5300", task_service_url: str = "http://tasks:5500", user_service_url: str = "http://user:5100"):
         self.schedule_service_url = schedule_service_url
@@ -42,6 +48,37 @@ class ScheduleClient:
             return data.get("data", [])
         return []
         
+    def iter_all_schedules(self, max_retries: int = 3) -> Iterator[Dict[str, Any]]:
+        """
+        Every current schedule from the schedule service's NDJSON stream, yielded
+        as each line arrives. A dropped stream is resumed after the last task
+        received instead of being downloaded again; raises once max_retries
+        attempts in a row fail without progress.
+        """
+        after = None
+        failures = 0
+        while True:
+            try:
+                with self.session.get(f"{self.schedule_service_url}/all/stream",
+                                      params={"after": after} if after else None,
+                                      stream=True, timeout=10) as response:
+                    response.raise_for_status()
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        schedule = json.loads(line)
+                        yield schedule
+                        after = schedule.get("tid") or after
+                        failures = 0
+                return
+            except (requests.RequestException, ValueError) as e:
+                failures += 1
+                logger.warning(f"Schedule stream failed after task {after} (attempt {failures}): {str(e)}")
+                if failures >= max_retries:
+                    logger.error(f"All {max_retries} attempts to stream schedules failed")
+                    raise
+                time.sleep(2 ** (failures - 1))  # Exponential backoff
+
     def fetch_recurring_tasks(self) -> List[Dict[str, Any]]:
         """Fetch all recurring tasks from schedule service"""
         response = self._make_request_with_retry("GET", f"{self.schedule_service_url}/recurring/all")
@@ -50,6 +87,18 @@ class ScheduleClient:
             return data.get("tasks", [])
         return []
     
+    def fetch_due_schedules(self, before: Optional[str] = None, after: Optional[str] = None,
+                            status_not: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Current schedules with a deadline in [after, before), soonest first"""
+        params = {"before": before, "after": after, "status_not": ",".join(status_not or []) or None}
+        response = self._make_request_with_retry(
+            "GET", f"{self.schedule_service_url}/due",
+            params={k: v for k, v in params.items() if v is not None},
+        )
+        if response:
+            return response.json().get("data", [])
+        return []
+
     def fetch_schedule_by_sid(self, sid: str) -> Optional[Dict[str, Any]]:
         """Fetch schedule by SID from schedule service"""
         response = self._make_request_with_retry("GET", f"{self.schedule_service_url}/sid/{sid}")
@@ -79,12 +128,12 @@ class ScheduleClient:
     
     def update_schedule(self, sid: str, schedule_data: Dict[str, Any]) -> bool:
         """Update a schedule entry via schedule service"""
-        logger.info(f"Updating schedule {sid} with data: {schedule_data}")
+        logger.debug("Updating schedule %s with data: %s", sid, schedule_data)
         response = self._make_request_with_retry("PUT", f"{self.schedule_service_url}/{sid}", json=schedule_data)
         if response:
             try:
                 response_data = response.json()
-                logger.info(f"Schedule update response: {response_data}")
+                logger.debug("Schedule update response: %s", response_data)
                 return response_data is not None
             except Exception as e:
                 logger.error(f"Error parsing response from schedule service: {e}")
@@ -93,6 +142,33 @@ class ScheduleClient:
             logger.error(f"Failed to get response from schedule service for sid {sid}")
         return False
     
+    def update_schedules(self, sids: List[str], schedule_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Apply the same update to many schedule entries, one call per BATCH_SIZE sids"""
+        sids = list(sids)
+        updated = []
+        for i in range(0, len(sids), BATCH_SIZE):
+            response = self._make_request_with_retry(
+                "POST", f"{self.schedule_service_url}/batch",
+                json={"op": "update", "sids": sids[i:i + BATCH_SIZE], "data": schedule_data}
+            )
+            if response:
+                updated.extend(response.json().get("data", []))
+        return updated
+
+    def rollover_schedule(self, sid: str, start: str, deadline: str, next_occurrence: str) -> Optional[Dict[str, Any]]:
+        """
+        Complete a recurring entry and create its next occurrence in one transaction.
+        Returns {"previous", "schedule", "created", "task_name", "participants"}; retrying is
+        safe because the schedule service returns the existing next entry instead of a duplicate.
+        """
+        response = self._make_request_with_retry(
+            "POST", f"{self.schedule_service_url}/sid/{sid}/rollover",
+            json={"start": start, "deadline": deadline, "next_occurrence": next_occurrence}
+        )
+        if response:
+            return response.json().get("data")
+        return None
+    
     def delete_schedule(self, sid: str) -> Optional[Dict[str, Any]]:
         """Delete a schedule entry via schedule service"""
         response = self._make_request_with_retry("DELETE", f"{self.schedule_service_url}/{sid}")
@@ -165,4 +241,89 @@ class ScheduleClient:
             
         except Exception as e:
             logger.error(f"Error getting user info for sid {sid}: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+
+
+class AsyncScheduleClient:
+    """
+    The schedule, task and user calls the scheduler jobs make, over one shared
+    httpx.AsyncClient. Create and use it on a single event loop (the job loop).
+    """
+    def __init__(self, schedule_service_url: str = "http://schedule:5300", task_service_url: str = "http://tasks:5500",
+                 max_connections: int = 50):
+        self.schedule_service_url = schedule_service_url
+        self.task_service_url = task_service_url
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=10.0, limits=self.limits)
+        return self._client
+
+    async def _make_request_with_retry(self, method: str, url: str, max_retries: int = 3, **kwargs) -> Optional[httpx.Response]:
+        """Make HTTP request with retry logic"""
+        for attempt in range(max_retries):
+            try:
+                response = await self.client.request(method, url, **kwargs)
+                response.raise_for_status()
+                return response
+            except Exception as e:
+                logger.warning(f"Attempt {attempt + 1} failed for {url}: {str(e)}")
+                if attempt < max_retries - 1:
+                    await asyncio.sleep(2 ** attempt)  # Exponential backoff
+                else:
+                    logger.error(f"All {max_retries} attempts failed for {url}")
+        return None
+
+    async def fetch_schedule_by_sid(self, sid: str) -> Optional[Dict[str, Any]]:
+        """Fetch schedule by SID from schedule service"""
+        response = await self._make_request_with_retry("GET", f"{self.schedule_service_url}/sid/{sid}")
+        if response:
+            return response.json().get("data")
+        return None
+
+    async def fetch_task_name(self, tid: str) -> Optional[str]:
+        """Name of a task from the task service; a single attempt, as the name is only cosmetic"""
+        try:
+            response = await self.client.get(f"{self.task_service_url}/tid/{tid}", timeout=5.0)
+            if response.status_code == 200:
+                return response.json().get("task", {}).get("name")
+        except Exception as e:
+            logger.warning(f"Could not fetch task name for {tid}: {e}")
+        return None
+
+    async def update_schedule(self, sid: str, schedule_data: Dict[str, Any]) -> bool:
+        """Update a schedule entry via schedule service"""
+        response = await self._make_request_with_retry("PUT", f"{self.schedule_service_url}/{sid}", json=schedule_data)
+        if not response:
+            logger.error(f"Failed to get response from schedule service for sid {sid}")
+            return False
+        try:
+            return response.json() is not None
+        except Exception as e:
+            logger.error(f"Error parsing response from schedule service: {e}")
+            return False
+
+    async def rollover_schedule(self, sid: str, start: str, deadline: str, next_occurrence: str) -> Optional[Dict[str, Any]]:
+        """See ScheduleClient.rollover_schedule"""
+        response = await self._make_request_with_retry(
+            "POST", f"{self.schedule_service_url}/sid/{sid}/rollover",
+            json={"start": start, "deadline": deadline, "next_occurrence": next_occurrence}
+        )
+        if response:
+            return response.json().get("data")
+        return None
+
+    async def get_user_info(self, sid: str) -> Optional[List[Dict[str, Any]]]:
+        """Participants of a schedule's task, from the schedule service"""
+        response = await self._make_request_with_retry("GET", f"{self.schedule_service_url}/user-info/sid/{sid}")
+        if response:
+            return response.json().get("data")
+        return None
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,148 @@
+"""
+Keeps notify_user's timers in step with SCHEDULE through schedule-events
+
+The schedule service relays every schedule change from its outbox as a
+schedule_created / schedule_updated / schedule_deleted event carrying the whole
+row and a ``version`` that increases with each change. Events are applied one
+poll batch at a time. Each event replaces a schedule's jobs outright, so only
+the newest event per schedule in a batch is applied, and versions at or below
+the last one applied are skipped. Redelivered or reordered events are harmless.
+"""
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from kafka_client import EventTypes, KafkaEventConsumer, Topics
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_EVENT_TYPES = (EventTypes.SCHEDULE_CREATED, EventTypes.SCHEDULE_UPDATED, EventTypes.SCHEDULE_DELETED)
+
+# Statuses whose deadline notifications have already gone out or no longer apply
+_SETTLED_STATUSES = ("overdue", "completed", "cancelled")
+
+
+def latest_per_schedule(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The highest-version schedule event for each sid in a batch"""
+    latest: Dict[str, Dict[str, Any]] = {}
+    for event in events:
+        if event.get("event_type") not in SCHEDULE_EVENT_TYPES:
+            continue
+        data = event.get("data") or {}
+        sid, version = data.get("sid"), data.get("version")
+        if not sid or version is None:
+            logger.warning(f"Ignoring schedule event without sid/version: {event.get('event_type')}")
+            continue
+        current = latest.get(sid)
+        if current is None or version > current["data"]["version"]:
+            latest[sid] = event
+    return list(latest.values())
+
+
+class ScheduleEventApplier:
+    """Applies schedule events to a RecurringTaskProcessor's jobs"""
+
+    def __init__(self, processor):
+        self.processor = processor
+        # sid -> newest version applied; deletes are remembered too, so a late
+        # schedule_created cannot bring a deleted schedule's jobs back
+        self.versions: Dict[str, int] = {}
+
+    def apply_batch(self, events: List[Dict[str, Any]]) -> int:
+        """Apply a polled batch; returns how many schedules had their jobs changed"""
+        applied = 0
+        for event in latest_per_schedule(events):
+            data = event["data"]
+            sid, version = data["sid"], data["version"]
+            if version <= self.versions.get(sid, -1):
+                logger.debug("Skipping schedule event %s v%s, already at v%s", sid, version, self.versions[sid])
+                continue
+            try:
+                self.apply(event["event_type"], sid, data.get("schedule") or {})
+            except Exception as e:
+                logger.error(f"Error applying {event['event_type']} for schedule {sid}: {str(e)}")
+                continue
+            self.versions[sid] = version
+            applied += 1
+        return applied
+
+    def apply(self, event_type: str, sid: str, schedule: Dict[str, Any]) -> None:
+        if event_type == EventTypes.SCHEDULE_DELETED:
+            self.processor.cancel_all_task_jobs(sid)
+            logger.info(f"Cancelled jobs for deleted schedule {sid}")
+            return
+
+        if not self.processor.owns(sid):
+            # Sharded mode: another process holds this schedule's shard and applies the event
+            return
+
+        schedule = {**schedule, "sid": sid}
+        self.processor.sync_schedule_jobs(schedule)
+        logger.info(f"Synced jobs for schedule {sid} from {event_type}")
+
+        # A deadline moved into the past or the 3-day window would never fire its jobs
+        status = (schedule.get("status") or "").lower()
+        if event_type == EventTypes.SCHEDULE_UPDATED and schedule.get("deadline") and status not in _SETTLED_STATUSES:
+            self.processor.process_deadline_if_due(sid, schedule["deadline"])
+
+
+class ScheduleEventConsumer:
+    """
+    Runs an applier over the schedule-events topic on a background thread
+
+    Every process needs every schedule event, since each keeps the timers of its
+    own shards (or all timers). So the consumer joins no consumer group and
+    leaves nothing behind on the broker; it reads all partitions directly.
+    position() records where the topic ends and must run before the schedules
+    are loaded: changes published while the load runs are then applied once
+    start() is called, instead of being skipped.
+    """
+
+    def __init__(self, processor, retry_seconds: float = 5.0):
+        self.applier = ScheduleEventApplier(processor)
+        self.consumer = KafkaEventConsumer(join_group=False)
+        self.retry_seconds = retry_seconds
+        self.positioned = False
+        # The topic had not been created yet when position() last ran
+        self.topic_missing = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def position(self, at_end: bool = True) -> bool:
+        """Take every partition of the topic at its current end; False while Kafka or the topic is unavailable"""
+        try:
+            if self.consumer.consumer is None:
+                self.consumer._connect()
+            offsets = self.consumer.assign_all_partitions(Topics.SCHEDULE_EVENTS, at_end=at_end)
+            self.topic_missing = offsets is None
+            self.positioned = offsets is not None
+        except Exception as e:
+            logger.error(f"Could not position the schedule event consumer: {e}")
+        return self.positioned
+
+    def _run(self) -> None:
+        try:
+            # Not positioned before the load: when the topic did not exist yet,
+            # everything in it once it appears is new, so read it from the start;
+            # when Kafka was unreachable, start from the end, as before.
+            while not self.positioned and not self._stop.is_set():
+                if self.position(at_end=not self.topic_missing):
+                    break
+                self._stop.wait(self.retry_seconds)
+            self.consumer.consume_batches(self.applier.apply_batch, stop=self._stop)
+        except Exception as e:
+            logger.error(f"Schedule event consumer stopped: {e}")
+        finally:
+            self.consumer.close()
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="schedule-events-consumer", daemon=True)
+        self._thread.start()
+        logger.info(f"Consuming {Topics.SCHEDULE_EVENTS}")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
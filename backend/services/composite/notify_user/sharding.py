@@ -0,0 +1,208 @@
+"""
+Sharded scheduling for notify_user
+
+Every notify_user process (each uvicorn worker, each replica) runs its own
+APScheduler, so left alone every process arms and fires every schedule's
+timers. In sharded mode (NOTIFY_SCHEDULER_MODE=sharded) schedules are split
+into NOTIFY_SCHEDULER_SHARDS shards by a hash of sid, and each shard is leased
+to one live process through a small SQLite store that all of them open
+(NOTIFY_SCHEDULER_LEASE_DB; put it on a volume shared by the replicas).
+
+- Members heartbeat into the store. A member not seen for a lease period has left.
+- Shards are assigned to the live members by rendezvous hashing, so a member
+  joining or leaving only moves the shards that have to move. A member claims
+  its shards once the previous holder has released them or let the lease
+  lapse, and releases the shards now assigned elsewhere.
+- The processor arms the timers of the schedules in a shard it gains and drops
+  them for a shard it loses.
+- Firing is fenced: a timer only fires if its process holds the shard's lease
+  at that moment and nobody has fired the same job for the same due time,
+  recorded in the same transaction. A process that stalled past its lease
+  cannot fire late, and a timer armed by two processes around a hand-over
+  still fires once.
+"""
+import hashlib
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+SHARDS = int(os.getenv("NOTIFY_SCHEDULER_SHARDS", "64"))
+LEASE_DB = os.getenv("NOTIFY_SCHEDULER_LEASE_DB", "/tmp/notify_user_scheduler.sqlite")
+LEASE_SECONDS = float(os.getenv("NOTIFY_SCHEDULER_LEASE_SECONDS", "30"))
+# Fired-job records only need to outlive any timer that could still fire for them
+FIRED_RETENTION_SECONDS = 7 * 24 * 3600
+
+
+def sharded_mode() -> bool:
+    return os.getenv("NOTIFY_SCHEDULER_MODE", "").lower() == "sharded"
+
+
+def _hash(value: str) -> int:
+    # Stable across processes, unlike hash(), which is salted per interpreter
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def shard_of(sid: str, shards: int = SHARDS) -> int:
+    return _hash(sid) % shards
+
+
+def assign(shard: int, members: Iterable[str]) -> Optional[str]:
+    """Rendezvous (highest random weight) owner of a shard among the live members"""
+    return max(members, key=lambda member: _hash(f"{member}:{shard}"), default=None)
+
+
+class LeaseStore:
+    """Members, shard leases and fired jobs in SQLite; every method is one transaction"""
+
+    def __init__(self, path: str = LEASE_DB, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.clock = clock
+        with self._transaction() as db:
+            db.execute("create table if not exists members (member text primary key, seen_at real not null)")
+            db.execute("create table if not exists shard_leases "
+                       "(shard integer primary key, owner text not null, expires_at real not null)")
+            db.execute("create table if not exists fired (job text primary key, member text not null, fired_at real not null)")
+
+    @contextmanager
+    def _transaction(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            # Take the write lock up front so read-then-write steps cannot interleave across processes
+            db.execute("begin immediate")
+            try:
+                yield db
+            except BaseException:
+                db.execute("rollback")
+                raise
+            db.execute("commit")
+        finally:
+            db.close()
+
+    def heartbeat(self, member: str, lease_seconds: float) -> List[str]:
+        """Record ``member`` as alive and return the live members"""
+        now = self.clock()
+        with self._transaction() as db:
+            db.execute("insert into members (member, seen_at) values (?, ?) "
+                       "on conflict (member) do update set seen_at = excluded.seen_at", (member, now))
+            db.execute("delete from members where seen_at < ?", (now - lease_seconds,))
+            db.execute("delete from fired where fired_at < ?", (now - FIRED_RETENTION_SECONDS,))
+            return sorted(row[0] for row in db.execute("select member from members"))
+
+    def sync_leases(self, member: str, wanted: Set[int], lease_seconds: float) -> Set[int]:
+        """
+        Renew or claim the ``wanted`` shards that are free, lapsed or already ours,
+        release the ones we hold but no longer want, and return what we now hold
+        """
+        now = self.clock()
+        with self._transaction() as db:
+            for shard in wanted:
+                db.execute(
+                    "insert into shard_leases (shard, owner, expires_at) values (?, ?, ?) "
+                    "on conflict (shard) do update set owner = excluded.owner, expires_at = excluded.expires_at "
+                    "where shard_leases.owner = excluded.owner or shard_leases.expires_at < ?",
+                    (shard, member, now + lease_seconds, now),
+                )
+            held = {row[0] for row in db.execute("select shard from shard_leases where owner = ?", (member,))}
+            for shard in held - wanted:
+                db.execute("delete from shard_leases where shard = ? and owner = ?", (shard, member))
+            return held & wanted
+
+    def leave(self, member: str) -> None:
+        with self._transaction() as db:
+            db.execute("delete from shard_leases where owner = ?", (member,))
+            db.execute("delete from members where member = ?", (member,))
+
+    def fire_once(self, member: str, shard: int, job: str) -> bool:
+        """True if ``member`` holds a live lease on ``shard`` and ``job`` has not fired before"""
+        now = self.clock()
+        with self._transaction() as db:
+            lease = db.execute("select owner, expires_at from shard_leases where shard = ?", (shard,)).fetchone()
+            if not lease or lease[0] != member or lease[1] < now:
+                return False
+            cursor = db.execute("insert or ignore into fired (job, member, fired_at) values (?, ?, ?)", (job, member, now))
+            return cursor.rowcount == 1
+
+
+class ShardCoordinator:
+    """Keeps one process's set of owned shards in step with the live membership"""
+
+    def __init__(self, store: LeaseStore, member_id: Optional[str] = None, shards: int = SHARDS,
+                 lease_seconds: float = LEASE_SECONDS,
+                 on_gained: Optional[Callable[[Set[int]], None]] = None,
+                 on_lost: Optional[Callable[[Set[int]], None]] = None):
+        self.store = store
+        self.member_id = member_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.shards = shards
+        self.lease_seconds = lease_seconds
+        self.on_gained = on_gained
+        self.on_lost = on_lost
+        self.owned: Set[int] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def owns(self, sid: str) -> bool:
+        return shard_of(sid, self.shards) in self.owned
+
+    def rebalance(self) -> Tuple[Set[int], Set[int]]:
+        """Heartbeat, claim and release leases; returns the shards (gained, lost)"""
+        members = self.store.heartbeat(self.member_id, self.lease_seconds)
+        wanted = {shard for shard in range(self.shards) if assign(shard, members) == self.member_id}
+        held = self.store.sync_leases(self.member_id, wanted, self.lease_seconds)
+        with self._lock:
+            gained, lost = held - self.owned, self.owned - held
+            self.owned = held
+        # Drop timers first, so a shard moving back and forth is not left half armed
+        if lost:
+            logger.info(f"Scheduler {self.member_id} released {len(lost)} shard(s)")
+            if self.on_lost:
+                self.on_lost(lost)
+        if gained:
+            logger.info(f"Scheduler {self.member_id} took {len(gained)} shard(s) of {self.shards}, "
+                        f"{len(members)} live member(s)")
+            if self.on_gained:
+                self.on_gained(gained)
+        return gained, lost
+
+    def fire_once(self, job: str, sid: str) -> bool:
+        return self.store.fire_once(self.member_id, shard_of(sid, self.shards), job)
+
+    def _run(self) -> None:
+        # Renew well inside the lease so one slow round does not let it lapse
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                self.rebalance()
+            except Exception as e:
+                logger.error(f"Error rebalancing scheduler shards: {e}")
+
+    def start(self) -> None:
+        """Take this process's first shards, then keep rebalancing in the background"""
+        try:
+            self.rebalance()
+        except Exception as e:
+            logger.error(f"Error taking scheduler shards: {e}")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="scheduler-shards", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Hand every shard back straight away rather than after the lease runs out"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        with self._lock:
+            lost, self.owned = self.owned, set()
+        if lost and self.on_lost:
+            self.on_lost(lost)
+        try:
+            self.store.leave(self.member_id)
+        except Exception as e:
+            logger.error(f"Error releasing scheduler shards: {e}")
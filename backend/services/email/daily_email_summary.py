@@ -110,21 +110,28 @@ class DailyEmailSummaryService:
                             if task.get("created_by_uid") == user_id
                         ]
                         
-                        # Enrich creator tasks with schedule and project data
-                        for task in creator_tasks:
-                            task_id = task.get("id")
-                            
-                            # Get schedule data
+                        # Latest schedules of all creator tasks, up to 1000 per lookup
+                        schedules = {}
+                        task_ids = [t["id"] for t in creator_tasks if t.get("id")]
+                        for i in range(0, len(task_ids), 1000):
                             try:
-                                schedule_response = client.get(
-                                    f"{SCHEDULE_SERVICE_URL}/tid/{task_id}/latest"
+                                schedule_response = client.post(
+                                    f"{SCHEDULE_SERVICE_URL}/latest", json={"tids": task_ids[i:i + 1000]}
                                 )
                                 if schedule_response.status_code == 200:
-                                    schedule_data = schedule_response.json().get("data", {})
-                                    task["status"] = schedule_data.get("status")
-                                    task["deadline"] = schedule_data.get("deadline")
+                                    schedules.update(schedule_response.json().get("data") or {})
                             except Exception:
                                 pass
+
+                        # Enrich creator tasks with schedule and project data
+                        for task in creator_tasks:
+                            task_id = task.get("id")
+                            
+                            # Get schedule data
+                            schedule_data = schedules.get(task_id)
+                            if schedule_data:
+                                task["status"] = schedule_data.get("status")
+                                task["deadline"] = schedule_data.get("deadline")
                             
                             # Get project data
                             try:
@@ -3,12 +3,16 @@ Shared Kafka client utilities for SPM microservices using kafka-python
 """
 import json
 import logging
-from typing import Dict, Any, Optional, Callable
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Any, List, Optional, Callable
 from kafka import KafkaProducer, KafkaConsumer
 from kafka.errors import KafkaError
 import os
 from datetime import datetime, timezone
 import pytz
+from tracing import extract, kafka_headers, start_span
+from metrics import observe_consumer_lag
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,6 +21,22 @@ logger = logging.getLogger(__name__)
 # Define UTC+8 timezone (Singapore time)
 UTC_PLUS_8 = pytz.timezone('Asia/Singapore')
 
+# Fields that identify the entity an event is about, most specific first.
+# Events keyed by the same entity land on the same partition, so they are
+# consumed in the order they were published.
+PARTITION_KEY_FIELDS = ("tid", "task_id", "sid", "schedule_id", "pid", "project_id", "uid", "user_id")
+
+
+def partition_key(data: Dict[str, Any]) -> Optional[str]:
+    """Default message key for an event payload, or None when it names no entity"""
+    if not isinstance(data, dict):
+        return None
+    for field in PARTITION_KEY_FIELDS:
+        value = data.get(field)
+        if value:
+            return str(value)
+    return None
+
 class KafkaEventPublisher:
     """Kafka event publisher for sending events to topics"""
     
@@ -50,7 +70,8 @@ class KafkaEventPublisher:
             topic: Kafka topic name
             event_type: Type of event (e.g., 'task_created', 'user_updated')
             data: Event data payload
-            key: Optional message key for partitioning
+            key: Optional message key for partitioning; derived from the task,
+                 schedule, project or user id in data when omitted
             partition: Optional partition number
         """
         if not self.producer:
@@ -60,6 +81,9 @@ class KafkaEventPublisher:
                 logger.error("Failed to initialize producer")
                 return False
         
+        if key is None and partition is None:
+            key = partition_key(data)
+
         try:
             event = {
                 'event_type': event_type,
@@ -67,17 +91,20 @@ class KafkaEventPublisher:
                 'data': data
             }
             
-            future = self.producer.send(
-                topic, 
-                value=event, 
-                key=key,
-                partition=partition
-            )
+            with start_span(f"produce {topic}", "producer",
+                            {"messaging.system": "kafka", "messaging.destination": topic, "event_type": event_type}):
+                future = self.producer.send(
+                    topic, 
+                    value=event, 
+                    key=key,
+                    partition=partition,
+                    headers=kafka_headers()
+                )
+                
+                # Wait for the message to be sent
+                record_metadata = future.get(timeout=10)
             
-            # Wait for the message to be sent
-            record_metadata = future.get(timeout=10)
-            
-            logger.info(f"Event published to {topic}: {event_type} at partition {record_metadata.partition}")
+            logger.debug("Event published to %s: %s at partition %s", topic, event_type, record_metadata.partition)
             return True
             
         except KafkaError as e:
@@ -164,15 +191,11 @@ class KafkaEventConsumer:
                     
                     # Process messages
                     for topic_partition, messages in message_batch.items():
-                        logger.info(f"📨 Received {len(messages)} messages from {topic_partition.topic}")
+                        logger.debug("📨 Received %d messages from %s", len(messages), topic_partition.topic)
                         
                         for message in messages:
-                            try:
-                                event = message.value
-                                logger.info(f"📧 Processing event: {event.get('event_type')} from {message.topic}")
-                                handler(event)
-                            except Exception as e:
-                                logger.error(f"❌ Error processing message: {e}")
+                            self._process(handler, message)
+                            observe_consumer_lag(self.consumer, message)
                                 
                 except Exception as poll_error:
                     logger.error(f"❌ Error polling for messages: {poll_error}")
@@ -184,12 +207,95 @@ class KafkaEventConsumer:
         except Exception as e:
             logger.error(f"❌ Error consuming events: {e}")
     
+    def consume_events_concurrently(self, handler: Callable[[Dict[str, Any]], None],
+                                    workers: int = 8, timeout_ms: int = 1000):
+        """
+        Like consume_events, but each polled batch is spread over ``workers``
+        threads by message key (see KeyedDispatcher): events for the same task
+        or user keep their order, events for different ones run in parallel.
+
+        The next poll waits for the whole batch, so auto-committed offsets
+        never run ahead of work that has not finished.
+        """
+        if not self.consumer:
+            logger.error("Consumer not initialized")
+            return
+
+        dispatcher = KeyedDispatcher(lambda message: self._process(handler, message), workers)
+        logger.info("Starting to consume events with %d workers...", workers)
+        try:
+            while True:
+                try:
+                    message_batch = self.consumer.poll(timeout_ms=timeout_ms)
+                    if not message_batch:
+                        continue
+                    dispatcher.run_batch(message_batch)
+                    for messages in message_batch.values():
+                        observe_consumer_lag(self.consumer, messages[-1])
+                except Exception as poll_error:
+                    logger.error(f"❌ Error polling for messages: {poll_error}")
+                    continue
+        except KeyboardInterrupt:
+            logger.info("🛑 Consumer interrupted by user")
+        finally:
+            dispatcher.close()
+
+    def _process(self, handler: Callable[[Dict[str, Any]], None], message) -> None:
+        """Run the handler for one message inside a span continuing the producer's trace"""
+        try:
+            event = message.value
+            logger.debug("📧 Processing event: %s from %s", event.get('event_type'), message.topic)
+            # Continue the producer's trace so consumer work shows up under the originating request
+            with start_span(f"consume {message.topic}", "consumer",
+                            {"messaging.system": "kafka", "messaging.destination": message.topic,
+                             "event_type": event.get('event_type')},
+                            parent=extract(message.headers)):
+                handler(event)
+        except Exception as e:
+            logger.error(f"❌ Error processing message: {e}")
+
     def close(self):
         """Close the consumer connection"""
         if self.consumer:
             self.consumer.close()
             logger.info("Kafka consumer closed")
 
+class KeyedDispatcher:
+    """
+    Runs messages on a fixed set of single-threaded lanes. A message's lane is
+    chosen from its key (or its partition when it has none), so messages for the
+    same key are processed one at a time in offset order while other keys
+    proceed in parallel.
+    """
+
+    def __init__(self, process: Callable[[Any], None], workers: int = 8):
+        self.process = process
+        self.lanes = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"kafka-lane-{i}")
+            for i in range(max(1, workers))
+        ]
+
+    def lane_for(self, message) -> int:
+        key = getattr(message, "key", None)
+        if key:
+            if isinstance(key, str):
+                key = key.encode("utf-8")
+            return zlib.crc32(key) % len(self.lanes)
+        return getattr(message, "partition", 0) % len(self.lanes)
+
+    def run_batch(self, message_batch: Dict[Any, List[Any]]) -> None:
+        """Process one poll() result and wait until every message in it is done"""
+        futures = [
+            self.lanes[self.lane_for(message)].submit(self.process, message)
+            for messages in message_batch.values()
+            for message in messages
+        ]
+        wait(futures)
+
+    def close(self) -> None:
+        for lane in self.lanes:
+            lane.shutdown(wait=True)
+
 # Event type constants
 class EventTypes:
     # Task events
@@ -227,6 +333,6 @@ class EventTypes:
 class Topics:
     # TASK_EVENTS = "task-events"
     # PROJECT_EVENTS = "project-events"
-    # SCHEDULE_EVENTS = "schedule-events"
+    SCHEDULE_EVENTS = "schedule-events"
     # USER_EVENTS = "user-events"
     NOTIFICATION_EVENTS = "notification-events"
\ No newline at end of file
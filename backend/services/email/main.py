@@ -11,6 +11,9 @@ import time
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from daily_email_summary import DailyEmailSummaryService
+from tracing import init_tracing, start_span
+from metrics import init_metrics, instrument_scheduler
+from logging_config import setup_logging
 
 load_dotenv()
 
@@ -33,7 +36,7 @@ class EmailService:
     
     def send_email(self, to_email: str, subject: str, body: str):
         """Send email via SMTP"""
-        logger.info(f"Sending email to: {to_email}")
+        logger.debug("Sending email to: %s", to_email)
         
         msg = MIMEMultipart()
         msg["From"] = self.smtp_user
@@ -42,11 +45,13 @@ class EmailService:
         msg.attach(MIMEText(body, "plain"))
 
         try:
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.smtp_user, self.smtp_pass)
-            server.sendmail(self.smtp_user, to_email, msg.as_string())
-            server.quit()
+            with start_span("smtp send", "client",
+                            {"net.protocol.name": "smtp", "net.peer.name": self.smtp_server, "net.peer.port": self.smtp_port}):
+                server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+                server.starttls()
+                server.login(self.smtp_user, self.smtp_pass)
+                server.sendmail(self.smtp_user, to_email, msg.as_string())
+                server.quit()
             logger.info("✅ Email sent successfully")
             return True
         except Exception as e:
@@ -55,37 +60,37 @@ class EmailService:
     
     def handle_notification_event(self, event: dict):
         """Handle incoming notification events from Kafka"""
-        logger.info(f"📧 Handling notification event: {event}")
+        logger.debug("📧 Handling notification event: %s", event)
         try:
             event_type = event.get('event_type')
             data = event.get('data', {})
             
             logger.info(f"📋 Processing notification event: {event_type}")
-            logger.info(f"📊 Event data: {data}")
+            logger.debug("📊 Event data: %s", data)
             
             if event_type == EventTypes.DEADLINE_OVERDUE:
                 # Handle deadline overdue event
-                logger.info(f"⏰ Handling deadline overdue event: {data}")
+                logger.debug("⏰ Handling deadline overdue event: %s", data)
                 self._handle_deadline_overdue(data)
             elif event_type == EventTypes.DEADLINE_APPROACHING:
                 # Handle deadline approaching event
-                logger.info(f"⏰ Handling deadline approaching event: {data}")
+                logger.debug("⏰ Handling deadline approaching event: %s", data)
                 self._handle_deadline_approaching(data)
             elif event_type == EventTypes.TASK_ASSIGNED:
                 # Handle task assigned event
-                logger.info(f"📝 Handling task assigned event: {data}")
+                logger.debug("📝 Handling task assigned event: %s", data)
                 self._handle_task_assigned(data)
             elif event_type == EventTypes.PROJECT_COLLABORATOR_ADDED:
                 # Handle project collaborator added event
-                logger.info(f"👥 Handling project collaborator added event: {data}")
+                logger.debug("👥 Handling project collaborator added event: %s", data)
                 self._handle_project_collaborator_added(data)
             elif event_type == EventTypes.TASK_DELETED:
                 # Handle task deleted event
-                logger.info(f"🗑️ Handling task deleted event: {data}")
+                logger.debug("🗑️ Handling task deleted event: %s", data)
                 self._handle_task_deleted(data)
             elif event_type == EventTypes.TASK_UPDATED:
                 # Handle task updated event
-                logger.info(f"📝 Handling task updated event: {data}")
+                logger.debug("📝 Handling task updated event: %s", data)
                 self._handle_task_updated(data)
             else:
                 logger.warning(f"❓ Unknown event type: {event_type}")
@@ -257,7 +262,7 @@ class EmailService:
     
     def _handle_notification_delivered(self, data: dict):
         """Handle notification delivered events"""
-        logger.info(f"Notification delivered: {data}")
+        logger.debug("Notification delivered: %s", data)
         # You can add logic here to update delivery status in database
     
     def _handle_notification_failed(self, data: dict):
@@ -287,6 +292,7 @@ def setup_daily_email_scheduler(email_service: EmailService):
         )
         
         # Start scheduler
+        instrument_scheduler(scheduler)
         scheduler.start()
         logger.info("✅ Daily email summary scheduler started")
         logger.info("📅 Daily summaries will be sent at 8:15 AM UTC+8 (Singapore time)")
@@ -300,6 +306,10 @@ def setup_daily_email_scheduler(email_service: EmailService):
 
 def main():
     """Main function to run the email service as a Kafka consumer"""
+    init_tracing("email")
+    setup_logging("email")
+    # No HTTP app here, so metrics get their own port
+    init_metrics(port=int(os.getenv("METRICS_PORT", "9100")))
     email_service = EmailService()
     consumer = KafkaEventConsumer(
         group_id='email-service-group'  # Unique consumer group for email service
@@ -324,8 +334,12 @@ def main():
         logger.info("✅ Email service started, waiting for notification events...")
         logger.info("⏳ Topic will be created automatically when first message is published")
         
-        # Start consuming events (will wait for topic creation)
-        consumer.consume_events(email_service.handle_notification_event)
+        # Start consuming events (will wait for topic creation). Emails for different
+        # recipients/tasks are sent in parallel; events for the same key stay in order.
+        consumer.consume_events_concurrently(
+            email_service.handle_notification_event,
+            workers=int(os.getenv("KAFKA_CONSUMER_WORKERS", "8")),
+        )
         
     except KeyboardInterrupt:
         logger.info("🛑 Email service stopped by user")
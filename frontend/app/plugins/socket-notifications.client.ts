@@ -30,8 +30,8 @@ export default defineNuxtPlugin(() => {
         }
     };
 
-    // Listen for notification events from Socket.IO
-    socket.on("notification", (payload: any) => {
+    // Show one notification as a toast, honouring the user's preferences
+    const handleNotification = (payload: any) => {
         console.log("[Socket.IO Client] Received notification:", payload);
 
         try {
@@ -80,6 +80,15 @@ export default defineNuxtPlugin(() => {
         } catch (error) {
             console.error("[Socket.IO Client] Error processing notification:", error);
         }
+    };
+
+    // Listen for notification events from Socket.IO
+    socket.on("notification", handleNotification);
+
+    // Notifications that arrive together are delivered as one batch
+    socket.on("notifications", (payloads: any[]) => {
+        if (!Array.isArray(payloads)) return;
+        payloads.forEach(handleNotification);
     });
 
     // Register user when socket connects
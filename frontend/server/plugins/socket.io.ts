@@ -3,6 +3,7 @@ import { Server as Engine } from "engine.io";
 import { Server } from "socket.io";
 import { defineEventHandler } from "h3";
 import { Kafka } from "kafkajs";
+import { NotificationRouter } from "../utils/notificationRouter";
 
 export default defineNitroPlugin(async (nitroApp: NitroApp) => {
     const engine = new Engine();
@@ -10,30 +11,26 @@ export default defineNitroPlugin(async (nitroApp: NitroApp) => {
 
     io.bind(engine);
 
-    // Store connected socket IDs mapped to user IDs for filtering notifications
-    const userSockets = new Map<string, Set<string>>();
+    // Per-user routing with a reverse socket -> user index, batched emits and backpressure
+    const router = new NotificationRouter(io, {
+        batchWindowMs: Number(process.env.NOTIFICATION_BATCH_WINDOW_MS || 25),
+        maxPendingPerUser: Number(process.env.NOTIFICATION_MAX_PENDING || 50),
+        maxSocketBuffer: Number(process.env.NOTIFICATION_MAX_SOCKET_BUFFER || 100),
+    });
 
     io.on("connection", (socket) => {
         console.log(`[Socket.IO] Client connected: ${socket.id}`);
 
         // Register user when they connect with their user ID
         socket.on("register_user", (userId: string) => {
-            if (!userSockets.has(userId)) {
-                userSockets.set(userId, new Set());
-            }
-            userSockets.get(userId)!.add(socket.id);
+            if (!userId) return;
+            router.register(socket, userId);
             console.log(`[Socket.IO] User ${userId} registered with socket ${socket.id}`);
         });
 
         socket.on("disconnect", (reason) => {
             console.log(`[Socket.IO] Client disconnected: ${socket.id}, reason: ${reason}`);
-            // Clean up user socket mappings
-            for (const [userId, sockets] of userSockets.entries()) {
-                sockets.delete(socket.id);
-                if (sockets.size === 0) {
-                    userSockets.delete(userId);
-                }
-            }
+            router.unregister(socket.id);
         });
     });
 
@@ -90,42 +87,21 @@ export default defineNitroPlugin(async (nitroApp: NitroApp) => {
                         const eventType = parsedMessage.event_type || parsedMessage.eventType;
                         const eventData = parsedMessage.data || parsedMessage;
 
-                        console.log(`[Kafka] Received notification event: ${eventType}`, eventData);
+                        const notificationPayload = {
+                            eventType,
+                            data: eventData,
+                            timestamp: new Date().toISOString(),
+                        };
 
                         // Extract user ID from the event data to send notification to specific user
                         const targetUserId = eventData.uid || eventData.user_id || eventData.userId;
 
                         if (targetUserId) {
-                            // Send notification to specific user's sockets
-                            const userSocketIds = userSockets.get(targetUserId);
-                            if (userSocketIds && userSocketIds.size > 0) {
-                                const notificationPayload = {
-                                    eventType,
-                                    data: eventData,
-                                    timestamp: new Date().toISOString(),
-                                };
-
-                                // Emit to all sockets for this user
-                                for (const socketId of userSocketIds) {
-                                    io.to(socketId).emit("notification", notificationPayload);
-                                }
-
-                                console.log(
-                                    `[Socket.IO] Sent notification to user ${targetUserId} (${userSocketIds.size} socket(s))`
-                                );
-                            } else {
-                                console.log(
-                                    `[Socket.IO] No connected sockets for user ${targetUserId}, skipping notification`
-                                );
-                            }
+                            // Queued and emitted with any other notifications for this user in the batch window
+                            router.send(targetUserId, notificationPayload);
                         } else {
                             // Broadcast to all connected clients if no specific user ID
-                            io.emit("notification", {
-                                eventType,
-                                data: eventData,
-                                timestamp: new Date().toISOString(),
-                            });
-                            console.log("[Socket.IO] Broadcasted notification to all clients");
+                            router.broadcast(notificationPayload);
                         }
                     } catch (error) {
                         console.error("[Kafka] Error processing message:", error);
@@ -154,6 +130,8 @@ export default defineNitroPlugin(async (nitroApp: NitroApp) => {
 
     // Cleanup on Nitro close
     nitroApp.hooks.hook("close", async () => {
+        router.flushAll();
+        router.close();
         try {
             // Only disconnect if consumer was connected
             if (consumer) {
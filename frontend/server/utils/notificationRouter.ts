@@ -0,0 +1,154 @@
+import type { Server, Socket } from "socket.io";
+
+export interface NotificationPayload {
+    eventType: string;
+    data: Record<string, any>;
+    timestamp: string;
+}
+
+export interface NotificationRouterOptions {
+    // Notifications for one user arriving within this window go out as one emit
+    batchWindowMs?: number;
+    // Per-user queue cap while a batch is pending; the oldest are dropped beyond it
+    maxPendingPerUser?: number;
+    // Engine.IO packets already buffered for a socket before it counts as slow and is skipped
+    maxSocketBuffer?: number;
+}
+
+/**
+ * Routes per-recipient Kafka notifications to Socket.IO connections.
+ *
+ * - userSockets (user -> sockets) and socketUser (socket -> user) are kept in
+ *   step, so a disconnect is O(1) instead of a scan over every user.
+ * - Notifications for the same user are buffered for batchWindowMs and
+ *   emitted once per socket: a single one as "notification" (unchanged for
+ *   clients), several as one "notifications" array.
+ * - Slow clients do not grow server memory: the per-user queue is capped and
+ *   sockets whose transport is still backed up are skipped for that batch.
+ */
+export class NotificationRouter {
+    private readonly userSockets = new Map<string, Map<string, Socket>>();
+    private readonly socketUser = new Map<string, string>();
+    private readonly pending = new Map<string, NotificationPayload[]>();
+    private readonly timers = new Map<string, ReturnType<typeof setTimeout>>();
+    private readonly batchWindowMs: number;
+    private readonly maxPendingPerUser: number;
+    private readonly maxSocketBuffer: number;
+
+    readonly stats = { emitted: 0, batches: 0, dropped: 0, skippedSlow: 0 };
+
+    constructor(private readonly io: Server, options: NotificationRouterOptions = {}) {
+        this.batchWindowMs = options.batchWindowMs ?? 25;
+        this.maxPendingPerUser = options.maxPendingPerUser ?? 50;
+        this.maxSocketBuffer = options.maxSocketBuffer ?? 100;
+    }
+
+    register(socket: Socket, userId: string): void {
+        const previous = this.socketUser.get(socket.id);
+        if (previous === userId) return;
+        if (previous !== undefined) this.unregister(socket.id);
+
+        let sockets = this.userSockets.get(userId);
+        if (!sockets) {
+            sockets = new Map();
+            this.userSockets.set(userId, sockets);
+        }
+        sockets.set(socket.id, socket);
+        this.socketUser.set(socket.id, userId);
+    }
+
+    unregister(socketId: string): void {
+        const userId = this.socketUser.get(socketId);
+        if (userId === undefined) return;
+        this.socketUser.delete(socketId);
+
+        const sockets = this.userSockets.get(userId);
+        if (!sockets) return;
+        sockets.delete(socketId);
+        if (sockets.size === 0) {
+            this.userSockets.delete(userId);
+            this.discard(userId);
+        }
+    }
+
+    isConnected(userId: string): boolean {
+        return this.userSockets.has(userId);
+    }
+
+    get connectedUsers(): number {
+        return this.userSockets.size;
+    }
+
+    /** Queue a notification for a user; returns false when nobody is connected to receive it */
+    send(userId: string, payload: NotificationPayload): boolean {
+        if (!this.userSockets.has(userId)) return false;
+
+        let queue = this.pending.get(userId);
+        if (!queue) {
+            queue = [];
+            this.pending.set(userId, queue);
+        }
+        queue.push(payload);
+        if (queue.length > this.maxPendingPerUser) {
+            queue.shift();
+            this.stats.dropped += 1;
+        }
+
+        if (!this.timers.has(userId)) {
+            this.timers.set(userId, setTimeout(() => this.flush(userId), this.batchWindowMs));
+        }
+        return true;
+    }
+
+    broadcast(payload: NotificationPayload): void {
+        this.io.emit("notification", payload);
+    }
+
+    flush(userId: string): void {
+        const timer = this.timers.get(userId);
+        if (timer) clearTimeout(timer);
+        this.timers.delete(userId);
+
+        const batch = this.pending.get(userId);
+        this.pending.delete(userId);
+        const sockets = this.userSockets.get(userId);
+        if (!batch || batch.length === 0 || !sockets) return;
+
+        this.stats.batches += 1;
+        for (const socket of sockets.values()) {
+            if (this.isBackedUp(socket)) {
+                this.stats.skippedSlow += 1;
+                continue;
+            }
+            if (batch.length === 1) {
+                socket.emit("notification", batch[0]);
+            } else {
+                socket.emit("notifications", batch);
+            }
+            this.stats.emitted += batch.length;
+        }
+    }
+
+    flushAll(): void {
+        for (const userId of [...this.pending.keys()]) this.flush(userId);
+    }
+
+    close(): void {
+        for (const timer of this.timers.values()) clearTimeout(timer);
+        this.timers.clear();
+        this.pending.clear();
+    }
+
+    private discard(userId: string): void {
+        const timer = this.timers.get(userId);
+        if (timer) clearTimeout(timer);
+        this.timers.delete(userId);
+        this.pending.delete(userId);
+    }
+
+    private isBackedUp(socket: Socket): boolean {
+        // engine.io keeps packets it could not write yet in writeBuffer
+        const buffered = (socket.conn as any)?.writeBuffer?.length ?? 0;
+        return buffered > this.maxSocketBuffer;
+    }
+}
@@ -0,0 +1,162 @@
+"""
+Load test for the user service's GET /checkCookies.
+
+Runs the user app in-process (no Supabase, no network) and drives it with
+concurrent requests in three scenarios:
+  - warm          every request carries the same valid cookies (memoized claims)
+  - cold          every request carries a fresh access token (full signature check)
+  - refresh_burst bursts of requests share one expired access token and one
+                  refresh token; the fake Supabase refresh takes --refresh-ms
+
+It reports throughput, p50/p95 latency and how many Supabase refresh calls were
+made. Valid sessions must never reach Supabase, and each burst must refresh
+exactly once (Supabase refresh tokens are single use).
+
+Usage (from repo root):
+    python test/benchmark/bench_auth.py [--requests 2000] [--concurrency 50]
+    python test/benchmark/bench_auth.py --check   # exit 1 on extra Supabase calls
+"""
+import argparse
+import asyncio
+import math
+import os
+import sys
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List
+
+import httpx
+import jwt
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "backend/services/atomic/user"))
+SECRET = "benchmark-secret-for-local-session-checks"
+os.environ["SUPABASE_JWT_SECRET"] = SECRET
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "benchmark")
+
+from backend.services.atomic.user import main as user_main  # noqa: E402
+
+USER_SERVICE = "http://user:5100"
+
+
+class FakeSupabase:
+    """Just enough of SupabaseClient for /checkCookies, with a blocking refresh like the real client"""
+
+    def __init__(self, refresh_ms: float):
+        self.refresh_ms = refresh_ms
+        self.refresh_calls = 0
+
+    def refresh_session(self, refresh_token: str):
+        self.refresh_calls += 1
+        time.sleep(self.refresh_ms / 1000)
+        return SimpleNamespace(
+            session=SimpleNamespace(access_token=access_token(), refresh_token=f"{refresh_token}-next"),
+            user=SimpleNamespace(id="u1", email="alice@example.com", user_metadata={"role": "staff", "name": "Alice"}),
+        )
+
+
+def access_token(exp_in: int = 3600, sub: str = "auth-1") -> str:
+    claims = {"sub": sub, "aud": "authenticated", "role": "authenticated", "exp": int(time.time()) + exp_in}
+    return jwt.encode(claims, SECRET, algorithm="HS256")
+
+
+USER_DATA = jwt.encode({"id": "u1", "email": "alice@example.com", "role": "staff", "name": "Alice",
+                        "exp": int(time.time()) + 3600}, SECRET, algorithm="HS256")
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+async def run_scenario(client: httpx.AsyncClient, cookies_for: Callable[[int], Dict[str, str]],
+                       requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    failures = 0
+
+    async def one(i):
+        nonlocal failures
+        start = time.perf_counter()
+        response = await client.get(f"{USER_SERVICE}/checkCookies", headers={"Cookie": "; ".join(
+            f"{k}={v}" for k, v in cookies_for(i).items())})
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            failures += 1
+
+    wall_start = time.perf_counter()
+    for batch in range(0, requests, concurrency):
+        await asyncio.gather(*(one(i) for i in range(batch, min(batch + concurrency, requests))))
+    wall = time.perf_counter() - wall_start
+    return {
+        "requests": requests,
+        "failures": failures,
+        "rps": round(requests / wall, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+    }
+
+
+async def run(args) -> Dict[str, Dict[str, Any]]:
+    fake = FakeSupabase(args.refresh_ms)
+    user_main.supabase = fake
+    user_main.JWT_SECRET = SECRET
+    user_main.access_token_verifier.secret = SECRET
+    user_main.user_data_verifier.secret = SECRET
+
+    warm_token = access_token()
+    cold_tokens = [access_token(sub=f"auth-{i}") for i in range(args.requests)]
+    bursts = math.ceil(args.requests / args.concurrency)
+    expired = [access_token(exp_in=-60, sub=f"auth-{b}") for b in range(bursts)]
+
+    scenarios = {
+        "warm": lambda i: {"access_token": warm_token, "refresh_token": "rt", "user_data": USER_DATA},
+        "cold": lambda i: {"access_token": cold_tokens[i], "refresh_token": "rt", "user_data": USER_DATA},
+        "refresh_burst": lambda i: {"access_token": expired[i // args.concurrency],
+                                    "refresh_token": f"rt-{i // args.concurrency}", "user_data": USER_DATA},
+    }
+
+    results = {}
+    transport = httpx.ASGITransport(app=user_main.app)
+    async with httpx.AsyncClient(transport=transport, timeout=60.0) as client:
+        for name, cookies_for in scenarios.items():
+            before = fake.refresh_calls
+            results[name] = await run_scenario(client, cookies_for, args.requests, args.concurrency)
+            results[name]["refresh_calls"] = fake.refresh_calls - before
+            results[name]["expected_refresh_calls"] = bursts if name == "refresh_burst" else 0
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--refresh-ms", type=float, default=80.0, help="simulated Supabase refresh latency")
+    parser.add_argument("--check", action="store_true", help="exit 1 on failures or unexpected Supabase calls")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    print(f"{args.requests} requests per scenario, concurrency {args.concurrency}, refresh {args.refresh_ms:g}ms")
+    print(f"{'scenario':<15} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'failed':>7} {'refreshes':>10}")
+    for name, r in results.items():
+        print(f"{name:<15} {r['rps']:>8.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['failures']:>7} "
+              f"{r['refresh_calls']:>5}/{r['expected_refresh_calls']:<4}")
+
+    if args.check:
+        problems = [
+            f"{name}: {r['failures']} failed, {r['refresh_calls']} refresh calls (expected {r['expected_refresh_calls']})"
+            for name, r in results.items()
+            if r["failures"] or r["refresh_calls"] != r["expected_refresh_calls"]
+        ]
+        for problem in problems:
+            print(f"FAIL {problem}")
+        if problems:
+            sys.exit(1)
+        print("checkCookies made no unexpected Supabase calls")
+
+
+if __name__ == "__main__":
+    main()
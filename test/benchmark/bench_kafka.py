@@ -0,0 +1,162 @@
+"""
+Throughput benchmark for the email service's Kafka consumer.
+
+Publishes notification events through the real KafkaEventPublisher into an
+in-memory broker stand-in (no Kafka needed) that assigns partitions from the
+message key, then drains the topic twice with the real KafkaEventConsumer:
+  - sequential   consume_events, one handler call at a time (the old path)
+  - concurrent   consume_events_concurrently with --workers key lanes
+
+The handler sleeps --handler-ms per event to stand in for an SMTP round trip.
+Both runs must see every task's events in publish order; the concurrent run
+should be roughly min(workers, distinct keys) times faster.
+
+Usage (from repo root):
+    python test/benchmark/bench_kafka.py [--events 2000] [--tasks 200] [--workers 8]
+    python test/benchmark/bench_kafka.py --check   # exit 1 on reordering or < --min-speedup
+"""
+import argparse
+import importlib.util
+import logging
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import defaultdict, namedtuple
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+EMAIL_DIR = os.path.join(ROOT, "backend/services/email")
+sys.path.append(EMAIL_DIR)
+
+_spec = importlib.util.spec_from_file_location("email_kafka_client", os.path.join(EMAIL_DIR, "kafka_client.py"))
+kafka_client = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(kafka_client)
+
+TOPIC = "notification-events"
+TopicPartition = namedtuple("TopicPartition", "topic partition")
+
+
+class StubBroker:
+    """One topic with keyed partitioning, like Kafka's default partitioner (crc32 instead of murmur2)"""
+
+    def __init__(self, partitions: int):
+        self.partitions: List[List[SimpleNamespace]] = [[] for _ in range(partitions)]
+        self._round_robin = 0
+
+    def send(self, topic, value=None, key=None, partition=None, headers=None):
+        if partition is None:
+            if key:
+                partition = zlib.crc32(key.encode("utf-8")) % len(self.partitions)
+            else:
+                partition = self._round_robin % len(self.partitions)
+                self._round_robin += 1
+        log = self.partitions[partition]
+        log.append(SimpleNamespace(topic=topic, partition=partition, offset=len(log), key=key,
+                                   value=value, headers=headers or []))
+        return SimpleNamespace(get=lambda timeout=None: SimpleNamespace(partition=partition))
+
+
+class StubConsumer:
+    """poll() hands out up to max_poll_records split across partitions; KeyboardInterrupt once drained ends the run"""
+
+    def __init__(self, broker: StubBroker, max_poll_records: int = 500):
+        self.broker = broker
+        self.max_poll_records = max_poll_records
+        self.positions = [0] * len(broker.partitions)
+
+    def poll(self, timeout_ms=1000):
+        batch = {}
+        budget = self.max_poll_records
+        for p, log in enumerate(self.broker.partitions):
+            take = log[self.positions[p]:self.positions[p] + max(1, budget // len(self.positions))]
+            if take:
+                batch[TopicPartition(TOPIC, p)] = take
+                self.positions[p] += len(take)
+        if not batch:
+            raise KeyboardInterrupt
+        return batch
+
+    def highwater(self, tp):
+        return len(self.broker.partitions[tp.partition])
+
+
+def publish(broker: StubBroker, events: int, tasks: int) -> None:
+    publisher = kafka_client.KafkaEventPublisher(bootstrap_servers="stub:9092")
+    publisher.producer = broker
+    for seq in range(events):
+        publisher.publish_event(TOPIC, "task_updated", {"tid": f"task-{seq % tasks}", "uid": "u1", "seq": seq})
+
+
+def drain(broker: StubBroker, handler_ms: float, workers: int = 0) -> Dict[str, Any]:
+    seen = defaultdict(list)
+    lock = threading.Lock()
+
+    def handler(event):
+        time.sleep(handler_ms / 1000)
+        with lock:
+            seen[event["data"]["tid"]].append(event["data"]["seq"])
+
+    consumer = kafka_client.KafkaEventConsumer(bootstrap_servers="stub:9092")
+    consumer.consumer = StubConsumer(broker)
+    start = time.perf_counter()
+    if workers:
+        consumer.consume_events_concurrently(handler, workers=workers)
+    else:
+        consumer.consume_events(handler)
+    elapsed = time.perf_counter() - start
+
+    processed = sum(len(v) for v in seen.values())
+    in_order = all(seqs == sorted(seqs) for seqs in seen.values())
+    return {"processed": processed, "seconds": elapsed, "eps": processed / elapsed, "in_order": in_order}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--tasks", type=int, default=200, help="distinct task ids (message keys)")
+    parser.add_argument("--partitions", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--handler-ms", type=float, default=2.0, help="simulated per-event work")
+    parser.add_argument("--check", action="store_true", help="exit 1 on reordering or too little speedup")
+    parser.add_argument("--min-speedup", type=float, default=3.0)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    broker = StubBroker(args.partitions)
+    publish(broker, args.events, args.tasks)
+    keyed = sum(1 for log in broker.partitions for m in log if m.key)
+
+    sequential = drain(broker, args.handler_ms)
+    concurrent = drain(broker, args.handler_ms, workers=args.workers)
+    speedup = concurrent["eps"] / sequential["eps"]
+
+    print(f"{args.events} events, {args.tasks} tasks, {args.partitions} partitions, "
+          f"{args.handler_ms:g}ms per event, {keyed}/{args.events} keyed")
+    print(f"{'mode':<12} {'events/s':>10} {'seconds':>8} {'in order':>9}")
+    for name, r in (("sequential", sequential), (f"{args.workers} workers", concurrent)):
+        print(f"{name:<12} {r['eps']:>10.1f} {r['seconds']:>8.2f} {str(r['in_order']):>9}")
+    print(f"speedup x{speedup:.1f}")
+
+    if args.check:
+        problems = []
+        if keyed != args.events:
+            problems.append(f"only {keyed}/{args.events} events were keyed")
+        for name, r in (("sequential", sequential), ("concurrent", concurrent)):
+            if r["processed"] != args.events:
+                problems.append(f"{name}: processed {r['processed']}/{args.events}")
+            if not r["in_order"]:
+                problems.append(f"{name}: events for a task were reordered")
+        if speedup < args.min_speedup:
+            problems.append(f"speedup x{speedup:.1f} below x{args.min_speedup:g}")
+        for problem in problems:
+            print(f"FAIL {problem}")
+        if problems:
+            sys.exit(1)
+        print("per-task order kept with parallel consumption")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Cross-service latency benchmark for the composite endpoints.
+
+Runs the manage-task and manage-project composites in-process against the
+in-memory stub services in stub_services.py (no Supabase, Kafka or network)
+and drives their main endpoints with a seeded, realistically sized dataset:
+  - GET  manage-task    /tasks/user/{uid}
+  - GET  manage-project /uid/{uid}
+  - POST manage-task    /createTask
+  - POST manage-task    /tasks/{tid}/messages       (chat, with a mention)
+  - POST manage-task    /tasks/{tid}/time-entries
+
+For every scenario it reports p50/p95/p99 latency, CPU per request (composite
+and stubs share the process, so this is the whole call tree) and downstream
+calls per request by service. Call counts are deterministic for a given
+dataset, so they are the primary regression signal; latency is compared with
+a relative threshold plus an absolute floor.
+
+Usage (from repo root):
+    python test/benchmark/bench_latency.py [--iterations 30] [--tasks 2000]
+    python test/benchmark/bench_latency.py --write-baseline test/benchmark/baseline.json
+    python test/benchmark/bench_latency.py --baseline test/benchmark/baseline.json --max-regression 0.25
+
+With --baseline the script exits 1 when a scenario makes more downstream calls
+than the baseline, or its p50 exceeds the baseline p50 by more than both
+--max-regression (a fraction, 0.25 = 25%) and --min-regression-ms. The gate
+uses the median and an absolute floor because a p95 taken from 20 samples of a
+millisecond-scale scenario is one slow sample, and moves by a few milliseconds
+with scheduler jitter alone. Re-record the baseline (with the
+CI settings, --iterations 20) in the same change as any intentional latency or
+call-count change; otherwise a stale baseline hides later regressions.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import logging.handlers
+import math
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "backend/services/composite/manage_task"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("INTERNAL_API_KEY", "benchmark")
+
+from backend.services.composite.manage_project import main as manage_project  # noqa: E402
+from backend.services.composite.manage_task import main as manage_task  # noqa: E402
+from stub_services import Dataset, FakeKafkaPublisher, ServiceRouter, build_stub_apps  # noqa: E402
+
+MANAGE_TASK = "http://manage-task:4000"
+MANAGE_PROJECT = "http://manage-project:4100"
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an unsorted sample list."""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def build_scenarios(ds: Dataset) -> Dict[str, Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]]:
+    # Reads run before writes so created tasks never change what the reads see
+    chat_tasks = [tid for tid in ds.task_ids if ds.heavy_user in ds.tasks[tid]["collaborators"]]
+    # A staff member on a single project, the common case for the projects page
+    project_user = next(
+        uid for uid in ds.user_ids
+        if ds.users[uid]["role"] == "staff" and sum(uid in p["members"] for p in ds.projects.values()) == 1
+    )
+
+    def create_task(client, i):
+        pid = ds.project_ids[i % len(ds.project_ids)]
+        team = ds.projects[pid]["members"]
+        return client.post(f"{MANAGE_TASK}/createTask", json={
+            "name": f"Benchmark task {i}",
+            "pid": pid,
+            "desc": "Created by the latency benchmark",
+            "priorityLevel": 5,
+            "created_by_uid": team[0],
+            "collaborators": team[1:4],
+            "schedule": {"status": "ongoing", "start": "2025-10-25T09:00:00Z",
+                         "deadline": "2025-10-30T17:00:00Z", "is_recurring": False},
+        })
+
+    def chat_send(client, i):
+        tid = chat_tasks[i % len(chat_tasks)]
+        task = ds.tasks[tid]
+        return client.post(f"{MANAGE_TASK}/tasks/{tid}/messages", json={
+            "message": f"Benchmark message {i}",
+            "sender_id": task["created_by_uid"],
+            "mentions": task["collaborators"][:1],
+        })
+
+    def time_entry_add(client, i):
+        tid = chat_tasks[i % len(chat_tasks)]
+        return client.post(f"{MANAGE_TASK}/tasks/{tid}/time-entries", json={
+            "entry": {"hours": 1, "minutes": 30, "description": "Benchmark"},
+            "user_id": ds.heavy_user,
+            "user_name": ds.users[ds.heavy_user]["name"],
+        })
+
+    return {
+        "tasks_by_user": lambda client, i: client.get(f"{MANAGE_TASK}/tasks/user/{ds.heavy_user}"),
+        "projects_by_user": lambda client, i: client.get(f"{MANAGE_PROJECT}/uid/{project_user}"),
+        "create_task": create_task,
+        "chat_send": chat_send,
+        "time_entry_add": time_entry_add,
+    }
+
+
+@contextlib.contextmanager
+def quiet():
+    """Send the services' debug prints and log output to /dev/null while measuring."""
+    with open(os.devnull, "w") as devnull:
+        handlers = [h for h in logging.getLogger().handlers if isinstance(h, logging.StreamHandler)]
+        # setup_logging() hands records to a QueueListener thread; its stdout handler is not on the root logger.
+        listeners = {id(m._listener): m._listener for m in list(sys.modules.values())
+                     if isinstance(getattr(m, "_listener", None), logging.handlers.QueueListener)}
+        handlers += [h for listener in listeners.values() for h in listener.handlers
+                     if isinstance(h, logging.StreamHandler)]
+        handlers = list(dict.fromkeys(handlers))
+        streams = [h.setStream(devnull) for h in handlers]
+        try:
+            with contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+                yield
+        finally:
+            for handler, stream in zip(handlers, streams):
+                handler.setStream(stream)
+
+
+async def settle():
+    """Let manage-task's background saga steps finish, so their calls count for the scenario that made them."""
+    await manage_task.sagas.drain(timeout=None)
+
+
+async def run_scenario(request, driver, router, iterations, warmup, concurrency) -> Dict[str, Any]:
+    for i in range(warmup):
+        await request(driver, i)
+    await settle()
+
+    router.reset()
+    latencies: List[float] = []
+    failures = 0
+
+    async def one(i):
+        nonlocal failures
+        start = time.perf_counter()
+        response = await request(driver, warmup + i)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            failures += 1
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for batch in range(0, iterations, concurrency):
+        await asyncio.gather(*(one(i) for i in range(batch, min(batch + concurrency, iterations))))
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    await settle()
+
+    calls = {host: round(count / iterations, 2) for host, count in sorted(router.calls.items())}
+    return {
+        "requests": iterations,
+        "failures": failures,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "cpu_ms": round(cpu / iterations * 1000, 2),
+        "rps": round(iterations / wall, 1),
+        "calls": calls,
+        "total_calls": round(sum(calls.values()), 2),
+    }
+
+
+async def run(args) -> Dict[str, Any]:
+    ds = Dataset(users=args.users, projects=args.projects, tasks=args.tasks)
+    apps = build_stub_apps(ds)
+    apps["manage-task"] = manage_task.app
+    router = ServiceRouter(apps)
+    driver_router = ServiceRouter({"manage-task": manage_task.app, "manage-project": manage_project.app})
+
+    real_client = httpx.AsyncClient
+
+    class RoutedAsyncClient(real_client):
+        def __init__(self, *a, **kw):
+            kw.setdefault("transport", router)
+            super().__init__(*a, **kw)
+
+    manage_task.kafka_publisher = FakeKafkaPublisher()
+    results = {}
+    httpx.AsyncClient = RoutedAsyncClient
+    try:
+        async with real_client(transport=driver_router, timeout=60.0) as driver:
+            scenarios = build_scenarios(ds)
+            for name in args.scenarios or scenarios:
+                with quiet():
+                    results[name] = await run_scenario(
+                        scenarios[name], driver, router, args.iterations, args.warmup, args.concurrency
+                    )
+    finally:
+        httpx.AsyncClient = real_client
+
+    return {
+        "config": {"users": args.users, "projects": args.projects, "tasks": args.tasks,
+                   "iterations": args.iterations, "concurrency": args.concurrency},
+        "scenarios": results,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], max_regression: float,
+            min_regression_ms: float = 5.0) -> List[str]:
+    problems = []
+    for name, current in report["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        if current["failures"]:
+            problems.append(f"{name}: {current['failures']} request(s) failed")
+        if current["total_calls"] > base["total_calls"]:
+            problems.append(f"{name}: {current['total_calls']} downstream calls/request (baseline {base['total_calls']})")
+        limit = max(base["p50_ms"] * (1 + max_regression), base["p50_ms"] + min_regression_ms)
+        if current["p50_ms"] > limit:
+            problems.append(f"{name}: p50 {current['p50_ms']}ms over limit {limit:.2f}ms (baseline {base['p50_ms']}ms)")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--projects", type=int, default=40)
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--scenarios", nargs="*", help="subset of scenarios to run")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    parser.add_argument("--min-regression-ms", type=float, default=5.0,
+                        help="p50 slowdowns smaller than this are never reported")
+    parser.add_argument("--write-baseline", help="write this run's results to the given path")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    print(f"{args.tasks} tasks / {args.projects} projects / {args.users} users, "
+          f"{args.iterations} requests per scenario, concurrency {args.concurrency}")
+    print(f"{'scenario':<18} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'cpu ms':>8} {'req/s':>7} {'calls':>7}  per service")
+    for name, r in report["scenarios"].items():
+        per_service = ", ".join(f"{host}={count:g}" for host, count in r["calls"].items())
+        print(f"{name:<18} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['cpu_ms']:>8.1f} "
+              f"{r['rps']:>7.1f} {r['total_calls']:>7g}  {per_service}")
+
+    if args.write_baseline:
+        with open(args.write_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.write_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.max_regression, args.min_regression_ms)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
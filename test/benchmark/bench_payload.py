@@ -0,0 +1,108 @@
+"""
+Payload benchmark for composite list responses.
+
+Builds a synthetic 5k-task project shaped like the manage-project /pid response
+and reports bytes on the wire and serialization CPU time for:
+  - stdlib json (FastAPI's default JSONResponse) vs orjson (ORJSONResponse)
+  - full payload vs fields=/include= projection
+  - identity vs gzip (GZipMiddleware is configured with compresslevel=6)
+
+Usage (from repo root):
+    python test/benchmark/bench_payload.py [--tasks 5000] [--repeat 5]
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import orjson
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from backend.services.composite.manage_project.main import parse_projection, project_task  # noqa: E402
+
+
+def build_project(task_count: int) -> dict:
+    now = datetime.now(timezone.utc)
+    users = [str(uuid.uuid4()) for _ in range(20)]
+    tasks = []
+    for i in range(task_count):
+        tid = str(uuid.uuid4())
+        tasks.append({
+            "id": tid,
+            "name": f"Task {i}",
+            "desc": "Set up the initial project structure and dependencies " * 2,
+            "notes": "Remember to update the README file",
+            "pid": "40339da5-9a62-4195-bbe5-c69f2fc04ed6",
+            "parentTaskId": tasks[i // 4]["id"] if i >= 4 else None,
+            "created_by_uid": users[i % len(users)],
+            "collaborators": users[i % 5: i % 5 + 3],
+            "priorityLevel": i % 10 + 1,
+            "label": "Setup",
+            "status": ["ongoing", "complete", "under review"][i % 3],
+            "deadline": (now + timedelta(days=i % 30)).isoformat(),
+            "updated_timestamp": now.isoformat(),
+            "messages": [
+                {"id": str(uuid.uuid4()), "message": f"Update {m} on task {i}", "sender_id": users[m],
+                 "timestamp": now.isoformat(), "mentions": [], "attachments": []}
+                for m in range(6)
+            ],
+            "time_entries": [
+                {"id": str(uuid.uuid4()), "hours": 1, "minutes": 30, "description": "Work",
+                 "date": now.isoformat(), "userId": users[e], "userName": f"User {e}"}
+                for e in range(3)
+            ],
+        })
+    return {"message": "Project retrieved successfully", "project_id": "p1",
+            "project": {"id": "p1", "name": "Benchmark", "tasks": tasks}}
+
+
+def stdlib_dumps(content) -> bytes:
+    # Mirrors starlette.responses.JSONResponse.render
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def orjson_dumps(content) -> bytes:
+    # Mirrors fastapi.responses.ORJSONResponse.render
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def measure(dumps, content, repeat: int, gzip_level: int):
+    best = float("inf")
+    body = b""
+    for _ in range(repeat):
+        start = time.process_time()
+        body = dumps(content)
+        best = min(best, time.process_time() - start)
+    start = time.process_time()
+    compressed = gzip.compress(body, compresslevel=gzip_level)
+    gzip_cpu = time.process_time() - start
+    return len(body), len(compressed), best, gzip_cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--gzip-level", type=int, default=6)
+    args = parser.parse_args()
+
+    full = build_project(args.tasks)
+    field_set = parse_projection("name,status,deadline,priorityLevel,parentTaskId,collaborators")
+    lean = {**full, "project": {**full["project"], "tasks": [
+        project_task(t, field_set, parse_projection("")) for t in full["project"]["tasks"]
+    ]}}
+
+    print(f"{args.tasks} tasks, best of {args.repeat}, gzip level {args.gzip_level}")
+    print(f"{'payload':<8} {'encoder':<8} {'bytes':>12} {'gzip bytes':>12} {'encode ms':>10} {'gzip ms':>9}")
+    for label, content in (("full", full), ("fields", lean)):
+        for name, dumps in (("json", stdlib_dumps), ("orjson", orjson_dumps)):
+            raw, packed, cpu, gzip_cpu = measure(dumps, content, args.repeat, args.gzip_level)
+            print(f"{label:<8} {name:<8} {raw:>12,} {packed:>12,} {cpu * 1000:>10.1f} {gzip_cpu * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+In-memory stand-ins for the atomic services, used by the latency benchmark.
+
+Each stub is a small FastAPI app that answers the routes the composites call
+(same paths and response shapes as the real Task / User / Project / Schedule
+services) from a shared in-memory dataset instead of Supabase. ServiceRouter
+is an httpx transport that sends every request to the app registered for its
+host name ("tasks", "user", "project", "schedule", "manage-task") in-process
+and counts calls per service, so a benchmark run needs no containers, network
+or database.
+"""
+import random
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+from fastapi import Body, FastAPI, HTTPException
+
+DEPARTMENTS = ["Tech", "Finance", "HR", "Sales", "Operations"]
+
+
+class Dataset:
+    """Synthetic users, projects, tasks and latest schedules, seeded for repeatable runs."""
+
+    def __init__(self, users: int = 200, projects: int = 40, tasks: int = 2000, team_size: int = 6, seed: int = 7):
+        rng = random.Random(seed)
+        now = datetime.now(timezone.utc)
+
+        def new_id() -> str:
+            return str(uuid.UUID(int=rng.getrandbits(128)))
+
+        self.users: Dict[str, Dict[str, Any]] = {}
+        for i in range(users):
+            uid = new_id()
+            self.users[uid] = {
+                "id": uid,
+                "name": f"User {i}",
+                "email": f"user{i}@example.com",
+                "role": "manager" if i % 10 == 0 else "staff",
+                "department": DEPARTMENTS[i % len(DEPARTMENTS)],
+            }
+        user_ids = list(self.users)
+
+        self.projects: Dict[str, Dict[str, Any]] = {}
+        teams: Dict[str, List[str]] = {}
+        for i in range(projects):
+            pid = new_id()
+            owner = user_ids[i % len(user_ids)]
+            teams[pid] = [owner, *rng.sample([u for u in user_ids if u != owner], team_size - 1)]
+            self.projects[pid] = {
+                "id": pid,
+                "uid": owner,
+                "name": f"Project {i}",
+                "desc": "Benchmark project",
+                "members": [owner],
+                "owner_department": self.users[owner]["department"],
+                "created_at": now.isoformat(),
+            }
+        project_ids = list(self.projects)
+
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        self.schedules: Dict[str, Dict[str, Any]] = {}
+        task_ids: List[str] = []
+        for i in range(tasks):
+            tid = new_id()
+            pid = project_ids[i % len(project_ids)]
+            creator = rng.choice(teams[pid])
+            collaborators = rng.sample(teams[pid], 3)
+            siblings = [t for t in task_ids[-20:] if self.tasks[t]["pid"] == pid]
+            self.tasks[tid] = {
+                "id": tid,
+                "name": f"Task {i}",
+                "desc": "Set up the initial project structure and dependencies",
+                "notes": "Remember to update the README file",
+                "pid": pid,
+                "parentTaskId": siblings[0] if siblings and i % 3 == 0 else None,
+                "created_by_uid": creator,
+                "collaborators": collaborators,
+                "priorityLevel": i % 10 + 1,
+                "label": "Setup",
+                "messages": [
+                    {"id": new_id(), "sender_id": creator, "message": f"Update {m}",
+                     "timestamp": now.isoformat(), "mentions": [], "attachments": []}
+                    for m in range(3)
+                ],
+                "time_entries": [
+                    {"id": new_id(), "hours": 1, "minutes": 15, "description": "Work",
+                     "date": now.isoformat(), "userId": creator, "userName": "Creator"}
+                ],
+                "updated_timestamp": now.isoformat(),
+            }
+            self.schedules[tid] = {
+                "sid": new_id(),
+                "tid": tid,
+                "status": ["ongoing", "complete", "under review", "to do"][i % 4],
+                "start": (now - timedelta(days=i % 14)).isoformat(),
+                "deadline": (now + timedelta(days=i % 30 - 5)).isoformat(),
+                "is_recurring": False,
+            }
+            project = self.projects[pid]
+            for uid in [creator, *collaborators]:
+                if uid not in project["members"]:
+                    project["members"].append(uid)
+            task_ids.append(tid)
+
+        # The busiest collaborator is the "typical heavy user" benchmarks read as
+        load = Counter(uid for t in self.tasks.values() for uid in t["collaborators"])
+        self.heavy_user = load.most_common(1)[0][0]
+        self.manager = next(u["id"] for u in self.users.values() if u["role"] == "manager")
+        self.user_ids = user_ids
+        self.project_ids = project_ids
+        self.task_ids = task_ids
+
+
+def build_user_app(ds: Dataset) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/internal/{user_id}")
+    def get_user(user_id: str):
+        user = ds.users.get(user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        return user
+
+    return app
+
+
+def build_project_app(ds: Dataset) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/pid/{project_id}")
+    def get_project(project_id: str):
+        project = ds.projects.get(project_id)
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+        return {"message": "Project retrieved successfully", "project": project}
+
+    @app.get("/uid/{user_id}/visible")
+    def get_visible(user_id: str):
+        # Like projects_visible_to_user: role and department come from the user's own row
+        user = ds.users.get(user_id) or {}
+        role = (user.get("role") or "").lower()
+        see_all = role in ("hr", "admin")
+        dept = user.get("department") if role == "manager" else None
+        projects = [
+            p for p in ds.projects.values()
+            if see_all or p["uid"] == user_id or user_id in p["members"]
+            or (dept and p["owner_department"] == dept)
+        ]
+        return {"message": f"{len(projects)} project(s) visible to user {user_id}", "project": projects}
+
+    @app.post("/pid/{project_id}/members/{action}")
+    def change_members(project_id: str, action: str, body: Dict[str, Any] = Body(...)):
+        project = ds.projects.get(project_id)
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+        user_ids = list(dict.fromkeys(body.get("user_ids") or []))
+        if action == "add":
+            changed = [u for u in user_ids if u not in project["members"]]
+            project["members"].extend(changed)
+        else:
+            changed = [u for u in user_ids if u in project["members"]]
+            project["members"] = [u for u in project["members"] if u not in changed]
+        return {"message": f"{len(changed)} member(s) changed", "project": project, "changed": changed}
+
+    return app
+
+
+def build_task_app(ds: Dataset) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/tasks")
+    def get_all_tasks():
+        tasks = list(ds.tasks.values())
+        return {"message": f"{len(tasks)} task(s) retrieved", "tasks": tasks}
+
+    @app.get("/tid/{task_id}")
+    def get_task(task_id: str):
+        task = ds.tasks.get(task_id)
+        if not task:
+            return {"message": "Task not found", "task": None}
+        return {"message": "Task retrieved successfully", "task": task}
+
+    @app.get("/pid/{project_id}")
+    def get_tasks_by_project(project_id: str):
+        tasks = [t for t in ds.tasks.values() if t["pid"] == project_id]
+        return {"message": f"{len(tasks)} task(s) retrieved", "tasks": tasks}
+
+    @app.get("/task-participants/{task_id}")
+    def get_participants(task_id: str):
+        task = ds.tasks.get(task_id)
+        if not task:
+            return {"message": "No participants found for this task", "participants": []}
+        uids = dict.fromkeys([task["created_by_uid"], *task["collaborators"]])
+        participants = [{"uid": u, "tid": task_id, "name": ds.users[u]["name"]} for u in uids if u in ds.users]
+        return {"message": f"{len(participants)} participant(s) retrieved", "participants": participants}
+
+    @app.post("/createTask")
+    def create_task(task: Dict[str, Any] = Body(...)):
+        tid = str(uuid.uuid4())
+        row = {"messages": [], "time_entries": [], **task, "id": tid,
+               "updated_timestamp": datetime.now(timezone.utc).isoformat()}
+        ds.tasks[tid] = row
+        return {"message": "Task created successfully", "task": row}
+
+    @app.put("/{task_id}")
+    def update_task(task_id: str, updates: Dict[str, Any] = Body(...)):
+        task = ds.tasks.get(task_id)
+        if not task:
+            raise HTTPException(status_code=404, detail="Task not found")
+        task.update(updates)
+        return {"message": "Task updated successfully", "task": task}
+
+    @app.delete("/{task_id}")
+    def delete_task(task_id: str):
+        task = ds.tasks.pop(task_id, None)
+        if not task:
+            raise HTTPException(status_code=404, detail="Task not found")
+        return {"message": "Task deleted successfully", "task": task}
+
+    @app.post("/tasks/{task_id}/time-entries")
+    def add_time_entry(task_id: str, payload: Dict[str, Any] = Body(...)):
+        task = ds.tasks.get(task_id)
+        if not task:
+            raise HTTPException(status_code=404, detail="Task not found")
+        entry = {**payload.get("entry", {}), "id": str(uuid.uuid4()),
+                 "userId": payload.get("user_id"), "userName": payload.get("user_name"),
+                 "date": datetime.now(timezone.utc).isoformat()}
+        task.setdefault("time_entries", []).append(entry)
+        return {"message": "Time entry added successfully", "task_id": task_id, "entry": entry}
+
+    return app
+
+
+def build_schedule_app(ds: Dataset) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/tid/{task_id}/latest")
+    def get_latest(task_id: str):
+        schedule = ds.schedules.get(task_id)
+        if not schedule:
+            raise HTTPException(status_code=404, detail="Schedule not found")
+        return schedule
+
+    @app.post("/")
+    def create_schedule(schedule: Dict[str, Any] = Body(...)):
+        row = {**schedule, "sid": str(uuid.uuid4())}
+        ds.schedules[row["tid"]] = row
+        return row
+
+    return app
+
+
+class FakeProducer:
+    def flush(self, timeout=None):
+        return None
+
+
+class FakeKafkaPublisher:
+    """Drop-in for KafkaEventPublisher that records events instead of sending them."""
+
+    def __init__(self):
+        self.producer = FakeProducer()
+        self.events: List[Dict[str, Any]] = []
+
+    def _connect(self):
+        return None
+
+    def publish_event(self, topic: str, event_type: str, data: Dict[str, Any], key: Optional[str] = None,
+                      partition: Optional[int] = None):
+        self.events.append({"topic": topic, "event_type": event_type, "key": key})
+        return True
+
+    def close(self):
+        return None
+
+
+class ServiceRouter(httpx.AsyncBaseTransport):
+    """httpx transport dispatching each request to the in-process app for its host."""
+
+    def __init__(self, apps: Dict[str, FastAPI]):
+        self.transports = {host: httpx.ASGITransport(app=app) for host, app in apps.items()}
+        self.calls: Counter = Counter()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        transport = self.transports.get(request.url.host)
+        if transport is None:
+            raise httpx.ConnectError(f"No stub service registered for {request.url.host}", request=request)
+        self.calls[request.url.host] += 1
+        return await transport.handle_async_request(request)
+
+    def reset(self) -> None:
+        self.calls.clear()
+
+
+def build_stub_apps(ds: Dataset) -> Dict[str, FastAPI]:
+    """Stub apps keyed by the host names the composites use in their *_SERVICE_URL constants."""
+    return {
+        "tasks": build_task_app(ds),
+        "user": build_user_app(ds),
+        "project": build_project_app(ds),
+        "schedule": build_schedule_app(ds),
+    }
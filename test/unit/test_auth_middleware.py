@@ -0,0 +1,119 @@
+import pytest
+import os
+import sys
+import time
+
+import jwt
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+# Every service ships an identical auth_middleware.py; import it the way the services do
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../backend/services/composite/manage_task")))
+import auth_middleware
+
+SECRET = "unit-test-secret-for-user-data-cookies"
+INTERNAL_KEY = "unit-test-internal-key"
+
+
+def user_data_cookie(exp_in: int = 3600, **claims) -> str:
+    payload = {"id": "u1", "email": "alice@example.com", "role": "Manager", "name": "Alice",
+               "department": "Sales", "exp": int(time.time()) + exp_in}
+    payload.update(claims)
+    return jwt.encode(payload, SECRET, algorithm="HS256")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", SECRET)
+    monkeypatch.setenv("INTERNAL_API_KEY", INTERNAL_KEY)
+    auth_middleware._verified.clear()
+
+    app = FastAPI()
+    auth_middleware.install_auth(app, internal_paths=("/internal",))
+
+    @app.get("/whoami")
+    async def whoami(request: Request):
+        return {"user": auth_middleware.current_user(request)}
+
+    @app.get("/internal/{uid}")
+    async def internal(uid: str):
+        return {"id": uid}
+
+    return TestClient(app)
+
+
+# -------------------------------
+# Internal API key
+# -------------------------------
+def test_wrong_internal_key_is_rejected_everywhere(client):
+    response = client.get("/whoami", headers={"X-Internal-API-Key": "nope"})
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Invalid or missing internal API key"}
+
+
+def test_internal_paths_require_the_key(client):
+    assert client.get("/internal/u1").status_code == 401
+    assert client.get("/internal/u1", headers={"X-Internal-API-Key": INTERNAL_KEY}).json() == {"id": "u1"}
+
+
+def test_key_is_optional_outside_internal_paths(client):
+    assert client.get("/whoami").status_code == 200
+
+
+def test_internal_key_matches():
+    assert auth_middleware.internal_key_matches("k", "k")
+    assert not auth_middleware.internal_key_matches("k", "kk")
+    assert not auth_middleware.internal_key_matches(None, "k")
+    assert not auth_middleware.internal_key_matches("k", "")
+
+
+# -------------------------------
+# Caller identity
+# -------------------------------
+def test_user_data_cookie_sets_request_user(client):
+    client.cookies.set("user_data", user_data_cookie())
+    user = client.get("/whoami").json()["user"]
+    assert user == {"id": "u1", "email": "alice@example.com", "role": "manager", "name": "Alice",
+                    "department": "Sales"}
+
+
+@pytest.mark.parametrize("cookie", [
+    user_data_cookie(exp_in=-60),
+    jwt.encode({"id": "u1", "role": "admin"}, "some-other-secret-that-is-long-enough", algorithm="HS256"),
+    "not-a-jwt",
+])
+def test_expired_or_forged_cookie_is_anonymous(client, cookie):
+    client.cookies.set("user_data", cookie)
+    assert client.get("/whoami").json() == {"user": None}
+
+
+def test_cached_identity_expires_with_the_cookie():
+    """A memoized identity is only returned until its expiry, then the cookie is verified again"""
+    auth_middleware._verified.clear()
+    cookie = user_data_cookie(exp_in=60)
+    assert auth_middleware.decode_user_data(cookie, SECRET)["id"] == "u1"
+    expires_at, _ = auth_middleware._verified[cookie]
+    assert expires_at <= time.time() + 60
+
+    auth_middleware._verified[cookie] = (time.time() + 60, {"id": "cached"})
+    assert auth_middleware.decode_user_data(cookie, SECRET) == {"id": "cached"}
+
+    auth_middleware._verified[cookie] = (time.time() - 1, {"id": "stale"})
+    assert auth_middleware.decode_user_data(cookie, SECRET)["id"] == "u1"
+
+
+def test_cookie_without_exp_is_anonymous_and_invalid_cookies_are_not_cached():
+    auth_middleware._verified.clear()
+    no_exp = jwt.encode({"id": "u1", "role": "admin"}, SECRET, algorithm="HS256")
+    assert auth_middleware.decode_user_data(no_exp, SECRET) is None
+    assert auth_middleware.decode_user_data("not-a-jwt", SECRET) is None
+    assert auth_middleware.decode_user_data(user_data_cookie(exp_in=-60), SECRET) is None
+    assert len(auth_middleware._verified) == 0
+
+
+def test_caller_profile_only_for_own_uid():
+    request = type("R", (), {"state": type("S", (), {"user": {"id": "u1", "name": "Alice"}})()})()
+    assert auth_middleware.caller_profile(request, "u1") == {"id": "u1", "name": "Alice"}
+    assert auth_middleware.caller_profile(request, "u2") is None
+    assert auth_middleware.caller_profile(None, "u1") is None
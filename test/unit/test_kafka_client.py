@@ -0,0 +1,182 @@
+import pytest
+import asyncio
+import importlib.util
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+EMAIL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../backend/services/email"))
+sys.path.append(EMAIL_DIR)
+
+# Several services ship a kafka_client.py; load the email service's copy under its own name
+_spec = importlib.util.spec_from_file_location("email_kafka_client", os.path.join(EMAIL_DIR, "kafka_client.py"))
+kafka_client = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(kafka_client)
+
+NOTIFY_USER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../backend/services/composite/notify_user"))
+_spec = importlib.util.spec_from_file_location("notify_user_kafka_client", os.path.join(NOTIFY_USER_DIR, "kafka_client.py"))
+notify_user_kafka_client = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(notify_user_kafka_client)
+
+
+def message(key, seq, partition=0):
+    return SimpleNamespace(key=key, partition=partition, topic="notification-events", headers=[],
+                           value={"event_type": "task_updated", "data": {"tid": key, "seq": seq}})
+
+
+# -------------------------------
+# Partition keys
+# -------------------------------
+@pytest.mark.parametrize("data, expected", [
+    ({"tid": "t1", "uid": "u1"}, "t1"),
+    ({"task_id": "t2", "uid": "u1"}, "t2"),
+    ({"sid": 7, "uid": "u1"}, "7"),
+    ({"project_id": "p1", "user_id": "u2"}, "p1"),
+    ({"uid": "u1", "name": "Alice"}, "u1"),
+    ({"tid": None, "uid": "u3"}, "u3"),
+    ({"test": True}, None),
+    (None, None),
+])
+def test_partition_key(data, expected):
+    assert kafka_client.partition_key(data) == expected
+
+
+def test_publish_event_keys_by_entity_unless_overridden():
+    publisher = kafka_client.KafkaEventPublisher(bootstrap_servers="stub:9092")
+    publisher.producer = MagicMock()
+
+    assert publisher.publish_event("notification-events", "task_updated", {"tid": "t1", "uid": "u1"})
+    assert publisher.producer.send.call_args.kwargs["key"] == "t1"
+
+    publisher.publish_event("notification-events", "task_updated", {"tid": "t1"}, key="custom")
+    assert publisher.producer.send.call_args.kwargs["key"] == "custom"
+
+    publisher.publish_event("notification-events", "task_updated", {"tid": "t1"}, partition=2)
+    assert publisher.producer.send.call_args.kwargs["key"] is None
+
+
+def test_publish_event_async_awaits_the_ack_from_the_producer_thread():
+    from kafka.errors import KafkaTimeoutError
+    from kafka.future import Future
+
+    publisher = notify_user_kafka_client.KafkaEventPublisher(bootstrap_servers="stub:9092")
+    publisher.producer = MagicMock()
+    sends = []
+
+    def send(topic, **kwargs):
+        sends.append(Future())
+        return sends[-1]
+
+    publisher.producer.send.side_effect = send
+
+    async def publish_two():
+        first = asyncio.ensure_future(publisher.publish_event_async("notification-events", "x", {"tid": "t1"}))
+        second = asyncio.ensure_future(publisher.publish_event_async("notification-events", "x", {"tid": "t2"}))
+        await asyncio.sleep(0.01)
+        # Both are in flight before either is acked; acks arrive on the producer's own thread
+        assert len(sends) == 2 and not first.done()
+        threading.Thread(target=sends[0].success, args=(SimpleNamespace(partition=0),)).start()
+        threading.Thread(target=sends[1].failure, args=(KafkaTimeoutError(),)).start()
+        return await first, await second
+
+    assert asyncio.run(publish_two()) == (True, False)
+    assert publisher.producer.send.call_args_list[0].kwargs["key"] == "t1"
+
+
+# -------------------------------
+# Concurrent consumption
+# -------------------------------
+def test_dispatcher_keeps_per_key_order_and_runs_keys_in_parallel():
+    seen = defaultdict(list)
+    active, peak = 0, 0
+    lock = threading.Lock()
+
+    def process(msg):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(random.uniform(0, 0.002))
+        with lock:
+            seen[msg.key].append(msg.value["data"]["seq"])
+            active -= 1
+
+    keys = [f"task-{i}" for i in range(20)]
+    batch = defaultdict(list)
+    for seq in range(10):
+        for key in keys:
+            batch[hash(key) % 3].append(message(key, seq, partition=hash(key) % 3))
+
+    dispatcher = kafka_client.KeyedDispatcher(process, workers=8)
+    try:
+        dispatcher.run_batch(batch)
+    finally:
+        dispatcher.close()
+
+    assert all(seen[key] == list(range(10)) for key in keys)
+    assert peak > 1
+
+
+def test_dispatcher_without_key_falls_back_to_partition():
+    dispatcher = kafka_client.KeyedDispatcher(lambda msg: None, workers=4)
+    try:
+        assert dispatcher.lane_for(message(None, 0, partition=6)) == 2
+        assert dispatcher.lane_for(message("t1", 0)) == dispatcher.lane_for(message(b"t1", 1, partition=5))
+    finally:
+        dispatcher.close()
+
+
+def test_handler_errors_do_not_stop_the_batch():
+    handled = []
+
+    def handler(event):
+        if event["data"]["seq"] == 0:
+            raise RuntimeError("smtp down")
+        handled.append(event["data"]["seq"])
+
+    consumer = kafka_client.KafkaEventConsumer(bootstrap_servers="stub:9092")
+    dispatcher = kafka_client.KeyedDispatcher(lambda msg: consumer._process(handler, msg), workers=2)
+    try:
+        dispatcher.run_batch({0: [message("t1", 0), message("t1", 1), message("t1", 2)]})
+    finally:
+        dispatcher.close()
+    assert handled == [1, 2]
+
+
+# -------------------------------
+# Batch consumption (notify_user / schedule copy)
+# -------------------------------
+def test_consume_batches_hands_each_poll_to_the_handler_until_stopped():
+    stop = threading.Event()
+    polls = [
+        {0: [message("t1", 0), message("t1", 1)], 1: [message("t2", 2, partition=1)]},
+        {},
+        {0: [message("t1", 3)]},
+    ]
+    batches = []
+
+    def poll(timeout_ms, max_records):
+        if not polls:
+            stop.set()
+            return {}
+        return polls.pop(0)
+
+    def handler(events):
+        if events[0]["data"]["seq"] == 3:
+            raise RuntimeError("boom")
+        batches.append([e["data"]["seq"] for e in events])
+
+    consumer = notify_user_kafka_client.KafkaEventConsumer(bootstrap_servers="stub:9092")
+    consumer.consumer = MagicMock(poll=MagicMock(side_effect=poll))
+    consumer.consume_batches(handler, max_records=10, stop=stop)
+
+    # Empty polls are skipped and a failing batch does not end the loop
+    assert batches == [[0, 1, 2]]
+    assert consumer.consumer.poll.call_count == 4
+
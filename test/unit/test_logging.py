@@ -0,0 +1,109 @@
+import pytest
+import json
+import logging
+import os
+import queue
+import sys
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+# Every service ships an identical logging_config.py; import it the way the services do
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../backend/services/composite/manage_task")))
+import logging_config
+import tracing
+
+
+class _Expensive:
+    """Counts how often it is turned into a string"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __str__(self):
+        self.calls += 1
+        return "big payload"
+
+
+@pytest.fixture
+def queued_logger():
+    """A logger wired like setup_logging() but onto a queue the test can read"""
+    log_queue = queue.Queue()
+    handler = logging_config.ContextQueueHandler(log_queue)
+    handler.addFilter(logging_config.SamplingFilter())
+    logger = logging.getLogger("test_logging.queued")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    yield logger, log_queue
+    logger.handlers = []
+
+
+# -------------------------------
+# Formatting
+# -------------------------------
+def test_json_line_has_trace_ids_and_extra_fields(queued_logger):
+    logger, log_queue = queued_logger
+    with tracing.start_span("request") as span:
+        logger.info("Task %s updated", "t1", extra={"task_id": "t1"})
+
+    entry = json.loads(logging_config.JsonFormatter("manage-task").format(log_queue.get_nowait()))
+    assert entry["message"] == "Task t1 updated"
+    assert entry["service"] == "manage-task" and entry["level"] == "INFO"
+    assert entry["trace_id"] == span.context.trace_id
+    assert entry["task_id"] == "t1"
+
+
+def test_exception_text_is_captured_before_enqueue(queued_logger):
+    logger, log_queue = queued_logger
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("Update failed")
+
+    record = log_queue.get_nowait()
+    assert record.exc_info is None
+    assert "ValueError: boom" in json.loads(logging_config.JsonFormatter("x").format(record))["exception"]
+
+
+def test_disabled_debug_never_stringifies_payload(queued_logger):
+    logger, log_queue = queued_logger
+    payload = _Expensive()
+    logger.debug("Raw payload: %s", payload)
+
+    assert payload.calls == 0
+    assert log_queue.empty()
+
+
+# -------------------------------
+# Per-route sampling
+# -------------------------------
+def test_parse_sample_rates_skips_malformed_entries():
+    rates = logging_config.parse_sample_rates("GET /tasks/user/{user_id}=0.1, POST /=2,bad,PUT /x=abc")
+    assert rates == {"GET /tasks/user/{user_id}": 0.1, "POST /": 1.0}
+
+
+def test_unsampled_route_keeps_only_warnings(queued_logger, monkeypatch):
+    logger, log_queue = queued_logger
+    monkeypatch.setenv("LOG_SAMPLE_RATES", "GET /tasks/user/{user_id}=0")
+    app = FastAPI()
+    logging_config.install_request_sampling(app)
+
+    @app.get("/tasks/user/{user_id}")
+    def tasks(user_id: str):
+        logger.info("listing tasks for %s", user_id)
+        logger.warning("slow query for %s", user_id)
+        return {}
+
+    @app.get("/tid/{task_id}")
+    def task(task_id: str):
+        logger.info("fetching %s", task_id)
+        return {}
+
+    client = TestClient(app)
+    client.get("/tasks/user/u1")
+    client.get("/tid/t1")
+
+    messages = [log_queue.get_nowait().getMessage() for _ in range(log_queue.qsize())]
+    assert messages == ["slow query for u1", "fetching t1"]
@@ -4,6 +4,8 @@ import os
 import sys
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+# Add the service directory to Python path so tracing can be found
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../backend/services/composite/manage_project")))
 from backend.services.composite.manage_project import main
 
 pytestmark = pytest.mark.asyncio
@@ -64,12 +66,9 @@ async def test_get_project_with_tasks_service_error():
         mock_client.get.side_effect = Exception("Service error")
         mock_client_cls.return_value.__aenter__.return_value = mock_client
 
-        result = await main.get_project_with_tasks("user-123")
-        
-        # The function handles errors gracefully and returns a response
-        assert result["message"] == "No projects found for this user"
-        assert result["user_id"] == "user-123"
-        assert result["projects"] == []
+        with pytest.raises(main.HTTPException) as exc:
+            await main.get_project_with_tasks("user-123")
+        assert exc.value.status_code == 500
 
 
 # -------------------------------
@@ -218,9 +217,149 @@ async def test_network_error_handling():
         mock_client.get.side_effect = main.httpx.RequestError("Network error")
         mock_client_cls.return_value.__aenter__.return_value = mock_client
 
+        # The user lookup failure is tolerated, but the project lookup is not:
+        # an empty list would look like "no projects" instead of an outage
+        with pytest.raises(main.HTTPException) as exc:
+            await main.get_project_with_tasks("user-123")
+        assert exc.value.status_code == 503
+
+
+async def test_visible_projects_error_propagates():
+    """A failed Project MS call is reported with its status, not as an empty project list"""
+    request = Mock()
+    request.state.user = {"id": "user-123", "name": "Hana", "role": "hr", "department": "HR"}
+    failed = Mock(status_code=500, text="boom")
+    error = main.httpx.HTTPStatusError("boom", request=Mock(), response=failed)
+
+    with patch("backend.services.composite.manage_project.main.httpx.AsyncClient") as mock_client_cls:
+        mock_client = AsyncMock()
+        mock_client.get.return_value = AsyncMock(status_code=500, raise_for_status=Mock(side_effect=error))
+        mock_client_cls.return_value.__aenter__.return_value = mock_client
+
+        with pytest.raises(main.HTTPException) as exc:
+            await main.get_project_with_tasks("user-123", request=request)
+        assert exc.value.status_code == 500
+
+
+# -------------------------------
+# fields= / include= projection
+# -------------------------------
+async def test_get_project_include_drops_heavy_subcollections():
+    fake_project = {"project": {"id": "p1", "name": "Project Alpha"}}
+    fake_tasks = {"tasks": [{"id": "t1", "name": "Task 1", "pid": "p1"}]}
+    fake_enriched = {"task": {"id": "t1", "name": "Task 1", "messages": [{"id": "m1"}],
+                              "time_entries": [{"id": "e1"}],
+                              "subtasks": [{"id": "t2", "messages": [{"id": "m2"}]}]}}
+
+    with patch("backend.services.composite.manage_project.main.httpx.AsyncClient") as mock_client_cls:
+        mock_client = AsyncMock()
+        mock_client.get.side_effect = [
+            AsyncMock(status_code=200, json=Mock(return_value=fake_project), raise_for_status=Mock()),
+            AsyncMock(status_code=200, json=Mock(return_value=fake_tasks), raise_for_status=Mock()),
+            AsyncMock(status_code=200, json=Mock(return_value=fake_enriched)),
+        ]
+        mock_client_cls.return_value.__aenter__.return_value = mock_client
+
+        result = await main.get_project("p1", include="time_entries")
+
+    task = result["project"]["tasks"][0]
+    assert "messages" not in task
+    assert task["time_entries"] == [{"id": "e1"}]
+    assert task["subtasks"] == [{"id": "t2"}]
+
+
+# -------------------------------
+# /projects/{pid}/stats and /projects/stats
+# -------------------------------
+async def test_get_project_stats_single_task_service_call():
+    fake_stats = {"stats": {"p1": {"task_count": 3, "status_counts": {"complete": 1, "ongoing": 2},
+                                   "overdue_count": 1,
+                                   "time_spent": {"hours": 1, "minutes": 30, "total_minutes": 90}}}}
+
+    with patch("backend.services.composite.manage_project.main.httpx.AsyncClient") as mock_client_cls:
+        mock_client = AsyncMock()
+        mock_client.get.return_value = AsyncMock(status_code=200, json=Mock(return_value=fake_stats),
+                                                 raise_for_status=Mock())
+        mock_client_cls.return_value.__aenter__.return_value = mock_client
+
+        result = await main.get_project_stats("p1")
+
+        mock_client.get.assert_called_once()
+        assert mock_client.get.call_args.kwargs["params"] == {"pids": "p1"}
+    assert result["stats"]["task_count"] == 3
+    assert result["stats"]["overdue_count"] == 1
+
+
+async def test_get_user_project_stats_totals():
+    fake_user = {"name": "Alice", "role": "hr"}
+    fake_projects = {"project": [{"id": "p1", "name": "Alpha"}, {"id": "p2", "name": "Beta"}]}
+    fake_stats = {"stats": {
+        "p1": {"task_count": 2, "status_counts": {"complete": 2}, "overdue_count": 0,
+               "time_spent": {"hours": 0, "minutes": 45, "total_minutes": 45}},
+        "p2": {"task_count": 1, "status_counts": {"ongoing": 1}, "overdue_count": 1,
+               "time_spent": {"hours": 0, "minutes": 30, "total_minutes": 30}},
+    }}
+
+    with patch("backend.services.composite.manage_project.main.httpx.AsyncClient") as mock_client_cls:
+        mock_client = AsyncMock()
+        mock_client.get.side_effect = [
+            AsyncMock(status_code=200, json=Mock(return_value=fake_user)),
+            AsyncMock(status_code=200, json=Mock(return_value=fake_projects), raise_for_status=Mock()),
+            AsyncMock(status_code=200, json=Mock(return_value=fake_stats), raise_for_status=Mock()),
+        ]
+        mock_client_cls.return_value.__aenter__.return_value = mock_client
+
+        result = await main.get_user_project_stats("user-123")
+
+    assert [p["id"] for p in result["projects"]] == ["p1", "p2"]
+    assert result["totals"] == {
+        "task_count": 3,
+        "status_counts": {"complete": 2, "ongoing": 1},
+        "overdue_count": 1,
+        "time_spent": {"hours": 1, "minutes": 15, "total_minutes": 75},
+    }
+
+
+async def test_get_project_with_tasks_manager_uses_single_visibility_call():
+    fake_user = {"name": "Mia", "role": "manager", "dept": "Sales"}
+    fake_visible = {"project": [{"id": "p1", "name": "Alpha"}]}
+
+    with patch("backend.services.composite.manage_project.main.httpx.AsyncClient") as mock_client_cls:
+        mock_client = AsyncMock()
+        mock_client.get.side_effect = [
+            AsyncMock(status_code=200, json=Mock(return_value=fake_user)),
+            AsyncMock(status_code=200, json=Mock(return_value=fake_visible), raise_for_status=Mock()),
+            AsyncMock(status_code=200, json=Mock(return_value={"tasks": []})),
+        ]
+        mock_client_cls.return_value.__aenter__.return_value = mock_client
+
         result = await main.get_project_with_tasks("user-123")
-        
-        # The function handles network errors gracefully and returns a response
-        assert result["message"] == "No projects found for this user"
-        assert result["user_id"] == "user-123"
-        assert result["projects"] == []
+
+        visible_call = mock_client.get.call_args_list[1]
+        assert visible_call.args[0].endswith("/uid/user-123/visible")
+        assert "params" not in visible_call.kwargs
+        assert mock_client.get.call_count == 3
+    assert result["user_role"] == "manager"
+    assert [p["id"] for p in result["projects"]] == ["p1"]
+
+
+async def test_get_project_with_tasks_uses_caller_cookie_profile():
+    fake_visible = {"project": [{"id": "p1", "name": "Alpha"}]}
+    request = Mock()
+    request.state.user = {"id": "user-123", "name": "Mia", "role": "manager", "department": "Sales"}
+
+    with patch("backend.services.composite.manage_project.main.httpx.AsyncClient") as mock_client_cls:
+        mock_client = AsyncMock()
+        mock_client.get.side_effect = [
+            AsyncMock(status_code=200, json=Mock(return_value=fake_visible), raise_for_status=Mock()),
+            AsyncMock(status_code=200, json=Mock(return_value={"tasks": []})),
+        ]
+        mock_client_cls.return_value.__aenter__.return_value = mock_client
+
+        result = await main.get_project_with_tasks("user-123", request=request)
+
+        urls = [c.args[0] for c in mock_client.get.call_args_list]
+        assert not any("/internal/" in url for url in urls)
+        assert "params" not in mock_client.get.call_args_list[0].kwargs
+    assert result["user_name"] == "Mia"
+    assert result["user_role"] == "manager"
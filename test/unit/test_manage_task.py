@@ -1,3 +1,5 @@
+import asyncio
+import sqlite3
 import pytest
 from unittest.mock import AsyncMock, Mock, patch
 import os
@@ -7,18 +9,30 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")
 # Add the service directory to Python path so kafka_client can be found
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../backend/services/composite/manage_task")))
 from backend.services.composite.manage_task import main
+import audit_trail
+import idempotency
+import saga
+from fastapi import HTTPException
+from starlette.requests import Request
 
-pytestmark = pytest.mark.asyncio
+
+@pytest.fixture(autouse=True)
+def saga_log(tmp_path, monkeypatch):
+    """A fresh saga log per test"""
+    log = saga.SagaLog(str(tmp_path / "sagas.sqlite"))
+    monkeypatch.setattr(main.sagas, "log", log)
+    return log
 
 
 # -------------------------------
 # /tasks/user/{user_id}
 # -------------------------------
+@pytest.mark.asyncio
 async def test_get_tasks_by_user_composite_success():
     user_id = "a1111111-b222-c333-d444-e55555555555"
     fake_user = {"id": user_id, "name": "Alice"}
     fake_tasks = {"tasks": [{"id": "33949f99-20d0-423d-9b26-f09292b2e40d", "collaborators": [user_id], "pid": "p1"}]}
-    fake_schedule = {"id": "s1", "task_id": "33949f99-20d0-423d-9b26-f09292b2e40d"}
+    fake_schedules = {"data": {"33949f99-20d0-423d-9b26-f09292b2e40d": {"sid": "s1", "status": "ongoing", "deadline": None}}}
     fake_project = {"id": "p1", "project": {"name": "Demo"}}
 
     with patch("backend.services.composite.manage_task.main.httpx.AsyncClient") as mock_client_cls:
@@ -26,9 +40,9 @@ async def test_get_tasks_by_user_composite_success():
         mock_client.get.side_effect = [
             AsyncMock(status_code=200, json=Mock(return_value=fake_user)),
             AsyncMock(status_code=200, json=Mock(return_value=fake_tasks), raise_for_status=Mock()),
-            AsyncMock(status_code=200, json=Mock(return_value=fake_schedule)),
             AsyncMock(status_code=200, json=Mock(return_value=fake_project)),
         ]
+        mock_client.post.return_value = AsyncMock(status_code=200, json=Mock(return_value=fake_schedules))
         mock_client_cls.return_value.__aenter__.return_value = mock_client
 
         result = await main.get_tasks_by_user_composite(user_id)
@@ -36,8 +50,14 @@ async def test_get_tasks_by_user_composite_success():
         assert result["user"]["name"] == "Alice"
         assert result["count"] == 1
         assert result["tasks"][0]["task"]["id"] == "33949f99-20d0-423d-9b26-f09292b2e40d"
+        assert result["tasks"][0]["task"]["status"] == "ongoing"
+        # one bulk schedule lookup rather than one GET per task
+        mock_client.post.assert_called_once_with(
+            f"{main.SCHEDULE_SERVICE_URL}/latest", json={"tids": ["33949f99-20d0-423d-9b26-f09292b2e40d"]}
+        )
 
 
+@pytest.mark.asyncio
 async def test_get_tasks_by_user_composite_no_tasks():
     user_id = "a1111111-b222-c333-d444-e55555555555"
     fake_user = {"id": user_id, "name": "Alice"}
@@ -60,6 +80,7 @@ async def test_get_tasks_by_user_composite_no_tasks():
 # -------------------------------
 # /tasks/tid/{task_id}
 # -------------------------------
+@pytest.mark.asyncio
 async def test_get_task_composite_success():
     task_id = "33949f99-20d0-423d-9b26-f09292b2e40d"
     fake_task = {"task": {"id": task_id, "name": "Test Task", "pid": "p1", "created_by_uid": "u1", "collaborators": []}}
@@ -87,6 +108,7 @@ async def test_get_task_composite_success():
 # -------------------------------
 # /createTask
 # -------------------------------
+@pytest.mark.asyncio
 async def test_create_task_composite_success(monkeypatch):
     fake_task_resp = {"id": "33949f99-20d0-423d-9b26-f09292b2e40d"}
     fake_schedule_resp = {"status": "success", "data": {"id": "s1"}}
@@ -123,6 +145,7 @@ async def test_create_task_composite_success(monkeypatch):
         assert result["schedule"]["status"] == "success"
 
 
+@pytest.mark.asyncio
 async def test_create_task_composite_schedule_validation_error(monkeypatch):
     """Test that schedule validation fails when deadline is missing"""
     
@@ -153,6 +176,7 @@ async def test_create_task_composite_schedule_validation_error(monkeypatch):
 # -------------------------------
 # DELETE /{task_id}
 # -------------------------------
+@pytest.mark.asyncio
 async def test_delete_task_composite_success():
     task_id = "33949f99-20d0-423d-9b26-f09292b2e40d"
     fake_task_data = {
@@ -178,14 +202,536 @@ async def test_delete_task_composite_success():
         mock_delete_response.status_code = 204
         mock_delete_response.json = Mock(return_value=fake_task_delete)
         mock_client.delete.return_value = mock_delete_response
+
+        # Mock the member sync POST (runs in the background)
+        mock_client.post.return_value = AsyncMock(status_code=200, json=Mock(return_value={"changed": ["u2"]}))
         
         mock_client_cls.return_value.__aenter__.return_value = mock_client
 
         result = await main.delete_task_composite(task_id)
 
         assert result["task_id"] == task_id
-        assert result["message"] == "Delete workflow completed and project members synced"
+        assert result["message"] == "Delete workflow completed; project members sync in the background"
         assert "task_delete" in result
-        assert "members_sync" in result
+        assert result["members_sync"] == {"project_id": "p1", "checked_users": ["u1", "u2"]}
         # Verify that only task_delete is present, not schedule_delete
         assert "schedule_delete" not in result
+
+        await main.sagas.drain()
+        mock_client.post.assert_called_once_with(
+            f"{main.PROJECTS_SERVICE_URL}/pid/p1/members/remove", json={"user_ids": ["u1", "u2"]}
+        )
+    assert main.sagas.status(result["saga"]["id"])["status"] == "completed"
+
+
+# -------------------------------
+# fields= / include= projection
+# -------------------------------
+@pytest.mark.asyncio
+async def test_get_tasks_by_user_composite_projection_drops_heavy_fields():
+    user_id = "a1111111-b222-c333-d444-e55555555555"
+    fake_user = {"id": user_id, "name": "Alice"}
+    fake_tasks = {"tasks": [
+        {"id": "t1", "name": "Parent", "collaborators": [user_id], "messages": [{"id": "m1"}],
+         "time_entries": [{"id": "e1"}]},
+        {"id": "t2", "name": "Child", "parentTaskId": "t1", "collaborators": [user_id], "messages": [{"id": "m2"}],
+         "time_entries": [{"id": "e2"}]},
+    ]}
+    fake_schedule = {"status": "ongoing", "deadline": None}
+
+    with patch("backend.services.composite.manage_task.main.httpx.AsyncClient") as mock_client_cls:
+        mock_client = AsyncMock()
+        mock_client.get.side_effect = [
+            AsyncMock(status_code=200, json=Mock(return_value=fake_user)),
+            AsyncMock(status_code=200, json=Mock(return_value=fake_tasks), raise_for_status=Mock()),
+        ]
+        mock_client.post.return_value = AsyncMock(
+            status_code=200, json=Mock(return_value={"data": {"t1": fake_schedule, "t2": fake_schedule}})
+        )
+        mock_client_cls.return_value.__aenter__.return_value = mock_client
+
+        result = await main.get_tasks_by_user_composite(user_id, fields="name,status,time_entries", include="time_entries")
+
+    parent = result["tasks"][0]
+    assert parent["task"] == {"id": "t1", "name": "Parent", "status": "ongoing", "time_entries": [{"id": "e1"}]}
+    assert parent["subtasks"][0]["task"] == {"id": "t2", "name": "Child", "status": "ongoing", "time_entries": [{"id": "e2"}]}
+
+
+def test_project_task_without_params_is_untouched():
+    task = {"id": "t1", "messages": [{"id": "m1"}]}
+    assert main.project_task(task, None, None) is task
+    assert main.project_task(task, None, set()) == {"id": "t1"}
+    # Without include= the heavy sub-collections are kept, even with fields=
+    assert main.project_task(task, {"messages"}, None) == task
+    assert main.parse_projection(" name, ,status ") == {"name", "status"}
+
+
+# -------------------------------
+# Project member sync
+# -------------------------------
+@pytest.mark.asyncio
+async def test_sync_project_members_single_post():
+    with patch("backend.services.composite.manage_task.main.httpx.AsyncClient") as mock_client_cls:
+        mock_client = AsyncMock()
+        mock_client.post.return_value = AsyncMock(
+            status_code=200, json=Mock(return_value={"project": {"id": "p1"}, "changed": ["u2"]})
+        )
+        mock_client_cls.return_value.__aenter__.return_value = mock_client
+
+        added = await main.ensure_members_present("p1", ["u1", "u2", "u1", None])
+
+        mock_client.post.assert_called_once_with(
+            f"{main.PROJECTS_SERVICE_URL}/pid/p1/members/add", json={"user_ids": ["u1", "u2"]}
+        )
+        mock_client.get.assert_not_called()
+        mock_client.put.assert_not_called()
+    assert added == ["u2"]
+
+
+@pytest.mark.asyncio
+async def test_sync_project_members_failure_returns_none():
+    with patch("backend.services.composite.manage_task.main.httpx.AsyncClient") as mock_client_cls:
+        mock_client = AsyncMock()
+        mock_client.post.return_value = AsyncMock(status_code=404)
+        mock_client_cls.return_value.__aenter__.return_value = mock_client
+
+        assert await main.sync_project_members("p1", ["u1"], action="remove") is None
+        assert await main.sync_project_members("p1", [], action="remove") is None
+        mock_client.post.assert_called_once()
+
+
+# -------------------------------
+# /tasks/{task_id}/timeline
+# -------------------------------
+class FakeTaskService:
+    """Routes GETs for the timeline: messages, time entries and a keyset-paged /logs"""
+
+    def __init__(self, audit, messages, entries):
+        self.audit = sorted(audit, key=lambda r: (r["timestamp"], r["id"]), reverse=True)
+        self.messages = messages
+        self.entries = entries
+        self.log_calls = 0
+
+    async def get(self, url, params=None, headers=None):
+        if url.endswith("/messages"):
+            return Mock(status_code=200, json=Mock(return_value={"messages": self.messages}), raise_for_status=Mock())
+        if url.endswith("/time-entries"):
+            return Mock(status_code=200, json=Mock(return_value={"time_entries": self.entries}), raise_for_status=Mock())
+        self.log_calls += 1
+        assert url.endswith("/logs") and params["record_id"] == "t1"
+        rows = self.audit
+        after = audit_trail.decode_cursor(params.get("cursor"))
+        if after:
+            rows = [r for r in rows if (r["timestamp"], r["id"]) < after]
+        limit = params["limit"]
+        page = audit_trail.logs_page(lambda after, limit: rows[:limit], None, limit)
+        return Mock(status_code=200, json=Mock(return_value=page), raise_for_status=Mock())
+
+
+def _timeline_fixture():
+    # Audit rows in UTC, chat and time log in UTC+8, as the services write them
+    audit = [{"id": f"a{i}", "timestamp": f"2025-10-01T0{i}:00:00+00:00"} for i in range(6)]
+    messages = [{"id": f"m{i}", "timestamp": f"2025-10-01T0{i + 8}:30:00+08:00"} for i in range(2)]
+    messages += [{"id": f"m{i}", "timestamp": f"2025-10-01T{i + 8}:30:00+08:00"} for i in range(2, 6)]
+    entries = [{"id": f"e{i}", "date": f"2025-10-01T{i + 8:02d}:15:00+08:00"} for i in range(4)]
+    return FakeTaskService(audit, messages, entries)
+
+
+@pytest.mark.asyncio
+async def test_get_task_timeline_pages_merge_all_sources_newest_first():
+    fake = _timeline_fixture()
+    with patch("backend.services.composite.manage_task.main.httpx.AsyncClient") as mock_client_cls:
+        mock_client_cls.return_value.__aenter__.return_value = fake
+
+        seen, cursor = [], None
+        while True:
+            page = await main.get_task_timeline("t1", limit=4, cursor=cursor)
+            seen += [(e["type"], e["id"]) for e in page["events"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+    # Interleaved by instant, not by the raw strings (which mix +00:00 and +08:00)
+    assert [i for _, i in seen] == [
+        "m5", "a5", "m4", "a4", "m3", "e3", "a3", "m2",
+        "e2", "a2", "m1", "e1", "a1", "m0", "e0", "a0",
+    ]
+    assert fake.log_calls == 4
+
+
+@pytest.mark.asyncio
+async def test_get_task_timeline_first_page_reads_one_audit_page():
+    fake = _timeline_fixture()
+    with patch("backend.services.composite.manage_task.main.httpx.AsyncClient") as mock_client_cls:
+        mock_client_cls.return_value.__aenter__.return_value = fake
+        page = await main.get_task_timeline("t1", limit=3, cursor=None)
+
+    assert page["count"] == 3 and page["next_cursor"]
+    assert fake.log_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_get_task_timeline_rejects_bad_cursor():
+    with pytest.raises(HTTPException) as exc:
+        await main.get_task_timeline("t1", limit=3, cursor="not-a-cursor")
+    assert exc.value.status_code == 400
+
+
+# -------------------------------
+# Idempotency-Key on create endpoints
+# -------------------------------
+@pytest.fixture
+def idempotency_db(tmp_path):
+    return str(tmp_path / "idempotency.sqlite")
+
+
+def _keyed_request(key=None, user_id="u1", path="/createTask"):
+    headers = [(b"idempotency-key", key.encode())] if key else []
+    request = Request({"type": "http", "method": "POST", "path": path, "headers": headers, "query_string": b""})
+    request.state.user = {"id": user_id}
+    return request
+
+
+def _counting_handler(store, result=None, error=None, gate=None):
+    calls = []
+
+    @idempotency.idempotent(store)
+    async def handler(task_json: dict, request: Request = None):
+        calls.append(task_json)
+        if gate is not None:
+            await gate.wait()
+        if error is not None:
+            raise error
+        return result or {"task_id": f"t{len(calls)}"}
+
+    return handler, calls
+
+
+@pytest.mark.asyncio
+async def test_idempotent_repeat_replays_first_result(idempotency_db):
+    handler, calls = _counting_handler(idempotency.IdempotencyStore(idempotency_db))
+
+    first = await handler({"name": "A"}, request=_keyed_request("k1"))
+    replay = await handler({"name": "A"}, request=_keyed_request("k1"))
+
+    assert first == {"task_id": "t1"}
+    assert len(calls) == 1
+    assert replay.headers[idempotency.REPLAYED_HEADER] == "true"
+    assert replay.body == b'{"task_id":"t1"}'
+
+
+@pytest.mark.asyncio
+async def test_idempotent_concurrent_duplicates_run_once(idempotency_db):
+    gate = asyncio.Event()
+    handler, calls = _counting_handler(idempotency.IdempotencyStore(idempotency_db), gate=gate)
+    pending = [asyncio.ensure_future(handler({"name": "A"}, request=_keyed_request("k1"))) for _ in range(5)]
+    await asyncio.sleep(0)
+    gate.set()
+    results = await asyncio.gather(*pending)
+
+    assert len(calls) == 1
+    assert results[0] == {"task_id": "t1"}
+    assert all(r.body == b'{"task_id":"t1"}' for r in results[1:])
+
+
+@pytest.mark.asyncio
+async def test_idempotent_key_reused_for_different_body_is_rejected(idempotency_db):
+    handler, _ = _counting_handler(idempotency.IdempotencyStore(idempotency_db))
+    await handler({"name": "A"}, request=_keyed_request("k1"))
+
+    with pytest.raises(HTTPException) as exc:
+        await handler({"name": "B"}, request=_keyed_request("k1"))
+    assert exc.value.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_idempotent_keys_are_scoped_per_user_and_unkeyed_requests_always_run(idempotency_db):
+    handler, calls = _counting_handler(idempotency.IdempotencyStore(idempotency_db))
+    await handler({"name": "A"}, request=_keyed_request("k1", user_id="u1"))
+    await handler({"name": "A"}, request=_keyed_request("k1", user_id="u2"))
+    await handler({"name": "A"}, request=_keyed_request())
+    await handler({"name": "A"}, request=_keyed_request())
+    assert len(calls) == 4
+
+
+@pytest.mark.asyncio
+async def test_idempotent_key_without_caller_is_rejected(idempotency_db):
+    handler, calls = _counting_handler(idempotency.IdempotencyStore(idempotency_db))
+    with pytest.raises(HTTPException) as exc:
+        await handler({"name": "A"}, request=_keyed_request("k1", user_id=None))
+    assert exc.value.status_code == 401
+    assert calls == []
+    # without a key, anonymous requests run as before
+    await handler({"name": "A"}, request=_keyed_request(user_id=None))
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_idempotent_server_errors_are_retried_client_errors_replayed(idempotency_db):
+    store = idempotency.IdempotencyStore(idempotency_db)
+    failing, failing_calls = _counting_handler(store, error=HTTPException(status_code=502, detail="down"))
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            await failing({"name": "A"}, request=_keyed_request("k5xx"))
+    assert len(failing_calls) == 2
+
+    invalid, invalid_calls = _counting_handler(store, error=HTTPException(status_code=400, detail="bad"))
+    for _ in range(2):
+        with pytest.raises(HTTPException) as exc:
+            await invalid({"name": "A"}, request=_keyed_request("k4xx"))
+        assert exc.value.status_code == 400
+    assert len(invalid_calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_idempotency_store_expires_kept_results_and_lapsed_claims(idempotency_db):
+    now = [0.0]
+    store = idempotency.IdempotencyStore(idempotency_db, ttl_seconds=10, lease_seconds=5, clock=lambda: now[0])
+
+    async def execute():
+        return {"ok": True}
+
+    assert await store.run("a", "f", execute) == (False, {"ok": True})
+    assert await store.run("a", "f", execute) == (True, {"ok": True})
+    now[0] = 11
+    assert await store.run("a", "f", execute) == (False, {"ok": True})
+
+    # a claim left behind by a worker that died is taken over once its lease is up
+    assert store.claim("b", "f", "dead-worker") is None
+    now[0] = 17
+    assert await store.run("b", "f", execute) == (False, {"ok": True})
+    now[0] = 30
+    assert len(store) == 0
+
+
+@pytest.mark.asyncio
+async def test_idempotency_stores_sharing_a_file_dedupe_across_workers(idempotency_db):
+    # Two stores over one file stand in for two uvicorn workers
+    first, second = (idempotency.IdempotencyStore(idempotency_db, poll_seconds=0.01) for _ in range(2))
+    calls = []
+    gate = asyncio.Event()
+
+    async def execute():
+        calls.append(1)
+        await gate.wait()
+        return {"task_id": "t1"}
+
+    running = asyncio.ensure_future(first.run("u1:POST:/createTask:k1", "f", execute))
+    while not calls:
+        await asyncio.sleep(0)
+    duplicate = asyncio.ensure_future(second.run("u1:POST:/createTask:k1", "f", execute))
+    await asyncio.sleep(0.05)
+    assert not duplicate.done()
+    gate.set()
+
+    assert await running == (False, {"task_id": "t1"})
+    assert await duplicate == (True, {"task_id": "t1"})
+    assert await second.run("u1:POST:/createTask:k1", "f", execute) == (True, {"task_id": "t1"})
+    assert len(calls) == 1
+
+    with pytest.raises(HTTPException) as exc:
+        await second.run("u1:POST:/createTask:k1", "other", execute)
+    assert exc.value.status_code == 422
+
+
+# -------------------------------
+# Sagas
+# -------------------------------
+def _recorder(calls, name, result=None, error=None, gate=None):
+    async def action(ctx):
+        calls.append(name)
+        if gate is not None:
+            await gate.wait()
+        if error is not None:
+            raise error
+        return result if result is not None else name
+    return action
+
+
+@pytest.mark.asyncio
+async def test_saga_runs_independent_steps_concurrently_and_passes_results_on(saga_log):
+    started = []
+    both_started = asyncio.Event()
+
+    async def slow(ctx):
+        started.append("x")
+        if len(started) == 2:
+            both_started.set()
+        await asyncio.wait_for(both_started.wait(), 1)
+        return len(started)
+
+    runner = saga.SagaRunner(saga_log)
+    runner.register(saga.Saga("demo", [
+        saga.Step("a", slow),
+        saga.Step("b", slow),
+        saga.Step("c", lambda ctx: asyncio.sleep(0, ctx["a"] + ctx["b"] + ctx["n"]), after=["a", "b"]),
+    ]))
+    saga_id, results = await runner.run("demo", {"n": 1})
+
+    assert results["c"] == 5
+    status = runner.status(saga_id)
+    assert status["status"] == "completed"
+    assert {step["step"]: step["status"] for step in status["steps"]} == {"a": "done", "b": "done", "c": "done"}
+
+
+@pytest.mark.asyncio
+async def test_saga_failure_compensates_finished_steps_newest_first(saga_log):
+    calls = []
+    runner = saga.SagaRunner(saga_log)
+    runner.register(saga.Saga("demo", [
+        saga.Step("first", _recorder(calls, "first"), compensate=_recorder(calls, "undo first")),
+        saga.Step("second", _recorder(calls, "second"), compensate=_recorder(calls, "undo second"), after=["first"]),
+        saga.Step("skipped", _recorder(calls, "skipped"), compensate=_recorder(calls, "undo skipped"),
+                  when=lambda ctx: False),
+        saga.Step("stuck", _recorder(calls, "stuck", gate=asyncio.Event()), compensate=_recorder(calls, "undo stuck")),
+        saga.Step("third", _recorder(calls, "third", error=HTTPException(status_code=400, detail="no")),
+                  after=["second"]),
+        saga.Step("notify", _recorder(calls, "notify"), after=["third"], background=True),
+    ]))
+
+    with pytest.raises(HTTPException) as exc:
+        await runner.run("demo", {})
+
+    assert exc.value.status_code == 400
+    assert {"first", "second", "third"} <= set(calls)
+    # the stuck step was cancelled before it finished, so there is nothing of it to undo
+    assert [call for call in calls if call.startswith("undo")] == ["undo second", "undo first"]
+    assert calls[-2:] == ["undo second", "undo first"]
+    assert saga_log.claim_stale("someone", idle_seconds=-1) == []
+
+
+@pytest.mark.asyncio
+async def test_saga_background_steps_finish_after_run_returns(saga_log):
+    calls = []
+    gate = asyncio.Event()
+    runner = saga.SagaRunner(saga_log)
+    runner.register(saga.Saga("demo", [
+        saga.Step("write", _recorder(calls, "write")),
+        saga.Step("sync", _recorder(calls, "sync", gate=gate, error=RuntimeError("sync down")),
+                  after=["write"], background=True),
+        saga.Step("after_sync", _recorder(calls, "after_sync"), after=["sync"], background=True),
+        saga.Step("notify", _recorder(calls, "notify"), after=["write"], background=True),
+    ]))
+
+    saga_id, _ = await runner.run("demo", {})
+    assert runner.status(saga_id)["status"] == "committed"
+
+    gate.set()
+    await runner.drain()
+    status = runner.status(saga_id)
+    assert sorted(calls) == ["notify", "sync", "write"]
+    assert status["status"] == "completed"
+    assert {step["step"]: step["status"] for step in status["steps"]} == {
+        "write": "done", "sync": "failed", "after_sync": "skipped", "notify": "done",
+    }
+
+
+@pytest.mark.asyncio
+async def test_saga_recovery_compensates_interrupted_sagas_and_resumes_background(saga_log):
+    calls = []
+    runner = saga.SagaRunner(saga_log, owner="new-worker")
+    runner.register(saga.Saga("demo", [
+        saga.Step("task", _recorder(calls, "task"), compensate=lambda ctx: asyncio.sleep(0, calls.append(("undo", ctx["task"])))),
+        saga.Step("schedule", _recorder(calls, "schedule"), after=["task"]),
+        saga.Step("notify", lambda ctx: asyncio.sleep(0, calls.append(("notify", ctx["tid"]))), after=["schedule"],
+                  background=True),
+    ]))
+    # A worker died after creating the task, and another after committing but before notifying
+    saga_log.begin("s1", "demo", "old-worker", {"tid": "t1"})
+    saga_log.step("s1", "task", "done", {"task_id": "t1"})
+    saga_log.step("s1", "schedule", "running")
+    saga_log.begin("s2", "demo", "old-worker", {"tid": "t2"})
+    saga_log.step("s2", "task", "done", {"task_id": "t2"})
+    saga_log.step("s2", "schedule", "done", {"ok": True})
+    saga_log.finish("s2", "committed")
+
+    assert await runner.recover(idle_seconds=60) == 0
+    assert await runner.recover(idle_seconds=-1) == 2
+    await runner.drain()
+
+    assert calls == [("undo", {"task_id": "t1"}), ("notify", "t2")]
+    assert runner.status("s1")["status"] == "compensated"
+    assert runner.status("s2")["status"] == "completed"
+    assert await runner.recover(idle_seconds=-1) == 0
+
+
+@pytest.mark.asyncio
+async def test_saga_log_writes_are_batched_off_the_request_path(saga_log):
+    runner = saga.SagaRunner(saga_log, flush_seconds=3600)
+    runner.register(saga.Saga("demo", [saga.Step("a", _recorder([], "a")), saga.Step("b", _recorder([], "b"), after=["a"])]))
+    saga_id, _ = await runner.run("demo", {})
+
+    # Nothing has reached the database yet: run() only queued its records
+    assert not os.path.exists(saga_log.path)
+
+    # Reads write out the queue first
+    assert runner.status(saga_id)["status"] == "completed"
+    assert saga_log._pending == []
+
+    second_id, _ = await runner.run("demo", {})
+    await runner.drain()
+    with sqlite3.connect(saga_log.path) as db:
+        assert db.execute("select status from sagas where saga_id = ?", (second_id,)).fetchone() == ("completed",)
+
+
+def test_saga_rejects_bad_dependencies():
+    noop = lambda ctx: asyncio.sleep(0)
+    with pytest.raises(ValueError):
+        saga.Saga("cycle", [saga.Step("a", noop, after=["b"]), saga.Step("b", noop, after=["a"])])
+    with pytest.raises(ValueError):
+        saga.Saga("inverted", [saga.Step("a", noop, background=True), saga.Step("b", noop, after=["a"])])
+    with pytest.raises(ValueError):
+        saga.Saga("unknown", [saga.Step("a", noop, after=["missing"])])
+
+
+@pytest.mark.asyncio
+async def test_create_task_composite_rolls_back_task_when_schedule_fails(monkeypatch):
+    deleted = []
+
+    async def fake_create_task_service(task_json):
+        return {"id": "33949f99-20d0-423d-9b26-f09292b2e40d"}
+
+    async def fake_create_schedule_service(task_id, schedule_data):
+        return {"status": "failed", "error": "bad deadline"}
+
+    async def fake_delete_task_service(task_id):
+        deleted.append(task_id)
+
+    monkeypatch.setattr(main, "create_task_service", fake_create_task_service)
+    monkeypatch.setattr(main, "create_schedule_service", fake_create_schedule_service)
+    monkeypatch.setattr(main, "delete_task_service", fake_delete_task_service)
+
+    payload = {"name": "Test Task", "schedule": {"status": "todo", "deadline": "2024-12-31T23:59:59Z"}}
+    with pytest.raises(HTTPException) as exc:
+        await main.create_task_composite(payload)
+
+    assert exc.value.status_code == 400
+    assert exc.value.detail["task_id_rolled_back"] == "33949f99-20d0-423d-9b26-f09292b2e40d"
+    assert deleted == ["33949f99-20d0-423d-9b26-f09292b2e40d"]
+
+
+@pytest.mark.asyncio
+async def test_update_task_composite_restores_task_fields_when_schedule_update_fails(monkeypatch):
+    current = {"id": "t1", "name": "Old name", "desc": "Old desc", "pid": None, "collaborators": []}
+    task_updates = []
+
+    async def fake_update_task_service(task_id, updates):
+        task_updates.append(updates)
+        return {"id": task_id, **updates}
+
+    async def fake_update_schedule_service(task_id, schedule_updates):
+        raise RuntimeError("schedule service crashed")
+
+    monkeypatch.setattr(main, "update_task_service", fake_update_task_service)
+    monkeypatch.setattr(main, "update_schedule_service", fake_update_schedule_service)
+
+    with patch("backend.services.composite.manage_task.main.httpx.AsyncClient") as mock_client_cls:
+        mock_client = AsyncMock()
+        mock_client.get.return_value = AsyncMock(status_code=200, json=Mock(return_value={"task": current}))
+        mock_client_cls.return_value.__aenter__.return_value = mock_client
+
+        with pytest.raises(HTTPException) as exc:
+            await main.update_task_composite("t1", {"name": "New name", "deadline": "2025-01-01T00:00:00Z"})
+
+    assert exc.value.status_code == 500
+    assert task_updates == [{"name": "New name"}, {"name": "Old name"}]
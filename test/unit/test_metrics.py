@@ -0,0 +1,173 @@
+import pytest
+import os
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import httpx
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+# Every service ships identical tracing.py / metrics.py; import them the way the services do
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../backend/services/composite/manage_task")))
+import metrics
+import tracing
+
+# Same hook init_metrics installs; spans from start_span() are then recorded automatically
+tracing.add_span_listener(metrics.observe_span)
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+# -------------------------------
+# Span -> histogram mapping
+# -------------------------------
+def test_client_spans_split_by_target_and_supabase_table(monkeypatch):
+    monkeypatch.setenv("SUPABASE_URL", "https://db.example.supabase.co")
+    before_http = sample("http_client_request_duration_seconds_count", target="schedule", method="GET", status="2xx")
+    before_db = sample("supabase_query_duration_seconds_count", table="TASK", method="GET", status="2xx")
+
+    for host, path in (("schedule", "/tid/1/latest"), ("db.example.supabase.co", "/rest/v1/TASK")):
+        request = SimpleNamespace(method="GET", url=httpx.URL(f"http://{host}{path}?id=eq.1"))
+        name, attributes = tracing._client_span(request)
+        span = tracing.Span(name, "client", None, {**attributes, "http.status_code": 200})
+        span.end()
+        metrics.observe_span(span)
+
+    assert sample("http_client_request_duration_seconds_count", target="schedule", method="GET", status="2xx") == before_http + 1
+    assert sample("supabase_query_duration_seconds_count", table="TASK", method="GET", status="2xx") == before_db + 1
+
+
+def test_kafka_and_smtp_spans_recorded():
+    before = sample("kafka_produce_duration_seconds_count", topic="task-events", outcome="error")
+    with pytest.raises(RuntimeError):
+        with tracing.start_span("produce task-events", "producer", {"messaging.destination": "task-events"}):
+            raise RuntimeError("broker down")
+    assert sample("kafka_produce_duration_seconds_count", topic="task-events", outcome="error") == before + 1
+
+    before = sample("smtp_send_duration_seconds_count", outcome="ok")
+    with tracing.start_span("smtp send", "client", {"net.protocol.name": "smtp"}):
+        pass
+    assert sample("smtp_send_duration_seconds_count", outcome="ok") == before + 1
+
+
+# -------------------------------
+# /metrics endpoint
+# -------------------------------
+def test_metrics_endpoint_reports_route_templates():
+    app = FastAPI()
+    tracing.instrument_app(app)
+    metrics.init_metrics(app)
+
+    @app.get("/tid/{task_id}")
+    def get_task(task_id: str):
+        return {"id": task_id}
+
+    client = TestClient(app)
+    for tid in ("1", "2", "3"):
+        client.get(f"/tid/{tid}")
+    body = client.get("/metrics").text
+
+    assert 'http_server_request_duration_seconds_count{method="GET",route="/tid/{task_id}",status="2xx"}' in body
+    assert 'route="/tid/1"' not in body
+
+
+# -------------------------------
+# Kafka lag / APScheduler
+# -------------------------------
+def test_consumer_lag_from_highwater():
+    consumer = MagicMock()
+    consumer.highwater.return_value = 120
+    metrics.observe_consumer_lag(consumer, SimpleNamespace(topic="notification-events", partition=2, offset=99))
+    assert sample("kafka_consumer_lag_messages", topic="notification-events", partition="2") == 20
+
+
+def test_instrument_scheduler_counts_events():
+    from apscheduler.events import EVENT_JOB_MISSED
+
+    scheduler = MagicMock()
+    scheduler.get_jobs.return_value = ["a", "b"]
+    metrics.instrument_scheduler(scheduler)
+    listener = scheduler.add_listener.call_args[0][0]
+
+    before = sample("scheduler_job_events_total", event="missed")
+    listener(SimpleNamespace(code=EVENT_JOB_MISSED))
+    assert sample("scheduler_job_events_total", event="missed") == before + 1
+    assert sample("scheduler_jobs") == 2
+
+
+def test_scheduled_jobs_gauge_is_recounted_after_job_events(monkeypatch):
+    from apscheduler.events import EVENT_JOB_ADDED
+
+    monkeypatch.setattr(metrics, "JOB_COUNT_INTERVAL_SECONDS", 0.01)
+    scheduler = MagicMock()
+    scheduler.get_jobs.return_value = ["a"]
+    metrics.instrument_scheduler(scheduler)
+    listener = scheduler.add_listener.call_args[0][0]
+    assert sample("scheduler_jobs") == 1
+
+    scheduler.get_jobs.return_value = ["a", "b", "c"]
+    for _ in range(50):
+        listener(SimpleNamespace(code=EVENT_JOB_ADDED))
+    deadline = time.time() + 2
+    while sample("scheduler_jobs") != 3 and time.time() < deadline:
+        time.sleep(0.01)
+    assert sample("scheduler_jobs") == 3
+    # a burst of events costs one recount, not one per event
+    assert scheduler.get_jobs.call_count <= 3
+
+
+def test_instrument_executor_sets_gauges_on_every_change():
+    executor = SimpleNamespace(queue_depth=4, running=2, on_load_change=None)
+    metrics.instrument_executor(executor)
+    assert (sample("scheduler_job_queue_depth"), sample("scheduler_jobs_running")) == (4, 2)
+
+    executor.queue_depth, executor.running = 0, 1
+    executor.on_load_change()
+    assert (sample("scheduler_job_queue_depth"), sample("scheduler_jobs_running")) == (0, 1)
+
+
+WORKER = """
+import sys, types
+sys.path.insert(0, {service!r})
+import metrics
+metrics.init_metrics()
+metrics.instrument_executor(types.SimpleNamespace(queue_depth={depth}, running=1, on_load_change=None))
+"""
+
+
+def test_scheduler_gauges_add_up_across_worker_processes(tmp_path):
+    service = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../backend/services/composite/notify_user"))
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    for depth in (3, 4):
+        subprocess.run([sys.executable, "-c", WORKER.format(service=service, depth=depth)], env=env, check=True)
+
+    # Both workers exited, so their live gauges are gone
+    from prometheus_client import CollectorRegistry, multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=str(tmp_path))
+    assert registry.get_sample_value("scheduler_job_queue_depth") is None
+
+    # While they run, /metrics reports the sum
+    script = WORKER.format(service=service, depth=3) + "import time; sys.stdout.write('ready\\n'); sys.stdout.flush(); time.sleep(30)\n"
+    workers = [subprocess.Popen([sys.executable, "-c", script.replace("queue_depth=3", f"queue_depth={depth}")],
+                                env=env, stdout=subprocess.PIPE, text=True) for depth in (3, 4)]
+    try:
+        for worker in workers:
+            assert worker.stdout.readline().strip() == "ready"
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=str(tmp_path))
+        assert registry.get_sample_value("scheduler_job_queue_depth") == 7
+        assert registry.get_sample_value("scheduler_jobs_running") == 2
+    finally:
+        for worker in workers:
+            worker.kill()
+            worker.wait()
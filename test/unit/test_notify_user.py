@@ -1,9 +1,18 @@
 import pytest
 from unittest.mock import AsyncMock, Mock, patch, MagicMock
+import asyncio
+import concurrent.futures
+import json
 import os
+import subprocess
 import sys
+import threading
+import time
+import importlib.util
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
+import pytz
+import requests
 
 # Add the backend path to sys.path
 backend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
@@ -22,8 +31,19 @@ sys.modules['recurring_processor'] = mock_recurring_processor
 sys.modules['schedule_client'] = mock_schedule_client
 
 # Now we can import the individual modules
+from backend.services.composite.notify_user.async_jobs import AsyncJobExecutor
 from backend.services.composite.notify_user.recurring_processor import RecurringTaskProcessor
 from backend.services.composite.notify_user.schedule_client import ScheduleClient
+from backend.services.composite.notify_user.schedule_events import (
+    ScheduleEventApplier, ScheduleEventConsumer, latest_per_schedule,
+)
+from backend.services.composite.notify_user.sharding import LeaseStore, ShardCoordinator, assign, shard_of
+from backend.services.composite.notify_user import schedule_events
+
+# Other services' tests may have put their own kafka_client first; use notify_user's copy
+_spec = importlib.util.spec_from_file_location("notify_user_kafka_client", os.path.join(service_path, "kafka_client.py"))
+notify_user_kafka_client = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(notify_user_kafka_client)
 
 # Import main after setting up mocks
 from backend.services.composite.notify_user import main
@@ -74,6 +94,46 @@ class TestScheduleClient:
             
             assert result is None
 
+    def test_update_schedules_batches_sids(self):
+        """Many sids go out as /batch calls of at most BATCH_SIZE"""
+        from backend.services.composite.notify_user import schedule_client as schedule_client_module
+        responses = [Mock(json=Mock(return_value={"data": [{"sid": "s1"}, {"sid": "s2"}]})),
+                     Mock(json=Mock(return_value={"data": [{"sid": "s3"}]}))]
+        
+        with patch.object(schedule_client_module, 'BATCH_SIZE', 2), \
+             patch.object(ScheduleClient, '_make_request_with_retry', side_effect=responses) as request:
+            result = ScheduleClient().update_schedules(["s1", "s2", "s3"], {"status": "overdue"})
+        
+        assert [r["sid"] for r in result] == ["s1", "s2", "s3"]
+        assert request.call_count == 2
+        assert request.call_args_list[0][1]["json"] == {"op": "update", "sids": ["s1", "s2"], "data": {"status": "overdue"}}
+        assert request.call_args_list[1][0][1].endswith("/batch")
+
+    def test_fetch_due_schedules_sends_range(self):
+        """Due schedules come from GET /due with only the bounds that were given"""
+        mock_response = Mock()
+        mock_response.json.return_value = {"data": [{"sid": "s1"}]}
+        
+        with patch.object(ScheduleClient, '_make_request_with_retry', return_value=mock_response) as request:
+            result = ScheduleClient().fetch_due_schedules(before="2024-01-01T00:00:00+08:00", status_not=["overdue", "completed"])
+        
+        assert result == [{"sid": "s1"}]
+        assert request.call_args[0][1].endswith("/due")
+        assert request.call_args[1]["params"] == {"before": "2024-01-01T00:00:00+08:00", "status_not": "overdue,completed"}
+
+    def test_rollover_schedule(self):
+        """Rollover posts the next occurrence's dates and returns the result"""
+        mock_response = Mock()
+        mock_response.json.return_value = {"data": {"schedule": {"sid": "s2"}, "created": True}}
+        
+        with patch.object(ScheduleClient, '_make_request_with_retry', return_value=mock_response) as request:
+            result = ScheduleClient().rollover_schedule("s1", "2024-01-08", "2024-01-10", "2024-01-15")
+        
+        assert result["schedule"]["sid"] == "s2"
+        method, url = request.call_args[0]
+        assert method == "POST" and url.endswith("/sid/s1/rollover")
+        assert request.call_args[1]["json"] == {"start": "2024-01-08", "deadline": "2024-01-10", "next_occurrence": "2024-01-15"}
+
     def test_create_schedule_success(self):
         """Test successful creation of schedule"""
         mock_response = Mock()
@@ -109,6 +169,68 @@ class TestScheduleClient:
             assert result is None
 
 
+class StreamResponse:
+    """requests response for a streamed NDJSON body that can drop after some lines"""
+    def __init__(self, rows, fail_after=None):
+        self.rows, self.fail_after = rows, fail_after
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self):
+        for i, row in enumerate(self.rows):
+            if i == self.fail_after:
+                raise requests.exceptions.ChunkedEncodingError("connection dropped")
+            yield json.dumps(row).encode()
+
+
+class TestScheduleStream:
+    def test_iter_all_schedules_resumes_after_last_task(self):
+        client = ScheduleClient()
+        rows = [{"sid": "s1", "tid": "t1"}, {"sid": "s2", "tid": "t2"}, {"sid": "s3", "tid": "t3"}]
+        responses = [StreamResponse(rows, fail_after=2), StreamResponse(rows[2:])]
+
+        with patch.object(client.session, "get", side_effect=responses) as get:
+            assert [row["sid"] for row in client.iter_all_schedules()] == ["s1", "s2", "s3"]
+
+        assert get.call_args_list[0].kwargs["params"] is None
+        assert get.call_args_list[1].kwargs["params"] == {"after": "t2"}
+        assert get.call_args_list[1].kwargs["stream"] is True
+
+    def test_iter_all_schedules_gives_up_without_progress(self):
+        client = ScheduleClient()
+        with patch.object(client.session, "get", side_effect=requests.exceptions.ConnectionError("down")), \
+                patch("time.sleep"):
+            with pytest.raises(requests.exceptions.ConnectionError):
+                list(client.iter_all_schedules(max_retries=2))
+
+    def test_readiness_follows_streamed_load(self):
+        from fastapi.testclient import TestClient
+        client = TestClient(main.app)
+        rows = [{"sid": "s1", "deadline": "2099-01-01T00:00:00Z"}, {"sid": "s2"}]
+
+        with patch.dict(main.startup, {"status": "loading", "schedules": 0, "jobs": 0}):
+            assert client.get("/ready").status_code == 503
+
+            with patch.object(main.schedule_client, "iter_all_schedules", return_value=iter(rows)), \
+                    patch.object(main.recurring_processor, "arm_schedules", side_effect=lambda batch: len(batch)) as arm:
+                main.arm_streamed_schedules()
+            # Rows are armed one at a time as they arrive
+            assert [c.args[0] for c in arm.call_args_list] == [[rows[0]], [rows[1]]]
+            assert main.startup["schedules"] == 2
+
+            main.startup["status"] = "ready"
+            response = client.get("/ready")
+            assert response.status_code == 200
+            assert response.json()["schedules"] == 2
+
+
 # -------------------------------
 # Test RecurringTaskProcessor
 # -------------------------------
@@ -119,6 +241,9 @@ class TestRecurringTaskProcessor:
             self.processor = RecurringTaskProcessor()
             self.mock_scheduler = mock_scheduler.return_value
 
+    def teardown_method(self):
+        self.processor.executor.shutdown()
+
     def test_calculate_next_occurrence_weekly(self):
         """Test weekly frequency calculation"""
         current_start = datetime(2024, 1, 1, 9, 0, 0)
@@ -187,30 +312,39 @@ class TestRecurringTaskProcessor:
         with pytest.raises(ValueError, match="Unsupported frequency"):
             self.processor.calculate_next_occurrence("Invalid", current_start, current_deadline)
 
-    def test_create_recurring_entry_success(self):
-        """Test successful creation of recurring entry"""
+    def test_rollover_entry_success(self):
+        """Test rolling an entry over to its next occurrence"""
         original_entry = {
+            "sid": "s1",
             "tid": "t1",
             "start": "2024-01-01T09:00:00Z",
             "deadline": "2024-01-03T17:00:00Z"
         }
         
-        mock_new_entry = {"sid": "s2", "tid": "t1"}
+        rollover = {"schedule": {"sid": "s2", "tid": "t1"}, "created": True}
         
-        with patch.object(self.processor.schedule_client, 'create_schedule', return_value=mock_new_entry):
-            result = self.processor.create_recurring_entry(original_entry, "Weekly")
+        with patch.object(self.processor, 'async_client', rollover_schedule=AsyncMock(return_value=rollover)):
+            result = self.processor.executor.run(self.processor.rollover_entry(original_entry, "Weekly"))
+            call = self.processor.async_client.rollover_schedule
             
-            assert result == mock_new_entry
+            assert result == rollover
+            args, kwargs = call.call_args
+            assert args == ("s1",)
+            # Weekly: the new start is a week after the old deadline, keeping the 2-day gap
+            assert kwargs["start"].startswith("2024-01-11T01:00:00")
+            assert kwargs["deadline"].startswith("2024-01-13T09:00:00")
+            assert kwargs["next_occurrence"].startswith("2024-01-20T09:00:00")
 
-    def test_create_recurring_entry_error(self):
-        """Test error handling in create_recurring_entry"""
+    def test_rollover_entry_error(self):
+        """Test error handling in rollover_entry"""
         original_entry = {
+            "sid": "s1",
             "tid": "t1",
             "start": "invalid-date",
             "deadline": "2024-01-03T17:00:00Z"
         }
         
-        result = self.processor.create_recurring_entry(original_entry, "Weekly")
+        result = self.processor.executor.run(self.processor.rollover_entry(original_entry, "Weekly"))
         
         assert result is None
 
@@ -248,21 +382,48 @@ class TestRecurringTaskProcessor:
             "deadline": "2024-01-03T17:00:00Z"
         }
         mock_new_entry = {"sid": "s2", "next_occurrence": "2024-01-08T09:00:00Z"}
+        participants = [{"user_id": "u1", "user_name": "Alice"}]
+        rollover = {"schedule": mock_new_entry, "created": True, "task_name": "Report", "participants": participants}
+        
+        with patch.object(self.processor, 'async_client', fetch_schedule_by_sid=AsyncMock(return_value=mock_current_entry)), \
+             patch.object(self.processor, 'rollover_entry', return_value=rollover), \
+             patch.object(self.processor, '_broadcast_recurring_task_reset_events', return_value=True) as broadcast, \
+             patch.object(self.processor, 'schedule_recurring_task', return_value=True) as schedule_next, \
+             patch.object(self.processor, 'schedule_deadline_monitoring', return_value=True):
+            
+            self.processor.executor.run(self.processor.process_recurring_task("s1", "Weekly"))
+            
+            # Verify that rollover_entry was called
+            self.processor.rollover_entry.assert_called_once_with(mock_current_entry, "Weekly")
+            # Participants and task name come back with the rollover, no extra lookups
+            self.processor.async_client.get_user_info.assert_not_called()
+            sent_to, event_data = broadcast.call_args[0]
+            assert sent_to == participants
+            assert event_data["sid"] == "s2" and event_data["task_name"] == "Report"
+            schedule_next.assert_called_once_with({"sid": "s2", "frequency": "Weekly",
+                                                   "next_occurrence": "2024-01-08T09:00:00Z"})
+
+    def test_process_recurring_task_already_rolled_over(self):
+        """A repeated run neither notifies nor reschedules again"""
+        mock_current_entry = {"sid": "s1", "tid": "t1", "start": "2024-01-01T09:00:00Z",
+                              "deadline": "2024-01-03T17:00:00Z"}
+        rollover = {"schedule": {"sid": "s2"}, "created": False, "participants": [{"user_id": "u1"}]}
         
-        with patch.object(self.processor.schedule_client, 'fetch_schedule_by_sid', return_value=mock_current_entry), \
-             patch.object(self.processor, 'create_recurring_entry', return_value=mock_new_entry), \
-             patch.object(self.processor, 'schedule_recurring_task', return_value=True):
+        with patch.object(self.processor, 'async_client', fetch_schedule_by_sid=AsyncMock(return_value=mock_current_entry)), \
+             patch.object(self.processor, 'rollover_entry', return_value=rollover), \
+             patch.object(self.processor, '_broadcast_recurring_task_reset_events') as broadcast, \
+             patch.object(self.processor, 'schedule_recurring_task') as schedule_next:
             
-            self.processor.process_recurring_task("s1", "Weekly")
+            self.processor.executor.run(self.processor.process_recurring_task("s1", "Weekly"))
             
-            # Verify that create_recurring_entry was called
-            self.processor.create_recurring_entry.assert_called_once()
+            broadcast.assert_not_called()
+            schedule_next.assert_not_called()
 
     def test_process_recurring_task_entry_not_found(self):
         """Test processing when current entry not found"""
-        with patch.object(self.processor.schedule_client, 'fetch_schedule_by_sid', return_value=None):
+        with patch.object(self.processor, 'async_client', fetch_schedule_by_sid=AsyncMock(return_value=None)):
             # Should not raise exception, just log error
-            self.processor.process_recurring_task("s1", "Weekly")
+            self.processor.executor.run(self.processor.process_recurring_task("s1", "Weekly"))
 
     def test_cancel_recurring_task_success(self):
         """Test successful cancellation of recurring task"""
@@ -291,6 +452,53 @@ class TestRecurringTaskProcessor:
         assert len(result) == 1
         assert result[0]["id"] == "recurring_s1"
 
+    def test_sync_schedule_jobs_recurring_with_deadline(self):
+        """Recurring row with a deadline gets its recurring job and fresh deadline jobs"""
+        schedule = {"sid": "s1", "is_recurring": True, "frequency": "Weekly",
+                    "next_occurrence": "2099-01-08T09:00:00Z", "deadline": "2099-01-03T17:00:00Z"}
+        with patch.object(self.processor, 'schedule_recurring_task', return_value=True) as recurring, \
+             patch.object(self.processor, 'cancel_recurring_task') as cancel_recurring, \
+             patch.object(self.processor, 'cancel_deadline_monitoring') as cancel_deadline, \
+             patch.object(self.processor, 'schedule_deadline_monitoring', return_value=True) as deadline:
+            assert self.processor.sync_schedule_jobs(schedule) is True
+
+        recurring.assert_called_once_with(schedule)
+        cancel_recurring.assert_not_called()
+        cancel_deadline.assert_called_once_with("s1")
+        deadline.assert_called_once_with(schedule)
+
+    def test_sync_schedule_jobs_cancels_what_the_row_no_longer_needs(self):
+        """No longer recurring and no deadline: both kinds of job are cancelled"""
+        with patch.object(self.processor, 'schedule_recurring_task') as recurring, \
+             patch.object(self.processor, 'cancel_recurring_task') as cancel_recurring, \
+             patch.object(self.processor, 'cancel_deadline_monitoring') as cancel_deadline, \
+             patch.object(self.processor, 'schedule_deadline_monitoring') as deadline:
+            assert self.processor.sync_schedule_jobs({"sid": "s1", "is_recurring": False}) is True
+
+        recurring.assert_not_called()
+        deadline.assert_not_called()
+        cancel_recurring.assert_called_once_with("s1")
+        cancel_deadline.assert_called_once_with("s1")
+
+    @pytest.mark.parametrize("offset, expected", [
+        (timedelta(days=-1), "reached"),
+        (timedelta(days=1), "approaching"),
+        (timedelta(days=10), None),
+    ])
+    def test_process_deadline_if_due(self, offset, expected):
+        """Past deadlines are processed as overdue, ones within 3 days as approaching"""
+        deadline = (datetime.now(pytz.utc) + offset).isoformat()
+        with patch.object(self.processor, 'process_deadline_reached', return_value=True) as reached, \
+             patch.object(self.processor, 'process_deadline_approaching', return_value=True) as approaching:
+            assert self.processor.process_deadline_if_due("s1", deadline) is True
+
+        assert reached.called == (expected == "reached")
+        assert approaching.called == (expected == "approaching")
+
+    def test_process_deadline_if_due_invalid_deadline(self):
+        """An unparseable deadline is logged, not raised"""
+        assert self.processor.process_deadline_if_due("s1", "not-a-date") is False
+
     def test_shutdown(self):
         """Test shutdown method"""
         self.processor.shutdown()
@@ -374,3 +582,468 @@ class TestNotifyUserEndpoints:
             assert response.status_code == 500
             assert "Error fetching scheduled jobs" in response.json()["detail"]
 
+    def test_process_overdue_marks_all_in_one_batch(self):
+        """Overdue schedules are marked with one batch write, then notified one by one"""
+        from fastapi.testclient import TestClient
+        client = TestClient(main.app)
+        schedules = [
+            {"sid": "s1", "deadline": "2000-01-01T00:00:00Z", "status": "ongoing"},
+            {"sid": "s2", "deadline": "2000-01-02T00:00:00Z", "status": "ongoing"},
+        ]
+        
+        with patch.object(main.schedule_client, 'fetch_due_schedules', return_value=schedules) as due, \
+             patch.object(main.schedule_client, 'update_schedules', return_value=[{"sid": "s1"}]) as update, \
+             patch.object(main.recurring_processor, 'initialize_kafka', return_value=True), \
+             patch.object(main.recurring_processor, 'process_deadline_reached', return_value=True) as reached, \
+             patch.object(main.recurring_processor, 'executor', submit=completed_future):
+            response = client.post("/task/process-overdue")
+        
+        assert response.status_code == 200
+        # Only past-deadline, unprocessed schedules are asked for
+        assert due.call_args.kwargs["status_not"] == ["overdue", "completed", "cancelled"]
+        assert "after" not in due.call_args.kwargs
+        update.assert_called_once_with(["s1", "s2"], {"status": "overdue"})
+        # s2 was not marked, so it is not announced as overdue
+        reached.assert_called_once_with("s1", mark_overdue=False)
+
+
+def completed_future(result):
+    future = concurrent.futures.Future()
+    future.set_result(result)
+    return future
+
+
+# -------------------------------
+# Test schedule-events consumption
+# -------------------------------
+def schedule_event(event_type, sid, version, **schedule):
+    return {"event_type": event_type,
+            "data": {"sid": sid, "tid": "t1", "version": version, "schedule": {"sid": sid, **schedule}}}
+
+
+class TestScheduleEventApplier:
+    def setup_method(self):
+        self.processor = MagicMock()
+        self.applier = ScheduleEventApplier(self.processor)
+
+    def test_latest_per_schedule_keeps_newest_version(self):
+        events = [
+            schedule_event("schedule_created", "s1", 1),
+            schedule_event("schedule_updated", "s1", 3),
+            schedule_event("schedule_updated", "s1", 2),
+            schedule_event("schedule_created", "s2", 4),
+            {"event_type": "deadline_overdue", "data": {"sid": "s1", "version": 9}},
+            {"event_type": "schedule_updated", "data": {"sid": "s3"}},
+        ]
+        latest = {e["data"]["sid"]: e["data"]["version"] for e in latest_per_schedule(events)}
+        assert latest == {"s1": 3, "s2": 4}
+
+    def test_created_syncs_jobs_once_per_schedule(self):
+        batch = [
+            schedule_event("schedule_created", "s1", 1, deadline="2099-01-01T00:00:00Z"),
+            schedule_event("schedule_updated", "s1", 2, deadline="2099-02-01T00:00:00Z"),
+        ]
+        assert self.applier.apply_batch(batch) == 1
+        self.processor.sync_schedule_jobs.assert_called_once_with({"sid": "s1", "deadline": "2099-02-01T00:00:00Z"})
+        self.processor.process_deadline_if_due.assert_called_once_with("s1", "2099-02-01T00:00:00Z")
+
+    def test_redelivered_and_stale_events_are_skipped(self):
+        self.applier.apply_batch([schedule_event("schedule_updated", "s1", 5, deadline="2099-01-01T00:00:00Z")])
+        self.processor.reset_mock()
+
+        applied = self.applier.apply_batch([
+            schedule_event("schedule_updated", "s1", 5, deadline="2099-01-01T00:00:00Z"),
+            schedule_event("schedule_created", "s1", 4),
+        ])
+
+        assert applied == 0
+        self.processor.sync_schedule_jobs.assert_not_called()
+
+    def test_deleted_cancels_jobs_and_blocks_late_create(self):
+        self.applier.apply_batch([schedule_event("schedule_deleted", "s1", 7)])
+        self.processor.cancel_all_task_jobs.assert_called_once_with("s1")
+
+        assert self.applier.apply_batch([schedule_event("schedule_created", "s1", 6)]) == 0
+        self.processor.sync_schedule_jobs.assert_not_called()
+
+    def test_settled_schedule_is_not_processed_immediately(self):
+        self.applier.apply_batch([schedule_event("schedule_updated", "s1", 1,
+                                                 deadline="2000-01-01T00:00:00Z", status="overdue")])
+        self.processor.sync_schedule_jobs.assert_called_once()
+        self.processor.process_deadline_if_due.assert_not_called()
+
+    def test_failed_apply_is_retried_on_redelivery(self):
+        self.processor.sync_schedule_jobs.side_effect = [Exception("scheduler down"), True]
+        event = schedule_event("schedule_created", "s1", 1)
+
+        assert self.applier.apply_batch([event]) == 0
+        assert self.applier.apply_batch([event]) == 1
+
+
+
+# -------------------------------
+# Test sharded scheduling
+# -------------------------------
+def fake_kafka_consumer(partitions=(0, 1, 2), end=100, beginning=0):
+    kafka = MagicMock()
+    kafka.partitions_for_topic.return_value = set(partitions) if partitions else None
+    kafka.end_offsets.side_effect = lambda tps: {tp: end + tp.partition for tp in tps}
+    kafka.beginning_offsets.side_effect = lambda tps: {tp: beginning for tp in tps}
+    return kafka
+
+
+@pytest.fixture
+def notify_user_kafka():
+    with patch.object(schedule_events, "KafkaEventConsumer", notify_user_kafka_client.KafkaEventConsumer):
+        yield
+
+
+@pytest.mark.usefixtures("notify_user_kafka")
+class TestScheduleEventConsumer:
+    def make(self, kafka):
+        consumer = ScheduleEventConsumer(MagicMock(), retry_seconds=0.01)
+        consumer.consumer.consumer = kafka
+        return consumer
+
+    def test_joins_no_group(self):
+        consumer = ScheduleEventConsumer(MagicMock())
+        assert consumer.consumer.group_id is None
+
+    def test_position_seeks_every_partition_to_its_end_before_loading(self):
+        kafka = fake_kafka_consumer()
+        consumer = self.make(kafka)
+
+        assert consumer.position()
+        assigned = kafka.assign.call_args[0][0]
+        assert sorted(tp.partition for tp in assigned) == [0, 1, 2]
+        assert sorted((tp.partition, offset) for (tp, offset), _ in kafka.seek.call_args_list) == \
+            [(0, 100), (1, 101), (2, 102)]
+        kafka.subscribe.assert_not_called()
+
+    def test_topic_created_after_startup_is_read_from_the_beginning(self):
+        kafka = fake_kafka_consumer(partitions=None)
+        consumer = self.make(kafka)
+        assert not consumer.position()
+        assert consumer.topic_missing
+
+        kafka.partitions_for_topic.return_value = {0}
+        with patch.object(consumer.consumer, "consume_batches") as consume, patch.object(consumer.consumer, "close"):
+            consumer._run()
+        assert [(tp.partition, offset) for (tp, offset), _ in kafka.seek.call_args_list] == [(0, 0)]
+        consume.assert_called_once()
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestShardAssignment:
+    def test_shard_of_is_stable_and_in_range(self):
+        shards = {shard_of(f"s{i}", 16) for i in range(200)}
+        assert shards <= set(range(16))
+        assert len(shards) == 16
+        assert shard_of("s1", 16) == shard_of("s1", 16)
+
+    def test_member_leaving_only_moves_its_shards(self):
+        members = ["a", "b", "c", "d"]
+        before = {shard: assign(shard, members) for shard in range(64)}
+        after = {shard: assign(shard, ["a", "b", "d"]) for shard in range(64)}
+
+        moved = {shard for shard in range(64) if before[shard] != after[shard]}
+        assert moved == {shard for shard in range(64) if before[shard] == "c"}
+        assert assign(0, []) is None
+
+
+class TestLeaseStore:
+    def setup_method(self):
+        self.clock = FakeClock()
+
+    def store(self, tmp_path):
+        return LeaseStore(str(tmp_path / "leases.sqlite"), clock=self.clock)
+
+    def test_live_lease_is_not_taken_over(self, tmp_path):
+        store = self.store(tmp_path)
+        assert store.sync_leases("a", {1, 2}, 10) == {1, 2}
+        assert store.sync_leases("b", {2, 3}, 10) == {3}
+
+    def test_lapsed_lease_is_taken_over(self, tmp_path):
+        store = self.store(tmp_path)
+        store.sync_leases("a", {1}, 10)
+        self.clock.now += 11
+
+        assert store.sync_leases("b", {1}, 10) == {1}
+        assert store.fire_once("a", 1, "deadline:s1:t") is False
+
+    def test_unwanted_shards_are_released(self, tmp_path):
+        store = self.store(tmp_path)
+        store.sync_leases("a", {1, 2}, 10)
+        assert store.sync_leases("a", {1}, 10) == {1}
+        assert store.sync_leases("b", {2}, 10) == {2}
+
+    def test_heartbeat_drops_silent_members(self, tmp_path):
+        store = self.store(tmp_path)
+        store.heartbeat("a", 10)
+        self.clock.now += 5
+        assert store.heartbeat("b", 10) == ["a", "b"]
+        self.clock.now += 6
+        assert store.heartbeat("b", 10) == ["b"]
+
+    def test_fire_once_needs_the_lease_and_fires_once(self, tmp_path):
+        store = self.store(tmp_path)
+        store.sync_leases("a", {1}, 10)
+
+        assert store.fire_once("b", 1, "deadline:s1:t") is False
+        assert store.fire_once("a", 1, "deadline:s1:t") is True
+        assert store.fire_once("a", 1, "deadline:s1:t") is False
+        assert store.fire_once("a", 1, "deadline:s1:t2") is True
+
+    def test_leave_releases_everything(self, tmp_path):
+        store = self.store(tmp_path)
+        store.heartbeat("a", 10)
+        store.sync_leases("a", {1, 2}, 10)
+        store.leave("a")
+
+        assert store.heartbeat("b", 10) == ["b"]
+        assert store.sync_leases("b", {1, 2}, 10) == {1, 2}
+
+
+class TestShardCoordinator:
+    def setup_method(self):
+        self.clock = FakeClock()
+
+    def coordinator(self, tmp_path, member, **kwargs):
+        store = LeaseStore(str(tmp_path / "leases.sqlite"), clock=self.clock)
+        return ShardCoordinator(store, member_id=member, shards=16, lease_seconds=10, **kwargs)
+
+    def test_single_member_owns_every_shard(self, tmp_path):
+        gained = []
+        a = self.coordinator(tmp_path, "a", on_gained=gained.append)
+
+        assert a.rebalance() == (set(range(16)), set())
+        assert gained == [set(range(16))]
+        assert a.owns("s1")
+
+    def test_rebalances_on_join_and_leave(self, tmp_path):
+        lost = []
+        a = self.coordinator(tmp_path, "a", on_lost=lost.append)
+        b = self.coordinator(tmp_path, "b")
+        a.rebalance()
+
+        # b is a member now but waits for a to release its shards
+        b.rebalance()
+        assert b.owned == set()
+        a.rebalance()
+        b.rebalance()
+
+        expected_b = {shard for shard in range(16) if assign(shard, ["a", "b"]) == "b"}
+        assert b.owned == expected_b
+        assert a.owned == set(range(16)) - expected_b
+        assert lost == [expected_b]
+
+        b.stop()
+        a.rebalance()
+        assert a.owned == set(range(16))
+
+    def test_stalled_member_is_replaced_after_its_lease(self, tmp_path):
+        a = self.coordinator(tmp_path, "a")
+        b = self.coordinator(tmp_path, "b")
+        a.rebalance()
+        self.clock.now += 11
+
+        b.rebalance()
+        assert b.owned == set(range(16))
+        assert a.fire_once("deadline:s1:t", "s1") is False
+        assert b.fire_once("deadline:s1:t", "s1") is True
+
+
+# Runs as a separate interpreter: polls a set of schedule deadlines, firing the
+# ones in its shards through the fence, and prints what it fired
+SHARD_WORKER = """
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+from sharding import LeaseStore, ShardCoordinator
+
+db, member, start_at, stop_at, leave_at = sys.argv[2], sys.argv[3], *map(float, sys.argv[4:7])
+deadlines = json.loads(sys.argv[7])
+while time.time() < start_at:
+    time.sleep(0.01)
+
+coordinator = ShardCoordinator(LeaseStore(db), member_id=member, shards=16, lease_seconds=1.0)
+fired = []
+while time.time() < stop_at:
+    if leave_at and time.time() >= leave_at:
+        coordinator.stop()
+        break
+    coordinator.rebalance()
+    for sid, deadline in deadlines.items():
+        if time.time() >= deadline and coordinator.owns(sid) and coordinator.fire_once(f"deadline:{sid}:{deadline}", sid):
+            fired.append(sid)
+    time.sleep(0.02)
+print(json.dumps(fired))
+"""
+
+
+class TestShardedSchedulerProcesses:
+    def test_each_deadline_fires_exactly_once_across_workers(self, tmp_path):
+        """Four worker processes, one joining late and one leaving midway"""
+        service_path = os.path.dirname(sys.modules[LeaseStore.__module__].__file__)
+        db = str(tmp_path / "leases.sqlite")
+        t0 = time.time() + 1.0
+        # Deadlines spread over the whole run, so some come due during each membership change
+        deadlines = {f"s{i}": t0 + 0.3 + i * 0.01 for i in range(200)}
+        workers = [
+            ("w1", t0, 0),
+            ("w2", t0, 0),
+            ("w3", t0, t0 + 1.0),
+            ("w4", t0 + 0.8, 0),
+        ]
+
+        processes = [
+            subprocess.Popen(
+                [sys.executable, "-c", SHARD_WORKER, service_path, db, member,
+                 str(start_at), str(t0 + 3.5), str(leave_at), json.dumps(deadlines)],
+                stdout=subprocess.PIPE, text=True,
+            )
+            for member, start_at, leave_at in workers
+        ]
+        fired = {}
+        for (member, _, _), process in zip(workers, processes):
+            out, _ = process.communicate(timeout=30)
+            assert process.returncode == 0
+            fired[member] = json.loads(out)
+
+        all_fired = [sid for sids in fired.values() for sid in sids]
+        assert sorted(all_fired) == sorted(deadlines)
+        assert sum(1 for sids in fired.values() if sids) >= 3
+
+
+class TestShardedProcessor:
+    def setup_method(self):
+        with patch('backend.services.composite.notify_user.recurring_processor.BackgroundScheduler') as mock_scheduler:
+            self.processor = RecurringTaskProcessor()
+            self.mock_scheduler = mock_scheduler.return_value
+        self.processor.coordinator = MagicMock(shards=16)
+
+    def teardown_method(self):
+        self.processor.executor.shutdown()
+
+    def test_unsharded_processor_owns_and_fires_everything(self):
+        self.processor.coordinator = None
+        assert self.processor.owns("s1")
+        assert self.processor.fire_once("deadline", "s1", "2099-01-01T00:00:00Z")
+
+    def test_schedules_outside_owned_shards_are_not_armed(self):
+        self.processor.coordinator.owns.return_value = False
+        schedule = {"sid": "s1", "deadline": "2099-01-01T00:00:00+08:00"}
+
+        assert self.processor.schedule_deadline_monitoring(schedule) is True
+        self.mock_scheduler.add_job.assert_not_called()
+
+    def test_deadline_is_not_processed_when_fenced_off(self):
+        self.processor.coordinator.fire_once.return_value = False
+        self.processor.async_client = AsyncMock()
+        self.processor.async_client.fetch_schedule_by_sid.return_value = {
+            "sid": "s1", "tid": "t1", "deadline": "2000-01-01T00:00:00+08:00", "status": "ongoing"
+        }
+
+        assert self.processor.executor.run(self.processor.process_deadline_reached("s1")) is False
+        self.processor.coordinator.fire_once.assert_called_once_with("deadline:s1:2000-01-01T00:00:00+08:00", "s1")
+        self.processor.async_client.update_schedule.assert_not_called()
+
+    def test_drop_shards_removes_only_their_jobs(self):
+        kept, dropped = MagicMock(args=["s1"]), MagicMock(args=["s2"])
+        self.mock_scheduler.get_jobs.return_value = [kept, dropped]
+        lost = {shard_of("s2", 16)} - {shard_of("s1", 16)}
+
+        self.processor.drop_shards(lost)
+
+        dropped.remove.assert_called_once()
+        kept.remove.assert_not_called()
+
+    def test_load_shards_arms_and_catches_up_in_shard_schedules(self):
+        self.processor.schedule_client = MagicMock()
+        in_shard = {"sid": "s1", "deadline": "2099-01-01T00:00:00+08:00"}
+        other = {"sid": "s2", "deadline": "2099-01-01T00:00:00+08:00"}
+        self.processor.schedule_client.iter_all_schedules.return_value = iter([in_shard, other])
+        self.processor.schedule_client.fetch_due_schedules.return_value = [{"sid": "s1"}, {"sid": "s2"}]
+
+        with patch.object(self.processor, "schedule_deadline_monitoring") as monitor, \
+                patch.object(self.processor, "process_deadline_reached") as reached:
+            self.processor.load_shards({shard_of("s1", 16)} - {shard_of("s2", 16)})
+
+        monitor.assert_called_once_with(in_shard)
+        reached.assert_called_once_with("s1")
+
+
+# -------------------------------
+# Test the async job executor
+# -------------------------------
+class TestAsyncJobExecutor:
+    def setup_method(self):
+        self.executor = AsyncJobExecutor(concurrency=2)
+
+    def teardown_method(self):
+        self.executor.shutdown()
+
+    def test_concurrency_is_bounded_and_the_rest_queue(self):
+        release = threading.Event()
+        peak = []
+
+        async def job(i):
+            peak.append(self.executor.running)
+            await asyncio.to_thread(release.wait, 5)
+            return i
+
+        futures = [self.executor.submit(job(i)) for i in range(6)]
+        deadline = time.time() + 5
+        while (self.executor.running, self.executor.queue_depth) != (2, 4) and time.time() < deadline:
+            time.sleep(0.01)
+        assert self.executor.running == 2
+        assert self.executor.queue_depth == 4
+
+        release.set()
+        assert [future.result(5) for future in futures] == list(range(6))
+        assert max(peak) <= 2
+        assert self.executor.queue_depth == 0 and self.executor.running == 0
+
+    def test_run_from_inside_a_job_is_refused(self):
+        async def nested():
+            return self.executor.run(asyncio.sleep(0))
+
+        with pytest.raises(RuntimeError):
+            self.executor.run(nested())
+
+    def test_scheduler_jobs_run_as_coroutines_and_late_ones_misfire(self):
+        from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_MISSED
+        from apscheduler.schedulers.background import BackgroundScheduler
+        from apscheduler.triggers.date import DateTrigger
+
+        executor = AsyncJobExecutor(concurrency=1)
+        scheduler = BackgroundScheduler(executors={"default": executor}, job_defaults={"misfire_grace_time": 1})
+        events = {}
+        scheduler.add_listener(lambda event: events.setdefault(event.job_id, event.code),
+                               EVENT_JOB_EXECUTED | EVENT_JOB_MISSED)
+        ran = []
+
+        async def job(name, seconds):
+            await asyncio.sleep(seconds)
+            ran.append(name)
+
+        # One slot: "slow" holds it past the grace time of "late", due just after it
+        due = datetime.now(pytz.utc) + timedelta(milliseconds=200)
+        scheduler.add_job(job, DateTrigger(run_date=due), args=["slow", 1.5], id="slow")
+        scheduler.add_job(job, DateTrigger(run_date=due + timedelta(milliseconds=100)), args=["late", 0], id="late")
+        scheduler.start()
+        try:
+            deadline = time.time() + 5
+            while len(events) < 2 and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            scheduler.shutdown()
+
+        assert ran == ["slow"]
+        assert events == {"slow": EVENT_JOB_EXECUTED, "late": EVENT_JOB_MISSED}
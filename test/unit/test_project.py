@@ -282,6 +282,51 @@ def test_fetch_projects_by_department_empty(mock_client, supabase_client):
     result = supabase_client.get_projects_by_department(dept)  # Changed method name
     assert result is None  # Changed from assert result == []
 
+# -------------------------------
+# fetch_projects_visible_to_user tests
+# -------------------------------
+def test_fetch_projects_visible_to_user_binds_rpc_params(mock_client, supabase_client):
+    expected = [{"id": "p1"}, {"id": "p2"}]
+    mock_client.rpc.return_value.execute.return_value.data = expected
+
+    uid = "x,id.not.is.null"
+    result = supabase_client.fetch_projects_visible_to_user(uid, role="manager", department='Sales",uid.neq.')
+
+    mock_client.table.assert_not_called()
+    mock_client.rpc.assert_called_once_with("projects_visible_to_user", {
+        "p_uid": uid,
+        "p_role": "manager",
+        "p_department": 'Sales",uid.neq.',
+    })
+    assert result == expected
+
+def test_fetch_projects_visible_to_user_role_from_db(mock_client, supabase_client):
+    mock_client.rpc.return_value.execute.return_value.data = None
+    assert supabase_client.fetch_projects_visible_to_user("u1") == []
+    mock_client.rpc.assert_called_once_with(
+        "projects_visible_to_user", {"p_uid": "u1", "p_role": None, "p_department": None}
+    )
+
+# -------------------------------
+# add_members / remove_members tests
+# -------------------------------
+def test_add_members_uses_rpc(mock_client, supabase_client):
+    result_payload = {"project": {"id": "p1", "members": ["u1", "u2"]}, "changed": ["u2"]}
+    mock_client.rpc.return_value.execute.return_value.data = result_payload
+
+    result = supabase_client.add_members("p1", ("u1", "u2"))
+
+    mock_client.rpc.assert_called_once_with("project_members_add", {"p_pid": "p1", "p_uids": ["u1", "u2"]})
+    assert result == result_payload
+
+def test_remove_members_uses_rpc(mock_client, supabase_client):
+    mock_client.rpc.return_value.execute.return_value.data = None
+
+    assert supabase_client.remove_members("p1", ["u1"], only_unreferenced=False) is None
+    mock_client.rpc.assert_called_once_with(
+        "project_members_remove", {"p_pid": "p1", "p_uids": ["u1"], "p_only_unreferenced": False}
+    )
+
 # ======================================================================
 #                         ProjectService tests
 # ======================================================================
@@ -390,6 +435,18 @@ def test_service_get_projects_by_department(project_service, mock_supabase_for_s
     assert result == expected
     mock_supabase_for_service.get_projects_by_department.assert_called_once_with(dept)
 
+@pytest.mark.parametrize("role, dept, expected_role, expected_dept", [
+    ("staff", "ENG", "staff", "ENG"),
+    ("Manager", "ENG", "manager", "ENG"),
+    (None, "ENG", None, None),
+])
+def test_service_get_projects_visible_to_user(project_service, mock_supabase_for_service, role, dept, expected_role, expected_dept):
+    mock_supabase_for_service.fetch_projects_visible_to_user.return_value = None
+    assert project_service.get_projects_visible_to_user("u1", role, dept) == []
+    mock_supabase_for_service.fetch_projects_visible_to_user.assert_called_once_with(
+        "u1", role=expected_role, department=expected_dept
+    )
+
 # ======================================================================
 #                         FastAPI main.py endpoint tests
 # ======================================================================
@@ -398,7 +455,10 @@ def test_service_get_projects_by_department(project_service, mock_supabase_for_s
 import backend.services.atomic.project.controllers as _controllers
 _sys.modules.setdefault("controllers", _controllers)
 
-# 4) Finally import the FastAPI app
+# 4) Service directory on the path so main's flat `tracing` import resolves
+_sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../backend/services/atomic/project")))
+
+# 5) Finally import the FastAPI app
 import backend.services.atomic.project.main as project_main
 
 @pytest.fixture
@@ -462,8 +522,18 @@ def test_delete_project(api_client):
 
 def test_get_all_logs(api_client):
     client, ctrl = api_client
-    assert client.get("/logs").status_code == 200
-    ctrl.get_all_logs.assert_called_once()
+    ctrl.get_logs_page.return_value = [{"id": "l1", "timestamp": "2025-10-01T00:00:00+00:00"}]
+    r = client.get("/logs", params={"actor": "u1", "since": "2025-09-01T00:00:00Z", "limit": 10})
+    assert r.status_code == 200
+    assert r.json()["next_cursor"] is None
+    ctrl.get_logs_page.assert_called_once_with(
+        record_id=None, actor="u1", since="2025-09-01T00:00:00+00:00", until=None, after=None, limit=11
+    )
+
+def test_get_all_logs_rejects_oversized_page(api_client):
+    client, ctrl = api_client
+    assert client.get("/logs", params={"limit": 100000}).status_code == 422
+    ctrl.get_logs_page.assert_not_called()
 
 def test_get_log_found(api_client):
     client, ctrl = api_client
@@ -484,6 +554,22 @@ def test_get_projects_by_department(api_client):
     assert client.get("/department/HR").status_code == 200
     ctrl.get_projects_by_department.assert_called_once_with("HR")
 
+def test_add_and_remove_project_members(api_client):
+    client, ctrl = api_client
+    ctrl.change_members.return_value = {"message": "ok", "project": None, "changed": []}
+    assert client.post("/pid/P1/members/add", json={"user_ids": ["u1"]}).status_code == 200
+    ctrl.change_members.assert_called_with("P1", ["u1"], "add")
+    assert client.post("/pid/P1/members/remove", json={"user_ids": ["u1"], "only_unreferenced": False}).status_code == 200
+    ctrl.change_members.assert_called_with("P1", ["u1"], "remove", False)
+    assert client.post("/pid/P1/members/add", json={"user_ids": []}).status_code == 422
+
+def test_get_projects_visible_to_user_ignores_role_param(api_client):
+    client, ctrl = api_client
+    ctrl.get_projects_visible_to_user.return_value = {"message": "ok", "project": []}
+    assert client.get("/uid/U1/visible?role=admin&department=ENG").status_code == 200
+    # no cookie: the role is resolved from the database, never from the query string
+    ctrl.get_projects_visible_to_user.assert_called_once_with("U1", None)
+
 # ======================================================================
 #                    ProjectController tests
 # ======================================================================
@@ -724,4 +810,44 @@ def test_service_get_all_projects_by_dept(project_service, mock_supabase_for_ser
 def test_service_get_all_projects_by_dept_none(project_service, mock_supabase_for_service):
     mock_supabase_for_service.get_projects_by_department.return_value = None
     result = project_service.get_all_projects_by_dept("MARKETING")
-    assert result == []
\ No newline at end of file
+    assert result == []
+
+def test_controller_get_projects_visible_to_user(project_controller, mock_service_for_controller):
+    mock_service_for_controller.get_projects_visible_to_user.return_value = [
+        {"id": "1", "uid": "u1", "name": "P1", "members": None, "owner_department": "ENG"}
+    ]
+    uid = "655a9260-f871-480f-abea-ded735b2170a"
+    result = project_controller.get_projects_visible_to_user(uid, {"id": uid, "role": "manager", "department": "ENG"})
+    assert result.message == f"1 project(s) visible to user {uid}"
+    assert result.project[0].members == []
+    mock_service_for_controller.get_projects_visible_to_user.assert_called_once_with(uid, "manager", "ENG")
+
+def test_controller_get_projects_visible_to_user_rejects_non_uuid(project_controller, mock_service_for_controller):
+    with pytest.raises(HTTPException) as exc:
+        project_controller.get_projects_visible_to_user("x,id.not.is.null")
+    assert exc.value.status_code == 400
+    mock_service_for_controller.get_projects_visible_to_user.assert_not_called()
+
+def test_controller_get_projects_visible_to_user_error(project_controller, mock_service_for_controller):
+    mock_service_for_controller.get_projects_visible_to_user.side_effect = Exception("boom")
+    with pytest.raises(HTTPException) as exc:
+        project_controller.get_projects_visible_to_user("655a9260-f871-480f-abea-ded735b2170a")
+    assert exc.value.status_code == 500
+
+
+def test_controller_change_members_add(project_controller, mock_service_for_controller):
+    mock_service_for_controller.add_members.return_value = {
+        "project": {"id": "p1", "uid": "u0", "name": "P1", "members": ["u0", "u1"]},
+        "changed": ["u1"],
+    }
+    result = project_controller.change_members("p1", ["u0", "u1"], "add")
+    assert result.message == "1 member(s) added to project p1"
+    assert result.changed == ["u1"]
+    mock_service_for_controller.add_members.assert_called_once_with("p1", ["u0", "u1"])
+
+def test_controller_change_members_remove_not_found(project_controller, mock_service_for_controller):
+    mock_service_for_controller.remove_members.return_value = None
+    with pytest.raises(HTTPException) as exc:
+        project_controller.change_members("missing", ["u1"], "remove")
+    assert exc.value.status_code == 404
+    mock_service_for_controller.remove_members.assert_called_once_with("missing", ["u1"], True)
@@ -1,3 +1,4 @@
+import json
 import sys
 import os
 import pytest
@@ -230,30 +231,52 @@ def test_fetch_schedule_by_tid_not_found(mock_client, supabase_client):
 def test_fetch_schedule_by_tid_latest_found(mock_client, supabase_client):
     tid = "1991067d-18d4-48c4-987b-7c067..."
     expected = {"tid": tid, "status": "ongoing", "sid": "schedule-1", "created_at": "2025-10-18T08:34:34.969657+00:00"}
-
-    mock_table = mock_client.table.return_value
-    mock_table.select.return_value.eq.return_value.order.return_value.limit.return_value.execute.return_value.data = [expected]
+    mock_client.rpc.return_value.execute.return_value.data = [expected]
 
     result = supabase_client.fetch_schedule_by_tid(tid, latest=True)
 
-    mock_client.table.assert_called_once_with("SCHEDULE")
-    mock_table.select.assert_called_once_with("*")
-    mock_table.select.return_value.eq.assert_called_once_with("tid", tid)
-    mock_table.select.return_value.eq.return_value.order.assert_called_once_with("start", desc=True)
-    mock_table.select.return_value.eq.return_value.order.return_value.limit.assert_called_once_with(1)
+    mock_client.rpc.assert_called_once_with("latest_schedule_for_tasks", {"p_tids": [tid]})
+    mock_client.table.assert_not_called()
     assert result == expected
 
 
 def test_fetch_schedule_by_tid_latest_not_found(mock_client, supabase_client):
-    tid = "missing-task"
-
-    mock_table = mock_client.table.return_value
-    mock_table.select.return_value.eq.return_value.order.return_value.limit.return_value.execute.return_value.data = []
+    mock_client.rpc.return_value.execute.return_value.data = []
 
-    result = supabase_client.fetch_schedule_by_tid(tid, latest=True)
+    result = supabase_client.fetch_schedule_by_tid("missing-task", latest=True)
     assert result is None
 
 
+def test_fetch_due_schedules_calls_range_rpc(mock_client, supabase_client):
+    rows = [{"sid": "S1", "deadline": "2025-01-01T00:00:00+00:00"}]
+    mock_client.rpc.return_value.execute.return_value.data = rows
+
+    assert supabase_client.fetch_due_schedules(before="B", status_not=["completed"]) == rows
+    mock_client.rpc.assert_called_once_with("schedules_due", {
+        "p_after": None, "p_before": "B", "p_status_not": ["completed"], "p_limit": None,
+    })
+
+
+def test_fetch_schedule_page_calls_keyset_rpc(mock_client, supabase_client):
+    rows = [{"sid": "S1", "tid": "T1"}]
+    mock_client.rpc.return_value.execute.return_value.data = rows
+
+    assert supabase_client.fetch_schedule_page(after="T0", limit=2) == rows
+    mock_client.rpc.assert_called_once_with("current_schedules_page", {"p_after": "T0", "p_limit": 2})
+
+
+def test_fetch_latest_schedules_keys_by_tid(mock_client, supabase_client):
+    rows = [{"tid": "T1", "sid": "S1"}, {"tid": "T2", "sid": "S2"}]
+    mock_client.rpc.return_value.execute.return_value.data = rows
+
+    assert supabase_client.fetch_latest_schedules(["T1", "T2", "T3"]) == {"T1": rows[0], "T2": rows[1]}
+    mock_client.rpc.assert_called_once_with("latest_schedule_for_tasks", {"p_tids": ["T1", "T2", "T3"]})
+
+    mock_client.rpc.reset_mock()
+    assert supabase_client.fetch_latest_schedules([]) == {}
+    mock_client.rpc.assert_not_called()
+
+
 def test_fetch_schedule_by_sid_found(mock_client, supabase_client):
     sid = "053a4e96-cefd-4a8e-9941-5b621ff8ca52"
     expected = {"sid": sid, "tid": "task-1", "status": "ongoing"}
@@ -442,109 +465,124 @@ def test_delete_schedule_exception_raises(mock_client, supabase_client):
 
 
 
-# --- inject fake supabaseClient BEFORE importing main ---
-fake_module = types.ModuleType("supabaseClient")
-fake_module.SupabaseClient = object  # dummy placeholder
-sys.modules["supabaseClient"] = fake_module
+# -------------------------------
+# Batch write tests
+# -------------------------------
+def test_insert_schedules_single_statement(mock_client, supabase_client):
+    payloads = [
+        {"tid": "t1", "deadline": "2025-01-02T00:00:00+00:00", "status": "ongoing",
+         "next_occurrence": "ignored-when-not-recurring"},
+        {"tid": "t2", "deadline": "2025-01-02T00:00:00+00:00", "status": "ongoing", "is_recurring": True,
+         "next_occurrence": "2025-01-09T00:00:00+00:00", "frequency": "Weekly"},
+    ]
+    mock_table = mock_client.table.return_value
+    mock_table.insert.return_value.execute.return_value.data = [{"sid": "s1"}, {"sid": "s2"}]
 
-import backend.services.atomic.schedule.main as main
+    assert supabase_client.insert_schedules(payloads) == [{"sid": "s1"}, {"sid": "s2"}]
 
-# -----------------------------
-# Helpers for httpx async stubs
-# -----------------------------
-class _FakeResponse:
-    def __init__(self, status_code: int):
-        self.status_code = status_code
+    rows = mock_table.insert.call_args[0][0]
+    assert rows[0]["next_occurrence"] is None and "frequency" not in rows[0]
+    assert rows[1]["frequency"] == "Weekly"
+    assert mock_table.insert.call_args[1] == {"default_to_null": False}
+    mock_table.insert.return_value.execute.assert_called_once()
 
 
-class _FakeAsyncClient:
-    """
-    A context manager that yields itself and returns canned responses in sequence.
-    - codes: list[int | Exception], we either return that status_code or raise.
-    - counter: tracks number of POST calls.
-    """
-    def __init__(self, codes):
-        self._codes = list(codes)
-        self.calls = 0
+def test_insert_schedules_reports_invalid_row(mock_client, supabase_client):
+    payloads = [{"tid": "t1"}, {"tid": "t2", "is_recurring": True, "frequency": "Weekly"}]
+    with pytest.raises(ValueError, match=r"rows\[1\]: next_occurrence is required"):
+        supabase_client.insert_schedules(payloads)
+    mock_client.table.return_value.insert.assert_not_called()
 
-    async def __aenter__(self):
-        return self
 
-    async def __aexit__(self, exc_type, exc, tb):
-        return False
+def test_upsert_schedules_conflicts_on_sid(mock_client, supabase_client):
+    mock_table = mock_client.table.return_value
+    mock_table.upsert.return_value.execute.return_value.data = [{"sid": "s1"}]
 
-    async def post(self, *args, **kwargs):
-        self.calls += 1
-        if not self._codes:
-            return _FakeResponse(200) # pragma: no cover
-        nxt = self._codes.pop(0)
-        if isinstance(nxt, Exception):
-            raise nxt
-        return _FakeResponse(nxt)
+    supabase_client.upsert_schedules([{"sid": "s1", "tid": "t1", "status": "ongoing"}, {"tid": "t2"}])
 
+    rows = mock_table.upsert.call_args[0][0]
+    assert rows[0]["sid"] == "s1" and "sid" not in rows[1]
+    assert mock_table.upsert.call_args[1] == {"on_conflict": "sid", "default_to_null": False}
 
-# -----------------------------
-# Fixtures / client
-# -----------------------------
-def _wire_supabase(mock=None):
-    """Replace module-level supabase with a mock client."""
-    main.supabase = mock or MagicMock()
 
-client = TestClient(main.app)
+def test_update_schedules_same_patch_for_many(mock_client, supabase_client):
+    mock_table = mock_client.table.return_value
+    mock_table.update.return_value.in_.return_value.execute.return_value.data = [{"sid": "s1"}, {"sid": "s2"}]
 
+    result = supabase_client.update_schedules(["s1", "s2"], {"status": "completed"})
 
-# =============================
-# NOTIFIER COVERAGE (25-58, 62-95)
-# =============================
+    assert len(result) == 2
+    mock_table.update.assert_called_once_with({"status": "completed"})
+    mock_table.update.return_value.in_.assert_called_once_with("sid", ["s1", "s2"])
 
-def test_notify_added_success_on_first_url(monkeypatch):
-    """
-    Exercise early success path (status_code==200) for notify_recurring_task_added.
-    Covers: loop, early return, no sleep/backoff.
-    """
-    fake = _FakeAsyncClient([200])
-    monkeypatch.setattr(main.httpx, "AsyncClient", lambda: fake)
 
-    # no real delay
-    # monkeypatch.setattr(asyncio, "sleep", lambda *_args, **_kw: asyncio.sleep(0))
+def test_patch_schedules_uses_rpc(mock_client, supabase_client):
+    patches = [{"sid": "s1", "status": "completed"}, {"sid": "s2", "deadline": "2025-02-01T00:00:00+00:00"}]
+    mock_client.rpc.return_value.execute.return_value.data = [{"sid": "s1"}, {"sid": "s2"}]
 
-    asyncio.run(main.notify_recurring_task_added({"sid": "S1", "tid": "T1"})) # pragma: no cover
-    # Should have attempted exactly one POST
-    assert fake.calls == 1 
+    assert len(supabase_client.patch_schedules(patches)) == 2
+    mock_client.rpc.assert_called_once_with("schedule_batch_update", {"p_rows": patches})
 
 
-def test_notify_added_all_fail_then_log(monkeypatch):
-    """
-    Exercise: non-200 statuses across all attempts & URLs + exceptions; ensure it completes.
-    Covers: warning logging branches, exception branch, exponential backoff awaits.
-    """
-    # 3 attempts * 3 URLs = up to 9 POSTs; we provide many failing codes and one exception.
-    codes = [500, 503, 404, Exception("boom"), 500, 500, 400, 502, 503]
-    fake = _FakeAsyncClient(codes)
-    monkeypatch.setattr(main.httpx, "AsyncClient", lambda: fake)
+def test_patch_schedules_requires_sid(mock_client, supabase_client):
+    with pytest.raises(ValueError, match=r"rows\[0\]: sid is required"):
+        supabase_client.patch_schedules([{"status": "completed"}])
+    mock_client.rpc.assert_not_called()
 
-    # Avoid real waiting; count calls implicitly via fake.calls
-    async def _fast_sleep(_):
-        return None
-    monkeypatch.setattr(asyncio, "sleep", lambda *_a, **_k: _fast_sleep(0))
 
-    asyncio.run(main.notify_recurring_task_added({"sid": "S2", "tid": "T2"}))
-    # We don't assert log content; just that we exercised many calls.
-    assert fake.calls >= 3  # definitely attempted multiple URLs/attempts
+def test_rollover_schedule_uses_rpc(mock_client, supabase_client):
+    result = {"previous": {"sid": "s1"}, "schedule": {"sid": "s2"}, "created": True, "participants": []}
+    mock_client.rpc.return_value.execute.return_value.data = result
 
+    assert supabase_client.rollover_schedule("s1", "a", "b", "c") == result
+    mock_client.rpc.assert_called_once_with("schedule_rollover", {
+        "p_sid": "s1", "p_start": "a", "p_deadline": "b", "p_next_occurrence": "c"})
 
-def test_notify_updated_fail_then_success(monkeypatch):
-    """
-    Exercise: first URL/attempt fails, second attempt succeeds -> early return.
-    """
-    fake = _FakeAsyncClient([500, 200])
-    monkeypatch.setattr(main.httpx, "AsyncClient", lambda: fake)
 
-    # no real delay
-    monkeypatch.setattr(asyncio, "sleep", lambda *_args, **_kw: asyncio.sleep(0))
+# -------------------------------
+# Outbox tests
+# -------------------------------
+def test_claim_outbox_calls_rpc(mock_client, supabase_client):
+    rows = [{"id": 7, "event_type": "schedule_updated", "sid": "S1"}]
+    mock_client.rpc.return_value.execute.return_value.data = rows
 
-    asyncio.run(main.notify_recurring_task_updated({"sid": "S3", "tid": "T3"}))
-    assert fake.calls == 2
+    assert supabase_client.claim_outbox(50, 30) == rows
+    mock_client.rpc.assert_called_once_with("schedule_outbox_claim", {"p_limit": 50, "p_lease_seconds": 30})
+
+
+def test_mark_outbox_published(mock_client, supabase_client):
+    mock_table = mock_client.table.return_value
+    mock_table.update.return_value.in_.return_value.execute.return_value.data = [{"id": 7}]
+
+    supabase_client.mark_outbox_published([7, 8])
+
+    mock_client.table.assert_called_once_with("SCHEDULE_OUTBOX")
+    assert "published_at" in mock_table.update.call_args[0][0]
+    mock_table.update.return_value.in_.assert_called_once_with("id", [7, 8])
+
+
+def test_mark_outbox_published_nothing_to_mark(mock_client, supabase_client):
+    assert supabase_client.mark_outbox_published([]) == []
+    mock_client.table.assert_not_called()
+
+
+# --- inject fake supabaseClient BEFORE importing main ---
+fake_module = types.ModuleType("supabaseClient")
+fake_module.SupabaseClient = object  # dummy placeholder
+sys.modules["supabaseClient"] = fake_module
+# Add the service directory to Python path so tracing can be found
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../backend/services/atomic/schedule")))
+
+import backend.services.atomic.schedule.main as main
+
+# -----------------------------
+# Fixtures / client
+# -----------------------------
+def _wire_supabase(mock=None):
+    """Replace module-level supabase with a mock client."""
+    main.supabase = mock or MagicMock()
+
+client = TestClient(main.app)
 
 
 # ==========================================
@@ -553,11 +591,11 @@ def test_notify_updated_fail_then_success(monkeypatch):
 
 def test_put_update_schedule_reraises_http_exception_branch():
     """
-    Force 404 from fetch_schedule_by_sid to hit the explicit HTTPException branch
-    inside update_schedule (lines around 173-174).
+    Force 404 from update_schedule to hit the explicit HTTPException branch
+    inside update_schedule.
     """
     _wire_supabase()
-    main.supabase.fetch_schedule_by_sid.return_value = None
+    main.supabase.update_schedule.return_value = None
     r = client.put("/NO_SUCH_SID", json={"status": "x"})
     assert r.status_code == 404
 
@@ -567,7 +605,6 @@ def test_put_update_schedule_generic_exception_to_400(monkeypatch):
     Force a generic Exception in update path to hit the generic except -> 400.
     """
     _wire_supabase()
-    main.supabase.fetch_schedule_by_sid.return_value = {"sid": "S99", "tid": "T99"}
     main.supabase.update_schedule.side_effect = Exception("boom!")
     r = client.put("/S99", json={"status": "x"})
     assert r.status_code == 400
@@ -644,21 +681,6 @@ _sys.modules.setdefault("supabaseClient", _sc)
 
 import backend.services.atomic.schedule.main as schedule_main
 
-@pytest.fixture
-def fake_notify_spies(monkeypatch):
-    """Patch notify coroutines to async no-ops we can spy on."""
-    calls = {"added": 0, "updated": 0}
-
-    async def _added(payload):
-        calls["added"] += 1
-
-    async def _updated(payload):
-        calls["updated"] += 1
-
-    monkeypatch.setattr(schedule_main, "notify_recurring_task_added", _added, raising=True)
-    monkeypatch.setattr(schedule_main, "notify_recurring_task_updated", _updated, raising=True)
-    return calls
-
 @pytest.fixture
 def api_client(monkeypatch):
     """Patch the module-level supabase in main.py and return a TestClient."""
@@ -686,20 +708,60 @@ def test_get_by_tid_404(api_client):
     r = client.get("/tid/MISS")
     assert r.status_code == 404
 
-def test_get_by_tid_latest_found(api_client):
+@pytest.fixture
+def latest_client(api_client, monkeypatch):
     client, sb = api_client
+    monkeypatch.setattr(schedule_main, "latest_cache", schedule_main.LatestScheduleCache())
+    return client, sb
+
+def test_get_by_tid_latest_found(latest_client):
+    client, sb = latest_client
     data = {"sid": "S2", "tid": "T2", "created_at": "2025-10-01T00:00:00Z"}
-    sb.fetch_schedule_by_tid.return_value = data
+    sb.fetch_latest_schedules.return_value = {"T2": data}
     r = client.get("/tid/T2/latest")
     assert r.status_code == 200
-    sb.fetch_schedule_by_tid.assert_called_once_with("T2", latest=True)
+    assert r.json()["data"] == data
+    sb.fetch_latest_schedules.assert_called_once_with(["T2"])
 
-def test_get_by_tid_latest_404(api_client):
-    client, sb = api_client
-    sb.fetch_schedule_by_tid.return_value = None
+def test_get_by_tid_latest_404(latest_client):
+    client, sb = latest_client
+    sb.fetch_latest_schedules.return_value = {}
     r = client.get("/tid/T3/latest")
     assert r.status_code == 404
 
+def test_get_by_tid_latest_cached_until_own_write(latest_client):
+    client, sb = latest_client
+    sb.fetch_latest_schedules.return_value = {"T2": {"sid": "S2", "tid": "T2", "status": "ongoing"}}
+    sb.update_schedule.return_value = {"sid": "S2", "tid": "T2", "status": "completed"}
+
+    client.get("/tid/T2/latest")
+    client.get("/tid/T2/latest")
+    assert sb.fetch_latest_schedules.call_count == 1
+
+    assert client.put("/S2", json={"status": "completed"}).status_code == 200
+    client.get("/tid/T2/latest")
+    assert sb.fetch_latest_schedules.call_count == 2
+
+def test_post_latest_bulk_lookup(latest_client):
+    client, sb = latest_client
+    sb.fetch_latest_schedules.side_effect = lambda tids: {t: {"tid": t, "sid": f"S-{t}"} for t in tids if t != "T9"}
+
+    client.get("/tid/T1/latest")
+    r = client.post("/latest", json={"tids": ["T1", "T2", "T9", "T2"]})
+    assert r.status_code == 200
+    assert set(r.json()["data"]) == {"T1", "T2"}
+    # T1 was cached by the single lookup; the rest are fetched together, duplicates once
+    assert sb.fetch_latest_schedules.call_args_list[-1].args == (["T2", "T9"],)
+
+    client.post("/latest", json={"tids": ["T1", "T2", "T9"]})
+    assert sb.fetch_latest_schedules.call_count == 2
+
+@pytest.mark.parametrize("body", [{}, {"tids": "T1"}, {"tids": [1, 2]}, {"tids": ["T"] * 1001}])
+def test_post_latest_rejects_bad_lookups(latest_client, body):
+    client, sb = latest_client
+    assert client.post("/latest", json=body).status_code == 400
+    sb.fetch_latest_schedules.assert_not_called()
+
 def test_get_by_sid_found(api_client):
     client, sb = api_client
     data = {"sid": "S5", "tid": "T5"}
@@ -715,7 +777,7 @@ def test_get_by_sid_404(api_client):
     r = client.get("/sid/SX")
     assert r.status_code == 404
 
-def test_post_insert_non_recurring(api_client, fake_notify_spies):
+def test_post_insert_non_recurring(api_client):
     client, sb = api_client
     payload = {
         "tid": "TT1",
@@ -727,10 +789,9 @@ def test_post_insert_non_recurring(api_client, fake_notify_spies):
     sb.insert_schedule.return_value = {"sid":"SNEW","tid":"TT1"}
     r = client.post("/", json=payload)
     assert r.status_code == 200
-    assert fake_notify_spies["added"] == 0  # no notify for non-recurring
     sb.insert_schedule.assert_called_once()
 
-def test_post_insert_recurring_triggers_notify(api_client, fake_notify_spies):
+def test_post_insert_recurring(api_client):
     client, sb = api_client
     payload = {
         "tid": "TT2",
@@ -744,50 +805,28 @@ def test_post_insert_recurring_triggers_notify(api_client, fake_notify_spies):
     sb.insert_schedule.return_value = {"sid":"SNEW2","tid":"TT2"}
     r = client.post("/", json=payload)
     assert r.status_code == 200
-    assert fake_notify_spies["added"] == 1
     sb.insert_schedule.assert_called_once()
 
-def test_put_update_by_sid_with_cron_change_triggers_notify(api_client, fake_notify_spies):
+def test_put_update_by_sid_writes_without_reading_first(api_client):
     client, sb = api_client
     sid = "S9"
-    sb.fetch_schedule_by_sid.return_value = {
-        "sid": sid, "tid": "T9", "is_recurring": False, "deadline": "2025-03-02T00:00:00+00:00"
-    }
     new_data = {"is_recurring": True, "next_occurrence": "2025-03-05T00:00:00+00:00"}
     sb.update_schedule.return_value = {"sid": sid, **new_data}
 
     r = client.put(f"/{sid}", json=new_data)
     assert r.status_code == 200
-    assert fake_notify_spies["updated"] == 1
-    sb.fetch_schedule_by_sid.assert_called_once_with(sid)
+    # Change events come from the outbox trigger, so nothing needs the old row
+    sb.fetch_schedule_by_sid.assert_not_called()
     sb.update_schedule.assert_called_once_with(sid, new_data)
 
-def test_put_update_by_sid_no_cron_change_no_notify(api_client, fake_notify_spies):
-    client, sb = api_client
-    sid = "S10"
-    sb.fetch_schedule_by_sid.return_value = {"sid": sid, "tid": "T10", "status":"ongoing"}
-    new_data = {"status":"overdue"}
-    sb.update_schedule.return_value = {"sid": sid, "status":"overdue"}
-    r = client.put(f"/{sid}", json=new_data)
-    assert r.status_code == 200
-    assert fake_notify_spies["updated"] == 0
-
 def test_put_update_by_sid_404_current_missing(api_client):
     client, sb = api_client
     sid = "S404"
-    sb.fetch_schedule_by_sid.return_value = None
-    r = client.put(f"/{sid}", json={"status":"x"})
-    assert r.status_code == 404
-
-def test_put_update_by_sid_404_after_update(api_client):
-    client, sb = api_client
-    sid = "S404b"
-    sb.fetch_schedule_by_sid.return_value = {"sid": sid, "tid": "Tz"}
     sb.update_schedule.return_value = None
     r = client.put(f"/{sid}", json={"status":"x"})
     assert r.status_code == 404
 
-def test_put_update_by_tid_happy_path_with_cron_change(api_client, fake_notify_spies):
+def test_put_update_by_tid_happy_path(api_client):
     client, sb = api_client
     tid = "TID1"
     sb.fetch_schedule_by_tid.return_value = {"sid":"SID1","tid":tid,"is_recurring":False}
@@ -796,7 +835,6 @@ def test_put_update_by_tid_happy_path_with_cron_change(api_client, fake_notify_s
 
     r = client.put(f"/tid/{tid}", json=new_data)
     assert r.status_code == 200
-    assert fake_notify_spies["updated"] >= 1
     sb.fetch_schedule_by_tid.assert_called_once_with(tid, latest=True)
     sb.update_schedule.assert_called_once_with("SID1", new_data)
 
@@ -842,18 +880,489 @@ def test_get_recurring_all_error(api_client):
     assert r.status_code == 400
     assert r.json()["detail"] == "boom"
 
-def test_has_cron_affecting_changes_true():
-    from backend.services.atomic.schedule.main import has_cron_affecting_changes
-    old_data = {"is_recurring": False, "deadline": "2025-01-01"}
-    new_data = {"is_recurring": True}  # change in cron-affecting field
-    assert has_cron_affecting_changes(old_data, new_data) is True
+def test_post_insert_recurring_missing_next_occurrence_400(api_client):
+    client, sb = api_client
     
-def test_has_cron_affecting_changes_false():
-    from backend.services.atomic.schedule.main import has_cron_affecting_changes
-    old_data = {"is_recurring": False, "deadline": "2025-01-01"}
-    new_data = {"status": "ongoing"}  # not a cron-affecting field
-    assert has_cron_affecting_changes(old_data, new_data) is False
 
-def test_post_insert_recurring_missing_next_occurrence_400(api_client, fake_notify_spies):
+
+def test_batch_insert(api_client):
     client, sb = api_client
-    
+    rows = [{"tid": "T1"}, {"tid": "T2"}]
+    sb.insert_schedules.return_value = [{"sid": "S1"}, {"sid": "S2"}]
+    r = client.post("/batch", json={"op": "insert", "rows": rows})
+    assert r.status_code == 200
+    assert r.json()["data"] == [{"sid": "S1"}, {"sid": "S2"}]
+    sb.insert_schedules.assert_called_once_with(rows)
+
+def test_batch_upsert(api_client):
+    client, sb = api_client
+    sb.upsert_schedules.return_value = [{"sid": "S1"}]
+    r = client.post("/batch", json={"op": "upsert", "rows": [{"sid": "S1", "tid": "T1"}]})
+    assert r.status_code == 200
+    sb.upsert_schedules.assert_called_once_with([{"sid": "S1", "tid": "T1"}])
+
+def test_batch_update_per_row_and_shared(api_client):
+    client, sb = api_client
+    sb.patch_schedules.return_value = [{"sid": "S1"}]
+    sb.update_schedules.return_value = [{"sid": "S1"}, {"sid": "S2"}]
+
+    r = client.post("/batch", json={"op": "update", "rows": [{"sid": "S1", "status": "completed"}]})
+    assert r.status_code == 200
+    sb.patch_schedules.assert_called_once_with([{"sid": "S1", "status": "completed"}])
+
+    r = client.post("/batch", json={"op": "update", "sids": ["S1", "S2"], "data": {"status": "completed"}})
+    assert r.status_code == 200
+    assert len(r.json()["data"]) == 2
+    sb.update_schedules.assert_called_once_with(["S1", "S2"], {"status": "completed"})
+
+@pytest.mark.parametrize("body", [
+    {"op": "delete", "rows": []},
+    {"op": "insert"},
+    {"op": "update", "sids": ["S1"]},
+    {"op": "insert", "rows": [{"tid": "T"}] * (schedule_main.MAX_BATCH_SIZE + 1)},
+])
+def test_batch_rejects_bad_requests(api_client, body):
+    client, sb = api_client
+    r = client.post("/batch", json=body)
+    assert r.status_code == 400
+    sb.insert_schedules.assert_not_called()
+
+def test_batch_empty_is_noop(api_client):
+    client, sb = api_client
+    r = client.post("/batch", json={"op": "insert", "rows": []})
+    assert r.status_code == 200
+    assert r.json()["data"] == []
+    sb.insert_schedules.assert_not_called()
+
+def test_batch_validation_error_to_400(api_client):
+    client, sb = api_client
+    sb.insert_schedules.side_effect = ValueError("rows[0]: frequency is required when is_recurring is True")
+    r = client.post("/batch", json={"op": "insert", "rows": [{"tid": "T", "is_recurring": True}]})
+    assert r.status_code == 400
+    assert r.json()["detail"].startswith("rows[0]")
+
+def test_rollover(api_client):
+    client, sb = api_client
+    body = {"start": "2025-01-08T00:00:00+08:00", "deadline": "2025-01-10T00:00:00+08:00",
+            "next_occurrence": "2025-01-17T00:00:00+08:00"}
+    sb.rollover_schedule.return_value = {"schedule": {"sid": "S2"}, "created": True, "participants": []}
+    r = client.post("/sid/S1/rollover", json=body)
+    assert r.status_code == 200
+    assert r.json()["data"]["schedule"]["sid"] == "S2"
+    sb.rollover_schedule.assert_called_once_with("S1", body["start"], body["deadline"], body["next_occurrence"])
+
+def test_rollover_missing_fields_400(api_client):
+    client, sb = api_client
+    r = client.post("/sid/S1/rollover", json={"start": "2025-01-08T00:00:00+08:00"})
+    assert r.status_code == 400
+    assert "deadline" in r.json()["detail"]
+    sb.rollover_schedule.assert_not_called()
+
+def test_rollover_unknown_sid_404(api_client):
+    client, sb = api_client
+    sb.rollover_schedule.return_value = None
+    r = client.post("/sid/NOPE/rollover", json={"start": "a", "deadline": "b", "next_occurrence": "c"})
+    assert r.status_code == 404
+
+
+# ======================================================================================================
+#                                    Outbox relay
+# ======================================================================================================
+import outbox
+
+
+class _FakePublisher:
+    def __init__(self, fail_on=()):
+        self.fail_on = set(fail_on)
+        self.sent = []
+        self.closed = False
+
+    def publish_event(self, topic, event_type, data):
+        if data["version"] in self.fail_on:
+            return False
+        self.sent.append((topic, event_type, data))
+        return True
+
+    def close(self):
+        self.closed = True
+
+
+def _outbox_row(row_id, event_type="schedule_updated", sid="S1"):
+    return {"id": row_id, "event_type": event_type, "sid": sid, "tid": "T1",
+            "payload": {"sid": sid, "tid": "T1", "deadline": "2025-01-02T00:00:00+00:00"},
+            "created_at": "2025-01-01T00:00:00+00:00"}
+
+
+def test_outbox_relay_publishes_in_version_order_and_marks():
+    store = MagicMock()
+    store.claim_outbox.return_value = [_outbox_row(3), _outbox_row(1, "schedule_created"), _outbox_row(2)]
+    publisher = _FakePublisher()
+    relay = outbox.OutboxRelay(store, publisher, batch_size=10, lease_seconds=5)
+
+    assert relay.relay_once() == 3
+    store.claim_outbox.assert_called_once_with(10, 5)
+    assert [data["version"] for _, _, data in publisher.sent] == [1, 2, 3]
+    topic, event_type, data = publisher.sent[0]
+    assert topic == "schedule-events" and event_type == "schedule_created"
+    assert data["sid"] == "S1" and data["tid"] == "T1" and data["schedule"]["deadline"]
+    store.mark_outbox_published.assert_called_once_with([1, 2, 3])
+
+
+def test_outbox_relay_stops_at_first_failed_publish():
+    store = MagicMock()
+    store.claim_outbox.return_value = [_outbox_row(1), _outbox_row(2), _outbox_row(3)]
+    publisher = _FakePublisher(fail_on={2})
+    relay = outbox.OutboxRelay(store, publisher)
+
+    assert relay.relay_once() == 1
+    # Row 3 is not published ahead of row 2; both are retried after their lease
+    assert [data["version"] for _, _, data in publisher.sent] == [1]
+    store.mark_outbox_published.assert_called_once_with([1])
+
+
+def test_outbox_relay_empty_outbox_marks_nothing():
+    store = MagicMock()
+    store.claim_outbox.return_value = []
+    assert outbox.OutboxRelay(store, _FakePublisher()).relay_once() == 0
+    store.mark_outbox_published.assert_not_called()
+
+
+def test_outbox_event_data_for_delete_uses_old_row():
+    row = {"id": 9, "event_type": "schedule_deleted", "sid": None, "tid": None,
+           "payload": {"sid": "S9", "tid": "T9"}, "created_at": None}
+    assert outbox.event_data(row) == {"sid": "S9", "tid": "T9", "version": 9, "changed_at": None,
+                                      "schedule": {"sid": "S9", "tid": "T9"}}
+
+
+def test_outbox_relay_thread_survives_errors_and_stops():
+    store = MagicMock()
+    store.claim_outbox.side_effect = Exception("db down")
+    publisher = _FakePublisher()
+    relay = outbox.OutboxRelay(store, publisher, poll_seconds=0.01)
+
+    relay.start()
+    relay.stop()
+    assert store.claim_outbox.called
+    assert publisher.closed
+
+
+def test_lifespan_runs_outbox_relay(monkeypatch):
+    started = []
+
+    class _Relay:
+        def __init__(self, store):
+            started.append(store)
+
+        def start(self):
+            started.append("start")
+
+        def stop(self):
+            started.append("stop")
+
+    fake = MagicMock()
+    monkeypatch.setattr(schedule_main, "supabase", fake)
+    monkeypatch.setattr(schedule_main, "OutboxRelay", _Relay)
+    with TestClient(schedule_main.app) as c:
+        assert c.get("/").status_code == 200
+        assert started == [fake, "start"]
+    assert started[-1] == "stop"
+
+
+
+# ======================================================================================================
+#                                    Recurrence expansion (/occurrences)
+# ======================================================================================================
+import recurrence
+import occurrences
+from datetime import datetime as _dt
+
+
+def _sgt(*args):
+    return recurrence.UTC_PLUS_8.localize(_dt(*args))
+
+
+def _recurring(tid, frequency, start, deadline, sid=None):
+    return {"sid": sid or f"S-{tid}", "tid": tid, "frequency": frequency, "is_recurring": True,
+            "start": start.isoformat(), "deadline": deadline.isoformat()}
+
+
+def _stepped(frequency, start, deadline, window_start, window_end):
+    """Reference: roll the series over one occurrence at a time, like notify_user does"""
+    found, index = [], 0
+    while start < window_end:
+        if deadline >= window_start:
+            found.append((index, start, deadline))
+        gap = deadline - start
+        start = recurrence.next_start(frequency, start, deadline)
+        deadline = start + gap
+        index += 1
+    return found
+
+
+@pytest.mark.parametrize("frequency", ["Weekly", "Monthly", "Yearly", "Immediate"])
+def test_expand_matches_stepping_one_occurrence_at_a_time(frequency):
+    start, deadline = _sgt(2025, 1, 31, 9), _sgt(2025, 2, 2, 17)
+    window = (_sgt(2025, 6, 1), _sgt(2027, 1, 1)) if frequency != "Immediate" else (_sgt(2025, 3, 1), _sgt(2025, 3, 20))
+    expanded = list(recurrence.expand(frequency, start, deadline, *window))
+    assert expanded and expanded == _stepped(frequency, start, deadline, *window)
+
+
+def test_expand_includes_occurrence_overlapping_window_start_and_respects_limit():
+    start, deadline = _sgt(2025, 1, 1, 9), _sgt(2025, 1, 3, 9)
+    # occurrence 3 runs 28 - 30 Jan (step is 1 week + the 2 day gap)
+    expanded = list(recurrence.expand("Weekly", start, deadline, _sgt(2025, 1, 29), _sgt(2025, 3, 1), limit=2))
+    assert [(i, s.date().isoformat()) for i, s, _ in expanded] == [(3, "2025-01-28"), (4, "2025-02-06")]
+
+
+def test_expand_rejects_bad_rows():
+    with pytest.raises(ValueError):
+        list(recurrence.expand("Daily", _sgt(2025, 1, 1), _sgt(2025, 1, 2), _sgt(2025, 1, 1), _sgt(2025, 2, 1)))
+    with pytest.raises(ValueError):
+        list(recurrence.expand("Weekly", _sgt(2025, 1, 2), _sgt(2025, 1, 1), _sgt(2025, 1, 1), _sgt(2025, 2, 1)))
+
+
+def test_expand_window_merges_by_start_skips_bad_rows_and_truncates():
+    schedules = [
+        _recurring("T1", "Weekly", _sgt(2025, 1, 1, 9), _sgt(2025, 1, 1, 17)),
+        _recurring("T2", "Monthly", _sgt(2025, 1, 2, 9), _sgt(2025, 1, 2, 17)),
+        _recurring("T3", "Immediate", _sgt(2025, 1, 1), _sgt(2025, 1, 1, 0, 1)),
+        _recurring("T4", "Fortnightly", _sgt(2025, 1, 1), _sgt(2025, 1, 2)),
+        {"sid": "S5", "tid": "T5", "is_recurring": False, "start": None, "deadline": None},
+    ]
+    result = occurrences.expand_window(schedules, _sgt(2025, 1, 1), _sgt(2025, 2, 1), per_schedule=10)
+
+    starts = [o["start"] for o in result["occurrences"]]
+    assert starts == sorted(starts)
+    assert result["truncated"] == ["T3"]
+    by_tid = {}
+    for o in result["occurrences"]:
+        by_tid.setdefault(o["tid"], []).append(o)
+    assert set(by_tid) == {"T1", "T2", "T3"}
+    assert len(by_tid["T1"]) == 5 and len(by_tid["T3"]) == 10
+    assert by_tid["T2"][0]["projected"] is False and by_tid["T1"][1]["projected"] is True
+
+
+def test_occurrence_cache_hits_until_invalidated_or_expired():
+    now = [0.0]
+    cache = occurrences.OccurrenceCache(maxsize=2, ttl_seconds=10, clock=lambda: now[0])
+    load = MagicMock(return_value=[_recurring("T1", "Weekly", _sgt(2025, 1, 1), _sgt(2025, 1, 2))])
+    window = (_sgt(2025, 1, 1), _sgt(2025, 2, 1))
+
+    first = cache.get(*window, load)
+    assert cache.get(*window, load) is first
+    assert load.call_count == 1
+
+    cache.invalidate()
+    cache.get(*window, load)
+    assert load.call_count == 2
+
+    now[0] = 11
+    cache.get(*window, load)
+    assert load.call_count == 3
+
+    cache.get(_sgt(2025, 2, 1), _sgt(2025, 3, 1), load)
+    cache.get(_sgt(2025, 3, 1), _sgt(2025, 4, 1), load)
+    assert len(cache) == 2
+
+
+def test_occurrence_cache_does_not_store_expansion_that_raced_a_write():
+    cache = occurrences.OccurrenceCache()
+
+    def load():
+        cache.invalidate()
+        return []
+
+    cache.get(_sgt(2025, 1, 1), _sgt(2025, 2, 1), load)
+    assert len(cache) == 0
+
+
+@pytest.fixture
+def occurrence_client(api_client, monkeypatch):
+    client, sb = api_client
+    monkeypatch.setattr(schedule_main, "occurrence_cache", occurrences.OccurrenceCache())
+    return client, sb
+
+
+def test_get_occurrences_expands_latest_schedules_and_caches(occurrence_client):
+    client, sb = occurrence_client
+    sb.fetch_all_schedules.return_value = [
+        _recurring("T1", "Weekly", _sgt(2025, 1, 1, 9), _sgt(2025, 1, 1, 17)),
+        {"sid": "S2", "tid": "T2", "is_recurring": False, "start": "2025-01-01T00:00:00+08:00",
+         "deadline": "2025-01-05T00:00:00+08:00"},
+    ]
+    params = {"from": "2025-01-01T00:00:00+08:00", "to": "2025-01-15T00:00:00+08:00"}
+
+    r = client.get("/occurrences", params=params)
+    assert r.status_code == 200
+    body = r.json()
+    assert [(o["index"], o["start"]) for o in body["data"]] == [
+        (0, "2025-01-01T09:00:00+08:00"), (1, "2025-01-08T17:00:00+08:00")]
+    assert body["truncated"] == []
+
+    client.get("/occurrences", params=params)
+    sb.fetch_all_schedules.assert_called_once()
+
+
+def test_get_occurrences_cache_dropped_on_write(occurrence_client):
+    client, sb = occurrence_client
+    sb.fetch_all_schedules.return_value = []
+    sb.delete_schedule.return_value = {"sid": "S1"}
+    params = {"from": "2025-01-01T00:00:00Z", "to": "2025-02-01T00:00:00Z"}
+
+    client.get("/occurrences", params=params)
+    assert client.delete("/S1").status_code == 200
+    client.get("/occurrences", params=params)
+    assert sb.fetch_all_schedules.call_count == 2
+
+
+@pytest.mark.parametrize("params", [
+    {"from": "yesterday", "to": "2025-02-01T00:00:00Z"},
+    {"from": "2025-02-01T00:00:00Z", "to": "2025-01-01T00:00:00Z"},
+    {"from": "2025-01-01T00:00:00Z", "to": "2026-06-01T00:00:00Z"},
+])
+def test_get_occurrences_rejects_bad_windows(occurrence_client, params):
+    client, sb = occurrence_client
+    assert client.get("/occurrences", params=params).status_code == 400
+    sb.fetch_all_schedules.assert_not_called()
+
+
+def test_get_occurrences_requires_window(occurrence_client):
+    client, _ = occurrence_client
+    assert client.get("/occurrences", params={"from": "2025-01-01T00:00:00Z"}).status_code == 422
+
+
+# ======================================================================================================
+#                                    Latest schedule cache
+# ======================================================================================================
+import latest_cache
+
+
+def test_latest_cache_caches_missing_tasks_and_expires():
+    now = [0.0]
+    cache = latest_cache.LatestScheduleCache(ttl_seconds=5, clock=lambda: now[0])
+    load = MagicMock(side_effect=lambda tids: {"T1": {"tid": "T1"}} if "T1" in tids else {})
+
+    assert cache.get_many(["T1", "T2"], load) == {"T1": {"tid": "T1"}}
+    assert cache.get_many(["T1", "T2"], load) == {"T1": {"tid": "T1"}}
+    assert load.call_count == 1
+
+    now[0] = 6
+    cache.get("T2", load)
+    assert load.call_count == 2
+
+
+def test_latest_cache_invalidates_per_task_or_everything():
+    cache = latest_cache.LatestScheduleCache()
+    load = MagicMock(side_effect=lambda tids: {t: {"tid": t} for t in tids})
+    cache.get_many(["T1", "T2", "T3"], load)
+
+    cache.invalidate(["T1"])
+    cache.get_many(["T1", "T2"], load)
+    assert load.call_args.args == (["T1"],)
+
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_latest_cache_evicts_least_recently_used():
+    cache = latest_cache.LatestScheduleCache(maxsize=2)
+    load = MagicMock(side_effect=lambda tids: {t: {"tid": t} for t in tids})
+    cache.get("T1", load)
+    cache.get("T2", load)
+    cache.get("T1", load)
+    cache.get("T3", load)
+
+    cache.get("T1", load)
+    assert load.call_count == 3
+    cache.get("T2", load)
+    assert load.call_count == 4
+
+
+def test_latest_cache_does_not_store_rows_read_before_a_write():
+    cache = latest_cache.LatestScheduleCache()
+
+    def load(tids):
+        cache.invalidate(["T1"])
+        return {"T1": {"tid": "T1", "status": "stale"}}
+
+    assert cache.get("T1", load) == {"tid": "T1", "status": "stale"}
+    assert len(cache) == 0
+
+
+def test_schedules_written_drops_only_touched_tasks(monkeypatch):
+    cache = latest_cache.LatestScheduleCache()
+    monkeypatch.setattr(schedule_main, "latest_cache", cache)
+    load = MagicMock(side_effect=lambda tids: {t: {"tid": t} for t in tids})
+    cache.get_many(["T1", "T2"], load)
+
+    schedule_main.schedules_written({"sid": "S1", "tid": "T1"})
+    assert len(cache) == 1
+    schedule_main.schedules_written(None)
+    assert len(cache) == 0
+
+
+# ======================================================================================================
+#                                    Due range query (/due)
+# ======================================================================================================
+def test_get_due_passes_normalised_range(api_client):
+    client, sb = api_client
+    sb.fetch_due_schedules.return_value = [{"sid": "S1", "tid": "T1"}]
+
+    r = client.get("/due", params={"after": "2025-01-01T00:00:00", "before": "2025-01-04T00:00:00Z",
+                                   "status_not": "completed, cancelled,", "limit": 50})
+    assert r.status_code == 200
+    assert r.json()["data"] == [{"sid": "S1", "tid": "T1"}]
+    sb.fetch_due_schedules.assert_called_once_with(
+        "2025-01-04T08:00:00+08:00", "2025-01-01T00:00:00+08:00", ["completed", "cancelled"], 50)
+
+
+def test_get_due_one_bound_is_enough(api_client):
+    client, sb = api_client
+    sb.fetch_due_schedules.return_value = []
+    assert client.get("/due", params={"before": "2025-01-04T00:00:00+08:00"}).status_code == 200
+    sb.fetch_due_schedules.assert_called_once_with("2025-01-04T00:00:00+08:00", None, [], None)
+
+
+@pytest.mark.parametrize("params", [{}, {"status_not": "completed"}, {"before": "soon"}])
+def test_get_due_rejects_unbounded_or_bad_range(api_client, params):
+    client, sb = api_client
+    assert client.get("/due", params=params).status_code == 400
+    sb.fetch_due_schedules.assert_not_called()
+
+
+def test_get_due_db_error_is_400(api_client):
+    client, sb = api_client
+    sb.fetch_due_schedules.side_effect = Exception("bad status list")
+    assert client.get("/due", params={"after": "2025-01-01T00:00:00Z"}).status_code == 400
+
+
+TID_A = "00000000-0000-0000-0000-00000000000a"
+TID_B = "00000000-0000-0000-0000-00000000000b"
+TID_C = "00000000-0000-0000-0000-00000000000c"
+
+
+def test_stream_all_reads_pages_and_writes_ndjson(api_client):
+    client, sb = api_client
+    pages = {None: [{"sid": "S1", "tid": TID_A}, {"sid": "S2", "tid": TID_B}], TID_B: [{"sid": "S3", "tid": TID_C}]}
+    sb.fetch_schedule_page.side_effect = lambda after, limit: pages.get(after, [])
+
+    r = client.get("/all/stream", params={"page_size": 2})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line)["sid"] for line in r.text.splitlines()] == ["S1", "S2", "S3"]
+    # The short second page ends the stream without another read
+    assert [c.kwargs["after"] for c in sb.fetch_schedule_page.call_args_list] == [None, TID_B]
+
+
+def test_stream_all_resumes_after_a_task(api_client):
+    client, sb = api_client
+    sb.fetch_schedule_page.return_value = []
+    assert client.get("/all/stream", params={"after": TID_B}).status_code == 200
+    sb.fetch_schedule_page.assert_called_once_with(after=TID_B, limit=500)
+
+
+@pytest.mark.parametrize("params", [{"after": "not-a-tid"}, {"page_size": 0}, {"page_size": 5001}])
+def test_stream_all_rejects_bad_params(api_client, params):
+    client, sb = api_client
+    assert client.get("/all/stream", params=params).status_code in (400, 422)
+    sb.fetch_schedule_page.assert_not_called()
@@ -8,6 +8,10 @@ from datetime import datetime
 backend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
 sys.path.insert(0, backend_path)
 
+# Add the service directory to Python path so tracing can be found
+service_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../backend/services/composite/notify_user"))
+sys.path.insert(0, service_path)
+
 # Mock the problematic modules before any imports
 mock_recurring_processor = Mock()
 mock_schedule_client = Mock()
@@ -7,6 +7,7 @@ from typing import Any, Dict
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
 from backend.services.atomic.tasks.supabaseClient import SupabaseClient
+from backend.services.atomic.tasks.task_tree import TaskTreeCache, build_task_tree, find_subtree
 
 
 # -------------------------------
@@ -286,6 +287,32 @@ def test_get_all_logs_empty(mock_client, supabase_client):
     assert result == []
 
 
+def test_get_logs_page_keyset_query(mock_client, supabase_client):
+    """Filters, keyset condition and (timestamp, id) ordering are pushed down to PostgREST"""
+    query = MagicMock()
+    for method in ("select", "in_", "eq", "gte", "lt", "or_", "order", "limit"):
+        getattr(query, method).return_value = query
+    query.execute.return_value.data = [{"id": "l-9"}]
+    mock_client.table.return_value = query
+
+    out = supabase_client.get_logs_page(
+        record_id="task123", actor="u1", since="2025-10-01T00:00:00", until="2025-11-01T00:00:00",
+        after=("2025-10-15T08:00:00+00:00", "l-10"), limit=51,
+    )
+
+    assert out == [{"id": "l-9"}]
+    query.in_.assert_called_once_with("table_name", ["TASK", "SCHEDULE"])
+    query.eq.assert_any_call("record_id", "task123")
+    query.eq.assert_any_call("changed_by", "u1")
+    query.gte.assert_called_once_with("timestamp", "2025-10-01T00:00:00")
+    query.lt.assert_called_once_with("timestamp", "2025-11-01T00:00:00")
+    query.or_.assert_called_once_with(
+        'timestamp.lt."2025-10-15T08:00:00+00:00",and(timestamp.eq."2025-10-15T08:00:00+00:00",id.lt."l-10")'
+    )
+    assert [c.args for c in query.order.call_args_list] == [("timestamp",), ("id",)]
+    query.limit.assert_called_once_with(51)
+
+
 # -------------------------------
 # Error Handling tests
 # -------------------------------
@@ -563,4 +590,142 @@ def test_get_all_logs_none_data(mock_client, supabase_client):
     mock_client.table.return_value.select.return_value.in_.return_value.execute.return_value = mock_resp
 
     out = supabase_client.get_all_logs()
-    assert out == []
\ No newline at end of file
+    assert out == []
+
+def test_get_latest_schedules_keys_by_tid(mock_client, supabase_client):
+    """Rows come back keyed by tid; rows without a tid are dropped."""
+    mock_client.rpc.return_value.execute.return_value.data = [
+        {"tid": "t1", "status": "complete"},
+        {"tid": "t2", "status": "ongoing"},
+        {"status": "orphan"},
+    ]
+
+    out = supabase_client.get_latest_schedules(["t1", "t2"])
+    assert out == {"t1": {"tid": "t1", "status": "complete"}, "t2": {"tid": "t2", "status": "ongoing"}}
+
+
+def test_get_latest_schedules_for_some_tasks(mock_client, supabase_client):
+    """Listed tasks are looked up with latest_schedule_for_tasks; an empty list skips the call."""
+    mock_client.rpc.return_value.execute.return_value.data = [{"tid": "t1", "status": "complete"}]
+
+    out = supabase_client.get_latest_schedules(["t1", "t3"])
+    mock_client.rpc.assert_called_once_with("latest_schedule_for_tasks", {"p_tids": ["t1", "t3"]})
+    assert out == {"t1": {"tid": "t1", "status": "complete"}}
+
+    mock_client.rpc.reset_mock()
+    assert supabase_client.get_latest_schedules([]) == {}
+    mock_client.rpc.assert_not_called()
+
+
+def test_get_due_schedules_calls_range_rpc(mock_client, supabase_client):
+    """Deadline filters read the schedules_due range query, keyed by tid."""
+    mock_client.rpc.return_value.execute.return_value.data = [{"tid": "t1", "deadline": "2025-01-02T00:00:00+00:00"}]
+
+    out = supabase_client.get_due_schedules(before="2025-01-05T00:00:00+00:00", after="2025-01-01T00:00:00+00:00")
+    mock_client.rpc.assert_called_once_with("schedules_due", {
+        "p_after": "2025-01-01T00:00:00+00:00",
+        "p_before": "2025-01-05T00:00:00+00:00",
+        "p_status_not": [],
+        "p_limit": None,
+    })
+    assert out == {"t1": {"tid": "t1", "deadline": "2025-01-02T00:00:00+00:00"}}
+
+
+def test_get_project_stats_single_grouped_rpc(mock_client, supabase_client):
+    """All projects are aggregated by one project_task_stats call; no pids means no call."""
+    rows = [{"pid": "p1", "status": "ongoing", "task_count": 2, "overdue_count": 1, "total_minutes": 125}]
+    mock_client.rpc.return_value.execute.return_value.data = rows
+
+    assert supabase_client.get_project_stats(["p1", "p2"]) == rows
+    mock_client.rpc.assert_called_once_with("project_task_stats", {"p_pids": ["p1", "p2"]})
+
+    mock_client.rpc.reset_mock()
+    assert supabase_client.get_project_stats([]) == []
+    mock_client.rpc.assert_not_called()
+
+
+def test_get_tasks_by_ids_single_query(mock_client, supabase_client):
+    """Tasks are fetched with one in_() query; no ids means no query."""
+    mock_table = mock_client.table.return_value
+    mock_table.select.return_value.in_.return_value.execute.return_value.data = [{"id": "t1"}]
+
+    assert supabase_client.get_tasks_by_ids(["t1", "t2"]) == [{"id": "t1"}]
+    mock_table.select.return_value.in_.assert_called_once_with("id", ["t1", "t2"])
+
+    mock_client.table.reset_mock()
+    assert supabase_client.get_tasks_by_ids([]) == []
+    mock_client.table.assert_not_called()
+
+
+def test_get_task_subtree_walks_all_levels(mock_client, supabase_client):
+    """Each level of children is fetched with one in_() query until none remain."""
+    mock_table = mock_client.table.return_value
+    mock_table.select.return_value.eq.return_value.execute.return_value.data = [{"id": "root"}]
+    mock_table.select.return_value.in_.return_value.execute.side_effect = [
+        MagicMock(data=[{"id": "c1", "parentTaskId": "root"}]),
+        MagicMock(data=[{"id": "g1", "parentTaskId": "c1"}]),
+        MagicMock(data=[]),
+    ]
+
+    out = supabase_client.get_task_subtree("root")
+    assert [t["id"] for t in out] == ["root", "c1", "g1"]
+    assert mock_table.select.return_value.in_.call_count == 3
+
+
+def test_build_task_tree_rolls_up_every_level():
+    tasks = [
+        {"id": "g1", "parentTaskId": "c1", "time_entries": [{"hours": 1, "minutes": 30}]},
+        {"id": "root", "parentTaskId": None},
+        {"id": "c1", "parentTaskId": "root", "time_entries": [{"hours": 0, "minutes": 15}]},
+        {"id": "c2", "parentTaskId": "root"},
+    ]
+    schedules = {
+        "g1": {"status": "complete"},
+        "c1": {"status": "ongoing", "deadline": "2000-01-01T00:00:00Z"},
+        "c2": {"status": "complete"},
+    }
+
+    forest = build_task_tree(tasks, schedules)
+    assert [n["id"] for n in forest] == ["root"]
+    root = forest[0]
+    assert root["rollup"] == {
+        "descendant_count": 3,
+        "completed_count": 2,
+        "overdue_count": 1,
+        "time_spent_minutes": 105,
+    }
+    assert root["progress"] == 66.67
+    c1 = find_subtree(forest, "c1")
+    assert c1["overdue"] is True
+    assert c1["progress"] == 100.0
+    assert "progress" not in find_subtree(forest, "g1")
+
+
+def test_build_task_tree_handles_deep_chains_and_cycles():
+    depth = 5000
+    tasks = [{"id": f"t{i}", "parentTaskId": f"t{i - 1}" if i else None} for i in range(depth)]
+    tasks += [{"id": "a", "parentTaskId": "b"}, {"id": "b", "parentTaskId": "a"}]
+
+    forest = build_task_tree(tasks)
+    assert forest[0]["rollup"]["descendant_count"] == depth - 1
+    # the cycle is broken at its first member instead of being dropped
+    assert [n["id"] for n in forest[1:]] == ["a"]
+    assert forest[1]["subtasks"][0]["id"] == "b"
+
+
+def test_task_tree_cache_invalidate_and_ttl():
+    cache = TaskTreeCache(ttl=60)
+    cache.set("p1", [{"id": "t1"}])
+    cache.set("p2", [{"id": "t2"}])
+    assert cache.get("p1") == [{"id": "t1"}]
+
+    cache.invalidate("p1")
+    assert cache.get("p1") is None
+    assert cache.get("p2") is not None
+
+    cache.invalidate()
+    assert cache.get("p2") is None
+
+    expired = TaskTreeCache(ttl=0)
+    expired.set("p1", [])
+    assert expired.get("p1") is None
@@ -0,0 +1,108 @@
+import pytest
+import os
+import sys
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+# Every service ships an identical tracing.py; import it the way the services do
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../backend/services/composite/manage_task")))
+import tracing
+
+
+class _CollectingExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span.to_dict())
+
+
+@pytest.fixture
+def exported(monkeypatch):
+    exporter = _CollectingExporter()
+    monkeypatch.setattr(tracing, "_exporter", exporter)
+    return exporter.spans
+
+
+# -------------------------------
+# Context propagation
+# -------------------------------
+def test_inject_and_extract_round_trip():
+    headers = {}
+    with tracing.start_span("outer") as span:
+        tracing.inject(headers)
+    ctx = tracing.extract(headers)
+    assert ctx.trace_id == span.context.trace_id
+    assert ctx.span_id == span.context.span_id
+
+
+@pytest.mark.parametrize("value", [None, "", "garbage", "00-xyz-123-01", "01-" + "a" * 32 + "-" + "b" * 16 + "-01"])
+def test_extract_rejects_malformed(value):
+    assert tracing.extract({"traceparent": value} if value is not None else {}) is None
+
+
+def test_kafka_headers_carry_context():
+    assert tracing.kafka_headers() is None
+    with tracing.start_span("publish") as span:
+        headers = tracing.kafka_headers()
+    ctx = tracing.extract(headers)
+    assert ctx.trace_id == span.context.trace_id
+
+
+def test_child_spans_share_trace_and_record_errors(exported):
+    with pytest.raises(ValueError):
+        with tracing.start_span("parent") as parent:
+            with tracing.start_span("child", attributes={"k": "v"}):
+                raise ValueError("boom")
+
+    child, parent_dict = exported
+    assert child["name"] == "child" and child["parent_id"] == parent.context.span_id
+    assert child["trace_id"] == parent.context.trace_id
+    assert child["status"] == "error" and "boom" in child["error"]
+    assert parent_dict["parent_id"] is None and parent_dict["duration_ms"] >= 0
+    assert tracing.current_span() is None
+
+
+# -------------------------------
+# HTTP instrumentation
+# -------------------------------
+@pytest.mark.asyncio
+async def test_outgoing_httpx_request_gets_client_span(exported):
+    tracing.instrument_httpx()
+    seen = {}
+
+    def handler(request):
+        seen["traceparent"] = request.headers.get("traceparent")
+        return httpx.Response(200, json={})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        with tracing.start_span("request") as root:
+            await client.get("http://tasks:5500/tid/123")
+
+    ctx = tracing.extract(seen)
+    assert ctx.trace_id == root.context.trace_id
+    client_span = next(s for s in exported if s["kind"] == "client")
+    assert client_span["name"] == "HTTP GET tasks"
+    assert client_span["span_id"] == ctx.span_id
+    assert client_span["attributes"]["http.status_code"] == 200
+
+
+def test_server_span_continues_incoming_trace(exported):
+    app = FastAPI()
+    tracing.instrument_app(app)
+
+    @app.get("/tid/{task_id}")
+    def get_task(task_id: str):
+        return {"id": task_id}
+
+    trace_id = "a" * 32
+    response = TestClient(app).get("/tid/42", headers={"traceparent": f"00-{trace_id}-{'b' * 16}-01"})
+
+    assert response.headers["X-Trace-Id"] == trace_id
+    assert response.headers["Server-Timing"].startswith("app;dur=")
+    server_span = next(s for s in exported if s["kind"] == "server")
+    assert server_span["name"] == "GET /tid/{task_id}"
+    assert server_span["trace_id"] == trace_id
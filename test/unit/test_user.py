@@ -1,6 +1,7 @@
 import sys
 import os
 import pytest
+import json
 from unittest.mock import patch, MagicMock
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
@@ -404,3 +405,146 @@ def test_get_all_logs_normalizes_none(mock_client, supabase_client):
     mock_table.select.return_value.eq.return_value.execute.return_value.data = None
     assert supabase_client.get_all_logs() == []
 
+
+
+# -------------------------------
+# Local session verification (auth_cache / checkCookies)
+# -------------------------------
+import asyncio
+import time
+
+import httpx
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../backend/services/atomic/user")))
+import auth_cache
+from backend.services.atomic.user import main as user_main
+
+SECRET = "test-secret-for-local-session-checks"
+
+
+def _access_token(exp_in=3600, aud="authenticated", secret=SECRET):
+    return jwt.encode({"sub": "auth-1", "aud": aud, "exp": int(time.time()) + exp_in}, secret, algorithm="HS256")
+
+
+def test_verifier_memoizes_claims_until_expiry():
+    verifier = auth_cache.TokenVerifier(SECRET, audience="authenticated")
+    token = _access_token()
+    assert verifier.cached(token) is None
+
+    with patch.object(auth_cache.jwt, "decode", wraps=jwt.decode) as decode:
+        verifier.verify(token)
+        verifier.verify(token)
+    assert decode.call_count == 1
+    assert verifier.cached(token)["sub"] == "auth-1"
+
+    with pytest.raises(jwt.ExpiredSignatureError):
+        verifier.verify(_access_token(exp_in=-10))
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify(_access_token(aud="anon"))
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify(_access_token(secret="another-secret-for-local-session-checks"))
+
+
+def test_verifier_uses_jwks_for_asymmetric_tokens(monkeypatch):
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    jwk = json.loads(jwt.algorithms.ECAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update({"kid": "key-1", "alg": "ES256"})
+    fetches = []
+
+    def fake_get(url, timeout):
+        fetches.append(url)
+        return httpx.Response(200, json={"keys": [jwk]}, request=httpx.Request("GET", url))
+
+    monkeypatch.setattr(auth_cache.httpx, "get", fake_get)
+    verifier = auth_cache.TokenVerifier(None, jwks=auth_cache.JWKSCache("https://x/jwks.json"), audience="authenticated")
+    claims = {"sub": "auth-1", "aud": "authenticated", "exp": int(time.time()) + 60}
+
+    assert verifier.verify(jwt.encode(claims, private_key, algorithm="ES256", headers={"kid": "key-1"}))["sub"] == "auth-1"
+    # An unknown kid refetches at most once per interval
+    for _ in range(3):
+        with pytest.raises(jwt.InvalidTokenError):
+            verifier.verify(jwt.encode(claims, private_key, algorithm="ES256", headers={"kid": "rotated"}))
+    assert len(fetches) == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_refreshes_share_one_call():
+    calls = []
+
+    def refresh(token):
+        calls.append(token)
+        time.sleep(0.05)
+        return {"session": token + "-new"}
+
+    coalescer = auth_cache.RefreshCoalescer(refresh)
+    results = await asyncio.gather(*(coalescer.refresh("rt-1") for _ in range(10)))
+
+    assert calls == ["rt-1"]
+    assert all(r == {"session": "rt-1-new"} for r in results)
+    # Requests still carrying the old cookies get the same result
+    assert await coalescer.refresh("rt-1") == {"session": "rt-1-new"}
+    assert calls == ["rt-1"]
+
+
+@pytest.fixture
+def check_cookies_client(monkeypatch):
+    monkeypatch.setattr(user_main, "JWT_SECRET", SECRET)
+    monkeypatch.setattr(user_main, "access_token_verifier", auth_cache.TokenVerifier(SECRET, audience="authenticated"))
+    monkeypatch.setattr(user_main, "user_data_verifier", auth_cache.TokenVerifier(SECRET))
+    fake_supabase = MagicMock()
+    monkeypatch.setattr(user_main, "supabase", fake_supabase)
+    monkeypatch.setattr(user_main, "session_refresher", auth_cache.RefreshCoalescer(
+        lambda token: user_main.supabase.refresh_session(token)))
+    return TestClient(user_main.app), fake_supabase
+
+
+def test_check_cookies_valid_session_skips_supabase(check_cookies_client):
+    client, fake_supabase = check_cookies_client
+    user_data = jwt.encode({"id": "u1", "name": "Alice"}, SECRET, algorithm="HS256")
+    client.cookies.update({"access_token": _access_token(), "refresh_token": "rt", "user_data": user_data})
+
+    for _ in range(3):
+        response = client.get("/checkCookies")
+        assert response.status_code == 200
+        assert response.json()["user"]["id"] == "u1"
+    fake_supabase.refresh_session.assert_not_called()
+
+
+def test_check_cookies_refreshes_expired_access_token(check_cookies_client):
+    client, fake_supabase = check_cookies_client
+    session = MagicMock()
+    session.session.access_token = _access_token()
+    session.session.refresh_token = "rt-2"
+    session.user.id = "u1"
+    session.user.email = "a@b.c"
+    session.user.user_metadata = {"role": "staff", "name": "Alice"}
+    fake_supabase.refresh_session.return_value = session
+    user_data = jwt.encode({"id": "u1"}, SECRET, algorithm="HS256")
+    client.cookies.update({"access_token": _access_token(exp_in=-10), "refresh_token": "rt", "user_data": user_data})
+
+    response = client.get("/checkCookies")
+
+    assert response.status_code == 200
+    assert response.json()["user"]["role"] == "staff"
+    assert response.cookies.get("refresh_token") == "rt-2"
+    fake_supabase.refresh_session.assert_called_once_with("rt")
+
+
+def test_user_data_token_expires_with_its_cookie(monkeypatch):
+    monkeypatch.setattr(user_main, "JWT_SECRET", SECRET)
+    claims = jwt.decode(user_main.sign_user_data({"id": "u1", "role": "staff"}), SECRET, algorithms=["HS256"])
+
+    assert claims["id"] == "u1"
+    assert claims["exp"] - claims["iat"] == user_main.USER_DATA_TTL_SECONDS
+    assert abs(claims["exp"] - (time.time() + 3600)) < 5
+
+
+def test_check_cookies_rejects_forged_access_token(check_cookies_client):
+    client, _ = check_cookies_client
+    user_data = jwt.encode({"id": "u1"}, SECRET, algorithm="HS256")
+    client.cookies.update({"access_token": _access_token(secret="forged-secret-for-local-session-checks"), "refresh_token": "rt", "user_data": user_data})
+
+    assert client.get("/checkCookies").status_code == 401